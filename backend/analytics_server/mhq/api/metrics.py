@@ -0,0 +1,34 @@
+import time
+
+from flask import Blueprint, Response, g, request
+
+from mhq.utils.metrics import (
+    HTTP_REQUEST_DURATION_SECONDS,
+    METRICS_CONTENT_TYPE,
+    render_metrics,
+)
+
+app = Blueprint("metrics", __name__)
+
+
+@app.before_app_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+
+
+@app.after_app_request
+def record_request_duration(response):
+    started_at = g.pop("request_started_at", None)
+    if started_at is not None:
+        HTTP_REQUEST_DURATION_SECONDS.labels(
+            blueprint=request.blueprint or "",
+            method=request.method,
+            route=request.url_rule.rule if request.url_rule else "unmatched",
+            status=response.status_code,
+        ).observe(time.perf_counter() - started_at)
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
@@ -1,8 +1,12 @@
 from flask import Blueprint, jsonify
 
+from mhq.service.merge_to_deploy_broker import process_merge_to_deploy_cache
 from mhq.service.query_validator import get_query_validator
-from mhq.service.sync_data import trigger_data_sync
-from mhq.utils.lock import get_redis_lock_service
+from mhq.service.sync_jobs import (
+    enqueue_org_sync,
+    get_sync_job_queue,
+    start_sync_tasks_processing,
+)
 from mhq.utils.log import LOG
 from mhq.utils.time import time_now
 
@@ -15,10 +19,77 @@ def sync():
     if not default_org:
         return jsonify({"message": "Default org not found"}), 404
     org_id = str(default_org.id)
-    with get_redis_lock_service().acquire_lock("{org}:" + f"{str(org_id)}:data_sync"):
-        try:
-            trigger_data_sync(org_id)
-        except Exception as e:
-            LOG.error(f"Error syncing data for org {org_id}: {str(e)}")
-            return {"message": "sync failed", "time": time_now().isoformat()}, 500
-    return {"message": "sync started", "time": time_now().isoformat()}
+    try:
+        job = enqueue_org_sync(org_id)
+    except Exception as e:
+        LOG.error(f"Error queueing data sync for org {org_id}: {str(e)}")
+        return {"message": "sync failed", "time": time_now().isoformat()}, 500
+
+    start_sync_tasks_processing()
+    return {
+        "message": "sync queued",
+        "job_id": job.id,
+        "time": time_now().isoformat(),
+    }, 202
+
+
+@app.route("/sync/jobs", methods=["GET"])
+def get_sync_jobs():
+    queue = get_sync_job_queue()
+    jobs = [queue.get_job_progress(job_id) for job_id in queue.get_recent_job_ids()]
+    return {"jobs": [job for job in jobs if job]}
+
+
+@app.route("/sync/jobs/<job_id>", methods=["GET"])
+def get_sync_job(job_id: str):
+    progress = get_sync_job_queue().get_job_progress(job_id)
+    if not progress:
+        return jsonify({"message": "Sync job not found"}), 404
+    return progress
+
+
+@app.route("/sync/jobs/process", methods=["POST"])
+def process_sync_jobs():
+    """
+    Requeues the tasks of sync workers that died mid task, and starts draining the queue
+    on background threads of this instance, e.g. to pick up tasks no worker picked up, or
+    to add an instance to a running sync. Answers right away, so it never holds a server
+    worker for the length of a sync.
+    """
+    requeued_tasks = get_sync_job_queue().requeue_expired_tasks()
+    started_workers = start_sync_tasks_processing()
+    return {
+        "message": "processing sync tasks",
+        "requeued_tasks": requeued_tasks,
+        "started_workers": started_workers,
+        "time": time_now().isoformat(),
+    }, 202
+
+
+@app.route("/sync/merge-to-deploy", methods=["POST"])
+def sync_merge_to_deploy():
+    """
+    Lets more sync server instances share the merge to deploy work of a running sync.
+    Repos are split through the per repo locks, repos held by another instance are skipped.
+    """
+    default_org = get_query_validator().get_default_org()
+    if not default_org:
+        return jsonify({"message": "Default org not found"}), 404
+    org_id = str(default_org.id)
+    reports = process_merge_to_deploy_cache(org_id, wait_for_locked_repos=False)
+    return {
+        "repos": [
+            {
+                "repo_id": report.repo_id,
+                "skipped": report.skipped,
+                "error": report.error,
+                "duration_seconds": report.duration_seconds,
+                "deployments_processed": report.deployments_processed,
+                "prs_updated": report.prs_updated,
+                "lag_seconds": report.lag_seconds,
+                "caught_up": report.caught_up,
+            }
+            for report in reports
+        ],
+        "time": time_now().isoformat(),
+    }
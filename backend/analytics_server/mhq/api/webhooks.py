@@ -0,0 +1,77 @@
+from os import getenv
+
+from flask import Blueprint, jsonify, request
+
+from mhq.service.webhooks import (
+    WebhookEvent,
+    get_webhook_event_queue,
+    process_webhook_events,
+    start_webhook_events_processing,
+    verify_github_signature,
+    verify_gitlab_token,
+)
+from mhq.store.models.code import CodeProvider
+from mhq.utils.log import LOG
+
+app = Blueprint("webhooks", __name__)
+
+GITHUB_WEBHOOK_SECRET = getenv("GITHUB_WEBHOOK_SECRET")
+GITLAB_WEBHOOK_SECRET = getenv("GITLAB_WEBHOOK_SECRET")
+
+GITHUB_QUEUED_EVENTS = ("pull_request", "pull_request_review", "workflow_run")
+GITLAB_QUEUED_EVENTS = ("Merge Request Hook", "Note Hook")
+
+
+@app.route("/webhooks/github", methods=["POST"])
+def github_webhook():
+    body = request.get_data()
+    if not verify_github_signature(
+        GITHUB_WEBHOOK_SECRET, body, request.headers.get("X-Hub-Signature-256")
+    ):
+        return jsonify({"message": "Invalid signature"}), 401
+
+    event = request.headers.get("X-GitHub-Event")
+    if event not in GITHUB_QUEUED_EVENTS:
+        return {"message": "event ignored", "event": event}
+
+    return _queue_event(
+        WebhookEvent(
+            provider=CodeProvider.GITHUB.value,
+            event=event,
+            payload=request.get_json(force=True),
+            delivery_id=request.headers.get("X-GitHub-Delivery"),
+        )
+    )
+
+
+@app.route("/webhooks/gitlab", methods=["POST"])
+def gitlab_webhook():
+    if not verify_gitlab_token(
+        GITLAB_WEBHOOK_SECRET, request.headers.get("X-Gitlab-Token")
+    ):
+        return jsonify({"message": "Invalid token"}), 401
+
+    event = request.headers.get("X-Gitlab-Event")
+    if event not in GITLAB_QUEUED_EVENTS:
+        return {"message": "event ignored", "event": event}
+
+    return _queue_event(
+        WebhookEvent(
+            provider=CodeProvider.GITLAB.value,
+            event=event,
+            payload=request.get_json(force=True),
+            delivery_id=request.headers.get("X-Gitlab-Event-UUID"),
+        )
+    )
+
+
+@app.route("/webhooks/process", methods=["POST"])
+def process_webhooks():
+    return process_webhook_events()
+
+
+def _queue_event(event: WebhookEvent):
+    get_webhook_event_queue().push(event)
+    LOG.info(f"[Webhooks] Queued {event.provider} {event.event} event")
+    start_webhook_events_processing()
+    return {"message": "event queued", "event": event.event}, 202
@@ -1,16 +1,26 @@
+import asyncio
 import contextlib
-from datetime import datetime
+import json
+import time
+from datetime import datetime, timezone
 from http import HTTPStatus
-from typing import Optional, Dict, Tuple, List, cast
+from typing import Callable, Optional, Dict, Tuple, List, TypeVar, cast
+from urllib.parse import parse_qs, urlparse
 
+import aiohttp
 import requests
 
 from github import Github, UnknownObjectException
-from github.GithubException import GithubException
+from github.GithubException import GithubException, RateLimitExceededException
 from github.Organization import Organization as GithubOrganization
 from github.PaginatedList import PaginatedList as GithubPaginatedList
 from github.PullRequest import PullRequest as GithubPullRequest
 from github.Repository import Repository as GithubRepository
+from github.Requester import (
+    HTTPRequestsConnectionClass,
+    HTTPSRequestsConnectionClass,
+    Requester,
+)
 
 from mhq.exapi.schemas.timeline import (
     GitHubPullTimelineEvent,
@@ -19,21 +29,77 @@ from mhq.exapi.schemas.timeline import (
 from mhq.exapi.models.github import GitHubContributor
 from mhq.exapi.models.github_timeline import GithubPullRequestTimelineEvents
 from mhq.store.models.code.enums import PullRequestEventType
+from mhq.utils.http_cache import CachedResponse, ResponseCache
+from mhq.utils.http_session import (
+    EXAPI_HTTP_POOL_SIZE,
+    AsyncHTTPSession,
+    AsyncResponse,
+    get_async_http_session,
+    get_http_adapter,
+    get_http_session,
+    get_retry_config,
+    run_async_http_requests,
+)
+from mhq.utils.http_replay import get_exapi_recordings
 from mhq.utils.log import LOG
+from mhq.utils.metrics import record_exapi_request
+from mhq.utils.time import ISO_8601_DATE_FORMAT
+from mhq.utils.rate_limit import (
+    RATE_LIMIT_MAX_ATTEMPTS,
+    RateLimitScheduler,
+    get_rate_limit_scheduler,
+)
 
 PAGE_SIZE = 100
+TIMELINE_FETCH_CONCURRENCY = 10
+
+T = TypeVar("T")
 
 
 class GithubRateLimitExceeded(Exception):
     pass
 
 
+class RecordingHTTPRequestsConnection(HTTPRequestsConnectionClass):
+    """
+    PyGithub connection sending its requests through the recording adapter, so PyGithub
+    calls are recorded and replayed along with the rest of the provider API calls.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.adapter = get_http_adapter(self.pool_size)
+        self.session.mount("http://", self.adapter)
+
+
+class RecordingHTTPSRequestsConnection(HTTPSRequestsConnectionClass):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.adapter = get_http_adapter(self.pool_size)
+        self.session.mount("https://", self.adapter)
+
+
 class GithubApiService:
     def __init__(self, access_token: str, domain: Optional[str]):
         self._token = access_token
         self.base_url = self._get_api_url(domain)
-        self._g = Github(self._token, base_url=self.base_url, per_page=PAGE_SIZE)
+        if get_exapi_recordings():
+            Requester.injectConnectionClasses(
+                RecordingHTTPRequestsConnection, RecordingHTTPSRequestsConnection
+            )
+        self._g = Github(
+            self._token,
+            base_url=self.base_url,
+            per_page=PAGE_SIZE,
+            retry=get_retry_config(),
+            pool_size=EXAPI_HTTP_POOL_SIZE,
+        )
         self.headers = {"Authorization": f"Bearer {self._token}"}
+        self._session = get_http_session(self.base_url, self._token)
+        self._rate_limiter: RateLimitScheduler = get_rate_limit_scheduler(
+            self.base_url, self._token
+        )
+        self._session.rate_limiter = self._rate_limiter
 
     def _get_api_url(self, domain: str) -> str:
         if not domain:
@@ -47,6 +113,60 @@ class GithubApiService:
         yield
         self._g.per_page = PAGE_SIZE
 
+    def _call_within_rate_limit(self, func: Callable[[], T], endpoint: str) -> T:
+        """
+        Runs a PyGithub call through the rate limiter, waiting and retrying when it is
+        rate limited instead of failing. PyGithub does not go through the shared session,
+        so the call is recorded in the exapi metrics under `endpoint` here.
+        """
+        attempt = 1
+        while True:
+            self._rate_limiter.acquire()
+            started_at = time.perf_counter()
+            status = None
+            try:
+                result = func()
+                status = HTTPStatus.OK
+                self._update_rate_limiter_from_last_response()
+                return result
+            except RateLimitExceededException as e:
+                status = e.status
+                if attempt >= RATE_LIMIT_MAX_ATTEMPTS or not self._rate_limiter.update(
+                    e.status, e.headers, str(e.data)
+                ):
+                    raise
+                attempt += 1
+            except GithubException as e:
+                status = e.status
+                raise
+            finally:
+                record_exapi_request(
+                    "GET",
+                    f"{self.base_url}{endpoint}",
+                    status,
+                    time.perf_counter() - started_at,
+                )
+
+    def _update_rate_limiter_from_last_response(self):
+        """
+        PyGithub keeps the quota reported by its last response. Feeding it to the rate
+        limiter after every call paces PyGithub calls as the quota drains, instead of only
+        once it is exhausted. The quota is read off the requester, as `Github.rate_limiting`
+        requests `/rate_limit` when no response reported a quota yet.
+        """
+        requester: Requester = self._g._Github__requester
+        remaining, limit = requester.rate_limiting
+        if limit < 0:
+            return
+        self._rate_limiter.update(
+            HTTPStatus.OK,
+            {
+                "X-RateLimit-Remaining": str(remaining),
+                "X-RateLimit-Limit": str(limit),
+                "X-RateLimit-Reset": str(requester.rate_limiting_resettime),
+            },
+        )
+
     def check_pat(self) -> bool:
         """
         Checks if PAT is Valid
@@ -55,14 +175,16 @@ class GithubApiService:
         """
         url = f"{self.base_url}/user"
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self._session.get(url, headers=self.headers)
         except GithubException as e:
             raise Exception(f"Error in PAT validation, Error: {e.data}")
         return response.status_code == 200
 
     def get_org_list(self) -> [GithubOrganization]:
         try:
-            orgs = list(self._g.get_user().get_orgs())
+            orgs = self._call_within_rate_limit(
+                lambda: list(self._g.get_user().get_orgs()), "/user/orgs"
+            )
         except GithubException as e:
             raise e
 
@@ -74,8 +196,10 @@ class GithubApiService:
         with self.temp_config(
             per_page=per_page
         ):  # This works on assumption of single thread, else make thread local
-            o = self._g.get_organization(org_login)
-            repos = o.get_repos().get_page(page)
+            repos = self._call_within_rate_limit(
+                lambda: self._g.get_organization(org_login).get_repos().get_page(page),
+                "/orgs/{org}/repos",
+            )
         return repos
 
     def get_repos_raw(
@@ -92,20 +216,35 @@ class GithubApiService:
         try:
             user = self._g.get_user()
             with self.temp_config(per_page=per_page):
-                repos = user.get_repos().get_page(page)
+                repos = self._call_within_rate_limit(
+                    lambda: user.get_repos().get_page(page), "/user/repos"
+                )
         except GithubException as e:
             raise e
 
         return [repo.__dict__["_rawData"] for repo in repos]
 
     def get_repo(self, org_login: str, repo_name: str) -> Optional[GithubRepository]:
-        try:
-            return self._g.get_repo(f"{org_login}/{repo_name}")
-        except GithubException as e:
-            raise e
+        """
+        Fetched over the shared session instead of PyGithub, so that unchanged repos are
+        revalidated against the response cache.
+        """
+        github_url = f"{self.base_url}/repos/{org_login}/{repo_name}"
+        response = self._session.get(github_url, headers=self.headers)
+
+        if response.status_code == HTTPStatus.NOT_FOUND:
+            raise UnknownObjectException(
+                response.status_code, response.text, response.headers
+            )
+
+        if response.status_code != HTTPStatus.OK:
+            raise GithubException(response.status_code, response.text, response.headers)
+
+        return self._g.create_from_raw_data(GithubRepository, response.json())
 
     def get_repo_contributors(self, github_repo: GithubRepository) -> [Tuple[str, int]]:
-        contributors = list(github_repo.get_contributors())
+        org_login, repo_name = github_repo.full_name.split("/", 1)
+        contributors = self.get_contributors(org_login, repo_name)
         return [(u.login, u.contributions) for u in contributors]
 
     def get_pull_requests(
@@ -113,6 +252,9 @@ class GithubApiService:
     ) -> GithubPaginatedList:
         return repo.get_pulls(state=state, sort=sort, direction=direction)
 
+    def get_pull_request_from_raw_data(self, raw_data: Dict) -> GithubPullRequest:
+        return self._g.create_from_raw_data(GithubPullRequest, raw_data)
+
     def get_raw_prs(self, prs: [GithubPullRequest]):
         return [pr.__dict__["_rawData"] for pr in prs]
 
@@ -121,8 +263,18 @@ class GithubApiService:
     ) -> GithubPullRequest:
         return github_repo.get_pull(number=number)
 
-    def get_pr_commits(self, pr: GithubPullRequest):
-        return pr.get_commits()
+    def get_pull_requests_page(
+        self, github_pull_requests: GithubPaginatedList, page: int
+    ) -> List[GithubPullRequest]:
+        return self._call_within_rate_limit(
+            lambda: github_pull_requests.get_page(page),
+            "/repos/{owner}/{repo}/pulls",
+        )
+
+    def get_pr_commits(self, pr: GithubPullRequest) -> List:
+        return self._call_within_rate_limit(
+            lambda: list(pr.get_commits()), "/repos/{owner}/{repo}/pulls/{id}/commits"
+        )
 
     def get_pr_reviews(self, pr: GithubPullRequest) -> GithubPaginatedList:
         return pr.get_reviews()
@@ -160,9 +312,12 @@ class GithubApiService:
         def _fetch_contributors(page: int = 0):
             github_url = f"{self.base_url}/repos/{org_login}/{repo_name}/contributors"
             query_params = dict(per_page=PAGE_SIZE, page=page)
-            response = requests.get(
+            response = self._session.get(
                 github_url, headers=self.headers, params=query_params
             )
+            # Empty repos have no contributors and respond with no content
+            if response.status_code == HTTPStatus.NO_CONTENT:
+                return []
             assert response.status_code == HTTPStatus.OK
             return response.json()
 
@@ -212,7 +367,7 @@ class GithubApiService:
         def _fetch_members(page: int = 0):
             github_url = f"{self.base_url}/orgs/{org_login}/members"
             query_params = dict(per_page=PAGE_SIZE, page=page)
-            response = requests.get(
+            response = self._session.get(
                 github_url, headers=self.headers, params=query_params
             )
             assert response.status_code == HTTPStatus.OK
@@ -244,18 +399,26 @@ class GithubApiService:
     def get_workflow_runs(
         self, org_login: str, repo_name: str, workflow_id: str, bookmark: datetime
     ):
+        """
+        Returns the runs of a workflow created at or after the bookmark. Runs are filtered
+        by GitHub and returned newest first, so paging stops at the first page that is not
+        full or that reaches back past the bookmark.
+        """
         repo_workflows = []
         page = 1
+        if bookmark.tzinfo is None:
+            bookmark = bookmark.replace(tzinfo=timezone.utc)
 
         def _fetch_workflow_runs(page: int = 1):
             github_url = f"{self.base_url}/repos/{org_login}/{repo_name}/actions/workflows/{workflow_id}/runs"
             query_params = dict(
                 per_page=PAGE_SIZE,
                 page=page,
-                created=f"created:>={bookmark.isoformat()}",
+                created=f">={bookmark.isoformat()}",
             )
-            response = requests.get(
-                github_url, headers=self.headers, params=query_params
+            # The bookmark moves every sync, so these responses are never revalidated
+            response = self._session.get(
+                github_url, headers=self.headers, params=query_params, cache=False
             )
 
             if response.status_code == HTTPStatus.NOT_FOUND:
@@ -268,17 +431,47 @@ class GithubApiService:
             assert response.status_code == HTTPStatus.OK
             return response.json()
 
+        def _is_before_bookmark(workflow_run: Dict) -> bool:
+            created_at = workflow_run.get("created_at")
+            if not created_at:
+                return False
+            return (
+                datetime.strptime(created_at, ISO_8601_DATE_FORMAT).replace(
+                    tzinfo=timezone.utc
+                )
+                < bookmark
+            )
+
         data = _fetch_workflow_runs(page=page)
         while data and data.get("workflow_runs"):
             curr_workflow_repos = data.get("workflow_runs")
-            repo_workflows += curr_workflow_repos
-            if len(curr_workflow_repos) == 0:
+            repo_workflows += [
+                workflow_run
+                for workflow_run in curr_workflow_repos
+                if not _is_before_bookmark(workflow_run)
+            ]
+            if len(curr_workflow_repos) < PAGE_SIZE or _is_before_bookmark(
+                curr_workflow_repos[-1]
+            ):
                 break
 
             page += 1
             data = _fetch_workflow_runs(page=page)
         return repo_workflows
 
+    def get_workflow_run(
+        self, org_login: str, repo_name: str, run_id: str
+    ) -> Optional[Dict]:
+        github_url = (
+            f"{self.base_url}/repos/{org_login}/{repo_name}/actions/runs/{run_id}"
+        )
+        response = self._session.get(github_url, headers=self.headers)
+        if response.status_code == HTTPStatus.NOT_FOUND:
+            return None
+
+        assert response.status_code == HTTPStatus.OK
+        return response.json()
+
     def _fetch_timeline_events(
         self, repo_name: str, pr_number: int, page: int = 1
     ) -> List[Dict]:
@@ -286,34 +479,40 @@ class GithubApiService:
         query_params = {"per_page": PAGE_SIZE, "page": page}
 
         try:
-            response = requests.get(
+            response = self._session.get(
                 github_url, headers=self.headers, params=query_params
             )
         except requests.RequestException as e:
             raise GithubException(
-                HTTPStatus.SERVICE_UNAVAILABLE, f"Network error: {str(e)}"
+                HTTPStatus.SERVICE_UNAVAILABLE, f"Network error: {str(e)}", headers=None
             ) from e
 
         if response.status_code == HTTPStatus.NOT_FOUND:
             raise GithubException(
                 HTTPStatus.NOT_FOUND,
                 f"PR {pr_number} not found for repo {repo_name}",
+                headers=None,
             )
 
-        if response.status_code == HTTPStatus.FORBIDDEN:
+        if RateLimitScheduler.is_rate_limited(
+            response.status_code, response.headers, response.text
+        ):
             raise GithubRateLimitExceeded("GitHub API rate limit exceeded")
 
         if response.status_code != HTTPStatus.OK:
             raise GithubException(
                 response.status_code,
                 f"Failed to fetch timeline events: {response.text}",
+                headers=None,
             )
 
         try:
             return response.json()
         except ValueError as e:
             raise GithubException(
-                HTTPStatus.INTERNAL_SERVER_ERROR, f"Invalid JSON response: {str(e)}"
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                f"Invalid JSON response: {str(e)}",
+                headers=None,
             ) from e
 
     def _create_timeline_event(self, event_data: Dict) -> GitHubPrTimelineEventsDict:
@@ -352,11 +551,214 @@ class GithubApiService:
             raise
         except Exception as e:
             raise GithubException(
-                HTTPStatus.INTERNAL_SERVER_ERROR, f"Unexpected error: {str(e)}"
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                f"Unexpected error: {str(e)}",
+                headers=None,
             ) from e
 
         return self._adapt_github_timeline_events(all_timeline_events)
 
+    def get_prs_timeline_events(
+        self,
+        repo_name_pr_number_pairs: List[Tuple[str, int]],
+        max_concurrency: int = TIMELINE_FETCH_CONCURRENCY,
+    ) -> List[List[GithubPullRequestTimelineEvents]]:
+        """
+        Fetches the timeline events of many PRs concurrently over a single HTTP session.
+        At most `max_concurrency` requests are in flight at a time. The remaining pages of a
+        PR are fetched in parallel once the first page reveals the page count.
+        :param repo_name_pr_number_pairs: List of (repo full name, PR number)
+        :returns: Timeline events of every PR, in the order of the input
+        """
+        if not repo_name_pr_number_pairs:
+            return []
+
+        return run_async_http_requests(
+            self._get_prs_timeline_events_async(
+                repo_name_pr_number_pairs,
+                self._rate_limiter.get_concurrency(max(1, max_concurrency)),
+            )
+        )
+
+    async def _get_prs_timeline_events_async(
+        self, repo_name_pr_number_pairs: List[Tuple[str, int]], max_concurrency: int
+    ) -> List[List[GithubPullRequestTimelineEvents]]:
+        semaphore = asyncio.Semaphore(max_concurrency)
+        session = get_async_http_session(self.base_url, self._token)
+        return list(
+            await asyncio.gather(
+                *[
+                    self._get_pr_timeline_events_async(
+                        session, semaphore, repo_name, pr_number
+                    )
+                    for repo_name, pr_number in repo_name_pr_number_pairs
+                ]
+            )
+        )
+
+    async def _get_pr_timeline_events_async(
+        self,
+        session: AsyncHTTPSession,
+        semaphore: asyncio.Semaphore,
+        repo_name: str,
+        pr_number: int,
+    ) -> List[GithubPullRequestTimelineEvents]:
+        timeline_events, last_page = await self._fetch_timeline_events_async(
+            session, semaphore, repo_name, pr_number
+        )
+
+        if last_page is not None:
+            pages = await asyncio.gather(
+                *[
+                    self._fetch_timeline_events_async(
+                        session, semaphore, repo_name, pr_number, page
+                    )
+                    for page in range(2, last_page + 1)
+                ]
+            )
+            for page_timeline_events, _ in pages:
+                timeline_events += page_timeline_events
+        else:
+            # Without pagination links, keep paging until a page is not full
+            page = 1
+            page_timeline_events = timeline_events
+            while len(page_timeline_events) >= PAGE_SIZE:
+                page += 1
+                page_timeline_events, _ = await self._fetch_timeline_events_async(
+                    session, semaphore, repo_name, pr_number, page
+                )
+                timeline_events += page_timeline_events
+
+        return self._adapt_github_timeline_events(
+            [self._create_timeline_event(event_data) for event_data in timeline_events]
+        )
+
+    async def _fetch_timeline_events_async(
+        self,
+        session: AsyncHTTPSession,
+        semaphore: asyncio.Semaphore,
+        repo_name: str,
+        pr_number: int,
+        page: int = 1,
+    ) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Async counterpart of `_fetch_timeline_events`. The async session retries and waits
+        for the rate limiter like the sync session does.
+        :returns: Timeline events of the page and the last page number from the `Link` header,
+        if GitHub sent one.
+        """
+        github_url = f"{self.base_url}/repos/{repo_name}/issues/{pr_number}/timeline"
+        query_params = {"per_page": PAGE_SIZE, "page": page}
+        response_cache: Optional[ResponseCache] = self._session.response_cache
+        cache_key: Optional[str] = None
+        cached_response: Optional[CachedResponse] = None
+        request_headers: Dict[str, str] = dict(self.headers)
+        if response_cache:
+            cache_key = response_cache.get_key(
+                self._session.cache_scope, github_url, query_params
+            )
+            # Cache reads and writes block on Redis or disk, so they run off the event
+            # loop shared by every concurrent fetch
+            cached_response = await asyncio.to_thread(response_cache.get, cache_key)
+            if cached_response:
+                request_headers.update(cached_response.conditional_headers)
+
+        async with semaphore:
+            try:
+                response = await session.get(
+                    github_url, params=query_params, headers=request_headers
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise GithubException(
+                    HTTPStatus.SERVICE_UNAVAILABLE,
+                    f"Network error: {str(e)}",
+                    headers=None,
+                ) from e
+
+        body, link_header = await self._read_timeline_page(
+            response, repo_name, pr_number, cached_response, cache_key
+        )
+        try:
+            timeline_events = json.loads(body)
+        except ValueError as e:
+            raise GithubException(
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                f"Invalid JSON response: {str(e)}",
+                headers=None,
+            ) from e
+
+        return timeline_events or [], self._get_last_page(link_header)
+
+    async def _read_timeline_page(
+        self,
+        response: AsyncResponse,
+        repo_name: str,
+        pr_number: int,
+        cached_response: Optional[CachedResponse],
+        cache_key: Optional[str],
+    ) -> Tuple[str, Optional[str]]:
+        """
+        :returns: Body and `Link` header of the page, from the cache for a 304 response
+        """
+        response_cache: Optional[ResponseCache] = self._session.response_cache
+        if cached_response and response.status == HTTPStatus.NOT_MODIFIED:
+            response_cache.record_hit()
+            return cached_response.body, cached_response.headers.get("Link")
+
+        body, link_header = self._read_timeline_response(response, repo_name, pr_number)
+        if response_cache:
+            response_cache.record_miss()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                await asyncio.to_thread(
+                    response_cache.set,
+                    cache_key,
+                    CachedResponse(
+                        body=body,
+                        etag=etag,
+                        last_modified=last_modified,
+                        headers={"Link": link_header} if link_header else {},
+                    ),
+                )
+        return body, link_header
+
+    @staticmethod
+    def _read_timeline_response(
+        response: AsyncResponse, repo_name: str, pr_number: int
+    ) -> Tuple[str, Optional[str]]:
+        if response.status == HTTPStatus.NOT_FOUND:
+            raise GithubException(
+                HTTPStatus.NOT_FOUND,
+                f"PR {pr_number} not found for repo {repo_name}",
+                headers=None,
+            )
+
+        if RateLimitScheduler.is_rate_limited(
+            response.status, response.headers, response.body
+        ):
+            raise GithubRateLimitExceeded("GitHub API rate limit exceeded")
+
+        if response.status != HTTPStatus.OK:
+            raise GithubException(
+                response.status,
+                f"Failed to fetch timeline events: {response.body}",
+                headers=None,
+            )
+
+        return response.body, response.headers.get("Link")
+
+    @staticmethod
+    def _get_last_page(link_header: Optional[str]) -> Optional[int]:
+        if not link_header:
+            return None
+
+        for link in requests.utils.parse_header_links(link_header):
+            if link.get("rel") == "last":
+                page = parse_qs(urlparse(link["url"]).query).get("page")
+                return int(page[0]) if page else None
+        return None
+
     @staticmethod
     def _adapt_github_timeline_events(
         timeline_events: List[GitHubPrTimelineEventsDict],
@@ -0,0 +1,395 @@
+from datetime import datetime
+from http import HTTPStatus
+from typing import Dict, List, Optional
+
+import pytz
+import requests
+from github.GithubException import GithubException
+
+from mhq.exapi.github import GithubApiService, GithubRateLimitExceeded
+from mhq.exapi.models.github import GithubPullRequestBulkData
+from mhq.exapi.schemas.timeline import GitHubPrTimelineEventsDict
+from mhq.utils.http_session import get_http_session
+from mhq.utils.rate_limit import RateLimitScheduler, get_rate_limit_scheduler
+from mhq.utils.time import ISO_8601_DATE_FORMAT, dt_from_iso_time_string
+
+PR_PAGE_SIZE = 25
+NESTED_PAGE_SIZE = 100
+
+PAGE_INFO_FIELDS = "pageInfo { hasNextPage endCursor }"
+ACTOR_FIELDS = "{ __typename login }"
+
+COMMITS_CONNECTION = f"""
+commits(first: $nestedPageSize, after: $nestedCursor) {{
+  totalCount
+  {PAGE_INFO_FIELDS}
+  nodes {{
+    commit {{
+      oid
+      url
+      message
+      author {{ name email date user {{ login }} }}
+      committer {{ name email date user {{ login }} }}
+    }}
+  }}
+}}
+"""
+
+REVIEWS_CONNECTION = f"""
+reviews(first: $nestedPageSize, after: $nestedCursor) {{
+  {PAGE_INFO_FIELDS}
+  nodes {{
+    id
+    databaseId
+    state
+    body
+    url
+    submittedAt
+    authorAssociation
+    commit {{ oid }}
+    comments {{ totalCount }}
+    author {ACTOR_FIELDS}
+  }}
+}}
+"""
+
+READY_FOR_REVIEW_CONNECTION = f"""
+timelineItems(first: $nestedPageSize, after: $nestedCursor, itemTypes: [READY_FOR_REVIEW_EVENT]) {{
+  {PAGE_INFO_FIELDS}
+  nodes {{
+    ... on ReadyForReviewEvent {{
+      id
+      createdAt
+      actor {ACTOR_FIELDS}
+    }}
+  }}
+}}
+"""
+
+NESTED_CONNECTIONS = {
+    "commits": COMMITS_CONNECTION,
+    "reviews": REVIEWS_CONNECTION,
+    "timelineItems": READY_FOR_REVIEW_CONNECTION,
+}
+
+PULL_REQUESTS_QUERY = f"""
+query ($owner: String!, $name: String!, $pageSize: Int!, $nestedPageSize: Int!,
+       $cursor: String, $nestedCursor: String) {{
+  repository(owner: $owner, name: $name) {{
+    pullRequests(first: $pageSize, after: $cursor, orderBy: {{field: UPDATED_AT, direction: DESC}}) {{
+      {PAGE_INFO_FIELDS}
+      nodes {{
+        id
+        databaseId
+        number
+        title
+        url
+        state
+        createdAt
+        updatedAt
+        closedAt
+        mergedAt
+        additions
+        deletions
+        changedFiles
+        baseRefName
+        headRefName
+        headRefOid
+        comments {{ totalCount }}
+        baseRepository {{ nameWithOwner }}
+        author {ACTOR_FIELDS}
+        mergeCommit {{ oid }}
+        reviewRequests(first: $nestedPageSize) {{
+          nodes {{
+            requestedReviewer {{
+              __typename
+              ... on User {{ login }}
+              ... on Bot {{ login }}
+            }}
+          }}
+        }}
+        {COMMITS_CONNECTION}
+        {REVIEWS_CONNECTION}
+        {READY_FOR_REVIEW_CONNECTION}
+      }}
+    }}
+  }}
+}}
+"""
+
+PULL_REQUEST_CONNECTION_QUERY = """
+query ($id: ID!, $nestedPageSize: Int!, $nestedCursor: String) {{
+  node(id: $id) {{
+    ... on PullRequest {{
+      {connection}
+    }}
+  }}
+}}
+"""
+
+
+class GithubGraphQLApiService:
+    """
+    Fetches pull requests along with their reviews, ready for review events and commits
+    using the GitHub GraphQL API, a page of PRs per request. The responses are adapted
+    to the shape of the REST API so that the same model adapters can be used.
+    Only reviews and ready for review events are fetched from the timeline, and since
+    ready for review events have no database id in GraphQL, their node id is used as id.
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        domain: Optional[str],
+        pr_page_size: int = PR_PAGE_SIZE,
+        nested_page_size: int = NESTED_PAGE_SIZE,
+    ):
+        self._token = access_token
+        self.graphql_url = self._get_graphql_url(domain)
+        self.headers = {"Authorization": f"Bearer {self._token}"}
+        self._session = get_http_session(self.graphql_url, self._token)
+        self._session.rate_limiter = get_rate_limit_scheduler(
+            self.graphql_url, self._token
+        )
+        self.pr_page_size = pr_page_size
+        self.nested_page_size = nested_page_size
+
+    def _get_graphql_url(self, domain: Optional[str]) -> str:
+        if not domain:
+            return "https://api.github.com/graphql"
+        else:
+            return f"{domain}/api/graphql"
+
+    def get_pull_requests_updated_after(
+        self, org_login: str, repo_name: str, bookmark: datetime
+    ) -> List[GithubPullRequestBulkData]:
+        """
+        Returns all PRs of the repo updated after the bookmark, most recently updated first.
+        Nested connections with more than a page of items are fetched per PR.
+        """
+        prs_bulk_data: List[GithubPullRequestBulkData] = []
+        cursor = None
+
+        while True:
+            data = self._execute(
+                PULL_REQUESTS_QUERY,
+                {
+                    "owner": org_login,
+                    "name": repo_name,
+                    "pageSize": self.pr_page_size,
+                    "nestedPageSize": self.nested_page_size,
+                    "cursor": cursor,
+                },
+            )
+            repository = data.get("repository")
+            if not repository:
+                raise GithubException(
+                    HTTPStatus.NOT_FOUND,
+                    f"Repo {org_login}/{repo_name} not found",
+                    headers=None,
+                )
+
+            pull_requests = repository["pullRequests"]
+            reached_bookmark = False
+            for pr_node in pull_requests["nodes"]:
+                if dt_from_iso_time_string(pr_node["updatedAt"]) <= bookmark:
+                    reached_bookmark = True
+                    break
+                prs_bulk_data.append(self._adapt_pull_request(pr_node))
+
+            page_info = pull_requests["pageInfo"]
+            if reached_bookmark or not page_info["hasNextPage"]:
+                break
+            cursor = page_info["endCursor"]
+
+        return prs_bulk_data
+
+    def _execute(self, query: str, variables: Dict) -> Dict:
+        try:
+            response = self._session.post(
+                self.graphql_url,
+                headers=self.headers,
+                json={"query": query, "variables": variables},
+            )
+        except requests.RequestException as e:
+            raise GithubException(
+                HTTPStatus.SERVICE_UNAVAILABLE, f"Network error: {str(e)}", headers=None
+            ) from e
+
+        if RateLimitScheduler.is_rate_limited(
+            response.status_code, response.headers, response.text
+        ):
+            raise GithubRateLimitExceeded("GitHub API rate limit exceeded")
+
+        if response.status_code != HTTPStatus.OK:
+            raise GithubException(
+                response.status_code,
+                f"Failed to execute GraphQL query: {response.text}",
+                headers=None,
+            )
+
+        body = response.json()
+        errors = body.get("errors")
+        if errors:
+            if any(error.get("type") == "RATE_LIMITED" for error in errors):
+                raise GithubRateLimitExceeded("GitHub API rate limit exceeded")
+            raise GithubException(
+                HTTPStatus.BAD_GATEWAY, f"GraphQL query failed: {errors}", headers=None
+            )
+
+        return body.get("data") or {}
+
+    def _get_all_connection_nodes(self, pr_node: Dict, connection: str) -> List[Dict]:
+        nodes = list(pr_node[connection]["nodes"])
+        page_info = pr_node[connection]["pageInfo"]
+
+        while page_info["hasNextPage"]:
+            data = self._execute(
+                PULL_REQUEST_CONNECTION_QUERY.format(
+                    connection=NESTED_CONNECTIONS[connection]
+                ),
+                {
+                    "id": pr_node["id"],
+                    "nestedPageSize": self.nested_page_size,
+                    "nestedCursor": page_info["endCursor"],
+                },
+            )
+            page = data["node"][connection]
+            nodes += page["nodes"]
+            page_info = page["pageInfo"]
+
+        return nodes
+
+    def _adapt_pull_request(self, pr_node: Dict) -> GithubPullRequestBulkData:
+        commits = [
+            self._adapt_commit(commit_node["commit"])
+            for commit_node in self._get_all_connection_nodes(pr_node, "commits")
+        ]
+        review_nodes = self._get_all_connection_nodes(pr_node, "reviews")
+        timeline_events: List[GitHubPrTimelineEventsDict] = [
+            GitHubPrTimelineEventsDict(
+                event="reviewed", data=self._adapt_review(review_node)
+            )
+            for review_node in review_nodes
+        ] + [
+            GitHubPrTimelineEventsDict(
+                event="ready_for_review", data=self._adapt_ready_for_review(event)
+            )
+            for event in self._get_all_connection_nodes(pr_node, "timelineItems")
+            if event
+        ]
+
+        return GithubPullRequestBulkData(
+            pr=self._adapt_pull_request_data(pr_node, review_nodes),
+            timeline_events=GithubApiService._adapt_github_timeline_events(
+                timeline_events
+            ),
+            commits=commits,
+        )
+
+    def _adapt_pull_request_data(self, pr_node: Dict, review_nodes: List[Dict]) -> Dict:
+        """
+        REST counts review comments on the PR itself, GraphQL only per review, so they are
+        summed over all reviews of the PR.
+        """
+        requested_reviewers = [
+            self._adapt_actor(review_request["requestedReviewer"])
+            for review_request in pr_node["reviewRequests"]["nodes"]
+            if (review_request.get("requestedReviewer") or {}).get("login")
+        ]
+        return {
+            "id": pr_node.get("databaseId"),
+            "node_id": pr_node["id"],
+            "number": pr_node["number"],
+            "title": pr_node["title"],
+            "html_url": pr_node["url"],
+            "state": "open" if pr_node["state"] == "OPEN" else "closed",
+            "created_at": pr_node["createdAt"],
+            "updated_at": pr_node["updatedAt"],
+            "closed_at": pr_node.get("closedAt"),
+            "merged_at": pr_node.get("mergedAt"),
+            "user": self._adapt_actor(pr_node.get("author")),
+            "base": {
+                "ref": pr_node["baseRefName"],
+                "repo": {
+                    "full_name": (pr_node.get("baseRepository") or {}).get(
+                        "nameWithOwner"
+                    )
+                },
+            },
+            "head": {"ref": pr_node["headRefName"], "sha": pr_node["headRefOid"]},
+            "requested_reviewers": requested_reviewers,
+            "merge_commit_sha": (pr_node.get("mergeCommit") or {}).get("oid"),
+            "commits": pr_node["commits"]["totalCount"],
+            "additions": pr_node["additions"],
+            "deletions": pr_node["deletions"],
+            "changed_files": pr_node["changedFiles"],
+            "comments": pr_node["comments"]["totalCount"],
+            "review_comments": sum(
+                review_node["comments"]["totalCount"] for review_node in review_nodes
+            ),
+        }
+
+    def _adapt_review(self, review_node: Dict) -> Dict:
+        return {
+            "event": "reviewed",
+            "id": review_node.get("databaseId"),
+            "node_id": review_node["id"],
+            "user": self._adapt_actor(review_node.get("author")),
+            "body": review_node.get("body"),
+            "state": (review_node.get("state") or "").lower(),
+            "html_url": review_node.get("url"),
+            "commit_id": (review_node.get("commit") or {}).get("oid"),
+            "submitted_at": review_node.get("submittedAt"),
+            "author_association": review_node.get("authorAssociation"),
+        }
+
+    def _adapt_ready_for_review(self, event_node: Dict) -> Dict:
+        return {
+            "event": "ready_for_review",
+            "id": event_node["id"],
+            "node_id": event_node["id"],
+            "actor": self._adapt_actor(event_node.get("actor")),
+            "created_at": event_node.get("createdAt"),
+        }
+
+    def _adapt_commit(self, commit_node: Dict) -> Dict:
+        author_user = (commit_node.get("author") or {}).get("user")
+        return {
+            "sha": commit_node["oid"],
+            "html_url": commit_node["url"],
+            "commit": {
+                "message": commit_node["message"],
+                "author": self._adapt_git_actor(commit_node.get("author")),
+                "committer": self._adapt_git_actor(commit_node.get("committer")),
+            },
+            "author": {"login": author_user["login"]} if author_user else None,
+        }
+
+    @staticmethod
+    def _adapt_actor(actor: Optional[Dict]) -> Dict:
+        """
+        Deleted users come back as null, REST returns them as `ghost`.
+        Bot logins in REST carry a `[bot]` suffix which GraphQL omits.
+        """
+        if not actor:
+            return {"login": "ghost", "type": "User"}
+
+        if actor.get("__typename") == "Bot":
+            return {"login": f"{actor['login']}[bot]", "type": "Bot"}
+
+        return {"login": actor["login"], "type": "User"}
+
+    @staticmethod
+    def _adapt_git_actor(git_actor: Optional[Dict]) -> Dict:
+        git_actor = git_actor or {}
+        date = dt_from_iso_time_string(git_actor.get("date"))
+        return {
+            "name": git_actor.get("name"),
+            "email": git_actor.get("email"),
+            "date": (
+                date.astimezone(pytz.UTC).strftime(ISO_8601_DATE_FORMAT)
+                if date
+                else None
+            ),
+        }
@@ -1,11 +1,36 @@
-from collections.abc import Awaitable
-from typing import Dict, List
-import requests
+import asyncio
+import json
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 from datetime import datetime
 from requests.exceptions import HTTPError
-import aiohttp
 
-from mhq.exapi.models.gitlab import GitlabCommit, GitlabNote, GitlabRepo, GitlabUser
+from mhq.exapi.models.gitlab import (
+    GitlabCommit,
+    GitlabMergeRequestDetails,
+    GitlabNote,
+    GitlabRepo,
+    GitlabUser,
+)
+from mhq.utils.diffparser import DiffStats, DiffStatsCounter
+from mhq.utils.http_session import (
+    AsyncHTTPSession,
+    get_async_http_session,
+    get_http_session,
+    run_async_http_requests,
+)
+from mhq.utils.rate_limit import get_rate_limit_scheduler
+
+MERGE_REQUEST_FETCH_CONCURRENCY = 10
+MERGE_REQUEST_DIFFS_PER_PAGE = 20
+
+
+def _get_next_page(headers: Mapping) -> Optional[int]:
+    """
+    GitLab sends the next page number in `X-Next-Page`, empty on the last page.
+    Without the header the endpoint is not paginated and the first page is all there is.
+    """
+    next_page = headers.get("X-Next-Page")
+    return int(next_page) if next_page and next_page.isdigit() else None
 
 
 class GithubRateLimitExceeded(Exception):
@@ -17,6 +42,10 @@ class GitlabApiService:
         self._token = access_token
         self.base_url = f"{domain}/api/v4"
         self.headers = {"Authorization": f"Bearer {self._token}"}
+        self._session = get_http_session(self.base_url, self._token)
+        self._session.rate_limiter = get_rate_limit_scheduler(
+            self.base_url, self._token
+        )
 
     def check_pat(self) -> bool:
         """
@@ -26,7 +55,7 @@ class GitlabApiService:
         """
         url = f"{self.base_url}/user"
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self._session.get(url, headers=self.headers)
         except Exception as e:
             raise Exception(f"Error in PAT validation, Error: {e}")
 
@@ -42,7 +71,7 @@ class GitlabApiService:
 
     def get_authenticated_user(self) -> GitlabUser:
         url = f"{self.base_url}/user"
-        response = requests.get(url, headers=self.headers)
+        response = self._session.get(url, headers=self.headers)
         self._handle_error(response)
         user = response.json()
         return GitlabUser(user)
@@ -57,14 +86,14 @@ class GitlabApiService:
             "order_by": "updated_at",
             "sort": "desc",
         }
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self._session.get(url, headers=self.headers, params=params)
         self._handle_error(response)
         projects = response.json()
         return list(map(GitlabRepo, projects))
 
     def get_groups(self) -> List[Dict]:
         url = f"{self.base_url}/groups"
-        response = requests.get(url, headers=self.headers)
+        response = self._session.get(url, headers=self.headers)
         self._handle_error(response)
         groups = response.json()
         return groups
@@ -74,75 +103,83 @@ class GitlabApiService:
     ) -> List[GitlabRepo]:
         url = f"{self.base_url}/groups/{group_id}/projects"
         params = {"page": page, "per_page": page_size}
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self._session.get(url, headers=self.headers, params=params)
         self._handle_error(response)
         projects = response.json()
         return list(map(GitlabRepo, projects))
 
     def get_group_members(self, group_id) -> List[GitlabUser]:
         url = f"{self.base_url}/groups/{group_id}/members/all"
-        response = requests.get(url, headers=self.headers)
+        response = self._session.get(url, headers=self.headers)
         self._handle_error(response)
         members = response.json()
         return list(map(GitlabUser, members))
 
     def get_project(self, project_id) -> GitlabRepo:
         url = f"{self.base_url}/projects/{project_id}"
-        response = requests.get(url, headers=self.headers)
+        response = self._session.get(url, headers=self.headers)
         self._handle_error(response)
         project = response.json()
         return GitlabRepo(project)
 
     def get_project_users(self, project_id) -> List[GitlabUser]:
         url = f"{self.base_url}/projects/{project_id}/users"
-        response = requests.get(url, headers=self.headers)
+        response = self._session.get(url, headers=self.headers)
         self._handle_error(response)
         users = response.json()
         return list(map(GitlabUser, users))
 
     def get_project_languages(self, project_id) -> Dict[str, float]:
         url = f"{self.base_url}/projects/{project_id}/languages"
-        response = requests.get(url, headers=self.headers)
+        response = self._session.get(url, headers=self.headers)
         self._handle_error(response)
         language_map = response.json()
         return language_map
 
     def get_project_contributors(self, project_id):
         url = f"{self.base_url}/projects/{project_id}/repository/contributors"
-        response = requests.get(url, headers=self.headers)
+        response = self._session.get(url, headers=self.headers)
         self._handle_error(response)
         contributors = response.json()
         return contributors
 
-    async def get_project_merge_requests(
+    def get_project_merge_requests(
         self, project_id, updated_after: datetime, per_page=20
-    ) -> Awaitable[List[Dict]]:
+    ) -> List[Dict]:
         updated_after = updated_after.isoformat()
         url = f"{self.base_url}/projects/{project_id}/merge_requests"
         params = {"per_page": per_page, "updated_after": updated_after}
         merge_requests = []
 
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            page = 1
-            while True:
-                params["page"] = page
-                async with session.get(url, params=params) as response:
-                    response.raise_for_status()
-                    page_merge_requests = await response.json()
-                    merge_requests.extend(page_merge_requests)
+        page = 1
+        while True:
+            params["page"] = page
+            # The bookmark moves every sync, so these responses are never revalidated
+            response = self._session.get(
+                url, headers=self.headers, params=params, cache=False
+            )
+            self._handle_error(response)
+            page_merge_requests = response.json()
+            merge_requests.extend(page_merge_requests)
 
-                    if len(page_merge_requests) < per_page:
-                        break
+            if len(page_merge_requests) < per_page:
+                break
 
-                    page += 1
+            page += 1
 
         return merge_requests
 
+    def get_merge_request(self, project_id, merge_request_internal_id) -> Dict:
+        url = f"{self.base_url}/projects/{project_id}/merge_requests/{merge_request_internal_id}"
+        response = self._session.get(url, headers=self.headers)
+        self._handle_error(response)
+        return response.json()
+
     def get_merge_request_commits(
         self, project_id, merge_request_internal_id
     ) -> List[GitlabCommit]:
         url = f"{self.base_url}/projects/{project_id}/merge_requests/{merge_request_internal_id}/commits"
-        response = requests.get(url, headers=self.headers)
+        response = self._session.get(url, headers=self.headers)
         self._handle_error(response)
         commits = response.json()
         return list(map(GitlabCommit, commits))
@@ -151,7 +188,7 @@ class GitlabApiService:
         self, project_id, merge_request_internal_id
     ) -> List[GitlabNote]:
         url = f"{self.base_url}/projects/{project_id}/merge_requests/{merge_request_internal_id}/notes"
-        response = requests.get(url, headers=self.headers)
+        response = self._session.get(url, headers=self.headers)
         self._handle_error(response)
         notes = response.json()
         return list(map(GitlabNote, notes))
@@ -160,7 +197,147 @@ class GitlabApiService:
         self, project_id, merge_request_internal_id
     ) -> List[Dict]:
         url = f"{self.base_url}/projects/{project_id}/merge_requests/{merge_request_internal_id}/diffs"
-        response = requests.get(url, headers=self.headers)
+        response = self._session.get(url, headers=self.headers)
         self._handle_error(response)
         diff = response.json()
         return diff
+
+    def get_merge_request_diff_stats(
+        self,
+        project_id,
+        merge_request_internal_id,
+        per_page: int = MERGE_REQUEST_DIFFS_PER_PAGE,
+    ) -> DiffStats:
+        """
+        Counts the added and deleted lines of a merge request page by page over its diffs,
+        so only one page of diffs is held in memory at a time.
+        """
+        url = f"{self.base_url}/projects/{project_id}/merge_requests/{merge_request_internal_id}/diffs"
+        counter = DiffStatsCounter()
+        page = 1
+        while page:
+            response = self._session.get(
+                url, headers=self.headers, params={"page": page, "per_page": per_page}
+            )
+            self._handle_error(response)
+            counter.add_file_diffs(diff.get("diff") for diff in response.json())
+            page = _get_next_page(response.headers)
+        return counter.stats
+
+    def get_merge_requests_details(
+        self,
+        project_id,
+        merge_requests: List[Tuple[str, bool]],
+        max_concurrency: int = MERGE_REQUEST_FETCH_CONCURRENCY,
+    ) -> List[GitlabMergeRequestDetails]:
+        """
+        Fetches the notes of many merge requests, and their commits and diff stats where asked
+        for, concurrently over a single HTTP session. The requests of all merge requests and
+        endpoints share one pool of at most `max_concurrency` requests in flight.
+        :param merge_requests: List of (merge request internal id, whether to fetch its commits and diff stats)
+        :returns: Details of every merge request, in the order of the input
+        """
+        if not merge_requests:
+            return []
+
+        return run_async_http_requests(
+            self._get_merge_requests_details_async(
+                project_id, merge_requests, max(1, max_concurrency)
+            )
+        )
+
+    async def _get_merge_requests_details_async(
+        self,
+        project_id,
+        merge_requests: List[Tuple[str, bool]],
+        max_concurrency: int,
+    ) -> List[GitlabMergeRequestDetails]:
+        semaphore = asyncio.Semaphore(max_concurrency)
+        session = get_async_http_session(self.base_url, self._token)
+        return list(
+            await asyncio.gather(
+                *[
+                    self._get_merge_request_details_async(
+                        session,
+                        semaphore,
+                        project_id,
+                        merge_request_internal_id,
+                        fetch_changes,
+                    )
+                    for merge_request_internal_id, fetch_changes in merge_requests
+                ]
+            )
+        )
+
+    async def _get_merge_request_details_async(
+        self,
+        session: AsyncHTTPSession,
+        semaphore: asyncio.Semaphore,
+        project_id,
+        merge_request_internal_id,
+        fetch_changes: bool,
+    ) -> GitlabMergeRequestDetails:
+        url = f"{self.base_url}/projects/{project_id}/merge_requests/{merge_request_internal_id}"
+        if not fetch_changes:
+            notes = await self._fetch_json_async(session, semaphore, f"{url}/notes")
+            return GitlabMergeRequestDetails(list(map(GitlabNote, notes)), [], None)
+
+        notes, commits, diff_stats = await asyncio.gather(
+            self._fetch_json_async(session, semaphore, f"{url}/notes"),
+            self._fetch_json_async(session, semaphore, f"{url}/commits"),
+            self._get_diff_stats_async(session, semaphore, f"{url}/diffs"),
+        )
+        return GitlabMergeRequestDetails(
+            list(map(GitlabNote, notes)), list(map(GitlabCommit, commits)), diff_stats
+        )
+
+    async def _get_diff_stats_async(
+        self, session: AsyncHTTPSession, semaphore: asyncio.Semaphore, url: str
+    ) -> DiffStats:
+        """
+        Async counterpart of `get_merge_request_diff_stats`. Each page is counted and
+        dropped before the next one is requested.
+        """
+        counter = DiffStatsCounter()
+        page = 1
+        while page:
+            diffs, headers = await self._fetch_async(
+                session,
+                semaphore,
+                url,
+                {"page": page, "per_page": MERGE_REQUEST_DIFFS_PER_PAGE},
+            )
+            counter.add_file_diffs(diff.get("diff") for diff in diffs)
+            page = _get_next_page(headers)
+        return counter.stats
+
+    async def _fetch_json_async(
+        self, session: AsyncHTTPSession, semaphore: asyncio.Semaphore, url: str
+    ) -> Any:
+        """
+        Async counterpart of a `_session.get` followed by `_handle_error`.
+        """
+        body, _ = await self._fetch_async(session, semaphore, url)
+        return body
+
+    async def _fetch_async(
+        self,
+        session: AsyncHTTPSession,
+        semaphore: asyncio.Semaphore,
+        url: str,
+        params: Optional[Dict] = None,
+    ) -> Tuple[Any, Mapping]:
+        async with semaphore:
+            response = await session.get(url, params=params, headers=self.headers)
+
+        try:
+            body = json.loads(response.body) if response.body else None
+        except ValueError:
+            body = None
+        if response.status != 200:
+            error_body = body if isinstance(body, dict) else {}
+            raise HTTPError(
+                f"Request failed with status {response.status}: "
+                f"{error_body.get('error', '')} {error_body.get('message', '')}"
+            )
+        return body, response.headers
@@ -1,4 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from mhq.exapi.models.github_timeline import GithubPullRequestTimelineEvents
 
 
 @dataclass
@@ -43,3 +46,15 @@ class GitHubContributor(GitHubBaseUser):
         if isinstance(other, GitHubContributor):
             return self.id == other.id
         return False
+
+
+@dataclass
+class GithubPullRequestBulkData:
+    """
+    A pull request along with its timeline events and commits, fetched together.
+    `pr` and `commits` are in the shape of the GitHub REST API responses.
+    """
+
+    pr: Dict
+    timeline_events: List[GithubPullRequestTimelineEvents] = field(default_factory=list)
+    commits: List[Dict] = field(default_factory=list)
@@ -3,6 +3,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Dict, List, Optional
 
+from mhq.utils.diffparser import DiffStats
 from mhq.utils.time import dt_from_iso_time_string
 
 
@@ -17,6 +18,7 @@ class GitlabRepo:
     web_url: str
     languages: Dict = None
     contributors: List = None
+    last_activity_at: Optional[datetime] = None
 
     def __init__(self, project: Dict):
         self.name = project.get("name")
@@ -28,6 +30,11 @@ class GitlabRepo:
         self.web_url = project.get("web_url")
         self.languages = project.get("languages")
         self.contributors = project.get("contributors")
+        self.last_activity_at = (
+            dt_from_iso_time_string(project.get("last_activity_at"))
+            if project.get("last_activity_at")
+            else None
+        )
 
     def __hash__(self):
         return hash(str(self.idempotency_key))
@@ -73,6 +80,7 @@ class GitlabPR:
     reviewers: list
     merge_commit_sha: Optional[str]
     merged_by: Optional[str]
+    changes_count: Optional[int]
 
     def __init__(self, pr: Dict):
         self.title = pr.get("title")
@@ -99,6 +107,14 @@ class GitlabPR:
         ]
         self.merge_commit_sha = pr.get("merge_commit_sha")
         self.merged_by = (pr.get("merged_by") or {}).get("username")
+        # Only the single merge request endpoint returns `changes_count`, as a string
+        # that is capped, e.g. "1000+", for very large merge requests
+        changes_count = pr.get("changes_count")
+        self.changes_count = (
+            int(changes_count)
+            if changes_count is not None and str(changes_count).isdigit()
+            else None
+        )
 
     @property
     def state(self):
@@ -169,3 +185,10 @@ class GitlabNote:
         if _is_pr_approved_event(self.data):
             return GitlabNoteType.APPROVED
         return GitlabNoteType.UPDATED
+
+
+@dataclass
+class GitlabMergeRequestDetails:
+    notes: List[GitlabNote]
+    commits: List[GitlabCommit]
+    diff_stats: Optional[DiffStats]
@@ -2,6 +2,8 @@ from os import getenv
 from datetime import datetime, timedelta
 from typing import Optional
 
+import pytz
+
 from mhq.service.bookmark.bookmark_types import BookmarkType
 from mhq.store.repos.code import CodeRepoService
 from mhq.store.models.code import (
@@ -10,6 +12,7 @@ from mhq.store.models.code import (
     RepoWorkflowRunsBookmark,
     BookmarkMergeToDeployBroker,
 )
+from mhq.utils.metrics import SYNC_BOOKMARK_LAG_SECONDS
 from mhq.utils.time import time_now
 from mhq.store.repos.workflows import WorkflowRepoService
 from mhq.utils.string import uuid4_str
@@ -79,6 +82,7 @@ class BookmarkService:
         provider: str,
         bookmark_timestamp: datetime,
     ):
+        self._record_bookmark_lag(entity_id, bookmark_type, bookmark_timestamp)
 
         if bookmark_type == BookmarkType.ORG_REPO_BOOKMARK:
             return self._update_org_repo_bookmark(entity_id, bookmark_timestamp)
@@ -98,6 +102,20 @@ class BookmarkService:
 
         raise ValueError(f"Unsupported BookmarkType: {bookmark_type}.")
 
+    def _record_bookmark_lag(
+        self,
+        entity_id: str,
+        bookmark_type: BookmarkType,
+        bookmark_timestamp: Optional[datetime],
+    ):
+        if not bookmark_timestamp:
+            return
+        if not bookmark_timestamp.tzinfo:
+            bookmark_timestamp = bookmark_timestamp.replace(tzinfo=pytz.UTC)
+        SYNC_BOOKMARK_LAG_SECONDS.labels(
+            bookmark_type=bookmark_type.value, entity_id=entity_id
+        ).set((time_now() - bookmark_timestamp).total_seconds())
+
     def reset_org_bookmarks(self, org_id: str, bookmark_timestamp: datetime):
         self._reset_repo_bookmarks(org_id, bookmark_timestamp)
         self._reset_incident_bookmarks(org_id, bookmark_timestamp)
@@ -1 +1 @@
-from .etl_handler import sync_code_repos
+from .etl_handler import sync_code_repos, sync_code_repo_pull_request
@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Tuple, TypeVar
+
+from mhq.store.models.code import PullRequest, PullRequestCommit, PullRequestEvent
+
+T = TypeVar("T")
+
+PullRequestsData = Tuple[
+    List[PullRequest], List[PullRequestCommit], List[PullRequestEvent]
+]
+
+
+def get_prs_chunks_by_updated_at(
+    prs: List[T], get_updated_at: Callable[[T], datetime], chunk_size: int
+) -> Iterator[List[T]]:
+    """
+    Splits PRs into chunks of about `chunk_size`, oldest updated first.
+    PRs updated at the same time are never split across chunks, so a bookmark set to the
+    last `updated_at` of a chunk never skips a PR of the next chunk.
+    """
+    prs = sorted(prs, key=get_updated_at)
+    chunk: List[T] = []
+    for pr in prs:
+        if len(chunk) >= chunk_size and get_updated_at(chunk[-1]) != get_updated_at(pr):
+            yield chunk
+            chunk = []
+        chunk.append(pr)
+
+    if chunk:
+        yield chunk
+
+
+def collect_pull_requests_data_chunks(
+    chunks: Iterable[PullRequestsData],
+) -> PullRequestsData:
+    pull_requests: List[PullRequest] = []
+    pr_commits: List[PullRequestCommit] = []
+    pr_events: List[PullRequestEvent] = []
+    for chunk_pull_requests, chunk_pr_commits, chunk_pr_events in chunks:
+        pull_requests += chunk_pull_requests
+        pr_commits += chunk_pr_commits
+        pr_events += chunk_pr_events
+    return pull_requests, pr_commits, pr_events
@@ -1,5 +1,6 @@
-from datetime import timedelta
-from typing import List
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
 from mhq.store.models.code.enums import PullRequestEventType
 from mhq.service.code.sync.models import PRPerformance
@@ -13,6 +14,11 @@ from mhq.store.models.code import (
 from mhq.utils.time import Interval
 from mhq.utils.string import is_bot_name
 
+TIMED_EVENT_TYPES = (
+    PullRequestEventType.REVIEW.value,
+    PullRequestEventType.READY_FOR_REVIEW.value,
+)
+
 
 class CodeETLAnalyticsService:
     def create_pr_metrics(
@@ -21,42 +27,193 @@ class CodeETLAnalyticsService:
         pr_events: List[PullRequestEvent],
         pr_commits: List[PullRequestCommit],
     ) -> PullRequest:
-        if pr.state == PullRequestState.OPEN:
-            return pr
+        return self.create_prs_metrics([(pr, pr_events, pr_commits)])[0]
+
+    def create_prs_metrics(
+        self,
+        prs_data: List[
+            Tuple[PullRequest, List[PullRequestEvent], List[PullRequestCommit]]
+        ],
+    ) -> List[PullRequest]:
+        """
+        Computes the metrics of many PRs at once, with the same results as
+        `get_pr_performance` and `get_rework_cycles` give PR by PR.
+        The review and ready for review events of all PRs are laid out as columns and sorted
+        once by PR and time, so the metrics of a PR are read off its slice of the columns in a
+        single pass. Rework cycles bisect the sorted commit times instead of sorting commits
+        and reviews together.
+        :param prs_data: List of (PR, its events, its commits). Commits are sorted in place.
+        :returns: The PRs, in the order given, with their metrics set
+        """
+        # The same few actors act on most PRs, so each is checked for being a bot only once
+        is_bot_by_actor: Dict[str, bool] = {}
 
-        non_bot_pr_events = self.filter_non_bot_events(pr_events)
-        pr_performance = self.get_pr_performance(pr, non_bot_pr_events)
+        def is_non_bot_event(event: PullRequestEvent) -> bool:
+            actor = event.actor_username
+            if actor is None:
+                return False
+            if actor not in is_bot_by_actor:
+                is_bot_by_actor[actor] = is_bot_name(actor)
+            return not is_bot_by_actor[actor]
 
-        pr.first_response_time = (
-            pr_performance.first_review_time
-            if pr_performance.first_review_time != -1
-            else None
-        )
-        pr.rework_time = (
-            pr_performance.rework_time if pr_performance.rework_time != -1 else None
+        closed_prs_data = [
+            (pr, [event for event in pr_events if is_non_bot_event(event)], pr_commits)
+            for pr, pr_events, pr_commits in prs_data
+            if pr.state != PullRequestState.OPEN
+        ]
+
+        pr_indexes: List[int] = []
+        event_times: List[datetime] = []
+        events: List[PullRequestEvent] = []
+        for pr_index, (_, pr_events, _) in enumerate(closed_prs_data):
+            for event in pr_events:
+                if event.type in TIMED_EVENT_TYPES:
+                    pr_indexes.append(pr_index)
+                    event_times.append(event.created_at)
+                    events.append(event)
+
+        # Sorting is stable, so events at the same time keep their order, as they do when
+        # the events of a single PR are sorted
+        order = sorted(
+            range(len(events)), key=lambda i: (pr_indexes[i], event_times[i])
         )
-        pr.merge_time = (
-            pr_performance.merge_time if pr_performance.merge_time != -1 else None
+
+        group_start = 0
+        for pr_index, (pr, pr_events, pr_commits) in enumerate(closed_prs_data):
+            group_end = group_start
+            while group_end < len(order) and pr_indexes[order[group_end]] == pr_index:
+                group_end += 1
+            self._set_pr_metrics(
+                pr,
+                pr_events,
+                pr_commits,
+                [events[i] for i in order[group_start:group_end]],
+            )
+            group_start = group_end
+
+        return [pr for pr, _, _ in prs_data]
+
+    @staticmethod
+    def _set_pr_metrics(
+        pr: PullRequest,
+        pr_events: List[PullRequestEvent],
+        pr_commits: List[PullRequestCommit],
+        sorted_timed_events: List[PullRequestEvent],
+    ):
+        """
+        Sets the metrics of a closed or merged PR from its non bot events, and its review and
+        ready for review events sorted by time.
+        """
+        pr.reviewers = list(
+            {e.actor_username for e in pr_events if e.actor_username != pr.author}
         )
-        pr.cycle_time = (
-            pr_performance.cycle_time if pr_performance.cycle_time != -1 else None
+        pr_reviewers = set(pr.reviewers)
+
+        first_review: Optional[PullRequestEvent] = None
+        first_ready_for_review: Optional[PullRequestEvent] = None
+        first_approval: Optional[PullRequestEvent] = None
+        first_blocking_review: Optional[PullRequestEvent] = None
+        blocking_review_times: List[datetime] = []
+        for event in sorted_timed_events:
+            if event.type == PullRequestEventType.READY_FOR_REVIEW.value:
+                first_ready_for_review = first_ready_for_review or event
+                continue
+
+            first_review = first_review or event
+            if event.data.get("state") == PullRequestEventState.APPROVED.value:
+                first_approval = first_approval or event
+                continue
+
+            if event.actor_username not in pr_reviewers:
+                continue
+            if not first_approval and not first_blocking_review:
+                first_blocking_review = event
+            if event.actor_username != pr.author:
+                blocking_review_times.append(event.created_at)
+
+        ready_for_review_time = (
+            first_ready_for_review.created_at
+            if first_ready_for_review
+            else pr.created_at
         )
-        pr.reviewers = list(
-            {
-                e.actor_username
-                for e in non_bot_pr_events
-                if e.actor_username != pr.author
-            }
+        first_review_time = (
+            (first_review.created_at - ready_for_review_time).total_seconds()
+            if first_review
+            else -1
         )
 
-        if pr_commits:
-            pr.rework_cycles = self.get_rework_cycles(pr, non_bot_pr_events, pr_commits)
-            pr_commits.sort(key=lambda x: x.created_at)
-            first_commit_to_open = pr.created_at - pr_commits[0].created_at
-            if isinstance(first_commit_to_open, timedelta):
-                pr.first_commit_to_open = first_commit_to_open.total_seconds()
+        if not first_approval:
+            rework_time = -1
+        elif first_review.data.get("state") == PullRequestEventState.APPROVED.value:
+            rework_time = 0
+        else:
+            rework_time = (
+                first_approval.created_at - first_review.created_at
+            ).total_seconds()
+
+        merge_time = -1
+        cycle_time = -1
+        if pr.state == PullRequestState.MERGED:
+            if first_approval:
+                merge_time = (
+                    pr.state_changed_at - first_approval.created_at
+                ).total_seconds()
+                # Prevent garbage state when PR is approved post merging
+                merge_time = -1 if merge_time < 0 else merge_time
+            cycle_time = (pr.state_changed_at - ready_for_review_time).total_seconds()
+
+        pr.first_response_time = first_review_time if first_review_time != -1 else None
+        pr.rework_time = rework_time if rework_time != -1 else None
+        pr.merge_time = merge_time if merge_time != -1 else None
+        pr.cycle_time = cycle_time if cycle_time != -1 else None
+
+        if not pr_commits:
+            return
+
+        pr_commits.sort(key=lambda x: x.created_at)
+        pr.rework_cycles = 0
+        if first_blocking_review and first_approval:
+            pr.rework_cycles = CodeETLAnalyticsService._count_rework_cycles(
+                Interval(
+                    first_blocking_review.created_at - timedelta(seconds=1),
+                    first_approval.created_at,
+                ),
+                [commit.created_at for commit in pr_commits],
+                blocking_review_times,
+            )
+
+        first_commit_to_open = pr.created_at - pr_commits[0].created_at
+        if isinstance(first_commit_to_open, timedelta):
+            pr.first_commit_to_open = first_commit_to_open.total_seconds()
+
+    @staticmethod
+    def _count_rework_cycles(
+        interval: Interval,
+        commit_times: List[datetime],
+        blocking_review_times: List[datetime],
+    ) -> int:
+        """
+        Counts the blocking reviews within the interval that are directly followed by a
+        commit within the interval, a commit at the same time as a review counting as
+        before it. Both lists of times must be sorted.
+        """
+        first_commit_index = bisect_right(commit_times, interval.from_time)
+        end_commit_index = bisect_left(commit_times, interval.to_time)
+        commit_times = commit_times[first_commit_index:end_commit_index]
+        review_times = [t for t in blocking_review_times if t in interval]
+        next_review_times = review_times[1:] + [None]
 
-        return pr
+        rework_cycles = 0
+        for review_time, next_review_time in zip(review_times, next_review_times):
+            commits_after = bisect_right(commit_times, review_time)
+            commits_until_next_review = (
+                bisect_right(commit_times, next_review_time)
+                if next_review_time is not None
+                else len(commit_times)
+            )
+            if commits_until_next_review > commits_after:
+                rework_cycles += 1
+        return rework_cycles
 
     @staticmethod
     def get_pr_performance(pr: PullRequest, pr_events: [PullRequestEvent]):
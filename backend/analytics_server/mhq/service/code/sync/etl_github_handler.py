@@ -1,6 +1,8 @@
+import hashlib
 import uuid
+from os import getenv
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple, Set
+from typing import Callable, Iterator, List, Dict, Optional, Tuple, Set
 
 import pytz
 from mhq.utils.github import get_custom_github_domain
@@ -8,12 +10,28 @@ from github.PaginatedList import PaginatedList as GithubPaginatedList
 from github.PullRequest import PullRequest as GithubPullRequest
 from github.Repository import Repository as GithubRepository
 
-from mhq.exapi.github import GithubApiService
+from mhq.exapi.github import GithubApiService, TIMELINE_FETCH_CONCURRENCY
+from mhq.exapi.github_graphql import GithubGraphQLApiService
+from mhq.exapi.models.github import GithubPullRequestBulkData
+from mhq.service.code.sync.chunking import (
+    PullRequestsData,
+    collect_pull_requests_data_chunks,
+    get_prs_chunks_by_updated_at,
+)
 from mhq.service.code.sync.etl_code_analytics import CodeETLAnalyticsService
 from mhq.service.code.sync.etl_provider_handler import CodeProviderETLHandler
+from mhq.service.code.sync.prefetch import (
+    ExistingPRsData,
+    prefetch_existing_prs_data,
+)
+from mhq.service.code.sync.repo_metadata import (
+    REPO_METADATA_FETCH_CONCURRENCY,
+    should_refresh_contributors,
+)
 from mhq.service.code.sync.revert_prs_github_sync import (
     RevertPRsGitHubSyncHandler,
     get_revert_prs_github_sync_handler,
+    get_reverted_pr_number,
 )
 from mhq.exapi.models.github_timeline import GithubPullRequestTimelineEvents
 from mhq.store.models import UserIdentityProvider
@@ -29,10 +47,26 @@ from mhq.store.models.code import (
 )
 from mhq.store.repos.code import CodeRepoService
 from mhq.store.repos.core import CoreRepoService
+from mhq.utils.concurrency import run_in_app_context_pool
 from mhq.utils.log import LOG
 from mhq.utils.time import time_now, ISO_8601_DATE_FORMAT
 
 PR_PROCESSING_CHUNK_SIZE = 100
+PR_SYNC_METRIC_ATTRIBUTES = (
+    "first_response_time",
+    "rework_time",
+    "merge_time",
+    "cycle_time",
+    "reviewers",
+    "rework_cycles",
+    "first_commit_to_open",
+)
+GITHUB_PR_FETCH_ENGINE = getenv("GITHUB_PR_FETCH_ENGINE", "rest")
+GITHUB_TIMELINE_FETCH_CONCURRENCY = (
+    int(getenv("GITHUB_TIMELINE_FETCH_CONCURRENCY"))
+    if getenv("GITHUB_TIMELINE_FETCH_CONCURRENCY")
+    else TIMELINE_FETCH_CONCURRENCY
+)
 
 
 class GithubETLHandler(CodeProviderETLHandler):
@@ -43,9 +77,15 @@ class GithubETLHandler(CodeProviderETLHandler):
         code_repo_service: CodeRepoService,
         code_etl_analytics_service: CodeETLAnalyticsService,
         github_revert_pr_sync_handler: RevertPRsGitHubSyncHandler,
+        github_graphql_api_service: Optional[GithubGraphQLApiService] = None,
+        timeline_fetch_concurrency: int = GITHUB_TIMELINE_FETCH_CONCURRENCY,
+        repo_metadata_fetch_concurrency: int = REPO_METADATA_FETCH_CONCURRENCY,
     ):
         self.org_id: str = org_id
         self._api: GithubApiService = github_api_service
+        self._graphql_api: Optional[GithubGraphQLApiService] = (
+            github_graphql_api_service
+        )
         self.code_repo_service: CodeRepoService = code_repo_service
         self.code_etl_analytics_service: CodeETLAnalyticsService = (
             code_etl_analytics_service
@@ -53,6 +93,8 @@ class GithubETLHandler(CodeProviderETLHandler):
         self.github_revert_pr_sync_handler: RevertPRsGitHubSyncHandler = (
             github_revert_pr_sync_handler
         )
+        self.timeline_fetch_concurrency: int = timeline_fetch_concurrency
+        self.repo_metadata_fetch_concurrency: int = repo_metadata_fetch_concurrency
         self.provider: str = CodeProvider.GITHUB.value
 
     def check_pat_validity(self) -> bool:
@@ -69,25 +111,28 @@ class GithubETLHandler(CodeProviderETLHandler):
     def get_org_repos(self, org_repos: List[OrgRepo]) -> List[OrgRepo]:
         """
         This method returns GitHub repos for Org.
+        The metadata of all repos is refreshed concurrently, on at most
+        `repo_metadata_fetch_concurrency` threads.
         :param org_repos: List of OrgRepo objects
         :returns: List of GitHub repos as OrgRepo objects
         """
-        github_repos: List[GithubRepository] = [
-            self._api.get_repo(org_repo.org_name, org_repo.name)
-            for org_repo in org_repos
-        ]
 
-        repo_idempotency_key_org_repo_map = {
-            org_repo.idempotency_key: org_repo for org_repo in org_repos
-        }
-
-        return [
-            self._process_github_repo(
-                repo_idempotency_key_org_repo_map.get(str(github_repo.id)), github_repo
+        def _refresh_org_repo(org_repo: OrgRepo) -> Optional[OrgRepo]:
+            github_repo: GithubRepository = self._api.get_repo(
+                org_repo.org_name, org_repo.name
             )
-            for github_repo in github_repos
-            if repo_idempotency_key_org_repo_map.get(str(github_repo.id))
-        ]
+            if str(github_repo.id) != org_repo.idempotency_key:
+                return None
+            return self._process_github_repo(org_repo, github_repo)
+
+        results = run_in_app_context_pool(
+            _refresh_org_repo, org_repos, self.repo_metadata_fetch_concurrency
+        )
+        for result in results:
+            if result.failed:
+                raise result.error
+
+        return [result.result for result in results if result.result]
 
     def get_repo_pull_requests_data(
         self, org_repo: OrgRepo, bookmark: datetime
@@ -98,6 +143,27 @@ class GithubETLHandler(CodeProviderETLHandler):
         :param bookmark: Bookmark date to get all pull requests after this date
         :return: Pull requests, their commits and events
         """
+        return collect_pull_requests_data_chunks(
+            self.get_repo_pull_requests_data_chunks(org_repo, bookmark)
+        )
+
+    def get_repo_pull_requests_data_chunks(
+        self, org_repo: OrgRepo, bookmark: datetime
+    ) -> Iterator[PullRequestsData]:
+        """
+        This method yields the pull requests, their Commits and Events of a repo in chunks of
+        `PR_PROCESSING_CHUNK_SIZE`, oldest updated first. Timelines and commits are only fetched
+        for the chunk being processed.
+        :param org_repo: OrgRepo object to get pull requests for
+        :param bookmark: Bookmark date to get all pull requests after this date
+        :return: Chunks of pull requests, their commits and events
+        """
+        if self._graphql_api:
+            yield from self._get_repo_pull_requests_data_chunks_from_graphql(
+                org_repo, bookmark
+            )
+            return
+
         github_repo: GithubRepository = self._api.get_repo(
             org_repo.org_name, org_repo.name
         )
@@ -108,7 +174,7 @@ class GithubETLHandler(CodeProviderETLHandler):
         for page in range(
             0, github_pull_requests.totalCount // PR_PROCESSING_CHUNK_SIZE + 1, 1
         ):
-            prs = github_pull_requests.get_page(page)
+            prs = self._api.get_pull_requests_page(github_pull_requests, page)
             if not prs:
                 break
 
@@ -122,81 +188,324 @@ class GithubETLHandler(CodeProviderETLHandler):
 
             prs_to_process += prs
 
+        filtered_prs = self._filter_prs_to_process(prs_to_process, bookmark)
+        if not filtered_prs:
+            LOG.info(f"No pull requests to process for repo {org_repo.name}")
+            return
+
+        for prs_chunk in get_prs_chunks_by_updated_at(
+            filtered_prs, lambda pr: pr.updated_at, PR_PROCESSING_CHUNK_SIZE
+        ):
+            existing_prs_data: ExistingPRsData = prefetch_existing_prs_data(
+                self.code_repo_service,
+                str(org_repo.id),
+                [str(github_pr.number) for github_pr in prs_chunk],
+            )
+            unchanged_pr_numbers: Set[int] = {
+                github_pr.number
+                for github_pr in prs_chunk
+                if self._is_pr_unchanged(
+                    github_pr, existing_prs_data.get_pr(github_pr.number)
+                )
+            }
+            prs_to_fetch = [
+                github_pr
+                for github_pr in prs_chunk
+                if github_pr.number not in unchanged_pr_numbers
+            ]
+            prs_timeline_events: List[List[GithubPullRequestTimelineEvents]] = (
+                self._api.get_prs_timeline_events(
+                    [(pr.base.repo.full_name, pr.number) for pr in prs_to_fetch],
+                    self.timeline_fetch_concurrency,
+                )
+                if prs_to_fetch
+                else []
+            )
+            pr_number_to_timeline_events_map: Dict[
+                int, List[GithubPullRequestTimelineEvents]
+            ] = {
+                pr.number: timeline_events
+                for pr, timeline_events in zip(prs_to_fetch, prs_timeline_events)
+            }
+
+            def _process_pr(github_pr: GithubPullRequest, existing_prs_data):
+                if github_pr.number in unchanged_pr_numbers:
+                    return self._process_unchanged_pr(
+                        str(org_repo.id),
+                        github_pr,
+                        existing_prs_data.get_pr(github_pr.number),
+                    )
+                return self.process_pr(
+                    str(org_repo.id),
+                    github_pr,
+                    existing_prs_data,
+                    pr_number_to_timeline_events_map[github_pr.number],
+                    create_metrics=False,
+                )
+
+            yield self._process_prs(
+                org_repo,
+                prs_chunk,
+                _process_pr,
+                existing_prs_data,
+                unchanged_pr_numbers,
+            )
+
+    def _get_repo_pull_requests_data_chunks_from_graphql(
+        self, org_repo: OrgRepo, bookmark: datetime
+    ) -> Iterator[PullRequestsData]:
+        """
+        Fetches PRs updated after the bookmark together with their reviews, ready for review
+        events and commits in batched GraphQL queries, instead of a REST list call per page
+        and timeline and commit calls per PR.
+        GraphQL returns PRs newest updated first, so all of them are fetched before the
+        oldest chunk can be processed.
+        """
+        prs_bulk_data: List[GithubPullRequestBulkData] = (
+            self._graphql_api.get_pull_requests_updated_after(
+                org_repo.org_name, org_repo.name, bookmark
+            )
+        )
+        pr_number_to_bulk_data_map: Dict[int, GithubPullRequestBulkData] = {}
+        prs_to_process: List[GithubPullRequest] = []
+        for pr_bulk_data in prs_bulk_data:
+            github_pr = self._api.get_pull_request_from_raw_data(pr_bulk_data.pr)
+            pr_number_to_bulk_data_map[github_pr.number] = pr_bulk_data
+            prs_to_process.append(github_pr)
+
+        filtered_prs = self._filter_prs_to_process(prs_to_process, bookmark)
+        if not filtered_prs:
+            LOG.info(f"No pull requests to process for repo {org_repo.name}")
+            return
+
+        def _process_pr(github_pr: GithubPullRequest, existing_prs_data):
+            pr_bulk_data = pr_number_to_bulk_data_map[github_pr.number]
+            return self._process_pr_data(
+                str(org_repo.id),
+                github_pr,
+                pr_bulk_data.timeline_events,
+                pr_bulk_data.commits if github_pr.merged_at else [],
+                existing_prs_data,
+                create_metrics=False,
+            )
+
+        for prs_chunk in get_prs_chunks_by_updated_at(
+            filtered_prs, lambda pr: pr.updated_at, PR_PROCESSING_CHUNK_SIZE
+        ):
+            yield self._process_prs(org_repo, prs_chunk, _process_pr)
+
+    @staticmethod
+    def _filter_prs_to_process(
+        prs_to_process: List[GithubPullRequest], bookmark: datetime
+    ) -> List[GithubPullRequest]:
+        """
+        Drops PRs that were not updated after the bookmark and returns the rest oldest first.
+        The bookmark is checkpointed at the last update of every synced chunk, so filtering
+        on the time a PR was closed or merged would lose PRs of chunks that were not synced
+        yet, whenever they were merged before the checkpoint and updated after it.
+        """
         filtered_prs: List = []
         for pr in prs_to_process:
-            state_changed_at = pr.merged_at if pr.merged_at else pr.closed_at
-            if (
-                pr.state.upper() != PullRequestState.OPEN.value
-                and state_changed_at.replace(tzinfo=pytz.UTC) < bookmark
-            ):
+            if pr.updated_at.replace(tzinfo=pytz.UTC) <= bookmark:
                 continue
             if pr not in filtered_prs:
                 filtered_prs.append(pr)
 
-        filtered_prs = filtered_prs[::-1]
-
-        if not filtered_prs:
-            print("Nothing to process 🎉")
-            return [], [], []
+        return filtered_prs[::-1]
 
+    def _process_prs(
+        self,
+        org_repo: OrgRepo,
+        filtered_prs: List[GithubPullRequest],
+        process_pr: Callable[
+            [GithubPullRequest, ExistingPRsData],
+            Tuple[PullRequest, List[PullRequestEvent], List[PullRequestCommit]],
+        ],
+        existing_prs_data: Optional[ExistingPRsData] = None,
+        unchanged_pr_numbers: Optional[Set[int]] = None,
+    ) -> Tuple[List[PullRequest], List[PullRequestCommit], List[PullRequestEvent]]:
+        """
+        Builds the models of a chunk of PRs with `process_pr`, which leaves out metrics, and
+        creates the metrics of the whole chunk at once. PRs in `unchanged_pr_numbers` keep
+        the metrics of the last sync.
+        """
         pull_requests: List[PullRequest] = []
         pr_commits: List[PullRequestCommit] = []
         pr_events: List[PullRequestEvent] = []
+        prs_metrics_data: List[
+            Tuple[PullRequest, List[PullRequestEvent], List[PullRequestCommit]]
+        ] = []
         prs_added: Set[int] = set()
+        unchanged_pr_numbers = unchanged_pr_numbers or set()
+        if existing_prs_data is None:
+            existing_prs_data = prefetch_existing_prs_data(
+                self.code_repo_service,
+                str(org_repo.id),
+                [str(github_pr.number) for github_pr in filtered_prs],
+            )
 
         for github_pr in filtered_prs:
             if github_pr.number in prs_added:
                 continue
 
-            pr_model, event_models, pr_commit_models = self.process_pr(
-                str(org_repo.id), github_pr
+            pr_model, event_models, pr_commit_models = process_pr(
+                github_pr, existing_prs_data
             )
             pull_requests.append(pr_model)
             pr_events += event_models
             pr_commits += pr_commit_models
             prs_added.add(github_pr.number)
+            if github_pr.number not in unchanged_pr_numbers:
+                prs_metrics_data.append(
+                    (pr_model, self._github_bot_filter(event_models), pr_commit_models)
+                )
 
+        self.code_etl_analytics_service.create_prs_metrics(prs_metrics_data)
         return pull_requests, pr_commits, pr_events
 
+    def get_pull_request_data(
+        self, org_repo: OrgRepo, pr_number: int
+    ) -> Tuple[PullRequest, List[PullRequestEvent], List[PullRequestCommit]]:
+        """
+        This method returns a single pull request of a repo with its Events and Commits.
+        :param org_repo: OrgRepo object the pull request belongs to
+        :param pr_number: Number of the pull request in the repo
+        :return: Pull request, its events and commits
+        """
+        github_repo: GithubRepository = self._api.get_repo(
+            org_repo.org_name, org_repo.name
+        )
+        github_pr: GithubPullRequest = self._api.get_pull_request(
+            github_repo, int(pr_number)
+        )
+        return self.process_pr(str(org_repo.id), github_pr)
+
     def process_pr(
-        self, repo_id: str, pr: GithubPullRequest
+        self,
+        repo_id: str,
+        pr: GithubPullRequest,
+        existing_prs_data: Optional[ExistingPRsData] = None,
+        timeline_pr_events: Optional[List[GithubPullRequestTimelineEvents]] = None,
+        create_metrics: bool = True,
     ) -> Tuple[PullRequest, List[PullRequestEvent], List[PullRequestCommit]]:
-        pr_model: Optional[PullRequest] = self.code_repo_service.get_repo_pr_by_number(
-            repo_id, pr.number
+        if timeline_pr_events is None:
+            timeline_pr_events = self._api.get_pr_timeline_events(
+                pr.base.repo.full_name, pr.number
+            )
+        commits: List[Dict] = []
+        if pr.merged_at:
+            commits = list(
+                map(
+                    lambda x: x.__dict__["_rawData"], list(self._api.get_pr_commits(pr))
+                )
+            )
+
+        return self._process_pr_data(
+            repo_id, pr, timeline_pr_events, commits, existing_prs_data, create_metrics
         )
-        pr_event_model_list: List[PullRequestEvent] = (
-            self.code_repo_service.get_pr_events(pr_model)
+
+    def _process_pr_data(
+        self,
+        repo_id: str,
+        pr: GithubPullRequest,
+        timeline_pr_events: List[GithubPullRequestTimelineEvents],
+        commits: List[Dict],
+        existing_prs_data: Optional[ExistingPRsData] = None,
+        create_metrics: bool = True,
+    ) -> Tuple[PullRequest, List[PullRequestEvent], List[PullRequestCommit]]:
+        """
+        Builds the PR models of a PR. With `create_metrics` False its metrics are left to
+        the caller, which creates them for many PRs at once.
+        """
+        if existing_prs_data is None:
+            existing_prs_data = prefetch_existing_prs_data(
+                self.code_repo_service, repo_id, [str(pr.number)]
+            )
+        pr_model: Optional[PullRequest] = existing_prs_data.get_pr(pr.number)
+        pr_event_model_list: List[PullRequestEvent] = existing_prs_data.get_pr_events(
+            pr_model
         )
         pr_commits_model_list: List = []
 
-        timeline_pr_events = self._api.get_pr_timeline_events(
-            pr.base.repo.full_name, pr.number
-        )
         reviews = [
             review
             for review in timeline_pr_events
             if (review.type == PullRequestEventType.REVIEW)
         ]
         pr_model: PullRequest = self._to_pr_model(pr, pr_model, repo_id, len(reviews))
+        pr_model.sync_fingerprint = self._get_pr_sync_fingerprint(pr)
         pr_events_model_list: List[PullRequestEvent] = self._to_pr_events(
             timeline_pr_events, pr_model, pr_event_model_list
         )
         if pr.merged_at:
-            commits: List[Dict] = list(
-                map(
-                    lambda x: x.__dict__["_rawData"], list(self._api.get_pr_commits(pr))
-                )
-            )
             pr_commits_model_list: List[PullRequestCommit] = self._to_pr_commits(
                 commits, pr_model
             )
-        non_bot_pr_events_model_list = self._github_bot_filter(pr_events_model_list)
-        pr_model = self.code_etl_analytics_service.create_pr_metrics(
-            pr_model, non_bot_pr_events_model_list, pr_commits_model_list
-        )
+        if create_metrics:
+            pr_model = self.code_etl_analytics_service.create_pr_metrics(
+                pr_model,
+                self._github_bot_filter(pr_events_model_list),
+                pr_commits_model_list,
+            )
 
         return pr_model, pr_events_model_list, pr_commits_model_list
 
+    def _process_unchanged_pr(
+        self, repo_id: str, pr: GithubPullRequest, pr_model: PullRequest
+    ) -> Tuple[PullRequest, List[PullRequestEvent], List[PullRequestCommit]]:
+        """
+        Refreshes only the PR row of a PR whose timeline and commits did not change since the
+        last sync. Its events and commits are already saved, so the review count and metrics
+        of the last sync are kept instead of being computed again.
+        """
+        code_stats = (pr_model.meta or {}).get("code_stats", {})
+        updated_pr_model = self._to_pr_model(
+            pr, pr_model, repo_id, code_stats.get("comments") or 0
+        )
+        for metric in PR_SYNC_METRIC_ATTRIBUTES:
+            setattr(updated_pr_model, metric, getattr(pr_model, metric))
+        updated_pr_model.sync_fingerprint = pr_model.sync_fingerprint
+
+        return updated_pr_model, [], []
+
+    def _is_pr_unchanged(
+        self, pr: GithubPullRequest, pr_model: Optional[PullRequest]
+    ) -> bool:
+        """
+        A PR is unchanged when it was closed or merged at the last sync and its fingerprint
+        still matches. Such PRs are synced again whenever they are updated after the bookmark
+        without new commits or comments, e.g. when their head branch is deleted after merge
+        or their labels change.
+        Open PRs are always synced in full, as a review without comments does not show up in
+        any of the counts the fingerprint is built from.
+        """
+        if not pr_model or not pr_model.sync_fingerprint:
+            return False
+        if pr_model.state == PullRequestState.OPEN:
+            return False
+        if self._get_state(pr) == PullRequestState.OPEN:
+            return False
+        return pr_model.sync_fingerprint == self._get_pr_sync_fingerprint(pr)
+
+    @staticmethod
+    def _get_pr_sync_fingerprint(pr: GithubPullRequest) -> str:
+        """
+        Digest of the parts of a PR that change whenever its timeline or commits change:
+        head SHA, state, comment, review comment and commit counts.
+        """
+        fingerprint_parts = [
+            pr.head.sha,
+            pr.state,
+            pr.merged_at.isoformat() if pr.merged_at else "",
+            pr.closed_at.isoformat() if pr.closed_at else "",
+            pr.comments,
+            pr.review_comments,
+            pr.commits,
+        ]
+        return hashlib.sha1(
+            "|".join(map(str, fingerprint_parts)).encode("utf-8")
+        ).hexdigest()
+
     def get_revert_prs_mapping(
         self, prs: List[PullRequest]
     ) -> List[PullRequestRevertPRMapping]:
@@ -205,6 +514,17 @@ class GithubETLHandler(CodeProviderETLHandler):
     def _process_github_repo(
         self, org_repo: OrgRepo, github_repo: GithubRepository
     ) -> OrgRepo:
+        now = time_now()
+        pushed_at: Optional[datetime] = (
+            github_repo.pushed_at.replace(tzinfo=pytz.UTC)
+            if github_repo.pushed_at
+            else None
+        )
+        contributors = org_repo.contributors
+        contributors_refreshed_at = org_repo.contributors_refreshed_at
+        if should_refresh_contributors(org_repo, pushed_at, now):
+            contributors = self._api.get_repo_contributors(github_repo)
+            contributors_refreshed_at = now
 
         org_repo = OrgRepo(
             id=org_repo.id,
@@ -214,10 +534,12 @@ class GithubETLHandler(CodeProviderETLHandler):
             org_name=org_repo.org_name,
             default_branch=github_repo.default_branch,
             language=github_repo.language,
-            contributors=self._api.get_repo_contributors(github_repo),
+            contributors=contributors,
             idempotency_key=str(github_repo.id),
             slug=github_repo.name,
-            updated_at=time_now(),
+            pushed_at=pushed_at,
+            contributors_refreshed_at=contributors_refreshed_at,
+            updated_at=now,
         )
         return org_repo
 
@@ -267,6 +589,8 @@ class GithubETLHandler(CodeProviderETLHandler):
             ),
             provider=UserIdentityProvider.GITHUB.value,
             merge_commit_sha=merge_commit_sha,
+            reverted_pr_number=get_reverted_pr_number(pr.head.ref),
+            reverted_merge_commit_sha=None,
         )
 
     @staticmethod
@@ -293,19 +617,43 @@ class GithubETLHandler(CodeProviderETLHandler):
         pr_model: PullRequest,
         pr_events_model: List[PullRequestEvent],
     ) -> List[PullRequestEvent]:
+        """
+        Ready for review events are keyed by their REST id when synced over REST and by
+        their node id when synced over GraphQL. An event already synced by the other engine
+        is matched on its actor and time instead, and keeps its id and idempotency key, so
+        switching engines does not save it twice.
+        """
         pr_events: List[PullRequestEvent] = []
         pr_event_id_map = {event.idempotency_key: event.id for event in pr_events_model}
+        ready_for_review_events_map: Dict[
+            Tuple[Optional[str], datetime], PullRequestEvent
+        ] = {
+            (event.actor_username, event.created_at): event
+            for event in pr_events_model
+            if getattr(event.type, "value", event.type)
+            == PullRequestEventType.READY_FOR_REVIEW.value
+        }
 
         for event in timeline_events:
             username = event.user
+            idempotency_key = str(event.id)
+            event_id = pr_event_id_map.get(idempotency_key)
+            if not event_id and event.type == PullRequestEventType.READY_FOR_REVIEW:
+                existing_event = ready_for_review_events_map.get(
+                    (username, event.timestamp)
+                )
+                if existing_event:
+                    event_id = existing_event.id
+                    idempotency_key = existing_event.idempotency_key
+
             pr_events.append(
                 PullRequestEvent(
-                    id=pr_event_id_map.get(str(event.id), uuid.uuid4()),
+                    id=event_id or uuid.uuid4(),
                     pull_request_id=str(pr_model.id),
                     type=event.type.value,
                     data=event.raw_data,
                     created_at=event.timestamp,
-                    idempotency_key=str(event.id),
+                    idempotency_key=idempotency_key,
                     org_repo_id=pr_model.repo_id,
                     actor_username=username,
                 )
@@ -382,10 +730,18 @@ def get_github_etl_handler(org_id: str) -> GithubETLHandler:
             )
         return access_token
 
+    access_token = _get_access_token()
+    custom_domain = get_custom_github_domain(org_id)
+
     return GithubETLHandler(
         org_id,
-        GithubApiService(_get_access_token(), get_custom_github_domain(org_id)),
+        GithubApiService(access_token, custom_domain),
         CodeRepoService(),
         CodeETLAnalyticsService(),
         get_revert_prs_github_sync_handler(),
+        (
+            GithubGraphQLApiService(access_token, custom_domain)
+            if GITHUB_PR_FETCH_ENGINE == "graphql"
+            else None
+        ),
     )
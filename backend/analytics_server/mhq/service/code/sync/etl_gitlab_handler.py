@@ -1,10 +1,11 @@
-import asyncio
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple, Set, Any
+from os import getenv
+from typing import Iterator, List, Dict, Optional, Tuple, Set, Any
 from uuid import uuid4
-from mhq.utils.diffparser import parse_gitlab_diffs
+from mhq.utils.diffparser import DiffStats
 from mhq.exapi.models.gitlab import (
     GitlabCommit,
+    GitlabMergeRequestDetails,
     GitlabNote,
     GitlabNoteType,
     GitlabPR,
@@ -16,10 +17,24 @@ from mhq.utils.string import uuid4_str
 from mhq.service.code.sync.revert_pr_gitlab_sync import (
     RevertPRsGitlabSyncHandler,
     get_revert_prs_gitlab_sync_handler,
+    get_reverted_merge_commit_sha,
+)
+from mhq.exapi.gitlab import GitlabApiService, MERGE_REQUEST_FETCH_CONCURRENCY
+from mhq.service.code.sync.chunking import (
+    PullRequestsData,
+    collect_pull_requests_data_chunks,
+    get_prs_chunks_by_updated_at,
 )
-from mhq.exapi.gitlab import GitlabApiService
 from mhq.service.code.sync.etl_code_analytics import CodeETLAnalyticsService
 from mhq.service.code.sync.etl_provider_handler import CodeProviderETLHandler
+from mhq.service.code.sync.repo_metadata import (
+    REPO_METADATA_FETCH_CONCURRENCY,
+    should_refresh_contributors,
+)
+from mhq.service.code.sync.prefetch import (
+    ExistingPRsData,
+    prefetch_existing_prs_data,
+)
 from mhq.store.models import UserIdentityProvider
 from mhq.store.models.code import (
     OrgRepo,
@@ -33,10 +48,16 @@ from mhq.store.models.code import (
 )
 from mhq.store.repos.code import CodeRepoService
 from mhq.store.repos.core import CoreRepoService
+from mhq.utils.concurrency import run_in_app_context_pool
 from mhq.utils.log import LOG
 from mhq.utils.time import time_now
 
 PR_PROCESSING_CHUNK_SIZE = 100
+GITLAB_MR_FETCH_CONCURRENCY = (
+    int(getenv("GITLAB_MR_FETCH_CONCURRENCY"))
+    if getenv("GITLAB_MR_FETCH_CONCURRENCY")
+    else MERGE_REQUEST_FETCH_CONCURRENCY
+)
 
 
 class GitlabETLHandler(CodeProviderETLHandler):
@@ -47,6 +68,8 @@ class GitlabETLHandler(CodeProviderETLHandler):
         code_repo_service: CodeRepoService,
         code_etl_analytics_service: CodeETLAnalyticsService,
         gitlab_revert_pr_sync_handler: RevertPRsGitlabSyncHandler,
+        mr_fetch_concurrency: int = GITLAB_MR_FETCH_CONCURRENCY,
+        repo_metadata_fetch_concurrency: int = REPO_METADATA_FETCH_CONCURRENCY,
     ):
         self.org_id: str = org_id
         self._api: GitlabApiService = gitlab_api_service
@@ -57,6 +80,8 @@ class GitlabETLHandler(CodeProviderETLHandler):
         self.gitlab_revert_pr_sync_handler: RevertPRsGitlabSyncHandler = (
             gitlab_revert_pr_sync_handler
         )
+        self.mr_fetch_concurrency: int = mr_fetch_concurrency
+        self.repo_metadata_fetch_concurrency: int = repo_metadata_fetch_concurrency
         self.provider: str = CodeProvider.GITLAB.value
 
     def check_pat_validity(self) -> bool:
@@ -73,31 +98,30 @@ class GitlabETLHandler(CodeProviderETLHandler):
     def get_org_repos(self, org_repos: List[OrgRepo]) -> List[OrgRepo]:
         """
         This method returns Gitlab repos for Org.
+        The metadata of all repos is refreshed concurrently, on at most
+        `repo_metadata_fetch_concurrency` threads.
         :param org_repos: List of OrgRepo objects
         :returns: List of Gitlab repos as OrgRepo objects
         """
-        gitlab_repos: List[GitlabRepo] = []
-
-        for org_repo in org_repos:
-            try:
-                gitlab_repo = self._api.get_project(org_repo.idempotency_key)
-                gitlab_repos.append(gitlab_repo)
-            except Exception as e:
-                LOG.error(f"Error getting project: {str(e)}")
-                continue
 
-        repo_idempotency_key_org_repo_map = {
-            org_repo.idempotency_key: org_repo for org_repo in org_repos
-        }
+        def _refresh_org_repo(org_repo: OrgRepo) -> Optional[OrgRepo]:
+            gitlab_repo: GitlabRepo = self._api.get_project(org_repo.idempotency_key)
+            if str(gitlab_repo.idempotency_key) != org_repo.idempotency_key:
+                return None
+            return self._process_gitlab_repo(org_repo, gitlab_repo)
 
-        return [
-            self._process_gitlab_repo(
-                repo_idempotency_key_org_repo_map.get(str(gitlab_repo.idempotency_key)),
-                gitlab_repo,
-            )
-            for gitlab_repo in gitlab_repos
-            if repo_idempotency_key_org_repo_map.get(str(gitlab_repo.idempotency_key))
-        ]
+        results = run_in_app_context_pool(
+            _refresh_org_repo, org_repos, self.repo_metadata_fetch_concurrency
+        )
+
+        refreshed_org_repos: List[OrgRepo] = []
+        for result in results:
+            if result.failed:
+                LOG.error(f"Error getting project: {str(result.error)}")
+                continue
+            if result.result:
+                refreshed_org_repos.append(result.result)
+        return refreshed_org_repos
 
     def get_revert_prs_mapping(
         self, prs: List[PullRequest]
@@ -107,6 +131,13 @@ class GitlabETLHandler(CodeProviderETLHandler):
     def _process_gitlab_repo(
         self, org_repo: OrgRepo, gitlab_repo: GitlabRepo
     ) -> OrgRepo:
+        now = time_now()
+        contributors = org_repo.contributors
+        contributors_refreshed_at = org_repo.contributors_refreshed_at
+        if should_refresh_contributors(org_repo, gitlab_repo.last_activity_at, now):
+            contributors = self.get_repo_contributors(gitlab_repo)
+            contributors_refreshed_at = now
+
         org_repo = OrgRepo(
             id=org_repo.id,
             org_id=self.org_id,
@@ -115,10 +146,12 @@ class GitlabETLHandler(CodeProviderETLHandler):
             org_name=gitlab_repo.org_name,
             default_branch=gitlab_repo.default_branch,
             language=str(gitlab_repo.languages),
-            contributors=self.get_repo_contributors(gitlab_repo),
+            contributors=contributors,
             idempotency_key=str(gitlab_repo.idempotency_key),
             slug=gitlab_repo.name,
-            updated_at=time_now(),
+            pushed_at=gitlab_repo.last_activity_at,
+            contributors_refreshed_at=contributors_refreshed_at,
+            updated_at=now,
         )
         return org_repo
 
@@ -131,52 +164,139 @@ class GitlabETLHandler(CodeProviderETLHandler):
         :param bookmark: Bookmark date to get all pull requests after this date
         :return: Pull requests, their commits and events
         """
+        return collect_pull_requests_data_chunks(
+            self.get_repo_pull_requests_data_chunks(org_repo, bookmark)
+        )
+
+    def get_repo_pull_requests_data_chunks(
+        self, org_repo: OrgRepo, bookmark: datetime
+    ) -> Iterator[PullRequestsData]:
+        """
+        This method yields the pull requests, their Commits and Events of a repo in chunks of
+        `PR_PROCESSING_CHUNK_SIZE`, oldest updated first. Notes, commits and diffs are only
+        fetched for the chunk being processed.
+        :param org_repo: OrgRepo object to get pull requests for
+        :param bookmark: Bookmark date to get all pull requests after this date
+        :return: Chunks of pull requests, their commits and events
+        """
         gitlab_repo: GitlabRepo = self._api.get_project(org_repo.idempotency_key)
-        prs_to_process: List[Dict] = asyncio.run(
-            self._api.get_project_merge_requests(gitlab_repo.idempotency_key, bookmark)
+        prs_to_process: List[Dict] = self._api.get_project_merge_requests(
+            gitlab_repo.idempotency_key, bookmark
         )
         filtered_prs: List[Dict] = []
         for pr in prs_to_process:
             if pr not in filtered_prs:
                 filtered_prs.append(pr)
 
-        filtered_prs = filtered_prs[::-1]
         if not filtered_prs:
-            print("Nothing to process 🎉")
-            return [], [], []
-
+            LOG.info(f"No pull requests to process for repo {org_repo.name}")
+            return
+
+        for prs_chunk in get_prs_chunks_by_updated_at(
+            list(map(GitlabPR, filtered_prs)),
+            lambda gitlab_pr: gitlab_pr.updated_at,
+            PR_PROCESSING_CHUNK_SIZE,
+        ):
+            yield self._process_prs(org_repo, prs_chunk)
+
+    def _process_prs(
+        self, org_repo: OrgRepo, gitlab_prs: List[GitlabPR]
+    ) -> PullRequestsData:
         pull_requests: List[PullRequest] = []
         pr_commits: List[PullRequestCommit] = []
         pr_events: List[PullRequestEvent] = []
+        prs_metrics_data: List[
+            Tuple[PullRequest, List[PullRequestEvent], List[PullRequestCommit]]
+        ] = []
         prs_added: Set[int] = set()
+        existing_prs_data: ExistingPRsData = prefetch_existing_prs_data(
+            self.code_repo_service,
+            str(org_repo.id),
+            [str(gitlab_pr.number) for gitlab_pr in gitlab_prs],
+        )
+        prs_details: List[GitlabMergeRequestDetails] = (
+            self._api.get_merge_requests_details(
+                str(org_repo.idempotency_key),
+                [
+                    (
+                        gitlab_pr.number,
+                        self.process_pr_state(gitlab_pr) == PullRequestState.MERGED,
+                    )
+                    for gitlab_pr in gitlab_prs
+                ],
+                self.mr_fetch_concurrency,
+            )
+        )
+        pr_number_to_details_map: Dict[str, GitlabMergeRequestDetails] = {
+            gitlab_pr.number: pr_details
+            for gitlab_pr, pr_details in zip(gitlab_prs, prs_details)
+        }
 
-        for gitlab_pr in filtered_prs:
-            gitlab_pr = GitlabPR(gitlab_pr)
+        for gitlab_pr in gitlab_prs:
             if gitlab_pr.number in prs_added:
                 continue
 
             pr_model, event_models, pr_commit_models = self.process_pr(
-                str(org_repo.id), str(org_repo.idempotency_key), gitlab_pr
+                str(org_repo.id),
+                str(org_repo.idempotency_key),
+                gitlab_pr,
+                existing_prs_data,
+                pr_number_to_details_map[gitlab_pr.number],
+                create_metrics=False,
             )
             pull_requests.append(pr_model)
             pr_events += event_models
             pr_commits += pr_commit_models
+            prs_metrics_data.append((pr_model, event_models, pr_commit_models))
             prs_added.add(gitlab_pr.number)
 
+        self.code_etl_analytics_service.create_prs_metrics(prs_metrics_data)
         return pull_requests, pr_commits, pr_events
 
-    def process_pr(
-        self, repo_id: str, repo_idempotency_key: str, pr: GitlabPR
+    def get_pull_request_data(
+        self, org_repo: OrgRepo, pr_number: int
     ) -> Tuple[PullRequest, List[PullRequestEvent], List[PullRequestCommit]]:
-        pr_model: Optional[PullRequest] = self.code_repo_service.get_repo_pr_by_number(
-            repo_id, pr.number
+        """
+        This method returns a single merge request of a repo with its Events and Commits.
+        :param org_repo: OrgRepo object the merge request belongs to
+        :param pr_number: Internal id of the merge request in the project
+        :return: Pull request, its events and commits
+        """
+        gitlab_pr = GitlabPR(
+            self._api.get_merge_request(org_repo.idempotency_key, pr_number)
         )
-        pr_event_model_list: List[PullRequestEvent] = (
-            self.code_repo_service.get_pr_events(pr_model)
+        return self.process_pr(
+            str(org_repo.id), str(org_repo.idempotency_key), gitlab_pr
+        )
+
+    def process_pr(
+        self,
+        repo_id: str,
+        repo_idempotency_key: str,
+        pr: GitlabPR,
+        existing_prs_data: Optional[ExistingPRsData] = None,
+        pr_details: Optional[GitlabMergeRequestDetails] = None,
+        create_metrics: bool = True,
+    ) -> Tuple[PullRequest, List[PullRequestEvent], List[PullRequestCommit]]:
+        """
+        Builds the PR models of a merge request. Its notes, commits and diff stats are taken from
+        `pr_details` when they were fetched in bulk, and fetched one by one otherwise.
+        With `create_metrics` False its metrics are left to the caller, which creates them for
+        many merge requests at once.
+        """
+        if existing_prs_data is None:
+            existing_prs_data = prefetch_existing_prs_data(
+                self.code_repo_service, repo_id, [pr.number]
+            )
+        pr_model: Optional[PullRequest] = existing_prs_data.get_pr(pr.number)
+        pr_event_model_list: List[PullRequestEvent] = existing_prs_data.get_pr_events(
+            pr_model
         )
         pr_commits_model_list: List = []
-        reviews: List[GitlabNote] = self._api.get_merge_request_notes(
-            repo_idempotency_key, pr.number
+        reviews: List[GitlabNote] = (
+            pr_details.notes
+            if pr_details
+            else self._api.get_merge_request_notes(repo_idempotency_key, pr.number)
         )
 
         pr_model: PullRequest = GitlabETLHandler._to_pr_model(pr, pr_model, repo_id)
@@ -185,15 +305,22 @@ class GitlabETLHandler(CodeProviderETLHandler):
         )
 
         if pr_model.state == PullRequestState.MERGED:
-            commits = self._api.get_merge_request_commits(
-                repo_idempotency_key, pr.number
+            commits = (
+                pr_details.commits
+                if pr_details
+                else self._api.get_merge_request_commits(
+                    repo_idempotency_key, pr.number
+                )
             )
             pr_commits_model_list: List[PullRequestCommit] = self._to_pr_commits(
                 commits, pr_model
             )
 
             additions, deletions, files_changed = self.process_pr_code_stats(
-                repo_idempotency_key, pr_model
+                repo_idempotency_key,
+                pr_model,
+                pr_details.diff_stats if pr_details else None,
+                pr.changes_count,
             )
             commits_count = len(pr_commits_model_list)
 
@@ -208,9 +335,10 @@ class GitlabETLHandler(CodeProviderETLHandler):
                 "user_profile": dict(username=pr_model.author),
             }
 
-        pr_model = self.code_etl_analytics_service.create_pr_metrics(
-            pr_model, pr_events_models, pr_commits_model_list
-        )
+        if create_metrics:
+            pr_model = self.code_etl_analytics_service.create_pr_metrics(
+                pr_model, pr_events_models, pr_commits_model_list
+            )
 
         return pr_model, pr_events_models, pr_commits_model_list
 
@@ -218,13 +346,26 @@ class GitlabETLHandler(CodeProviderETLHandler):
         self,
         repo_idempotency_key: str,
         pr_model: PullRequest,
+        diff_stats: Optional[DiffStats] = None,
+        changes_count: Optional[int] = None,
     ) -> Tuple[int, int, int]:
-        pr_number = pr_model.number
-        response = self._api.get_merge_request_diff(repo_idempotency_key, pr_number)
-        diffs = list(map(lambda x: x.get("diff"), response))
+        """
+        Additions, deletions and changed files of a merge request. The diffs are skipped
+        when the merge request reports no changed files, and the reported file count is
+        preferred over counting the diff pages when the merge request carries one.
+        """
+        if changes_count == 0:
+            return 0, 0, 0
 
-        additions, deletions, files_changed = parse_gitlab_diffs(diffs)
-        return additions, deletions, files_changed
+        if diff_stats is None:
+            diff_stats = self._api.get_merge_request_diff_stats(
+                repo_idempotency_key, pr_model.number
+            )
+
+        files_changed = (
+            changes_count if changes_count is not None else diff_stats.changed_files
+        )
+        return diff_stats.additions, diff_stats.deletions, files_changed
 
     def get_repo_contributors(self, gitlab_repo: GitlabRepo) -> Dict[str, Any]:
         project_contributors: List[Dict] = self._api.get_project_contributors(
@@ -270,6 +411,8 @@ class GitlabETLHandler(CodeProviderETLHandler):
             reviewers=pr.reviewers,
             provider=UserIdentityProvider.GITLAB.value,
             merge_commit_sha=pr.merge_commit_sha,
+            reverted_pr_number=None,
+            reverted_merge_commit_sha=get_reverted_merge_commit_sha(pr.head_branch),
         )
 
     @staticmethod
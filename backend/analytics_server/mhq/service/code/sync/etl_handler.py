@@ -1,5 +1,6 @@
+from os import getenv
 from datetime import datetime
-from typing import List
+from typing import Callable, List, Optional
 
 import pytz
 
@@ -21,14 +22,26 @@ from mhq.service.merge_to_deploy_broker import (
     get_merge_to_deploy_broker_utils_service,
     MergeToDeployBrokerUtils,
 )
-from mhq.store.models.code import OrgRepo, PullRequest
+from mhq.store.models.code import (
+    OrgRepo,
+    PullRequest,
+    PullRequestCommit,
+    PullRequestEvent,
+)
 from mhq.store.repos.code import CodeRepoService
+from mhq.utils.concurrency import run_in_app_context_pool
+from mhq.utils.lock import RedisLockService, get_redis_lock_service
 from mhq.utils.log import LOG
 from mhq.service.settings.models import DefaultSyncDaysSetting
 from mhq.service.bookmark import BookmarkService, BookmarkType, get_bookmark_service
 
 
 class CodeETLHandler:
+
+    REPO_SYNC_MAX_WORKERS = (
+        int(getenv("REPO_SYNC_MAX_WORKERS")) if getenv("REPO_SYNC_MAX_WORKERS") else 1
+    )
+
     def __init__(
         self,
         code_repo_service: CodeRepoService,
@@ -36,18 +49,25 @@ class CodeETLHandler:
         mtd_broker: MergeToDeployBrokerUtils,
         bookmark_service: BookmarkService,
         settings_service: SettingsService,
+        redis_lock_service: RedisLockService,
+        max_workers: int = REPO_SYNC_MAX_WORKERS,
+        worker_handler_factory: Optional[Callable[[], "CodeETLHandler"]] = None,
     ):
         self.code_repo_service = code_repo_service
         self.etl_service = etl_service
         self.mtd_broker = mtd_broker
         self.bookmark_service = bookmark_service
         self.settings_service = settings_service
+        self.redis_lock_service = redis_lock_service
+        self.max_workers = max_workers
+        self.worker_handler_factory = worker_handler_factory
 
     def sync_org_repos(self, org_id: str, provider: CodeProvider):
-        if not self.etl_service.check_pat_validity():
-            LOG.error("Invalid PAT for code provider")
+        org_repos: List[OrgRepo] = self.refresh_org_repos(org_id, provider)
+        if self.max_workers > 1 and self.worker_handler_factory:
+            self._sync_org_repos_pull_requests_data_concurrently(org_repos)
             return
-        org_repos: List[OrgRepo] = self._sync_org_repos(org_id, provider)
+
         for org_repo in org_repos:
             try:
                 self._sync_repo_pull_requests_data(org_repo)
@@ -57,6 +77,48 @@ class CodeETLHandler:
                 )
                 continue
 
+    def _sync_org_repos_pull_requests_data_concurrently(self, org_repos: List[OrgRepo]):
+        """
+        Syncs pull requests of the repos on a bounded pool of `max_workers` threads.
+        Every repo is synced by a fresh handler from `worker_handler_factory`, inside its own
+        app context, so API clients, DB sessions and bookmark handling are never shared between
+        workers. A failing repo is logged and does not affect the other repos.
+        """
+        repo_id_name_map = {str(org_repo.id): org_repo.name for org_repo in org_repos}
+
+        def _sync_repo(repo_id: str):
+            self.worker_handler_factory().sync_repo_pull_requests(repo_id)
+
+        results = run_in_app_context_pool(
+            _sync_repo, list(repo_id_name_map.keys()), self.max_workers
+        )
+        for result in results:
+            if result.failed:
+                LOG.error(
+                    f"Error syncing pull requests for repo {repo_id_name_map[result.item]}: "
+                    f"{str(result.error)}"
+                )
+
+    def refresh_org_repos(self, org_id: str, provider: CodeProvider) -> List[OrgRepo]:
+        """
+        Refreshes the metadata of the active repos of the provider.
+        :returns: The repos to sync pull requests for, none if the PAT is invalid
+        """
+        if not self.etl_service.check_pat_validity():
+            LOG.error("Invalid PAT for code provider")
+            return []
+        return self._sync_org_repos(org_id, provider)
+
+    def sync_repo_pull_requests(self, repo_id: str) -> int:
+        """
+        Syncs the pull requests of a single repo, loading the repo in the current session.
+        :returns: The number of pull requests synced
+        """
+        org_repo = self.code_repo_service.get_repo_by_id(repo_id)
+        if not org_repo:
+            raise Exception(f"Repo with {repo_id} not found")
+        return self._sync_repo_pull_requests_data(org_repo)
+
     def _sync_org_repos(self, org_id: str, provider: CodeProvider) -> List[OrgRepo]:
         try:
             org_repos = self.code_repo_service.get_active_org_repos_for_provider(
@@ -69,7 +131,15 @@ class CodeETLHandler:
             LOG.error(f"Error syncing org repos for org {org_id}: {str(e)}")
             raise e
 
-    def _sync_repo_pull_requests_data(self, org_repo: OrgRepo) -> None:
+    def _sync_repo_pull_requests_data(self, org_repo: OrgRepo) -> int:
+        """
+        Syncs the PRs of the repo while holding its per repo PR lock, so job workers, sync
+        servers and webhook updates never write the PRs of a repo at the same time.
+        """
+        with self._acquire_repo_pull_requests_lock(org_repo):
+            return self.__sync_repo_pull_requests_data(org_repo)
+
+    def __sync_repo_pull_requests_data(self, org_repo: OrgRepo) -> int:
         try:
             default_sync_days_setting: DefaultSyncDaysSetting = (
                 self.settings_service.get_or_set_default_settings(
@@ -86,37 +156,92 @@ class CodeETLHandler:
                 org_repo.provider,
                 default_sync_days,
             )
-            (
+            synced_chunks = 0
+            synced_prs = 0
+            for (
                 pull_requests,
                 pull_request_commits,
                 pull_request_events,
-            ) = self.etl_service.get_repo_pull_requests_data(org_repo, bookmark)
-            self.code_repo_service.save_pull_requests_data(
-                pull_requests, pull_request_commits, pull_request_events
-            )
-            if not pull_requests:
+            ) in self.etl_service.get_repo_pull_requests_data_chunks(
+                org_repo, bookmark
+            ):
+                if not pull_requests:
+                    continue
+                bookmark = self._sync_repo_pull_requests_data_chunk(
+                    org_repo, pull_requests, pull_request_commits, pull_request_events
+                )
+                synced_chunks += 1
+                synced_prs += len(pull_requests)
+
+            if not synced_chunks:
                 self.bookmark_service.update_bookmark(
                     str(org_repo.id),
                     BookmarkType.ORG_REPO_BOOKMARK,
                     org_repo.provider,
                     bookmark,
                 )
-                return
-
-            pull_requests.sort(key=lambda x: x.updated_at)
-            bookmark = pull_requests[-1].updated_at.astimezone(tz=pytz.UTC)
-            self.bookmark_service.update_bookmark(
-                str(org_repo.id),
-                BookmarkType.ORG_REPO_BOOKMARK,
-                org_repo.provider,
-                bookmark,
-            )
-            self.mtd_broker.pushback_merge_to_deploy_bookmark(org_repo, pull_requests)
-            self.__sync_revert_prs_mapping(org_repo, pull_requests)
+            return synced_prs
         except Exception as e:
             LOG.error(f"Error syncing pull requests for repo {org_repo.name}: {str(e)}")
             raise e
 
+    def _sync_repo_pull_requests_data_chunk(
+        self,
+        org_repo: OrgRepo,
+        pull_requests: List[PullRequest],
+        pull_request_commits: List[PullRequestCommit],
+        pull_request_events: List[PullRequestEvent],
+    ) -> datetime:
+        """
+        Saves a chunk of PRs and checkpoints the repo bookmark at the last PR update of the
+        chunk. The bookmark is moved only once everything derived from the chunk is saved,
+        so a sync that fails midway resumes from the last saved chunk.
+        :returns: The new bookmark
+        """
+        self.code_repo_service.save_pull_requests_data(
+            pull_requests, pull_request_commits, pull_request_events
+        )
+        self.mtd_broker.pushback_merge_to_deploy_bookmark(org_repo, pull_requests)
+        self.__sync_revert_prs_mapping(org_repo, pull_requests)
+
+        bookmark = max(pr.updated_at for pr in pull_requests).astimezone(tz=pytz.UTC)
+        self.bookmark_service.update_bookmark(
+            str(org_repo.id),
+            BookmarkType.ORG_REPO_BOOKMARK,
+            org_repo.provider,
+            bookmark,
+        )
+        return bookmark
+
+    def sync_repo_pull_request(self, org_repo: OrgRepo, pr_number: int) -> None:
+        """
+        Syncs a single PR, e.g. when a webhook reports a change to it. The repo bookmark is
+        left as is, as the PRs updated before this one may not be synced yet.
+        Holds the per repo PR lock, so the PR is not written while the repo is being synced.
+        """
+        try:
+            with self._acquire_repo_pull_requests_lock(org_repo):
+                pull_request, pull_request_events, pull_request_commits = (
+                    self.etl_service.get_pull_request_data(org_repo, pr_number)
+                )
+                self.code_repo_service.save_pull_requests_data(
+                    [pull_request], pull_request_commits, pull_request_events
+                )
+                self.mtd_broker.pushback_merge_to_deploy_bookmark(
+                    org_repo, [pull_request]
+                )
+                self.__sync_revert_prs_mapping(org_repo, [pull_request])
+        except Exception as e:
+            LOG.error(
+                f"Error syncing pull request {pr_number} for repo {org_repo.name}: {str(e)}"
+            )
+            raise e
+
+    def _acquire_repo_pull_requests_lock(self, org_repo: OrgRepo):
+        return self.redis_lock_service.acquire_lock(
+            "{org_repo}:" + f"{str(org_repo.id)}:pull_requests"
+        )
+
     def __sync_revert_prs_mapping(
         self, org_repo: OrgRepo, prs: List[PullRequest]
     ) -> None:
@@ -128,25 +253,42 @@ class CodeETLHandler:
             raise e
 
 
+def get_code_etl_handler(org_id: str, provider: str) -> CodeETLHandler:
+    return CodeETLHandler(
+        CodeRepoService(),
+        CodeETLFactory(org_id)(provider),
+        get_merge_to_deploy_broker_utils_service(),
+        get_bookmark_service(),
+        get_settings_service(),
+        get_redis_lock_service(),
+        worker_handler_factory=lambda: get_code_etl_handler(org_id, provider),
+    )
+
+
 def sync_code_repos(org_id: str):
     code_providers: List[str] = get_code_integration_service().get_org_providers(org_id)
     if not code_providers:
         LOG.info(f"No code integrations found for org {org_id}")
         return
-    etl_factory = CodeETLFactory(org_id)
 
     for provider in code_providers:
         try:
-            code_etl_handler = CodeETLHandler(
-                CodeRepoService(),
-                etl_factory(provider),
-                get_merge_to_deploy_broker_utils_service(),
-                get_bookmark_service(),
-                get_settings_service(),
-            )
+            code_etl_handler = get_code_etl_handler(org_id, provider)
             code_etl_handler.sync_org_repos(org_id, CodeProvider(provider))
             LOG.info(f"Synced org repos for provider {provider}")
         except Exception as e:
             LOG.error(f"Error syncing org repos for provider {provider}: {str(e)}")
             continue
     LOG.info(f"Synced all org repos for org {org_id}")
+
+
+def sync_code_repo_pull_request(org_id: str, org_repo: OrgRepo, pr_number: int):
+    code_etl_handler = CodeETLHandler(
+        CodeRepoService(),
+        CodeETLFactory(org_id)(org_repo.provider),
+        get_merge_to_deploy_broker_utils_service(),
+        get_bookmark_service(),
+        get_settings_service(),
+        get_redis_lock_service(),
+    )
+    code_etl_handler.sync_repo_pull_request(org_repo, pr_number)
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
 
 from mhq.store.models.code import (
     OrgRepo,
@@ -38,6 +38,32 @@ class CodeProviderETLHandler(ABC):
         :return: Pull requests sorted by state_changed_at date, their commits and events
         """
 
+    @abstractmethod
+    def get_repo_pull_requests_data_chunks(
+        self, org_repo: OrgRepo, bookmark: datetime
+    ) -> Iterator[
+        Tuple[List[PullRequest], List[PullRequestCommit], List[PullRequestEvent]]
+    ]:
+        """
+        This method yields the pull requests, their Commits and Events of a repo after the bookmark date,
+        in chunks ordered by the PR updated_at date, oldest first. Every chunk can be saved and
+        bookmarked before the next one is fetched.
+        :param org_repo: OrgRepo object to get pull requests for
+        :param bookmark: Bookmark object to get all pull requests after this date
+        :return: Chunks of pull requests, their commits and events
+        """
+
+    @abstractmethod
+    def get_pull_request_data(
+        self, org_repo: OrgRepo, pr_number: int
+    ) -> Tuple[PullRequest, List[PullRequestEvent], List[PullRequestCommit]]:
+        """
+        This method returns a single pull request of a repo with its Events and Commits.
+        :param org_repo: OrgRepo object the pull request belongs to
+        :param pr_number: Number of the pull request in the repo
+        :return: Pull request, its events and commits
+        """
+
     @abstractmethod
     def get_revert_prs_mapping(
         self, prs: List[PullRequest]
@@ -0,0 +1,51 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from mhq.store.models.code import PullRequest, PullRequestEvent
+from mhq.store.repos.code import CodeRepoService
+
+
+@dataclass
+class ExistingPRsData:
+    """
+    In memory map of the PRs of a repo that are already synced, along with their events.
+    It lets the ETL handlers resolve existing ids and event idempotency keys without
+    going to the DB once per PR.
+    """
+
+    pr_number_to_pr_map: Dict[str, PullRequest] = field(default_factory=dict)
+    pr_id_to_events_map: Dict[str, List[PullRequestEvent]] = field(default_factory=dict)
+
+    def get_pr(self, pr_number) -> Optional[PullRequest]:
+        return self.pr_number_to_pr_map.get(str(pr_number))
+
+    def get_pr_events(self, pr_model: Optional[PullRequest]) -> List[PullRequestEvent]:
+        if not pr_model:
+            return []
+        return self.pr_id_to_events_map.get(str(pr_model.id), [])
+
+
+def prefetch_existing_prs_data(
+    code_repo_service: CodeRepoService, repo_id: str, pr_numbers: List[str]
+) -> ExistingPRsData:
+    """
+    Loads all existing PRs for the given numbers and their events in two queries.
+    """
+    existing_prs: List[PullRequest] = code_repo_service.get_repo_prs_by_numbers(
+        repo_id, [str(number) for number in pr_numbers]
+    )
+    if not existing_prs:
+        return ExistingPRsData()
+
+    pr_events: List[PullRequestEvent] = code_repo_service.get_prs_events_by_pr_ids(
+        [str(pr.id) for pr in existing_prs]
+    )
+    pr_id_to_events_map: Dict[str, List[PullRequestEvent]] = defaultdict(list)
+    for pr_event in pr_events:
+        pr_id_to_events_map[str(pr_event.pull_request_id)].append(pr_event)
+
+    return ExistingPRsData(
+        pr_number_to_pr_map={str(pr.number): pr for pr in existing_prs},
+        pr_id_to_events_map=dict(pr_id_to_events_map),
+    )
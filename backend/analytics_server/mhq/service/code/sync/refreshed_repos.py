@@ -0,0 +1,51 @@
+import json
+from typing import List, Optional
+
+from redis import Redis
+
+from mhq.utils.lock import get_redis_lock_service
+
+REFRESHED_ORG_REPOS_TTL_SECONDS = 24 * 60 * 60
+
+
+class RefreshedOrgReposStore:
+    """
+    Records the repos kept by the last refresh of the repos of an org and code provider,
+    so the PR syncs that follow the refresh, on any worker, know which repos the refresh
+    dropped without asking the provider again.
+    """
+
+    def __init__(
+        self, redis: Redis, ttl_seconds: int = REFRESHED_ORG_REPOS_TTL_SECONDS
+    ):
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _get_key(org_id: str, provider: str) -> str:
+        return f"org_repos:{org_id}:{provider}:refreshed_repo_ids"
+
+    def save_refreshed_repo_ids(self, org_id: str, provider: str, repo_ids: List[str]):
+        self.redis.set(
+            self._get_key(org_id, provider), json.dumps(repo_ids), ex=self.ttl_seconds
+        )
+
+    def is_repo_kept(self, org_id: str, provider: str, repo_id: str) -> bool:
+        """
+        :returns: False if the last refresh dropped the repo. Repos are kept when no
+        refresh was recorded, e.g. once the record expired.
+        """
+        value: Optional[bytes] = self.redis.get(self._get_key(org_id, provider))
+        if value is None:
+            return True
+        return str(repo_id) in json.loads(value)
+
+
+_store: Optional[RefreshedOrgReposStore] = None
+
+
+def get_refreshed_org_repos_store() -> RefreshedOrgReposStore:
+    global _store
+    if not _store:
+        _store = RefreshedOrgReposStore(get_redis_lock_service().redis)
+    return _store
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+from os import getenv
+from typing import Optional
+
+from mhq.store.models.code import OrgRepo
+
+REPO_METADATA_FETCH_CONCURRENCY = (
+    int(getenv("REPO_METADATA_FETCH_CONCURRENCY"))
+    if getenv("REPO_METADATA_FETCH_CONCURRENCY")
+    else 10
+)
+CONTRIBUTORS_REFRESH_TTL = timedelta(
+    hours=(
+        int(getenv("CONTRIBUTORS_REFRESH_TTL_HOURS"))
+        if getenv("CONTRIBUTORS_REFRESH_TTL_HOURS")
+        else 24
+    )
+)
+
+
+def should_refresh_contributors(
+    org_repo: OrgRepo,
+    pushed_at: Optional[datetime],
+    now: datetime,
+    ttl: timedelta = CONTRIBUTORS_REFRESH_TTL,
+) -> bool:
+    """
+    Contributors only change with pushes, so they are refetched when the repo was pushed
+    to since they were last fetched, or when they are older than `ttl`. Repos whose push
+    time is unknown are refetched every time.
+    """
+    if org_repo.contributors is None or not org_repo.contributors_refreshed_at:
+        return True
+    if pushed_at is None or pushed_at != org_repo.pushed_at:
+        return True
+    return now - org_repo.contributors_refreshed_at >= ttl
@@ -8,6 +8,21 @@ from mhq.store.models.code.enums import (
 from mhq.store.models.code.pull_requests import PullRequest, PullRequestRevertPRMapping
 from mhq.store.repos.code import CodeRepoService
 
+REVERT_BRANCH_PATTERN = re.compile(r"^revert-([a-fA-F0-9]{8})$")
+
+
+def get_reverted_merge_commit_sha(head_branch: Optional[str]) -> Optional[str]:
+    """
+    Returns the short merge commit hash of the MR reverted by an MR with the given head
+    branch, from GitLab's "revert-[merge_commit_hash]" revert branches. Stored on the PR
+    at ingest so revert PRs can be looked up by an indexed equality match.
+    """
+    if not head_branch:
+        return None
+
+    match = REVERT_BRANCH_PATTERN.match(head_branch)
+    return match.group(1).lower() if match else None
+
 
 class RevertPRsGitlabSyncHandler:
     def __init__(self, code_repo_service: CodeRepoService):
@@ -47,41 +62,43 @@ class RevertPRsGitlabSyncHandler:
         """
         This function takes a list of PRs and for each PR it tries to
         find if that pr has been reverted and by which PR. It is done
-        by taking repo_id and the merge commit hash and searching for
-        the string 'revert-[merge-commit-hash]' in the head branch.
+        by taking repo_id and the merge commit hash and looking up the PRs
+        whose reverted_merge_commit_sha, parsed from their head branch at
+        ingest, matches.
         """
 
         repo_ids: Set[str] = set()
         repo_id_to_pr_merge_hash_to_revert_pr_id_map: Dict[str, Dict[str, str]] = {}
-        pr_merge_hash_match_strings: List[str] = []
+        pr_merge_hashes: List[str] = []
 
         for pr in prs:
-            if pr.state != PullRequestState.MERGED:
+            if pr.state != PullRequestState.MERGED or not pr.merge_commit_sha:
                 continue
 
-            pr_merge_hash_match_strings.append(f"revert-{pr.merge_commit_sha[:8]}")
+            merge_hash = pr.merge_commit_sha[:8].lower()
+            pr_merge_hashes.append(merge_hash)
             repo_ids.add(str(pr.repo_id))
 
             if str(pr.repo_id) not in repo_id_to_pr_merge_hash_to_revert_pr_id_map:
                 repo_id_to_pr_merge_hash_to_revert_pr_id_map[str(pr.repo_id)] = {}
 
             repo_id_to_pr_merge_hash_to_revert_pr_id_map[str(pr.repo_id)][
-                str(pr.merge_commit_sha[:8])
+                merge_hash
             ] = pr.id
 
-        if len(pr_merge_hash_match_strings) == 0:
+        if len(pr_merge_hashes) == 0:
             return []
 
         revert_prs: List[PullRequest] = (
-            self.code_repo_service.get_prs_by_head_branch_match_strings(
-                list(repo_ids), pr_merge_hash_match_strings
+            self.code_repo_service.get_revert_prs_by_reverted_merge_commit_shas(
+                list(repo_ids), pr_merge_hashes
             )
         )
 
         revert_pr_mappings: List[PullRequestRevertPRMapping] = []
 
         for rev_pr in revert_prs:
-            merge_commit_hash = self.get_revert_merge_commit_hash(rev_pr.head_branch)
+            merge_commit_hash = rev_pr.reverted_merge_commit_sha
             if merge_commit_hash is None:
                 continue
 
@@ -137,8 +154,8 @@ class RevertPRsGitlabSyncHandler:
                 str(revert_pr_merge_commit_hash)
             ] = pr.id
 
-            if len(revert_pr_hashes) == 0:
-                return []
+        if len(revert_pr_hashes) == 0:
+            return []
 
         reverted_prs: List[PullRequest] = (
             self.code_repo_service.get_reverted_prs_by_merge_commit_hash(
@@ -154,7 +171,7 @@ class RevertPRsGitlabSyncHandler:
             if repo_key_exists is None:
                 continue
 
-            commit_hash = rev_pr.merge_commit_sha[:8]
+            commit_hash = rev_pr.merge_commit_sha[:8].lower()
             original_pr_id = repo_id_to_pr_merge_hash_to_revert_pr_id_map[
                 str(rev_pr.repo_id)
             ].get(commit_hash)
@@ -178,14 +195,7 @@ class RevertPRsGitlabSyncHandler:
         return the merge_commit hash for Gitlab. The commit hash will be at least
         8 characters and at most 40 characters long
         """
-        pattern = r"^revert-([a-fA-F0-9]{8})$"
-
-        matches = re.findall(pattern, head_branch)
-
-        if matches:
-            return matches[-1]
-        else:
-            return None
+        return get_reverted_merge_commit_sha(head_branch)
 
 
 def get_revert_prs_gitlab_sync_handler() -> RevertPRsGitlabSyncHandler:
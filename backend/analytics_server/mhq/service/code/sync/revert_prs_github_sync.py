@@ -10,6 +10,21 @@ from mhq.store.models.code import (
 from mhq.store.repos.code import CodeRepoService
 from mhq.utils.time import time_now
 
+REVERT_BRANCH_PATTERN = re.compile(r"revert-(\d+)-\w+")
+
+
+def get_reverted_pr_number(head_branch: Optional[str]) -> Optional[str]:
+    """
+    Returns the number of the PR reverted by a PR with the given head branch, from
+    GitHub's "revert-[pr-num]-[branch-name]" revert branches. Stored on the PR at ingest
+    so revert PRs can be looked up by an indexed equality match.
+    """
+    if not head_branch:
+        return None
+
+    match = REVERT_BRANCH_PATTERN.search(head_branch)
+    return match.group(1) if match else None
+
 
 class RevertPRsGitHubSyncHandler:
     def __init__(
@@ -50,16 +65,16 @@ class RevertPRsGitHubSyncHandler:
         """
         This function takes a list of PRs and for each PR it tries to
         find if that pr has been reverted and by which PR. It is done
-        by taking repo_id and the pr_number and searching for the
-        string 'revert-[pr-number]' in the head branch.
+        by taking repo_id and the pr_number and looking up the PRs whose
+        reverted_pr_number, parsed from their head branch at ingest, matches.
         """
 
         repo_ids: Set[str] = set()
         repo_id_to_pr_number_to_id_map: Dict[str, Dict[str, str]] = {}
-        pr_numbers_match_strings: List[str] = []
+        pr_numbers: List[str] = []
 
         for pr in prs:
-            pr_numbers_match_strings.append(f"revert-{pr.number}")
+            pr_numbers.append(str(pr.number))
             repo_ids.add(str(pr.repo_id))
 
             if str(pr.repo_id) not in repo_id_to_pr_number_to_id_map:
@@ -67,19 +82,19 @@ class RevertPRsGitHubSyncHandler:
 
             repo_id_to_pr_number_to_id_map[str(pr.repo_id)][str(pr.number)] = pr.id
 
-        if len(pr_numbers_match_strings) == 0:
+        if len(pr_numbers) == 0:
             return []
 
         revert_prs: List[PullRequest] = (
-            self.code_repo_service.get_prs_by_head_branch_match_strings(
-                list(repo_ids), pr_numbers_match_strings
+            self.code_repo_service.get_revert_prs_by_reverted_pr_numbers(
+                list(repo_ids), pr_numbers
             )
         )
 
         revert_pr_mappings: List[PullRequestRevertPRMapping] = []
 
         for rev_pr in revert_prs:
-            original_pr_number = self._get_revert_pr_number(rev_pr.head_branch)
+            original_pr_number = rev_pr.reverted_pr_number
             if original_pr_number is None:
                 continue
 
@@ -170,15 +185,7 @@ class RevertPRsGitHubSyncHandler:
         Function to match the regex pattern "revert-[pr-num]-[branch-name]" and
         return the PR number for GitHub.
         """
-        pattern = r"revert-(\d+)-\w+"
-
-        match = re.search(pattern, head_branch)
-
-        if match:
-            pr_num = match.group(1)
-            return pr_num
-        else:
-            return None
+        return get_reverted_pr_number(head_branch)
 
 
 def get_revert_prs_github_sync_handler() -> RevertPRsGitHubSyncHandler:
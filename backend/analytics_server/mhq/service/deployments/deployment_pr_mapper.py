@@ -1,7 +1,7 @@
-from collections import defaultdict
+from collections import defaultdict, deque
 from datetime import datetime
 from queue import Queue
-from typing import List
+from typing import Deque, Dict, List, Optional, Set
 from mhq.store.models.code.enums import PullRequestState
 
 from mhq.store.models.code.pull_requests import PullRequest
@@ -60,6 +60,81 @@ class DeploymentPRGraph:
         self._last_change_deployed_for_branch[root_branch] = deployment_time
 
 
+class DeploymentPRSweep:
+    """
+    Finds the PRs shipped by each of many deployments in a single pass over the PRs.
+    Deployments must be added in order of `conducted_at`.
+
+    The result is the same as running `DeploymentPRGraph` for every deployment over the merged
+    PRs not shipped by an earlier deployment. PRs join the graph as the sweep passes their
+    merge time, and each PR leaves it once shipped, so every PR is visited about once
+    instead of once per deployment.
+    """
+
+    def __init__(self, prs: List[PullRequest]):
+        self._prs: List[PullRequest] = sorted(
+            (
+                pr
+                for pr in prs
+                if pr.state == PullRequestState.MERGED and pr.state_changed_at
+            ),
+            key=lambda pr: pr.state_changed_at,
+        )
+        self._next_pr_index = 0
+        self._prs_by_base_branch: Dict[str, Deque[PullRequest]] = defaultdict(deque)
+        self._prs_by_head_branch: Dict[str, List[PullRequest]] = defaultdict(list)
+        self._deployed_pr_ids: Set[str] = set()
+
+    def add_deployment(self, deployment: Deployment) -> List[PullRequest]:
+        """
+        :returns: The PRs shipped by the deployment that no earlier deployment shipped
+        """
+        self._add_prs_merged_until(deployment.conducted_at)
+
+        root_branch = deployment.head_branch
+        deployed_prs: List[PullRequest] = []
+        visited = {root_branch}
+        branches: Deque[str] = deque([root_branch])
+        while branches:
+            branch = branches.popleft()
+            last_change = (
+                deployment.conducted_at
+                if branch == root_branch
+                else self._get_last_change_for_branch(branch)
+            )
+            base_branch_prs = self._prs_by_base_branch[branch]
+            while (
+                base_branch_prs
+                and last_change
+                and base_branch_prs[0].state_changed_at <= last_change
+            ):
+                pr = base_branch_prs.popleft()
+                deployed_prs.append(pr)
+                if pr.head_branch not in visited:
+                    visited.add(pr.head_branch)
+                    branches.append(pr.head_branch)
+
+        # Last changes of branches are taken from the PRs before this deployment shipped them
+        self._deployed_pr_ids.update(str(pr.id) for pr in deployed_prs)
+        return deployed_prs
+
+    def _add_prs_merged_until(self, time: datetime):
+        while (
+            self._next_pr_index < len(self._prs)
+            and self._prs[self._next_pr_index].state_changed_at <= time
+        ):
+            pr = self._prs[self._next_pr_index]
+            self._prs_by_base_branch[pr.base_branch].append(pr)
+            self._prs_by_head_branch[pr.head_branch].append(pr)
+            self._next_pr_index += 1
+
+    def _get_last_change_for_branch(self, branch: str) -> Optional[datetime]:
+        head_branch_prs = self._prs_by_head_branch[branch]
+        while head_branch_prs and str(head_branch_prs[-1].id) in self._deployed_pr_ids:
+            head_branch_prs.pop()
+        return head_branch_prs[-1].state_changed_at if head_branch_prs else None
+
+
 class DeploymentPRMapperService:
     def get_all_prs_deployed(
         self, prs: List[PullRequest], deployment: Deployment
@@ -77,3 +152,19 @@ class DeploymentPRMapperService:
             branch_graph.add_edge(pr.base_branch, pr.head_branch, pr)
 
         return branch_graph.get_all_prs_for_root(deployment.head_branch)
+
+    def get_prs_merge_to_deploy(
+        self, prs: List[PullRequest], deployments: List[Deployment]
+    ) -> Dict[str, int]:
+        """
+        Maps the PRs shipped by the deployments to the seconds from their merge to the first
+        deployment that shipped them.
+        """
+        sweep = DeploymentPRSweep(prs)
+        merge_to_deploy_by_pr_id: Dict[str, int] = {}
+        for deployment in sorted(deployments, key=lambda d: d.conducted_at):
+            for pr in sweep.add_deployment(deployment):
+                merge_to_deploy_by_pr_id[pr.id] = int(
+                    (deployment.conducted_at - pr.state_changed_at).total_seconds()
+                )
+        return merge_to_deploy_by_pr_id
@@ -1,5 +1,8 @@
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional
+from os import getenv
+from typing import Callable, Dict, List, Optional
 
 from mhq.service.deployments import DeploymentPRMapperService
 from mhq.service.bookmark import BookmarkService, BookmarkType, get_bookmark_service
@@ -12,12 +15,36 @@ from mhq.store.models.code import (
 )
 from mhq.store.repos.code import CodeRepoService
 from mhq.store.repos.workflows import WorkflowRepoService
+from mhq.utils.concurrency import run_in_app_context_pool
 from mhq.utils.lock import RedisLockService, get_redis_lock_service
+from mhq.utils.log import LOG
+from mhq.utils.time import time_now
 
 DEPLOYMENTS_TO_PROCESS = 500
+SLOWEST_REPOS_TO_REPORT = 5
+
+
+@dataclass
+class MergeToDeployRepoReport:
+    repo_id: str
+    skipped: bool = False
+    error: Optional[str] = None
+    duration_seconds: float = 0
+    deployments_processed: int = 0
+    prs_updated: int = 0
+    bookmark: Optional[datetime] = None
+    lag_seconds: Optional[float] = None
+    caught_up: bool = True
 
 
 class MergeToDeployCacheHandler:
+
+    MERGE_TO_DEPLOY_MAX_WORKERS = (
+        int(getenv("MERGE_TO_DEPLOY_MAX_WORKERS"))
+        if getenv("MERGE_TO_DEPLOY_MAX_WORKERS")
+        else 1
+    )
+
     def __init__(
         self,
         org_id: str,
@@ -26,6 +53,10 @@ class MergeToDeployCacheHandler:
         deployment_pr_mapper_service: DeploymentPRMapperService,
         redis_lock_service: RedisLockService,
         bookmark_service: BookmarkService,
+        max_workers: int = MERGE_TO_DEPLOY_MAX_WORKERS,
+        worker_handler_factory: Optional[
+            Callable[[], "MergeToDeployCacheHandler"]
+        ] = None,
     ):
         self.org_id = org_id
         self.code_repo_service = code_repo_service
@@ -33,33 +64,131 @@ class MergeToDeployCacheHandler:
         self.deployment_pr_mapper_service = deployment_pr_mapper_service
         self.redis_lock_service = redis_lock_service
         self.bookmark_service = bookmark_service
+        self.max_workers = max_workers
+        self.worker_handler_factory = worker_handler_factory
 
-    def process_org_mtd(self):
+    def process_org_mtd(
+        self, wait_for_locked_repos: bool = True
+    ) -> List[MergeToDeployRepoReport]:
+        """
+        Processes the repos of the org, on a pool of `max_workers` threads when a
+        `worker_handler_factory` is given. A repo is only processed while holding its
+        per repo lock, so several workers, processes or sync server instances can run
+        this together and split the repos between them. Repos locked by someone else are
+        skipped at first, and waited for at the end if `wait_for_locked_repos` is set.
+        :returns: Timings and lag of every repo
+        """
         org_repos: List[OrgRepo] = self.code_repo_service.get_active_org_repos(
             self.org_id
         )
-        for org_repo in org_repos:
-            try:
-                with self.redis_lock_service.acquire_lock(
-                    "{org_repo}:" + f"{str(org_repo.id)}:merge_to_deploy_broker"
-                ):
-                    self._process_deployments_for_merge_to_deploy_caching(
-                        str(org_repo.id)
-                    )
-            except Exception as e:
-                print(f"Error syncing workflow for repo {str(org_repo.id)}: {str(e)}")
-                continue
-
-    def _process_deployments_for_merge_to_deploy_caching(self, repo_id: str):
+        repo_ids = [str(org_repo.id) for org_repo in org_repos]
+
+        reports = self._process_repos(repo_ids, blocking=False)
+        locked_repo_ids = [report.repo_id for report in reports if report.skipped]
+        if wait_for_locked_repos and locked_repo_ids:
+            reports_by_repo_id = {report.repo_id: report for report in reports}
+            for report in self._process_repos(locked_repo_ids, blocking=True):
+                reports_by_repo_id[report.repo_id] = report
+            reports = list(reports_by_repo_id.values())
+
+        self._log_reports(reports)
+        return reports
+
+    def _process_repos(
+        self, repo_ids: List[str], blocking: bool
+    ) -> List[MergeToDeployRepoReport]:
+        if self.max_workers <= 1 or not self.worker_handler_factory:
+            return [self.process_repo(repo_id, blocking) for repo_id in repo_ids]
+
+        def _process_repo_in_worker(repo_id: str) -> MergeToDeployRepoReport:
+            return self.worker_handler_factory().process_repo(repo_id, blocking)
+
+        results = run_in_app_context_pool(
+            _process_repo_in_worker, repo_ids, self.max_workers
+        )
+        return [
+            (
+                result.result
+                if not result.failed
+                else MergeToDeployRepoReport(
+                    repo_id=result.item, error=str(result.error)
+                )
+            )
+            for result in results
+        ]
+
+    def process_repo(
+        self, repo_id: str, blocking: bool = True
+    ) -> MergeToDeployRepoReport:
+        """
+        Caches merge to deploy for the repo while holding its per repo lock.
+        :returns: The timings and lag of the repo, skipped if not `blocking` and the lock is held
+        """
+        lock = self.redis_lock_service.acquire_lock(
+            "{org_repo}:" + f"{repo_id}:merge_to_deploy_broker"
+        )
+        if not lock.acquire(blocking=blocking):
+            return MergeToDeployRepoReport(repo_id=repo_id, skipped=True)
+
+        started_at = time.monotonic()
+        try:
+            report = self._process_deployments_for_merge_to_deploy_caching(repo_id)
+        except Exception as e:
+            LOG.error(f"Error caching merge to deploy for repo {repo_id}: {str(e)}")
+            report = MergeToDeployRepoReport(repo_id=repo_id, error=str(e))
+        finally:
+            lock.release()
+
+        report.duration_seconds = time.monotonic() - started_at
+        if report.bookmark:
+            report.lag_seconds = (time_now() - report.bookmark).total_seconds()
+        return report
+
+    def _log_reports(self, reports: List[MergeToDeployRepoReport]):
+        for report in reports:
+            LOG.info(
+                f"[Merge To Deploy] Repo {report.repo_id}: "
+                + (
+                    "skipped, locked by another worker"
+                    if report.skipped
+                    else f"{report.duration_seconds:.2f}s, "
+                    f"{report.deployments_processed} deployments, "
+                    f"{report.prs_updated} PRs updated, "
+                    f"lag {report.lag_seconds if report.lag_seconds is not None else '-'}s"
+                    + ("" if report.caught_up else ", more deployments pending")
+                    + (f", failed: {report.error}" if report.error else "")
+                )
+            )
+
+        slowest_reports = sorted(
+            reports, key=lambda report: report.duration_seconds, reverse=True
+        )[:SLOWEST_REPOS_TO_REPORT]
+        LOG.info(
+            f"[Merge To Deploy] Processed {len(reports)} repos for org {self.org_id}, "
+            f"{sum(r.skipped for r in reports)} skipped, "
+            f"{sum(bool(r.error) for r in reports)} failed. Slowest: "
+            + ", ".join(
+                f"{r.repo_id} ({r.duration_seconds:.2f}s)" for r in slowest_reports
+            )
+        )
+
+    def _process_deployments_for_merge_to_deploy_caching(
+        self, repo_id: str
+    ) -> MergeToDeployRepoReport:
+        """
+        Caches merge to deploy for the PRs shipped by the next batch of deployments of the
+        repo. The pending PRs are loaded once and swept against the deployments in order,
+        the results are written with a single bulk update, and the bookmark moves once.
+        """
         org_repo: OrgRepo = self.code_repo_service.get_repo_by_id(repo_id)
         if not org_repo:
-            Exception(f"Repo with {repo_id} not found")
+            raise Exception(f"Repo with {repo_id} not found")
 
         repo_workflows: List[RepoWorkflow] = (
             self.workflow_repo_service.get_repo_workflows_by_repo_id(repo_id)
         )
         if not repo_workflows:
-            return
+            return MergeToDeployRepoReport(repo_id=repo_id)
 
         bookmark: Optional[datetime] = self.bookmark_service.get_bookmark(
             repo_id, BookmarkType.MERGE_TO_DEPLOY_BOOKMARK, org_repo.provider
@@ -72,55 +201,65 @@ class MergeToDeployCacheHandler:
         )
 
         if not repo_workflow_runs:
-            return
+            return MergeToDeployRepoReport(repo_id=repo_id, bookmark=bookmark)
 
-        for repo_workflow_run in repo_workflow_runs:
-            try:
-                self._cache_prs_merge_to_deploy_for_repo_workflow_run(
-                    repo_id, repo_workflow_run
+        try:
+            last_conducted_at: datetime = max(
+                repo_workflow_run.conducted_at
+                for repo_workflow_run in repo_workflow_runs
+            )
+            successful_repo_workflow_runs: List[RepoWorkflowRuns] = [
+                repo_workflow_run
+                for repo_workflow_run in repo_workflow_runs
+                if repo_workflow_run.status == RepoWorkflowRunsStatus.SUCCESS
+            ]
+            pending_prs: List[PullRequest] = (
+                self.code_repo_service.get_prs_in_repo_merged_before_given_date_with_merge_to_deploy_as_null(
+                    repo_id, last_conducted_at
                 )
-                conducted_at: datetime = repo_workflow_run.conducted_at
-                self.bookmark_service.update_bookmark(
-                    repo_id,
-                    BookmarkType.MERGE_TO_DEPLOY_BOOKMARK,
-                    org_repo.provider,
-                    conducted_at,
+            )
+            merge_to_deploy_by_pr_id: Dict[str, int] = (
+                self.deployment_pr_mapper_service.get_prs_merge_to_deploy(
+                    pending_prs, successful_repo_workflow_runs
                 )
-            except Exception as e:
-                raise Exception(f"Error caching prs for repo {repo_id}: {str(e)}")
-
-    def _cache_prs_merge_to_deploy_for_repo_workflow_run(
-        self, repo_id: str, repo_workflow_run: RepoWorkflowRuns
-    ):
-        if repo_workflow_run.status != RepoWorkflowRunsStatus.SUCCESS:
-            return
-
-        conducted_at: datetime = repo_workflow_run.conducted_at
-        relevant_prs: List[PullRequest] = (
-            self.code_repo_service.get_prs_in_repo_merged_before_given_date_with_merge_to_deploy_as_null(
-                repo_id, conducted_at
             )
-        )
-        prs_to_update: List[PullRequest] = (
-            self.deployment_pr_mapper_service.get_all_prs_deployed(
-                relevant_prs, repo_workflow_run
+            if merge_to_deploy_by_pr_id:
+                self.code_repo_service.update_prs_merge_to_deploy(
+                    merge_to_deploy_by_pr_id
+                )
+            self.bookmark_service.update_bookmark(
+                repo_id,
+                BookmarkType.MERGE_TO_DEPLOY_BOOKMARK,
+                org_repo.provider,
+                last_conducted_at,
             )
-        )
+        except Exception as e:
+            raise Exception(f"Error caching prs for repo {repo_id}: {str(e)}")
 
-        for pr in prs_to_update:
-            pr.merge_to_deploy = int(
-                (conducted_at - pr.state_changed_at).total_seconds()
-            )
-        self.code_repo_service.update_prs(prs_to_update)
+        return MergeToDeployRepoReport(
+            repo_id=repo_id,
+            deployments_processed=len(repo_workflow_runs),
+            prs_updated=len(merge_to_deploy_by_pr_id),
+            bookmark=last_conducted_at,
+            caught_up=len(repo_workflow_runs) < DEPLOYMENTS_TO_PROCESS,
+        )
 
 
-def process_merge_to_deploy_cache(org_id: str):
-    merge_to_deploy_cache_handler = MergeToDeployCacheHandler(
+def get_merge_to_deploy_cache_handler(org_id: str) -> MergeToDeployCacheHandler:
+    return MergeToDeployCacheHandler(
         org_id,
         CodeRepoService(),
         WorkflowRepoService(),
         DeploymentPRMapperService(),
         get_redis_lock_service(),
         get_bookmark_service(),
+        worker_handler_factory=lambda: get_merge_to_deploy_cache_handler(org_id),
+    )
+
+
+def process_merge_to_deploy_cache(
+    org_id: str, wait_for_locked_repos: bool = True
+) -> List[MergeToDeployRepoReport]:
+    return get_merge_to_deploy_cache_handler(org_id).process_org_mtd(
+        wait_for_locked_repos
     )
-    merge_to_deploy_cache_handler.process_org_mtd()
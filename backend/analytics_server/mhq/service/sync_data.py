@@ -1,26 +1,286 @@
-from mhq.service.code import sync_code_repos
+from collections import defaultdict
+from dataclasses import dataclass
+from enum import Enum
+from os import getenv
+from typing import Callable, Dict, List, Optional
+
+from mhq.service.code.integration import get_code_integration_service
+from mhq.service.code.sync.etl_handler import get_code_etl_handler
+from mhq.service.code.sync.refreshed_repos import get_refreshed_org_repos_store
 from mhq.service.incidents import sync_org_incidents
-from mhq.service.merge_to_deploy_broker import process_merge_to_deploy_cache
-from mhq.service.workflows import sync_org_workflows
+from mhq.service.merge_to_deploy_broker.mtd_handler import (
+    get_merge_to_deploy_cache_handler,
+)
+from mhq.service.workflows.sync.etl_handler import get_workflow_etl_handler
+from mhq.store.models.code import CodeProvider, OrgRepo, RepoWorkflow
+from mhq.store.repos.code import CodeRepoService
+from mhq.utils.concurrency import (
+    DAGTask,
+    DAGTaskResult,
+    DAGTaskSkipped,
+    run_dag_in_app_context_pool,
+)
+from mhq.utils.http_cache import get_response_cache
 from mhq.utils.log import LOG
+from mhq.utils.metrics import (
+    SYNC_ITEMS_TOTAL,
+    SYNC_STAGE_DURATION_SECONDS,
+    SYNC_TASK_DURATION_SECONDS,
+    SYNC_TASKS_TOTAL,
+)
+
+DATA_SYNC_MAX_WORKERS = (
+    int(getenv("DATA_SYNC_MAX_WORKERS")) if getenv("DATA_SYNC_MAX_WORKERS") else 1
+)
+
+
+class SyncStage(Enum):
+    ORG_REPOS = "org_repos"
+    PULL_REQUESTS = "pull_requests"
+    WORKFLOWS = "workflows"
+    MERGE_TO_DEPLOY = "merge_to_deploy"
+    INCIDENTS = "incidents"
+
+
+# PRs are not synced when the refresh of their provider failed, e.g. for an invalid PAT
+SKIPPED_ON_FAILED_DEPENDENCY_STAGES = (SyncStage.PULL_REQUESTS,)
+
+
+@dataclass
+class SyncStageReport:
+    stage: SyncStage
+    tasks: int = 0
+    failed: int = 0
+    skipped: int = 0
+    items: int = 0
+    wall_clock_seconds: float = 0
+    busy_seconds: float = 0
+
+
+def _get_task_key(stage: SyncStage, entity_id: Optional[str] = None) -> str:
+    return f"{stage.value}:{entity_id}" if entity_id else stage.value
+
+
+def get_task_stage(key: str) -> SyncStage:
+    return SyncStage(key.split(":", 1)[0])
+
+
+def is_skipped_on_failed_dependency(key: str) -> bool:
+    return get_task_stage(key) in SKIPPED_ON_FAILED_DEPENDENCY_STAGES
+
+
+def get_org_sync_task_graph(org_id: str) -> Dict[str, List[str]]:
+    """
+    Models the sync of an org as per repo tasks, so stages of different repos overlap:
+    - org_repos:<provider> refreshes the repos of a code provider
+    - pull_requests:<repo> syncs the PRs of a repo once its provider is refreshed, and is
+      skipped when the refresh failed or dropped the repo
+    - workflows:<repo workflow> syncs the runs of a workflow, independent of PRs
+    - merge_to_deploy:<repo> runs once the PRs and all workflows of the repo are synced
+    - incidents syncs incidents once the PRs, and their revert PRs, of all repos are synced
+    :returns: The keys of the tasks mapped to the keys of the tasks they depend on
+    """
+    code_providers: List[str] = (
+        get_code_integration_service().get_org_providers(org_id) or []
+    )
+    org_repos: List[OrgRepo] = CodeRepoService().get_active_org_repos(org_id)
+    repo_workflows: List[RepoWorkflow] = [
+        repo_workflow
+        for _, repo_workflow in get_workflow_etl_handler(
+            org_id
+        ).get_active_repo_workflows(org_id)
+    ]
+
+    graph: Dict[str, List[str]] = {}
+    for provider in code_providers:
+        graph[_get_task_key(SyncStage.ORG_REPOS, provider)] = []
+
+    repo_dependencies: Dict[str, List[str]] = defaultdict(list)
+    for org_repo in org_repos:
+        if org_repo.provider not in code_providers:
+            continue
+        key = _get_task_key(SyncStage.PULL_REQUESTS, str(org_repo.id))
+        graph[key] = [_get_task_key(SyncStage.ORG_REPOS, org_repo.provider)]
+        repo_dependencies[str(org_repo.id)].append(key)
+
+    for repo_workflow in repo_workflows:
+        key = _get_task_key(SyncStage.WORKFLOWS, str(repo_workflow.id))
+        graph[key] = []
+        repo_dependencies[str(repo_workflow.org_repo_id)].append(key)
+
+    for org_repo in org_repos:
+        graph[_get_task_key(SyncStage.MERGE_TO_DEPLOY, str(org_repo.id))] = (
+            repo_dependencies[str(org_repo.id)]
+        )
+
+    graph[_get_task_key(SyncStage.INCIDENTS)] = [
+        key for key in graph if get_task_stage(key) == SyncStage.PULL_REQUESTS
+    ]
+    return graph
 
-sync_sequence = [
-    sync_code_repos,
-    sync_org_workflows,
-    process_merge_to_deploy_cache,
-    sync_org_incidents,
-]
 
+def get_org_sync_task_func(org_id: str, key: str) -> Callable[[], Optional[int]]:
+    """
+    Returns the function that runs a task of the org sync graph. Tasks are built from
+    their key alone, so any worker process or host can run any task of a sync.
+    Every task returns the number of items it synced, where that is known, and raises
+    DAGTaskSkipped when it has nothing to sync.
+    """
+    stage = get_task_stage(key)
+    entity_id = key.split(":", 1)[1] if ":" in key else None
 
-def trigger_data_sync(org_id: str):
+    def _refresh_org_repos() -> int:
+        org_repos: List[OrgRepo] = get_code_etl_handler(
+            org_id, entity_id
+        ).refresh_org_repos(org_id, CodeProvider(entity_id))
+        get_refreshed_org_repos_store().save_refreshed_repo_ids(
+            org_id, entity_id, [str(org_repo.id) for org_repo in org_repos]
+        )
+        return len(org_repos)
+
+    def _sync_repo_pull_requests() -> int:
+        org_repo: Optional[OrgRepo] = CodeRepoService().get_repo_by_id(entity_id)
+        if not org_repo:
+            raise Exception(f"Repo with {entity_id} not found")
+        if not get_refreshed_org_repos_store().is_repo_kept(
+            org_id, org_repo.provider, entity_id
+        ):
+            raise DAGTaskSkipped(f"Repo {org_repo.name} was dropped by the refresh")
+        return get_code_etl_handler(org_id, org_repo.provider).sync_repo_pull_requests(
+            entity_id
+        )
+
+    def _sync_repo_workflow() -> int:
+        return get_workflow_etl_handler(org_id).sync_repo_workflow(entity_id)
+
+    def _process_repo_merge_to_deploy() -> int:
+        report = get_merge_to_deploy_cache_handler(org_id).process_repo(entity_id)
+        if report.error:
+            raise Exception(report.error)
+        return report.deployments_processed
+
+    def _sync_incidents() -> None:
+        sync_org_incidents(org_id)
+
+    return {
+        SyncStage.ORG_REPOS: _refresh_org_repos,
+        SyncStage.PULL_REQUESTS: _sync_repo_pull_requests,
+        SyncStage.WORKFLOWS: _sync_repo_workflow,
+        SyncStage.MERGE_TO_DEPLOY: _process_repo_merge_to_deploy,
+        SyncStage.INCIDENTS: _sync_incidents,
+    }[stage]
+
+
+def get_org_sync_tasks(org_id: str) -> List[DAGTask]:
+    return [
+        DAGTask(
+            key=key,
+            func=get_org_sync_task_func(org_id, key),
+            depends_on=depends_on,
+            skip_on_failed_dependency=is_skipped_on_failed_dependency(key),
+        )
+        for key, depends_on in get_org_sync_task_graph(org_id).items()
+    ]
+
+
+def get_sync_stage_reports(results: List[DAGTaskResult]) -> List[SyncStageReport]:
+    """
+    Aggregates task results per stage. The wall clock time of a stage runs from the start
+    of its first task to the end of its last task, the busy time sums up its tasks.
+    """
+    results_by_stage: Dict[SyncStage, List[DAGTaskResult]] = defaultdict(list)
+    for result in results:
+        results_by_stage[get_task_stage(result.key)].append(result)
+
+    reports: List[SyncStageReport] = []
+    for stage in SyncStage:
+        stage_results = results_by_stage.get(stage)
+        if not stage_results:
+            continue
+        reports.append(
+            SyncStageReport(
+                stage=stage,
+                tasks=len(stage_results),
+                failed=sum(result.failed for result in stage_results),
+                skipped=sum(result.skipped for result in stage_results),
+                items=sum(
+                    result.result
+                    for result in stage_results
+                    if isinstance(result.result, int)
+                ),
+                wall_clock_seconds=max(r.finished_at for r in stage_results)
+                - min(r.started_at for r in stage_results),
+                busy_seconds=sum(r.duration_seconds for r in stage_results),
+            )
+        )
+    return reports
+
+
+def record_sync_task_metrics(
+    key: str,
+    duration_seconds: float,
+    failed: bool,
+    items: Optional[int],
+    skipped: bool = False,
+):
+    stage = get_task_stage(key).value
+    if skipped:
+        SYNC_TASKS_TOTAL.labels(stage=stage, status="skipped").inc()
+        return
+    SYNC_TASK_DURATION_SECONDS.labels(stage=stage).observe(duration_seconds)
+    SYNC_TASKS_TOTAL.labels(
+        stage=stage, status="failed" if failed else "succeeded"
+    ).inc()
+    if items:
+        SYNC_ITEMS_TOTAL.labels(stage=stage).inc(items)
+
+
+def record_sync_stage_metrics(reports: List[SyncStageReport]):
+    for report in reports:
+        SYNC_STAGE_DURATION_SECONDS.labels(stage=report.stage.value).observe(
+            report.wall_clock_seconds
+        )
+
+
+def trigger_data_sync(org_id: str) -> List[SyncStageReport]:
     LOG.info(f"Starting data sync for org {org_id}")
-    for sync_func in sync_sequence:
-        try:
-            sync_func(org_id)
-            LOG.info(f"Data sync for {sync_func.__name__} completed successfully")
-        except Exception as e:
+    response_cache = get_response_cache()
+    if response_cache:
+        response_cache.reset_stats()
+
+    results = run_dag_in_app_context_pool(
+        get_org_sync_tasks(org_id), DATA_SYNC_MAX_WORKERS
+    )
+    for result in results:
+        if result.failed:
             LOG.error(
-                f"Error syncing {sync_func.__name__} data for org {org_id}: {str(e)}"
+                f"Error syncing {result.key} for org {org_id}: {str(result.error)}"
             )
-            continue
+        if result.skipped:
+            LOG.info(f"Skipped syncing {result.key} for org {org_id}")
+        record_sync_task_metrics(
+            result.key,
+            result.duration_seconds,
+            result.failed,
+            result.result if isinstance(result.result, int) else None,
+            result.skipped,
+        )
+
+    reports = get_sync_stage_reports(results)
+    record_sync_stage_metrics(reports)
+    for report in reports:
+        LOG.info(
+            f"Data sync stage {report.stage.value} for org {org_id}: "
+            f"{report.tasks} tasks, {report.failed} failed, {report.skipped} skipped, "
+            f"{report.items} items, "
+            f"{report.wall_clock_seconds:.2f}s wall clock, {report.busy_seconds:.2f}s busy"
+        )
+
+    if response_cache:
+        stats = response_cache.get_stats()
+        LOG.info(
+            f"Response cache for org {org_id} sync: {stats['hits']} not modified responses "
+            f"served from cache, {stats['misses']} fetched"
+        )
     LOG.info(f"Data sync for org {org_id} completed successfully")
+    return reports
@@ -0,0 +1,3 @@
+from .jobs import SyncJob, SyncJobStatus, SyncTask, SyncTaskResult
+from .queue import get_sync_job_queue
+from .worker import enqueue_org_sync, process_sync_tasks, start_sync_tasks_processing
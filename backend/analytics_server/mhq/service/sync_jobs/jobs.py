@@ -0,0 +1,142 @@
+import json
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from mhq.service.sync_data import SyncStage, get_task_stage
+from mhq.utils.time import time_now
+
+
+class SyncJobStatus(Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+
+
+@dataclass
+class SyncJob:
+    id: str
+    org_id: str
+    graph: Dict[str, List[str]]
+    created_at: str = field(default_factory=lambda: time_now().isoformat())
+
+    def get_dependents(self, key: str) -> List[str]:
+        return [
+            dependent
+            for dependent, depends_on in self.graph.items()
+            if key in depends_on
+        ]
+
+    def get_ready_task_keys(self) -> List[str]:
+        return [key for key, depends_on in self.graph.items() if not depends_on]
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, value) -> "SyncJob":
+        return cls(**json.loads(value))
+
+
+@dataclass
+class SyncTask:
+    job_id: str
+    org_id: str
+    key: str
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, value) -> "SyncTask":
+        return cls(**json.loads(value))
+
+
+@dataclass
+class SyncTaskResult:
+    started_at: float
+    finished_at: float
+    items: Optional[int] = None
+    error: Optional[str] = None
+    skipped: bool = False
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.finished_at - self.started_at
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, value) -> "SyncTaskResult":
+        return cls(**json.loads(value))
+
+
+def get_sync_job_progress(
+    job: SyncJob,
+    results: Dict[str, SyncTaskResult],
+    started_at: Optional[datetime],
+    finished_at: Optional[datetime],
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Status of a sync job with the progress of every stage. The ETA extrapolates the time
+    taken so far over the tasks that are left.
+    """
+    now = now or time_now()
+    total = len(job.graph)
+    completed = len(results)
+
+    if finished_at or (total and completed == total):
+        status = SyncJobStatus.COMPLETED
+    elif started_at:
+        status = SyncJobStatus.RUNNING
+    else:
+        status = SyncJobStatus.QUEUED
+
+    eta_seconds: Optional[float] = None
+    if status == SyncJobStatus.COMPLETED:
+        eta_seconds = 0
+    elif started_at and completed:
+        elapsed_seconds = (now - started_at).total_seconds()
+        eta_seconds = elapsed_seconds * (total - completed) / completed
+
+    stages: List[Dict[str, Any]] = []
+    for stage in SyncStage:
+        keys = [key for key in job.graph if get_task_stage(key) == stage]
+        if not keys:
+            continue
+        stage_results = [results[key] for key in keys if key in results]
+        stages.append(
+            {
+                "stage": stage.value,
+                "total": len(keys),
+                "completed": len(stage_results),
+                "failed": sum(result.failed for result in stage_results),
+                "skipped": sum(result.skipped for result in stage_results),
+                "items": sum(result.items or 0 for result in stage_results),
+                "busy_seconds": sum(r.duration_seconds for r in stage_results),
+            }
+        )
+
+    return {
+        "job_id": job.id,
+        "org_id": job.org_id,
+        "status": status.value,
+        "created_at": job.created_at,
+        "started_at": started_at.isoformat() if started_at else None,
+        "finished_at": finished_at.isoformat() if finished_at else None,
+        "tasks": {
+            "total": total,
+            "completed": completed,
+            "failed": sum(result.failed for result in results.values()),
+            "skipped": sum(result.skipped for result in results.values()),
+        },
+        "stages": stages,
+        "eta_seconds": eta_seconds,
+    }
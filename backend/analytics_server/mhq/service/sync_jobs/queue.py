@@ -0,0 +1,333 @@
+import time
+from datetime import datetime
+from os import getenv
+from typing import Any, Dict, List, Optional
+
+from mhq.service.sync_data import (
+    get_sync_stage_reports,
+    is_skipped_on_failed_dependency,
+    record_sync_stage_metrics,
+)
+from mhq.service.sync_jobs.jobs import (
+    SyncJob,
+    SyncTask,
+    SyncTaskResult,
+    get_sync_job_progress,
+)
+from mhq.utils.concurrency import DAGTaskResult
+from mhq.utils.lock import get_redis_lock_service
+from mhq.utils.log import LOG
+from mhq.utils.string import uuid4_str
+from mhq.utils.time import time_now
+
+SYNC_JOBS_KEY_PREFIX = "sync_jobs"
+SYNC_JOB_TIMEOUT_SECONDS = (
+    int(getenv("SYNC_JOB_TIMEOUT_SECONDS"))
+    if getenv("SYNC_JOB_TIMEOUT_SECONDS")
+    else 6 * 60 * 60
+)
+SYNC_TASK_LEASE_SECONDS = (
+    int(getenv("SYNC_TASK_LEASE_SECONDS")) if getenv("SYNC_TASK_LEASE_SECONDS") else 60
+)
+SYNC_JOB_RETENTION_SECONDS = 7 * 24 * 60 * 60
+RECENT_SYNC_JOBS_TO_KEEP = 20
+
+
+def _decode(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+class SyncJobQueue:
+    """
+    Queue of the tasks of org sync jobs, kept in Redis so that every sync server process
+    and worker host can pick up tasks of the same job.
+
+    A job stores its task graph. Tasks without pending dependencies are pushed to a shared
+    list, and every finished task decrements the pending dependency counts of the tasks
+    depending on it, pushing those that reach zero. Tasks that are skipped on a failed
+    dependency are completed as skipped instead of being pushed, when a task they depend
+    on failed or was skipped. Only one job per org is in flight, until
+    it finishes or SYNC_JOB_TIMEOUT_SECONDS pass.
+
+    A popped task is moved to a processing list of the worker running it, and stays there
+    until it is completed. Workers hold a lease they renew while they run, and the tasks of
+    a worker whose lease expired, e.g. because its process was killed mid task, are moved
+    back to the shared list by `requeue_expired_tasks`.
+    """
+
+    def __init__(
+        self,
+        redis,
+        key_prefix: str = SYNC_JOBS_KEY_PREFIX,
+        lease_seconds: int = SYNC_TASK_LEASE_SECONDS,
+    ):
+        self._redis = redis
+        self._prefix = key_prefix
+        self.lease_seconds = lease_seconds
+
+    def _key(self, *parts: str) -> str:
+        return ":".join([self._prefix, *parts])
+
+    def _job_key(self, job_id: str, *parts: str) -> str:
+        return self._key("job", job_id, *parts)
+
+    def _active_job_key(self, org_id: str) -> str:
+        return self._key("org", org_id, "active_job")
+
+    def _processing_key(self, worker_id: str) -> str:
+        return self._key("processing", worker_id)
+
+    def get_active_job(self, org_id: str) -> Optional[SyncJob]:
+        job_id = _decode(self._redis.get(self._active_job_key(org_id)))
+        return self.get_job(job_id) if job_id else None
+
+    def enqueue_job(self, org_id: str, graph: Dict[str, List[str]]) -> SyncJob:
+        """
+        Creates a sync job for the task graph and queues its first tasks.
+        :returns: The new job, or the job already in flight for the org
+        """
+        job = SyncJob(id=uuid4_str(), org_id=org_id, graph=graph)
+        if not self._redis.set(
+            self._active_job_key(org_id), job.id, nx=True, ex=SYNC_JOB_TIMEOUT_SECONDS
+        ):
+            active_job = self.get_active_job(org_id)
+            if active_job:
+                return active_job
+            self._redis.set(
+                self._active_job_key(org_id), job.id, ex=SYNC_JOB_TIMEOUT_SECONDS
+            )
+
+        self._redis.set(
+            self._job_key(job.id), job.to_json(), ex=SYNC_JOB_RETENTION_SECONDS
+        )
+        if graph:
+            self._redis.hset(
+                self._job_key(job.id, "pending"),
+                mapping={
+                    key: len(set(depends_on)) for key, depends_on in graph.items()
+                },
+            )
+            self._redis.expire(
+                self._job_key(job.id, "pending"), SYNC_JOB_RETENTION_SECONDS
+            )
+        self._redis.lpush(self._key("recent"), job.id)
+        self._redis.ltrim(self._key("recent"), 0, RECENT_SYNC_JOBS_TO_KEEP - 1)
+
+        if not graph:
+            self._finish_job(job)
+        for key in job.get_ready_task_keys():
+            self._push_task(SyncTask(job_id=job.id, org_id=org_id, key=key))
+
+        LOG.info(f"[Sync Jobs] Queued sync job {job.id} with {len(graph)} tasks")
+        return job
+
+    def _push_task(self, task: SyncTask):
+        self._redis.lpush(self._key("tasks"), task.to_json())
+
+    def pop_task(self, worker_id: str, wait_seconds: int = 0) -> Optional[SyncTask]:
+        """
+        Moves the next ready task to the processing list of the worker, waiting up to
+        `wait_seconds` for one to be queued, and renews the lease of the worker.
+        """
+        self.renew_lease(worker_id)
+        if wait_seconds:
+            value = self._redis.blmove(
+                self._key("tasks"),
+                self._processing_key(worker_id),
+                wait_seconds,
+                "RIGHT",
+                "LEFT",
+            )
+        else:
+            value = self._redis.lmove(
+                self._key("tasks"), self._processing_key(worker_id), "RIGHT", "LEFT"
+            )
+        if value is None:
+            return None
+
+        try:
+            task = SyncTask.from_json(value)
+        except Exception as e:
+            LOG.error(f"[Sync Jobs] Dropping malformed queued task: {str(e)}")
+            self._redis.lrem(self._processing_key(worker_id), 1, value)
+            return None
+
+        self._redis.set(
+            self._job_key(task.job_id, "started_at"),
+            time_now().isoformat(),
+            nx=True,
+            ex=SYNC_JOB_RETENTION_SECONDS,
+        )
+        return task
+
+    def complete_task(
+        self, task: SyncTask, result: SyncTaskResult, worker_id: Optional[str] = None
+    ):
+        """
+        Records the result of a task and queues the tasks that were only waiting for it,
+        then drops it from the processing list of `worker_id`.
+        A task completed twice, e.g. when it was requeued while its worker was still
+        running it, is only counted once.
+        """
+        self._complete_task(task, result)
+        if worker_id:
+            self._redis.lrem(self._processing_key(worker_id), 1, task.to_json())
+
+    def _complete_task(self, task: SyncTask, result: SyncTaskResult):
+        job = self.get_job(task.job_id)
+        if not job:
+            LOG.error(f"[Sync Jobs] Sync job {task.job_id} of task {task.key} expired")
+            return
+
+        results_key = self._job_key(job.id, "results")
+        if not self._redis.hsetnx(results_key, task.key, result.to_json()):
+            return
+        self._redis.expire(results_key, SYNC_JOB_RETENTION_SECONDS)
+
+        for dependent in job.get_dependents(task.key):
+            if (
+                self._redis.hincrby(self._job_key(job.id, "pending"), dependent, -1)
+                != 0
+            ):
+                continue
+            dependent_task = SyncTask(job_id=job.id, org_id=job.org_id, key=dependent)
+            if self._has_failed_dependency(job, dependent):
+                now = time.time()
+                self._complete_task(
+                    dependent_task,
+                    SyncTaskResult(started_at=now, finished_at=now, skipped=True),
+                )
+                continue
+            self._push_task(dependent_task)
+
+        finished_key = self._job_key(job.id, "finished_tasks")
+        finished_tasks = self._redis.incr(finished_key)
+        self._redis.expire(finished_key, SYNC_JOB_RETENTION_SECONDS)
+        if finished_tasks == len(job.graph):
+            self._finish_job(job)
+
+    def _has_failed_dependency(self, job: SyncJob, key: str) -> bool:
+        if not is_skipped_on_failed_dependency(key):
+            return False
+        results = self._get_results(job.id)
+        return any(
+            results[dependency].failed or results[dependency].skipped
+            for dependency in job.graph[key]
+            if dependency in results
+        )
+
+    def renew_lease(self, worker_id: str):
+        self._redis.hset(
+            self._key("leases"), mapping={worker_id: time.time() + self.lease_seconds}
+        )
+
+    def release_worker(self, worker_id: str):
+        """
+        Drops the lease of a worker that stopped, requeueing any task it left behind.
+        """
+        self._requeue_worker_tasks(worker_id)
+        self._redis.hdel(self._key("leases"), worker_id)
+
+    def requeue_expired_tasks(self) -> int:
+        """
+        Moves the tasks of workers whose lease expired back to the shared list, so a task
+        left behind by a dead worker is run again and its job still finishes.
+        :returns: The number of tasks requeued
+        """
+        now = time.time()
+        requeued_tasks = 0
+        for worker_id, expires_at in (
+            self._redis.hgetall(self._key("leases")) or {}
+        ).items():
+            if float(expires_at) >= now:
+                continue
+            worker_id = _decode(worker_id)
+            worker_requeued_tasks = self._requeue_worker_tasks(worker_id)
+            self._redis.hdel(self._key("leases"), worker_id)
+            if worker_requeued_tasks:
+                LOG.warning(
+                    f"[Sync Jobs] Requeued {worker_requeued_tasks} tasks of sync worker "
+                    f"{worker_id}, whose lease expired"
+                )
+            requeued_tasks += worker_requeued_tasks
+        return requeued_tasks
+
+    def _requeue_worker_tasks(self, worker_id: str) -> int:
+        # Requeued tasks go to the end tasks are popped from, as they are already late
+        requeued_tasks = 0
+        while self._redis.lmove(
+            self._processing_key(worker_id), self._key("tasks"), "RIGHT", "RIGHT"
+        ):
+            requeued_tasks += 1
+        return requeued_tasks
+
+    def _finish_job(self, job: SyncJob):
+        self._redis.set(
+            self._job_key(job.id, "finished_at"),
+            time_now().isoformat(),
+            ex=SYNC_JOB_RETENTION_SECONDS,
+        )
+        if _decode(self._redis.get(self._active_job_key(job.org_id))) == job.id:
+            self._redis.delete(self._active_job_key(job.org_id))
+
+        record_sync_stage_metrics(
+            get_sync_stage_reports(
+                [
+                    DAGTaskResult(
+                        key=key,
+                        result=result.items,
+                        error=result.error,
+                        started_at=result.started_at,
+                        finished_at=result.finished_at,
+                        skipped=result.skipped,
+                    )
+                    for key, result in self._get_results(job.id).items()
+                ]
+            )
+        )
+        LOG.info(f"[Sync Jobs] Finished sync job {job.id}")
+
+    def get_job(self, job_id: str) -> Optional[SyncJob]:
+        value = self._redis.get(self._job_key(job_id))
+        return SyncJob.from_json(value) if value else None
+
+    def get_job_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.get_job(job_id)
+        if not job:
+            return None
+
+        return get_sync_job_progress(
+            job,
+            self._get_results(job_id),
+            self._get_datetime(self._job_key(job_id, "started_at")),
+            self._get_datetime(self._job_key(job_id, "finished_at")),
+        )
+
+    def _get_results(self, job_id: str) -> Dict[str, SyncTaskResult]:
+        return {
+            _decode(key): SyncTaskResult.from_json(value)
+            for key, value in (
+                self._redis.hgetall(self._job_key(job_id, "results")) or {}
+            ).items()
+        }
+
+    def get_recent_job_ids(self) -> List[str]:
+        return [
+            _decode(job_id) for job_id in self._redis.lrange(self._key("recent"), 0, -1)
+        ]
+
+    def _get_datetime(self, key: str) -> Optional[datetime]:
+        value = _decode(self._redis.get(key))
+        return datetime.fromisoformat(value) if value else None
+
+
+_queue: Optional[SyncJobQueue] = None
+
+
+def get_sync_job_queue() -> SyncJobQueue:
+    global _queue
+    if not _queue:
+        _queue = SyncJobQueue(get_redis_lock_service().redis)
+    return _queue
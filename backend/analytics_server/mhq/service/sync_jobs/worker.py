@@ -0,0 +1,160 @@
+import threading
+import time
+from typing import List, Optional
+
+from flask import current_app, has_app_context
+
+from mhq.service.sync_data import (
+    DATA_SYNC_MAX_WORKERS,
+    get_org_sync_task_func,
+    get_org_sync_task_graph,
+    record_sync_task_metrics,
+)
+from mhq.service.sync_jobs.jobs import SyncJob, SyncTask, SyncTaskResult
+from mhq.service.sync_jobs.queue import SyncJobQueue, get_sync_job_queue
+from mhq.utils.concurrency import DAGTaskSkipped
+from mhq.utils.log import LOG
+from mhq.utils.string import uuid4_str
+
+_processing_threads: List[threading.Thread] = []
+_processing_threads_lock = threading.Lock()
+
+
+def enqueue_org_sync(org_id: str, queue: Optional[SyncJobQueue] = None) -> SyncJob:
+    """
+    Queues a sync of the org, unless one is already in flight.
+    :returns: The queued job, or the job already in flight
+    """
+    queue = queue or get_sync_job_queue()
+    active_job = queue.get_active_job(org_id)
+    if active_job:
+        return active_job
+    return queue.enqueue_job(org_id, get_org_sync_task_graph(org_id))
+
+
+def run_sync_task(task: SyncTask) -> SyncTaskResult:
+    started_at = time.time()
+    try:
+        items = get_org_sync_task_func(task.org_id, task.key)()
+        result = SyncTaskResult(
+            started_at=started_at,
+            finished_at=time.time(),
+            items=items if isinstance(items, int) else None,
+        )
+    except DAGTaskSkipped as e:
+        LOG.info(f"[Sync Jobs] Skipped {task.key} of job {task.job_id}: {str(e)}")
+        result = SyncTaskResult(
+            started_at=started_at, finished_at=time.time(), skipped=True
+        )
+    except Exception as e:
+        LOG.error(
+            f"[Sync Jobs] Error running {task.key} of job {task.job_id}: {str(e)}"
+        )
+        result = SyncTaskResult(
+            started_at=started_at, finished_at=time.time(), error=str(e)
+        )
+
+    record_sync_task_metrics(
+        task.key, result.duration_seconds, result.failed, result.items, result.skipped
+    )
+    return result
+
+
+def run_sync_task_in_app_context(task: SyncTask) -> SyncTaskResult:
+    """
+    Runs the task inside its own app context, so every task gets a fresh scoped `db.session`
+    which is removed once the task finishes. Without it a long lived worker would keep one
+    session, idle in transaction between tasks, and carry ORM state from task to task.
+    """
+    if not has_app_context():
+        return run_sync_task(task)
+    with current_app._get_current_object().app_context():
+        return run_sync_task(task)
+
+
+class SyncWorkerLease:
+    """
+    Renews the lease of a sync worker on a background thread for as long as the worker
+    runs, so tasks that outlast the lease are not requeued, and releases it on exit.
+    """
+
+    def __init__(self, queue: SyncJobQueue, worker_id: str):
+        self.queue = queue
+        self.worker_id = worker_id
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _renew_periodically(self):
+        while not self._stopped.wait(self.queue.lease_seconds / 4):
+            try:
+                self.queue.renew_lease(self.worker_id)
+            except Exception as e:
+                LOG.error(f"[Sync Jobs] Error renewing sync worker lease: {str(e)}")
+
+    def __enter__(self) -> "SyncWorkerLease":
+        self.queue.renew_lease(self.worker_id)
+        self._thread = threading.Thread(target=self._renew_periodically, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+        self.queue.release_worker(self.worker_id)
+
+
+def process_sync_tasks(
+    queue: Optional[SyncJobQueue] = None,
+    wait_seconds: int = 0,
+    max_tasks: Optional[int] = None,
+) -> int:
+    """
+    Runs queued sync tasks until the queue stays empty for `wait_seconds`. Several workers,
+    in this or other processes and hosts, can drain the queue together. A worker that
+    finishes a task picks up the tasks it unblocked, so they are never left behind, and
+    tasks of workers that died mid task are requeued before it starts.
+    :returns: The number of tasks run
+    """
+    queue = queue or get_sync_job_queue()
+    queue.requeue_expired_tasks()
+    worker_id = uuid4_str()
+    processed_tasks = 0
+    with SyncWorkerLease(queue, worker_id):
+        while max_tasks is None or processed_tasks < max_tasks:
+            task = queue.pop_task(worker_id, wait_seconds)
+            if not task:
+                break
+            queue.complete_task(task, run_sync_task_in_app_context(task), worker_id)
+            processed_tasks += 1
+    return processed_tasks
+
+
+def start_sync_tasks_processing(workers: int = DATA_SYNC_MAX_WORKERS) -> int:
+    """
+    Drains the queue on background threads, so `/sync` answers right away while the
+    sync runs. Threads already draining the queue in this process count towards
+    `workers`, so repeated calls never run more than `workers` threads at once.
+    :returns: The number of threads started
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def _process():
+        try:
+            if not app:
+                process_sync_tasks()
+                return
+            with app.app_context():
+                process_sync_tasks()
+        except Exception as e:
+            LOG.error(f"[Sync Jobs] Error processing sync tasks: {str(e)}")
+
+    with _processing_threads_lock:
+        _processing_threads[:] = [
+            thread for thread in _processing_threads if thread.is_alive()
+        ]
+        threads_to_start = max(1, workers) - len(_processing_threads)
+        for _ in range(threads_to_start):
+            thread = threading.Thread(target=_process, daemon=True)
+            thread.start()
+            _processing_threads.append(thread)
+    return max(threads_to_start, 0)
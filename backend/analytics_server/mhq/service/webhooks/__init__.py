@@ -0,0 +1,4 @@
+from .events import WebhookEvent
+from .processor import process_webhook_events, start_webhook_events_processing
+from .queue import get_webhook_event_queue
+from .signature import verify_github_signature, verify_gitlab_token
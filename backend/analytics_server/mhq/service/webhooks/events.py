@@ -0,0 +1,39 @@
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from mhq.utils.time import time_now
+
+
+@dataclass
+class WebhookEvent:
+    provider: str
+    event: str
+    payload: Dict[str, Any]
+    delivery_id: Optional[str] = None
+    received_at: str = field(default_factory=lambda: time_now().isoformat())
+
+    def to_json(self) -> str:
+        return json.dumps(self.__dict__)
+
+    @classmethod
+    def from_json(cls, value) -> "WebhookEvent":
+        return cls(**json.loads(value))
+
+
+@dataclass(frozen=True)
+class PullRequestUpdate:
+    provider: str
+    repo_idempotency_key: str
+    pr_number: int
+
+
+@dataclass
+class WorkflowRunUpdate:
+    provider: str
+    repo_idempotency_key: str
+    workflow_run: Dict[str, Any]
+
+    @property
+    def run_id(self) -> str:
+        return str(self.workflow_run.get("id"))
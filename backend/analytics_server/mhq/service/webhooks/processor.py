@@ -0,0 +1,240 @@
+import threading
+from collections import OrderedDict
+from os import getenv
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+from mhq.service.code.sync import sync_code_repo_pull_request
+from mhq.service.query_validator import get_query_validator
+from mhq.service.webhooks.events import (
+    PullRequestUpdate,
+    WebhookEvent,
+    WorkflowRunUpdate,
+)
+from mhq.service.webhooks.queue import WebhookEventQueue, get_webhook_event_queue
+from mhq.service.workflows.sync import sync_repo_workflow_run
+from mhq.store.models.code import CodeProvider, OrgRepo, RepoWorkflowProviders
+from mhq.store.repos.code import CodeRepoService
+from mhq.utils.lock import get_redis_lock_service
+from mhq.utils.log import LOG
+
+WEBHOOK_PROCESSING_BATCH_SIZE = (
+    int(getenv("WEBHOOK_PROCESSING_BATCH_SIZE"))
+    if getenv("WEBHOOK_PROCESSING_BATCH_SIZE")
+    else 100
+)
+
+GITHUB_PULL_REQUEST_EVENTS = ("pull_request", "pull_request_review")
+GITHUB_WORKFLOW_RUN_EVENT = "workflow_run"
+GITLAB_MERGE_REQUEST_EVENT = "Merge Request Hook"
+GITLAB_NOTE_EVENT = "Note Hook"
+
+CODE_PROVIDER_WORKFLOW_PROVIDER_MAP = {
+    CodeProvider.GITHUB.value: RepoWorkflowProviders.GITHUB_ACTIONS,
+}
+
+
+class WebhookEventProcessor:
+    """
+    Applies queued webhook events as targeted updates. Events are coalesced first, so a
+    burst of events for one PR or workflow run syncs it only once.
+    """
+
+    def __init__(
+        self,
+        org_id: str,
+        code_repo_service: CodeRepoService,
+        sync_pull_request: Callable[[str, OrgRepo, int], None],
+        sync_workflow_run: Callable[[str, OrgRepo, RepoWorkflowProviders, Dict], None],
+    ):
+        self.org_id = org_id
+        self.code_repo_service = code_repo_service
+        self._sync_pull_request = sync_pull_request
+        self._sync_workflow_run = sync_workflow_run
+
+    def process(self, events: List[WebhookEvent]) -> Dict[str, int]:
+        pull_request_updates, workflow_run_updates = self.get_updates(events)
+        org_repos_map = self._get_org_repos_map(
+            [update.repo_idempotency_key for update in pull_request_updates]
+            + [update.repo_idempotency_key for update in workflow_run_updates]
+        )
+
+        synced_pull_requests = 0
+        for update in pull_request_updates:
+            org_repo = org_repos_map.get((update.provider, update.repo_idempotency_key))
+            if not org_repo:
+                continue
+            try:
+                self._sync_pull_request(self.org_id, org_repo, update.pr_number)
+                synced_pull_requests += 1
+            except Exception as e:
+                LOG.error(
+                    f"[Webhooks] Error syncing PR {update.pr_number} of repo {org_repo.name}: {str(e)}"
+                )
+
+        synced_workflow_runs = 0
+        for update in workflow_run_updates:
+            org_repo = org_repos_map.get((update.provider, update.repo_idempotency_key))
+            workflow_provider = CODE_PROVIDER_WORKFLOW_PROVIDER_MAP.get(update.provider)
+            if not org_repo or not workflow_provider:
+                continue
+            try:
+                self._sync_workflow_run(
+                    self.org_id, org_repo, workflow_provider, update.workflow_run
+                )
+                synced_workflow_runs += 1
+            except Exception as e:
+                LOG.error(
+                    f"[Webhooks] Error syncing workflow run {update.run_id} of repo {org_repo.name}: {str(e)}"
+                )
+
+        return {
+            "events": len(events),
+            "pull_requests": synced_pull_requests,
+            "workflow_runs": synced_workflow_runs,
+        }
+
+    @staticmethod
+    def get_updates(
+        events: List[WebhookEvent],
+    ) -> Tuple[List[PullRequestUpdate], List[WorkflowRunUpdate]]:
+        """
+        Maps events to the PRs and workflow runs they change. Every PR is listed once, and
+        only the most recently updated state of every workflow run is kept.
+        """
+        pull_request_updates: Dict[PullRequestUpdate, None] = OrderedDict()
+        workflow_run_updates: Dict[Tuple[str, str], WorkflowRunUpdate] = OrderedDict()
+        for event in events:
+            try:
+                update = WebhookEventProcessor._get_update(event)
+            except (KeyError, TypeError, ValueError) as e:
+                LOG.error(
+                    f"[Webhooks] Ignoring malformed {event.provider} {event.event} event: {str(e)}"
+                )
+                continue
+
+            if isinstance(update, PullRequestUpdate):
+                pull_request_updates[update] = None
+            elif isinstance(update, WorkflowRunUpdate):
+                key = (update.repo_idempotency_key, update.run_id)
+                existing_update = workflow_run_updates.get(key)
+                if existing_update and str(
+                    existing_update.workflow_run.get("updated_at")
+                ) > str(update.workflow_run.get("updated_at")):
+                    continue
+                workflow_run_updates[key] = update
+
+        return list(pull_request_updates.keys()), list(workflow_run_updates.values())
+
+    @staticmethod
+    def _get_update(event: WebhookEvent):
+        payload = event.payload
+        if event.provider == CodeProvider.GITHUB.value:
+            if event.event in GITHUB_PULL_REQUEST_EVENTS:
+                return PullRequestUpdate(
+                    event.provider,
+                    str(payload["repository"]["id"]),
+                    int(payload["pull_request"]["number"]),
+                )
+            if event.event == GITHUB_WORKFLOW_RUN_EVENT:
+                return WorkflowRunUpdate(
+                    event.provider,
+                    str(payload["repository"]["id"]),
+                    payload["workflow_run"],
+                )
+
+        if event.provider == CodeProvider.GITLAB.value:
+            if event.event == GITLAB_MERGE_REQUEST_EVENT:
+                return PullRequestUpdate(
+                    event.provider,
+                    str(payload["project"]["id"]),
+                    int(payload["object_attributes"]["iid"]),
+                )
+            if (
+                event.event == GITLAB_NOTE_EVENT
+                and payload["object_attributes"].get("noteable_type") == "MergeRequest"
+            ):
+                return PullRequestUpdate(
+                    event.provider,
+                    str(payload["project"]["id"]),
+                    int(payload["merge_request"]["iid"]),
+                )
+
+        return None
+
+    def _get_org_repos_map(
+        self, repo_idempotency_keys: List[str]
+    ) -> Dict[Tuple[str, str], OrgRepo]:
+        if not repo_idempotency_keys:
+            return {}
+        org_repos: List[OrgRepo] = self.code_repo_service.get_repos_by_idempotency_keys(
+            list(set(repo_idempotency_keys))
+        )
+        return {
+            (org_repo.provider, str(org_repo.idempotency_key)): org_repo
+            for org_repo in org_repos
+            if str(org_repo.org_id) == str(self.org_id) and org_repo.is_active
+        }
+
+
+def process_webhook_events(
+    queue: Optional[WebhookEventQueue] = None,
+    batch_size: int = WEBHOOK_PROCESSING_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Drains the webhook event queue in batches. Only one worker drains the queue at a time,
+    other calls return right away, as do calls before an org is set up. Events that fail to
+    apply are logged and dropped, the periodic sync picks up their changes.
+    """
+    totals = {"events": 0, "pull_requests": 0, "workflow_runs": 0}
+    default_org = get_query_validator().get_default_org()
+    if not default_org:
+        LOG.info("[Webhooks] Default org not found, skipping webhook events")
+        return totals
+
+    queue = queue or get_webhook_event_queue()
+    org_id = str(default_org.id)
+    processor = WebhookEventProcessor(
+        org_id,
+        CodeRepoService(),
+        sync_code_repo_pull_request,
+        sync_repo_workflow_run,
+    )
+
+    lock = get_redis_lock_service().acquire_lock("{org}:" + f"{org_id}:webhook_events")
+    if not lock.acquire(blocking=False):
+        return totals
+
+    try:
+        while True:
+            events = queue.pop_batch(batch_size)
+            if not events:
+                break
+            for key, count in processor.process(events).items():
+                totals[key] += count
+    finally:
+        lock.release()
+
+    LOG.info(f"[Webhooks] Processed webhook events: {totals}")
+    return totals
+
+
+def start_webhook_events_processing():
+    """
+    Drains the queue on a background thread, so webhook deliveries are answered right away
+    while their updates are applied within seconds.
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def _process():
+        try:
+            if not app:
+                process_webhook_events()
+                return
+            with app.app_context():
+                process_webhook_events()
+        except Exception as e:
+            LOG.error(f"[Webhooks] Error processing webhook events: {str(e)}")
+
+    threading.Thread(target=_process, daemon=True).start()
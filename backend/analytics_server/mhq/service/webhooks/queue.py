@@ -0,0 +1,46 @@
+from typing import List, Optional
+
+from mhq.service.webhooks.events import WebhookEvent
+from mhq.utils.lock import get_redis_lock_service
+from mhq.utils.log import LOG
+
+WEBHOOK_EVENTS_QUEUE_KEY = "webhook_events"
+
+
+class WebhookEventQueue:
+    """
+    FIFO queue of received webhook events, kept in a Redis list so that it is shared by
+    every sync server worker and survives restarts.
+    """
+
+    def __init__(self, redis, key: str = WEBHOOK_EVENTS_QUEUE_KEY):
+        self._redis = redis
+        self._key = key
+
+    def push(self, event: WebhookEvent):
+        self._redis.lpush(self._key, event.to_json())
+
+    def pop_batch(self, max_events: int) -> List[WebhookEvent]:
+        events: List[WebhookEvent] = []
+        while len(events) < max_events:
+            value = self._redis.rpop(self._key)
+            if value is None:
+                break
+            try:
+                events.append(WebhookEvent.from_json(value))
+            except Exception as e:
+                LOG.error(f"[Webhooks] Dropping malformed queued event: {str(e)}")
+        return events
+
+    def size(self) -> int:
+        return self._redis.llen(self._key)
+
+
+_queue: Optional[WebhookEventQueue] = None
+
+
+def get_webhook_event_queue() -> WebhookEventQueue:
+    global _queue
+    if not _queue:
+        _queue = WebhookEventQueue(get_redis_lock_service().redis)
+    return _queue
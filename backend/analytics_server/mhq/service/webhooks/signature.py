@@ -0,0 +1,31 @@
+import hashlib
+import hmac
+from typing import Optional
+
+GITHUB_SIGNATURE_PREFIX = "sha256="
+
+
+def verify_github_signature(
+    secret: Optional[str], body: bytes, signature: Optional[str]
+) -> bool:
+    """
+    Checks the `X-Hub-Signature-256` header, the HMAC SHA256 of the raw body keyed with
+    the webhook secret.
+    """
+    if not secret or not signature or not signature.startswith(GITHUB_SIGNATURE_PREFIX):
+        return False
+    expected_signature = hmac.new(
+        secret.encode("utf-8"), body, hashlib.sha256
+    ).hexdigest()
+    return hmac.compare_digest(
+        expected_signature, signature.removeprefix(GITHUB_SIGNATURE_PREFIX)
+    )
+
+
+def verify_gitlab_token(secret: Optional[str], token: Optional[str]) -> bool:
+    """
+    GitLab does not sign payloads, it sends the configured secret token in `X-Gitlab-Token`.
+    """
+    if not secret or not token:
+        return False
+    return hmac.compare_digest(secret.encode("utf-8"), token.encode("utf-8"))
@@ -1 +1 @@
-from .etl_handler import sync_org_workflows
+from .etl_handler import sync_org_workflows, sync_repo_workflow_run
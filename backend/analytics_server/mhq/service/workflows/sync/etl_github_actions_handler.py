@@ -1,6 +1,6 @@
-from datetime import datetime
-from typing import Dict, Optional, List, Tuple
-from uuid import uuid4
+from datetime import datetime, timedelta
+from typing import Dict, Optional, List, Set, Tuple
+from uuid import UUID, uuid4
 
 import pytz
 
@@ -21,6 +21,8 @@ from mhq.utils.log import LOG
 from mhq.utils.time import ISO_8601_DATE_FORMAT, time_now
 
 WORKFLOW_PROCESSING_CHUNK_SIZE = 100
+# GitHub cancels workflow runs that take longer than 35 days
+PENDING_WORKFLOW_RUN_MAX_AGE = timedelta(days=35)
 
 
 class GithubActionsETLHandler(WorkflowProviderETLHandler):
@@ -54,12 +56,16 @@ class GithubActionsETLHandler(WorkflowProviderETLHandler):
     ) -> Tuple[List[RepoWorkflowRuns], datetime]:
         """
         This method returns all workflow runs of a repo's workflow. After the bookmark date.
+        Runs created after the bookmark are filtered by GitHub. Runs that were still pending
+        when they were last synced are fetched again one by one, so the bookmark does not
+        have to stay behind the oldest pending run. Pending runs GitHub no longer has are
+        returned as cancelled, so they are not fetched again.
         :param org_repo: OrgRepo object to get workflow runs for
         :param repo_workflow: RepoWorkflow object to get workflow runs for
         :param bookmark: datetime object to get all workflow runs after this date
         :return: Workflow runs, datetime object
         """
-
+        sync_started_at = time_now()
         try:
             github_workflow_runs = self._api.get_workflow_runs(
                 org_repo.org_name,
@@ -67,10 +73,18 @@ class GithubActionsETLHandler(WorkflowProviderETLHandler):
                 repo_workflow.provider_workflow_id,
                 bookmark,
             )
+            pending_github_workflow_runs, missing_workflow_runs = (
+                self._get_pending_workflow_runs(
+                    org_repo,
+                    repo_workflow,
+                    {str(workflow_run["id"]) for workflow_run in github_workflow_runs},
+                )
+            )
+            github_workflow_runs += pending_github_workflow_runs
         except Exception as e:
             raise Exception(
                 f"[GitHub Sync Repo Workflow Worker] Error fetching workflow {str(repo_workflow.id)} "
-                f"for repo {str(org_repo.repo_id)}: {str(e)}"
+                f"for repo {str(org_repo.id)}: {str(e)}"
             )
 
         if not github_workflow_runs:
@@ -79,49 +93,130 @@ class GithubActionsETLHandler(WorkflowProviderETLHandler):
                 f"Workflow: {str(repo_workflow.provider_workflow_id)}. Repo: {org_repo.org_name}/{org_repo.name}. "
                 f"Org: {self.org_id}"
             )
-            return [], bookmark
+            return missing_workflow_runs, bookmark
+
+        # Runs created while this sync was fetching are picked up by the next sync
+        bookmark = sync_started_at
 
-        bookmark = self._get_new_bookmark_time_stamp(github_workflow_runs)
+        repo_workflow_runs: List[RepoWorkflowRuns] = []
+        for start in range(
+            0, len(github_workflow_runs), WORKFLOW_PROCESSING_CHUNK_SIZE
+        ):
+            end = start + WORKFLOW_PROCESSING_CHUNK_SIZE
+            repo_workflow_runs += self._adapt_github_workflow_runs_chunk(
+                str(repo_workflow.id), github_workflow_runs[start:end]
+            )
 
-        repo_workflow_runs = [
+        return repo_workflow_runs + missing_workflow_runs, bookmark
+
+    def _adapt_github_workflow_runs_chunk(
+        self, repo_workflow_id: str, github_workflow_runs: List[Dict]
+    ) -> List[RepoWorkflowRuns]:
+        """
+        Adapts a page of workflow runs, looking up the runs already synced with a single
+        query for the whole page instead of one query per run.
+        """
+        existing_workflow_runs: List[RepoWorkflowRuns] = (
+            self._workflow_repo_service.get_repo_workflow_runs_by_provider_workflow_run_ids(
+                repo_workflow_id,
+                [str(workflow_run["id"]) for workflow_run in github_workflow_runs],
+            )
+        )
+        existing_workflow_run_ids: Dict[str, UUID] = {
+            workflow_run.provider_workflow_run_id: workflow_run.id
+            for workflow_run in existing_workflow_runs
+        }
+        return [
             self._adapt_github_workflows_to_workflow_runs(
-                str(repo_workflow.id), workflow_run
+                repo_workflow_id, workflow_run, existing_workflow_run_ids
             )
             for workflow_run in github_workflow_runs
         ]
 
-        return repo_workflow_runs, bookmark
+    def get_workflow_run_from_payload(
+        self, repo_workflow: RepoWorkflow, provider_workflow_run: Dict
+    ) -> RepoWorkflowRuns:
+        """
+        This method adapts a GitHub `workflow_run` webhook payload run, which has the same
+        shape as the runs returned by the API, so no API call is needed.
+        :param repo_workflow: RepoWorkflow object the workflow run belongs to
+        :param provider_workflow_run: Workflow run of the webhook payload
+        :return: RepoWorkflowRuns object
+        """
+        return self._adapt_github_workflows_to_workflow_runs(
+            str(repo_workflow.id), provider_workflow_run
+        )
 
-    def _get_new_bookmark_time_stamp(
-        self, github_workflow_runs: List[Dict]
-    ) -> datetime:
+    def _get_pending_workflow_runs(
+        self,
+        org_repo: OrgRepo,
+        repo_workflow: RepoWorkflow,
+        fetched_workflow_run_ids: Set[str],
+    ) -> Tuple[List[Dict], List[RepoWorkflowRuns]]:
         """
-        This method returns the new bookmark timestamp for the workflow runs.
-        It returns the minimum timestamp of the pending jobs if there are any pending jobs.
-        This is done because there might be a workflow run that is still pending, and we
-        want to fetch it in the next sync.
+        Fetches the runs that were pending when they were last synced and were not fetched
+        again with the runs after the bookmark.
+        :returns: The fetched runs, and the pending runs GitHub returned 404 for, e.g. runs
+        deleted or replaced by a re-run, marked as cancelled
         """
-        pending_job_timestamps = [
-            self._get_datetime_from_gh_datetime(workflow_run["created_at"])
-            for workflow_run in github_workflow_runs
-            if workflow_run["status"] != "completed"
-        ]
-        return min(pending_job_timestamps) if pending_job_timestamps else time_now()
+        pending_workflow_runs: List[RepoWorkflowRuns] = (
+            self._workflow_repo_service.get_pending_repo_workflow_runs(
+                str(repo_workflow.id), time_now() - PENDING_WORKFLOW_RUN_MAX_AGE
+            )
+        )
+        github_workflow_runs: List[Dict] = []
+        missing_workflow_runs: List[RepoWorkflowRuns] = []
+        for pending_workflow_run in pending_workflow_runs:
+            if (
+                pending_workflow_run.provider_workflow_run_id
+                in fetched_workflow_run_ids
+            ):
+                continue
+            github_workflow_run = self._api.get_workflow_run(
+                org_repo.org_name,
+                org_repo.name,
+                pending_workflow_run.provider_workflow_run_id,
+            )
+            if github_workflow_run:
+                github_workflow_runs.append(github_workflow_run)
+                continue
+
+            LOG.info(
+                f"[GitHub Sync Repo Workflow Worker] Pending workflow run "
+                f"{pending_workflow_run.provider_workflow_run_id} of {org_repo.org_name}/"
+                f"{org_repo.name} no longer exists, marking it as cancelled"
+            )
+            pending_workflow_run.status = RepoWorkflowRunsStatus.CANCELLED
+            pending_workflow_run.updated_at = time_now()
+            missing_workflow_runs.append(pending_workflow_run)
+        return github_workflow_runs, missing_workflow_runs
 
     def _adapt_github_workflows_to_workflow_runs(
-        self, repo_workflow_id: str, github_workflow_run: Dict
+        self,
+        repo_workflow_id: str,
+        github_workflow_run: Dict,
+        existing_workflow_run_ids: Optional[Dict[str, UUID]] = None,
     ) -> RepoWorkflowRuns:
-        repo_workflow_run_in_db = self._workflow_repo_service.get_repo_workflow_run_by_provider_workflow_run_id(
-            repo_workflow_id, str(github_workflow_run["id"])
-        )
-        if repo_workflow_run_in_db:
-            workflow_run_id = repo_workflow_run_in_db.id
+        """
+        :param existing_workflow_run_ids: Ids of the runs already synced by their provider
+        run id, when looked up in bulk. The run is looked up on its own otherwise.
+        """
+        provider_workflow_run_id = str(github_workflow_run["id"])
+        if existing_workflow_run_ids is not None:
+            workflow_run_id = existing_workflow_run_ids.get(provider_workflow_run_id)
         else:
+            repo_workflow_run_in_db = self._workflow_repo_service.get_repo_workflow_run_by_provider_workflow_run_id(
+                repo_workflow_id, provider_workflow_run_id
+            )
+            workflow_run_id = (
+                repo_workflow_run_in_db.id if repo_workflow_run_in_db else None
+            )
+        if not workflow_run_id:
             workflow_run_id = uuid4()
         return RepoWorkflowRuns(
             id=workflow_run_id,
             repo_workflow_id=repo_workflow_id,
-            provider_workflow_run_id=str(github_workflow_run["id"]),
+            provider_workflow_run_id=provider_workflow_run_id,
             event_actor=github_workflow_run["actor"]["login"],
             head_branch=github_workflow_run["head_branch"],
             status=self._get_repo_workflow_status(github_workflow_run),
@@ -1,6 +1,7 @@
+import os
 from os import getenv
 from datetime import datetime
-from typing import List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 from mhq.service.settings.configuration_settings import (
     SettingsService,
@@ -22,6 +23,7 @@ from mhq.store.models.code import (
 )
 from mhq.store.repos.code import CodeRepoService
 from mhq.store.repos.workflows import WorkflowRepoService
+from mhq.utils.concurrency import run_in_app_context_pool
 from mhq.utils.log import LOG
 from mhq.service.settings.models import DefaultSyncDaysSetting
 from mhq.service.bookmark import BookmarkService, BookmarkType, get_bookmark_service
@@ -32,6 +34,11 @@ class WorkflowETLHandler:
     DEFAULT_SYNC_DAYS = (
         int(getenv("DEFAULT_SYNC_DAYS")) if getenv("DEFAULT_SYNC_DAYS") else 31
     )
+    WORKFLOW_SYNC_MAX_WORKERS = (
+        int(getenv("WORKFLOW_SYNC_MAX_WORKERS"))
+        if getenv("WORKFLOW_SYNC_MAX_WORKERS")
+        else 1
+    )
 
     def __init__(
         self,
@@ -40,17 +47,24 @@ class WorkflowETLHandler:
         etl_factory: WorkflowETLFactory,
         settings_service: SettingsService,
         bookmark_service: BookmarkService,
+        max_workers: int = WORKFLOW_SYNC_MAX_WORKERS,
+        worker_handler_factory: Optional[Callable[[], "WorkflowETLHandler"]] = None,
     ):
         self.code_repo_service = code_repo_service
         self.workflow_repo_service = workflow_repo_service
         self.etl_factory = etl_factory
         self.settings_service = settings_service
         self.bookmark_service = bookmark_service
+        self.max_workers = max_workers
+        self.worker_handler_factory = worker_handler_factory
 
     def sync_org_workflows(self, org_id: str):
         active_repo_workflows: List[Tuple[OrgRepo, RepoWorkflow]] = (
-            self._get_active_repo_workflows(org_id)
+            self.get_active_repo_workflows(org_id)
         )
+        if self.max_workers > 1 and self.worker_handler_factory:
+            self._sync_repo_workflows_concurrently(active_repo_workflows)
+            return
 
         for org_repo, repo_workflow in active_repo_workflows:
             try:
@@ -61,7 +75,36 @@ class WorkflowETLHandler:
                 )
                 continue
 
-    def _get_active_repo_workflows(
+    def _sync_repo_workflows_concurrently(
+        self, repo_workflows: List[Tuple[OrgRepo, RepoWorkflow]]
+    ):
+        """
+        Syncs workflows on a bounded pool of `max_workers` threads, like the repos of the
+        code sync. Every workflow is synced by a fresh handler from `worker_handler_factory`
+        inside its own app context. The API services of all workers use the same token, so
+        they share one HTTP session and rate limit budget.
+        """
+        repo_workflow_id_repo_id_map = {
+            str(repo_workflow.id): str(org_repo.id)
+            for org_repo, repo_workflow in repo_workflows
+        }
+
+        def _sync_repo_workflow(repo_workflow_id: str):
+            self.worker_handler_factory().sync_repo_workflow(repo_workflow_id)
+
+        results = run_in_app_context_pool(
+            _sync_repo_workflow,
+            list(repo_workflow_id_repo_id_map.keys()),
+            self.max_workers,
+        )
+        for result in results:
+            if result.failed:
+                LOG.error(
+                    f"Error syncing workflow for repo {repo_workflow_id_repo_id_map[result.item]}: "
+                    f"{str(result.error)}"
+                )
+
+    def get_active_repo_workflows(
         self, org_id: str
     ) -> List[Tuple[OrgRepo, RepoWorkflow]]:
         code_providers: List[str] = get_code_integration_service().get_org_providers(
@@ -90,14 +133,34 @@ class WorkflowETLHandler:
             )
         return org_repo_workflows
 
-    def _sync_repo_workflow(self, org_repo: OrgRepo, repo_workflow: RepoWorkflow):
+    def sync_repo_workflow(self, repo_workflow_id: str) -> int:
+        """
+        Syncs the runs of a single workflow, loading the workflow and its repo in the
+        current session.
+        :returns: The number of workflow runs synced
+        """
+        repo_workflow = self.workflow_repo_service.get_repo_workflow_by_id(
+            repo_workflow_id
+        )
+        org_repo = (
+            self.code_repo_service.get_repo_by_id(str(repo_workflow.org_repo_id))
+            if repo_workflow
+            else None
+        )
+        if not org_repo or not repo_workflow:
+            raise Exception(f"Repo workflow with {repo_workflow_id} not found")
+        return self._sync_repo_workflow(org_repo, repo_workflow)
+
+    def _sync_repo_workflow(
+        self, org_repo: OrgRepo, repo_workflow: RepoWorkflow
+    ) -> int:
         workflow_provider: RepoWorkflowProviders = repo_workflow.provider
         etl_service: WorkflowProviderETLHandler = self.etl_factory(
             workflow_provider.name
         )
         if not etl_service.check_pat_validity():
             LOG.error("Invalid PAT for code provider")
-            return
+            return 0
         try:
             default_sync_days_setting: DefaultSyncDaysSetting = (
                 self.settings_service.get_or_set_default_settings(
@@ -125,11 +188,90 @@ class WorkflowETLHandler:
                 repo_workflow.provider,
                 bookmark,
             )
+            return len(repo_workflow_runs)
         except Exception as e:
             LOG.error(
                 f"Error syncing workflow for repo {repo_workflow.org_repo_id}: {str(e)}"
             )
-            return
+            return 0
+
+    def sync_repo_workflow_run(
+        self,
+        org_repo: OrgRepo,
+        provider: RepoWorkflowProviders,
+        provider_workflow_run: Dict,
+    ) -> Optional[RepoWorkflowRuns]:
+        """
+        Saves a single workflow run reported by the provider, e.g. in a webhook, if it belongs
+        to an active workflow of the repo. Bookmarks are left as is.
+        :returns: The saved workflow run, None if no active workflow of the repo matches
+        """
+        repo_workflow: Optional[RepoWorkflow] = self._get_repo_workflow_for_run(
+            org_repo, provider, provider_workflow_run
+        )
+        if not repo_workflow:
+            return None
+
+        etl_service: WorkflowProviderETLHandler = self.etl_factory(
+            repo_workflow.provider.name
+        )
+        repo_workflow_run: RepoWorkflowRuns = etl_service.get_workflow_run_from_payload(
+            repo_workflow, provider_workflow_run
+        )
+        self.workflow_repo_service.save_repo_workflow_runs([repo_workflow_run])
+        return repo_workflow_run
+
+    def _get_repo_workflow_for_run(
+        self,
+        org_repo: OrgRepo,
+        provider: RepoWorkflowProviders,
+        provider_workflow_run: Dict,
+    ) -> Optional[RepoWorkflow]:
+        """
+        Workflows can be configured by id or by file name, so both are matched.
+        """
+        workflow_keys = {
+            str(provider_workflow_run.get("workflow_id")),
+            os.path.basename(provider_workflow_run.get("path") or ""),
+        }
+        repo_workflows: List[RepoWorkflow] = (
+            self.workflow_repo_service.get_active_repo_workflows_by_repo_ids_and_providers(
+                [str(org_repo.id)], [provider]
+            )
+        )
+        for repo_workflow in repo_workflows:
+            if repo_workflow.provider_workflow_id in workflow_keys:
+                return repo_workflow
+        return None
+
+
+def sync_repo_workflow_run(
+    org_id: str,
+    org_repo: OrgRepo,
+    provider: RepoWorkflowProviders,
+    provider_workflow_run: Dict,
+) -> Optional[RepoWorkflowRuns]:
+    workflow_etl_handler = WorkflowETLHandler(
+        CodeRepoService(),
+        WorkflowRepoService(),
+        WorkflowETLFactory(org_id),
+        get_settings_service(),
+        get_bookmark_service(),
+    )
+    return workflow_etl_handler.sync_repo_workflow_run(
+        org_repo, provider, provider_workflow_run
+    )
+
+
+def get_workflow_etl_handler(org_id: str) -> WorkflowETLHandler:
+    return WorkflowETLHandler(
+        CodeRepoService(),
+        WorkflowRepoService(),
+        WorkflowETLFactory(org_id),
+        get_settings_service(),
+        get_bookmark_service(),
+        worker_handler_factory=lambda: get_workflow_etl_handler(org_id),
+    )
 
 
 def sync_org_workflows(org_id: str):
@@ -139,14 +281,6 @@ def sync_org_workflows(org_id: str):
     if not workflow_providers:
         LOG.info(f"No workflow integrations found for org {org_id}")
         return
-    code_repo_service = CodeRepoService()
-    workflow_repo_service = WorkflowRepoService()
-    etl_factory = WorkflowETLFactory(org_id)
-    workflow_etl_handler = WorkflowETLHandler(
-        code_repo_service,
-        workflow_repo_service,
-        etl_factory,
-        get_settings_service(),
-        get_bookmark_service(),
-    )
+
+    workflow_etl_handler = get_workflow_etl_handler(org_id)
     workflow_etl_handler.sync_org_workflows(org_id)
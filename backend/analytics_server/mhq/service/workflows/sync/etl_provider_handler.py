@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
 from mhq.store.models.code import (
     OrgRepo,
@@ -32,3 +32,14 @@ class WorkflowProviderETLHandler(ABC):
         :param bookmark: datetime object to get all workflow runs after this date
         :return: List of RepoWorkflowRuns objects, datetime object
         """
+
+    @abstractmethod
+    def get_workflow_run_from_payload(
+        self, repo_workflow: RepoWorkflow, provider_workflow_run: Dict
+    ) -> RepoWorkflowRuns:
+        """
+        This method adapts a workflow run received from the provider, e.g. in a webhook.
+        :param repo_workflow: RepoWorkflow object the workflow run belongs to
+        :param provider_workflow_run: Workflow run as returned by the provider API
+        :return: RepoWorkflowRuns object
+        """
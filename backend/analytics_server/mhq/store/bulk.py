@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import inspect, update, values
+from sqlalchemy.sql import column as sql_column
+from sqlalchemy.dialects.postgresql import insert
+
+from mhq.utils.metrics import DB_ROWS_WRITTEN_TOTAL
+
+MAX_BIND_PARAMS = 32767
+BULK_UPSERT_BATCH_SIZE = 1000
+
+
+def _get_row(model_object) -> Dict[str, Any]:
+    """
+    Column values of the attributes that were set on the object. Like `session.merge`,
+    attributes that were never set are left out, so they keep their value in the DB on
+    update and get their defaults on insert.
+    """
+    state = inspect(model_object)
+    row = {}
+    for column_attr in state.mapper.column_attrs:
+        if column_attr.key not in state.dict:
+            continue
+        column = column_attr.columns[0]
+        value = state.dict[column_attr.key]
+        if column.primary_key and value is None:
+            continue
+        row[column.name] = value
+    return row
+
+
+def _dedupe_by_primary_key(model, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    A row can only be upserted once per statement. The last row for a primary key wins,
+    as it would with successive merges.
+    """
+    pk_columns = [column.name for column in inspect(model).primary_key]
+    rows_by_pk: Dict[Tuple, Dict[str, Any]] = OrderedDict()
+    rows_without_pk = []
+    for row in rows:
+        if not all(column in row for column in pk_columns):
+            rows_without_pk.append(row)
+            continue
+        pk = tuple(row[column] for column in pk_columns)
+        rows_by_pk.pop(pk, None)
+        rows_by_pk[pk] = row
+    return list(rows_by_pk.values()) + rows_without_pk
+
+
+def get_bulk_upsert_statements(
+    model, model_objects: List, batch_size: int = BULK_UPSERT_BATCH_SIZE
+):
+    """
+    Builds `INSERT ... ON CONFLICT (primary key) DO UPDATE` statements for the objects, in
+    batches. Rows are grouped by the set of columns they carry, so every statement has a
+    single column list.
+    """
+    table = model.__table__
+    pk_columns = [column.name for column in inspect(model).primary_key]
+    rows = _dedupe_by_primary_key(model, [_get_row(obj) for obj in model_objects])
+
+    rows_by_columns: Dict[Tuple[str, ...], List[Dict[str, Any]]] = OrderedDict()
+    for row in rows:
+        rows_by_columns.setdefault(tuple(sorted(row.keys())), []).append(row)
+
+    statements = []
+    for columns, column_rows in rows_by_columns.items():
+        rows_per_statement = max(
+            1, min(batch_size, MAX_BIND_PARAMS // max(1, len(table.columns)))
+        )
+        for start in range(0, len(column_rows), rows_per_statement):
+            end = start + rows_per_statement
+            statement = insert(table).values(column_rows[start:end])
+            update_values = {
+                column: statement.excluded[column]
+                for column in columns
+                if column not in pk_columns
+            }
+            for column in table.columns:
+                if (
+                    column.name not in columns
+                    and column.onupdate is not None
+                    and column.onupdate.is_clause_element
+                ):
+                    update_values[column.name] = column.onupdate.arg
+
+            if update_values:
+                statement = statement.on_conflict_do_update(
+                    index_elements=pk_columns, set_=update_values
+                )
+            else:
+                statement = statement.on_conflict_do_nothing(index_elements=pk_columns)
+            statements.append(statement)
+
+    return statements
+
+
+def get_bulk_update_statements(
+    model,
+    column_name: str,
+    values_by_primary_key: Dict[Any, Any],
+    batch_size: int = BULK_UPSERT_BATCH_SIZE,
+):
+    """
+    Builds `UPDATE ... FROM (VALUES ...)` statements that set one column of many rows, each
+    to its own value, in batches. Only for models with a single column primary key.
+    """
+    table = model.__table__
+    [pk_column] = inspect(model).primary_key
+    value_column = table.columns[column_name]
+    rows = list(values_by_primary_key.items())
+
+    statements = []
+    for start in range(0, len(rows), batch_size):
+        end = start + batch_size
+        new_values = values(
+            sql_column("pk", pk_column.type),
+            sql_column("value", value_column.type),
+            name="new_values",
+        ).data(rows[start:end])
+        statements.append(
+            update(table)
+            .where(pk_column == new_values.c.pk)
+            .values({column_name: new_values.c.value})
+        )
+    return statements
+
+
+def bulk_update_column(
+    session,
+    model,
+    column_name: str,
+    values_by_primary_key: Dict[Any, Any],
+    batch_size: int = BULK_UPSERT_BATCH_SIZE,
+):
+    """
+    Sets one column of many rows with a few statements instead of a write per row.
+    Does not commit.
+    """
+    for statement in get_bulk_update_statements(
+        model, column_name, values_by_primary_key, batch_size
+    ):
+        session.execute(statement)
+    if values_by_primary_key:
+        DB_ROWS_WRITTEN_TOTAL.labels(table=model.__tablename__, operation="update").inc(
+            len(values_by_primary_key)
+        )
+
+
+def bulk_upsert(
+    session, model, model_objects: List, batch_size: int = BULK_UPSERT_BATCH_SIZE
+):
+    """
+    Upserts the objects with a few multi row statements instead of a `session.merge` per
+    object, which selects every row before writing it. Does not commit.
+    Objects that were already tracked by the session are expunged after being written,
+    so that the next flush does not write them again.
+    """
+    for statement in get_bulk_upsert_statements(model, model_objects, batch_size):
+        session.execute(statement)
+    if model_objects:
+        DB_ROWS_WRITTEN_TOTAL.labels(table=model.__tablename__, operation="upsert").inc(
+            len(model_objects)
+        )
+
+    for model_object in model_objects:
+        state = inspect(model_object)
+        if state.persistent or state.pending:
+            session.expunge(model_object)
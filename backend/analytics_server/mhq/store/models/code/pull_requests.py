@@ -41,6 +41,9 @@ class PullRequest(db.Model):
     updated_in_db_at = db.Column(
         db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+    sync_fingerprint = db.Column(db.String)
+    reverted_pr_number = db.Column(db.String)
+    reverted_merge_commit_sha = db.Column(db.String)
 
     def __eq__(self, other):
         return self.id == other.id
@@ -31,6 +31,8 @@ class OrgRepo(db.Model):
         db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
     is_active = db.Column(db.Boolean, default=True)
+    pushed_at = db.Column(db.DateTime(timezone=True))
+    contributors_refreshed_at = db.Column(db.DateTime(timezone=True))
 
     @property
     def url(self):
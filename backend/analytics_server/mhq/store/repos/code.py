@@ -1,13 +1,14 @@
 from datetime import datetime
 from operator import and_
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 from mhq.store.models.code.enums import CodeProvider
-from sqlalchemy import or_
+from sqlalchemy import func, or_
 from sqlalchemy.orm import defer
 from mhq.store.models.core import Team
 
 from mhq.store import db, rollback_on_exc
+from mhq.store.bulk import bulk_update_column, bulk_upsert
 from mhq.store.models.code import (
     PullRequest,
     PullRequestEvent,
@@ -119,27 +120,28 @@ class CodeRepoService:
         pull_request_commits: List[PullRequestCommit],
         pull_request_events: List[PullRequestEvent],
     ):
-        [self._db.session.merge(pull_request) for pull_request in pull_requests]
-        [
-            self._db.session.merge(pull_request_commit)
-            for pull_request_commit in pull_request_commits
-        ]
-        [
-            self._db.session.merge(pull_request_event)
-            for pull_request_event in pull_request_events
-        ]
+        bulk_upsert(self._db.session, PullRequest, pull_requests)
+        bulk_upsert(self._db.session, PullRequestCommit, pull_request_commits)
+        bulk_upsert(self._db.session, PullRequestEvent, pull_request_events)
         self._db.session.commit()
 
     @rollback_on_exc
     def update_prs(self, prs: List[PullRequest]):
-        [self._db.session.merge(pr) for pr in prs]
+        bulk_upsert(self._db.session, PullRequest, prs)
+        self._db.session.commit()
+
+    @rollback_on_exc
+    def update_prs_merge_to_deploy(self, merge_to_deploy_by_pr_id: Dict[str, int]):
+        bulk_update_column(
+            self._db.session, PullRequest, "merge_to_deploy", merge_to_deploy_by_pr_id
+        )
         self._db.session.commit()
 
     @rollback_on_exc
     def save_revert_pr_mappings(
         self, revert_pr_mappings: List[PullRequestRevertPRMapping]
     ):
-        [self._db.session.merge(revert_pr_map) for revert_pr_map in revert_pr_mappings]
+        bulk_upsert(self._db.session, PullRequestRevertPRMapping, revert_pr_mappings)
         self._db.session.commit()
 
     @rollback_on_exc
@@ -209,6 +211,37 @@ class CodeRepoService:
         )
         return pr_events
 
+    @rollback_on_exc
+    def get_repo_prs_by_numbers(
+        self, repo_id: str, pr_numbers: List[str]
+    ) -> List[PullRequest]:
+        if not pr_numbers:
+            return []
+
+        return (
+            self._db.session.query(PullRequest)
+            .options(defer(PullRequest.data))
+            .filter(
+                and_(
+                    PullRequest.repo_id == repo_id,
+                    PullRequest.number.in_([str(number) for number in pr_numbers]),
+                )
+            )
+            .all()
+        )
+
+    @rollback_on_exc
+    def get_prs_events_by_pr_ids(self, pr_ids: List[str]) -> List[PullRequestEvent]:
+        if not pr_ids:
+            return []
+
+        return (
+            self._db.session.query(PullRequestEvent)
+            .options(defer(PullRequestEvent.data))
+            .filter(PullRequestEvent.pull_request_id.in_(pr_ids))
+            .all()
+        )
+
     @rollback_on_exc
     def get_prs_by_ids(self, pr_ids: List[str]):
         query = (
@@ -219,8 +252,26 @@ class CodeRepoService:
         return query.all()
 
     @rollback_on_exc
-    def get_prs_by_head_branch_match_strings(
-        self, repo_ids: List[str], match_strings: List[str]
+    def get_revert_prs_by_reverted_pr_numbers(
+        self, repo_ids: List[str], reverted_pr_numbers: List[str]
+    ) -> List[PullRequest]:
+        query = (
+            self._db.session.query(PullRequest)
+            .options(defer(PullRequest.data))
+            .filter(
+                and_(
+                    PullRequest.repo_id.in_(repo_ids),
+                    PullRequest.reverted_pr_number.in_(reverted_pr_numbers),
+                )
+            )
+            .order_by(PullRequest.updated_in_db_at.desc())
+        )
+
+        return query.all()
+
+    @rollback_on_exc
+    def get_revert_prs_by_reverted_merge_commit_shas(
+        self, repo_ids: List[str], reverted_merge_commit_shas: List[str]
     ) -> List[PullRequest]:
         query = (
             self._db.session.query(PullRequest)
@@ -228,11 +279,8 @@ class CodeRepoService:
             .filter(
                 and_(
                     PullRequest.repo_id.in_(repo_ids),
-                    or_(
-                        *[
-                            PullRequest.head_branch.ilike(f"{match_string}%")
-                            for match_string in match_strings
-                        ]
+                    PullRequest.reverted_merge_commit_sha.in_(
+                        [sha.lower() for sha in reverted_merge_commit_shas]
                     ),
                 )
             )
@@ -472,17 +520,18 @@ class CodeRepoService:
     def get_reverted_prs_by_merge_commit_hash(
         self, repo_ids: List[str], merge_commit_hashes: List[str]
     ) -> List[PullRequest]:
+        """
+        Matches the short merge commit hashes referenced by revert PRs against the first
+        8 characters of merge commit SHAs, which are indexed.
+        """
         query = (
             self._db.session.query(PullRequest)
             .options(defer(PullRequest.data))
             .filter(
                 and_(
                     PullRequest.repo_id.in_(repo_ids),
-                    or_(
-                        *[
-                            PullRequest.merge_commit_sha.ilike(f"{merge_hash}%")
-                            for merge_hash in merge_commit_hashes
-                        ]
+                    func.lower(func.left(PullRequest.merge_commit_sha, 8)).in_(
+                        [merge_hash.lower() for merge_hash in merge_commit_hashes]
                     ),
                 )
             )
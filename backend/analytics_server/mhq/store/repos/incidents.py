@@ -5,6 +5,7 @@ from mhq.store.models.core.teams import Team
 from mhq.store.models.incidents.enums import IncidentSource
 
 from mhq.store import db, rollback_on_exc
+from mhq.store.bulk import bulk_upsert
 from mhq.store.models.incidents import (
     Incident,
     IncidentFilter,
@@ -131,11 +132,12 @@ class IncidentsRepoService:
         incidents: List[Incident],
         incident_org_incident_service_map: List[IncidentOrgIncidentServiceMap],
     ):
-        [self._db.session.merge(incident) for incident in incidents]
-        [
-            self._db.session.merge(incident_service_map)
-            for incident_service_map in incident_org_incident_service_map
-        ]
+        bulk_upsert(self._db.session, Incident, incidents)
+        bulk_upsert(
+            self._db.session,
+            IncidentOrgIncidentServiceMap,
+            incident_org_incident_service_map,
+        )
         self._db.session.commit()
 
     @rollback_on_exc
@@ -1,10 +1,11 @@
 from datetime import datetime
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 from sqlalchemy.orm import defer
 from sqlalchemy import and_
 
 from mhq.store import db, rollback_on_exc
+from mhq.store.bulk import bulk_upsert
 from mhq.store.models.code.workflows.enums import (
     RepoWorkflowRunsStatus,
     RepoWorkflowType,
@@ -53,12 +54,43 @@ class WorkflowRepoService:
             .one_or_none()
         )
 
+    @rollback_on_exc
+    def get_repo_workflow_runs_by_provider_workflow_run_ids(
+        self, repo_workflow_id: str, provider_workflow_run_ids: List[str]
+    ) -> List[RepoWorkflowRuns]:
+        if not provider_workflow_run_ids:
+            return []
+
+        return (
+            self._db.session.query(RepoWorkflowRuns)
+            .options(defer(RepoWorkflowRuns.meta))
+            .filter(
+                RepoWorkflowRuns.repo_workflow_id == repo_workflow_id,
+                RepoWorkflowRuns.provider_workflow_run_id.in_(
+                    provider_workflow_run_ids
+                ),
+            )
+            .all()
+        )
+
+    @rollback_on_exc
+    def get_pending_repo_workflow_runs(
+        self, repo_workflow_id: str, conducted_after: datetime
+    ) -> List[RepoWorkflowRuns]:
+        return (
+            self._db.session.query(RepoWorkflowRuns)
+            .options(defer(RepoWorkflowRuns.meta))
+            .filter(
+                RepoWorkflowRuns.repo_workflow_id == repo_workflow_id,
+                RepoWorkflowRuns.status == RepoWorkflowRunsStatus.PENDING,
+                RepoWorkflowRuns.conducted_at >= conducted_after,
+            )
+            .all()
+        )
+
     @rollback_on_exc
     def save_repo_workflow_runs(self, repo_workflow_runs: List[RepoWorkflowRuns]):
-        [
-            self._db.session.merge(repo_workflow_run)
-            for repo_workflow_run in repo_workflow_runs
-        ]
+        bulk_upsert(self._db.session, RepoWorkflowRuns, repo_workflow_runs)
         self._db.session.commit()
 
     @rollback_on_exc
@@ -118,6 +150,15 @@ class WorkflowRepoService:
             .all()
         )
 
+    @rollback_on_exc
+    def get_repo_workflow_by_id(self, repo_workflow_id: str) -> Optional[RepoWorkflow]:
+        return (
+            self._db.session.query(RepoWorkflow)
+            .options(defer(RepoWorkflow.meta))
+            .filter(RepoWorkflow.id == repo_workflow_id)
+            .one_or_none()
+        )
+
     @rollback_on_exc
     def get_repo_workflows_by_repo_id(self, repo_id: str) -> List[RepoWorkflow]:
         return (
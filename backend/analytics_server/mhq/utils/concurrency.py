@@ -0,0 +1,206 @@
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Generic, List, Optional, Set, TypeVar
+
+from flask import current_app, has_app_context
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class WorkerResult(Generic[T, R]):
+    item: T
+    result: Optional[R] = None
+    error: Optional[Exception] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+
+def run_in_app_context_pool(
+    func: Callable[[T], R], items: List[T], max_workers: int
+) -> List[WorkerResult]:
+    """
+    Runs `func` for every item on a bounded thread pool and returns the results in the order of `items`.
+    Every call runs inside its own Flask app context, so each worker gets its own scoped `db.session`
+    which is closed when the call finishes. An exception raised for an item is captured in its
+    WorkerResult and does not affect the other items.
+    """
+    if not items:
+        return []
+
+    app: Optional[Any] = (
+        current_app._get_current_object() if has_app_context() else None
+    )
+
+    def _run(item: T) -> WorkerResult:
+        try:
+            if not app:
+                return WorkerResult(item=item, result=func(item))
+            with app.app_context():
+                return WorkerResult(item=item, result=func(item))
+        except Exception as e:
+            return WorkerResult(item=item, error=e)
+
+    if max_workers <= 1:
+        return [_run(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(_run, items))
+
+
+class DAGTaskSkipped(Exception):
+    """
+    Raised by a task that finds it has nothing to do, so it is reported as skipped
+    instead of failed.
+    """
+
+
+@dataclass
+class DAGTask:
+    key: str
+    func: Callable[[], Any]
+    depends_on: List[str] = field(default_factory=list)
+    skip_on_failed_dependency: bool = False
+
+
+@dataclass
+class DAGTaskResult:
+    key: str
+    result: Any = None
+    error: Optional[Exception] = None
+    started_at: float = 0
+    finished_at: float = 0
+    skipped: bool = False
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.finished_at - self.started_at
+
+
+def _get_dependents(tasks: List[DAGTask]) -> Dict[str, Set[str]]:
+    """
+    Maps every task to the tasks that depend on it. Raises a ValueError for unknown
+    dependencies, duplicate keys and cycles.
+    """
+    dependents: Dict[str, Set[str]] = {task.key: set() for task in tasks}
+    if len(dependents) != len(tasks):
+        raise ValueError("Task keys must be unique")
+
+    for task in tasks:
+        for dependency in task.depends_on:
+            if dependency not in dependents:
+                raise ValueError(
+                    f"Task {task.key} depends on unknown task {dependency}"
+                )
+            dependents[dependency].add(task.key)
+
+    pending_dependencies = {task.key: len(set(task.depends_on)) for task in tasks}
+    ready = [key for key, count in pending_dependencies.items() if not count]
+    visited = 0
+    while ready:
+        key = ready.pop()
+        visited += 1
+        for dependent in dependents[key]:
+            pending_dependencies[dependent] -= 1
+            if not pending_dependencies[dependent]:
+                ready.append(dependent)
+    if visited != len(tasks):
+        raise ValueError("Task dependencies contain a cycle")
+
+    return dependents
+
+
+def run_dag_in_app_context_pool(
+    tasks: List[DAGTask], max_workers: int
+) -> List[DAGTaskResult]:
+    """
+    Runs tasks on a bounded thread pool, starting every task as soon as all the tasks it
+    depends on have finished, and returns the results in the order of `tasks`.
+    Dependencies only order tasks: a task still runs when one of its dependencies failed,
+    like the steps of a sync carry on with the data already synced, unless it is marked
+    `skip_on_failed_dependency`. Such a task is skipped when a dependency failed or was
+    skipped itself. Every task runs inside its own Flask app context, like
+    `run_in_app_context_pool`.
+    """
+    if not tasks:
+        return []
+
+    dependents = _get_dependents(tasks)
+    tasks_by_key = {task.key: task for task in tasks}
+    pending_dependencies = {task.key: len(set(task.depends_on)) for task in tasks}
+    ready: Deque[str] = deque(
+        task.key for task in tasks if not pending_dependencies[task.key]
+    )
+    results: Dict[str, DAGTaskResult] = {}
+    unsuccessful_keys: Set[str] = set()
+
+    app: Optional[Any] = (
+        current_app._get_current_object() if has_app_context() else None
+    )
+
+    def _run(task: DAGTask) -> DAGTaskResult:
+        result = DAGTaskResult(key=task.key, started_at=time.monotonic())
+        try:
+            if not app:
+                result.result = task.func()
+            else:
+                with app.app_context():
+                    result.result = task.func()
+        except DAGTaskSkipped:
+            result.skipped = True
+        except Exception as e:
+            result.error = e
+        result.finished_at = time.monotonic()
+        return result
+
+    def _should_skip(task: DAGTask) -> bool:
+        return task.skip_on_failed_dependency and any(
+            dependency in unsuccessful_keys for dependency in task.depends_on
+        )
+
+    def _skip(task: DAGTask) -> DAGTaskResult:
+        now = time.monotonic()
+        return DAGTaskResult(
+            key=task.key, started_at=now, finished_at=now, skipped=True
+        )
+
+    def _complete(result: DAGTaskResult):
+        results[result.key] = result
+        if result.failed or result.skipped:
+            unsuccessful_keys.add(result.key)
+        for dependent in dependents[result.key]:
+            pending_dependencies[dependent] -= 1
+            if not pending_dependencies[dependent]:
+                ready.append(dependent)
+
+    if max_workers <= 1:
+        while ready:
+            task = tasks_by_key[ready.popleft()]
+            _complete(_skip(task) if _should_skip(task) else _run(task))
+        return [results[task.key] for task in tasks]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        running = set()
+        while ready or running:
+            while ready:
+                task = tasks_by_key[ready.popleft()]
+                if _should_skip(task):
+                    _complete(_skip(task))
+                    continue
+                running.add(executor.submit(_run, task))
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                _complete(future.result())
+
+    return [results[task.key] for task in tasks]
@@ -1,24 +1,73 @@
 import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
 
+HUNK_HEADER_PATTERN = re.compile(r"^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@")
 
-def _parse_gitlab_diff(text):
-    line_range_match = re.search(
-        r"^@@ -(\d+),(\d+) \+(\d+),(\d+) @@$", text, flags=re.MULTILINE
-    )
-    if line_range_match:
-        deletion_lines = int(line_range_match.group(2))
-        addition_lines = int(line_range_match.group(4))
-    else:
-        deletion_lines = 0
-        addition_lines = 0
-    return addition_lines, deletion_lines
+
+@dataclass
+class DiffStats:
+    additions: int = 0
+    deletions: int = 0
+    changed_files: int = 0
+
+
+def _iter_lines(text: str) -> Iterator[str]:
+    """
+    Yields the lines of a diff one at a time, without splitting the whole text up front.
+    """
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start)
+        if end == -1:
+            end = len(text)
+        yield text[start:end]
+        start = end + 1
+
+
+class DiffStatsCounter:
+    """
+    Counts added and deleted lines across every hunk of unified diffs, one file diff at a
+    time, so diffs fetched page by page never have to be held in memory together.
+
+    Lines are attributed using the line counts of each hunk header, so removed lines that
+    start with `--` or added lines that start with `++` are not mistaken for file headers.
+    """
+
+    def __init__(self):
+        self.stats = DiffStats()
+
+    def add_file_diff(self, text: Optional[str]):
+        self.stats.changed_files += 1
+        old_lines_left = new_lines_left = 0
+
+        for line in _iter_lines(text or ""):
+            if old_lines_left <= 0 and new_lines_left <= 0:
+                hunk_header_match = HUNK_HEADER_PATTERN.match(line)
+                if hunk_header_match:
+                    old_count, new_count = hunk_header_match.groups()
+                    old_lines_left = int(old_count) if old_count is not None else 1
+                    new_lines_left = int(new_count) if new_count is not None else 1
+                continue
+
+            if line.startswith("+"):
+                self.stats.additions += 1
+                new_lines_left -= 1
+            elif line.startswith("-"):
+                self.stats.deletions += 1
+                old_lines_left -= 1
+            elif line.startswith("\\"):
+                continue
+            else:
+                old_lines_left -= 1
+                new_lines_left -= 1
+
+    def add_file_diffs(self, texts: Iterable[Optional[str]]):
+        for text in texts:
+            self.add_file_diff(text)
 
 
 def parse_gitlab_diffs(texts):
-    additions = 0
-    deletions = 0
-    for text in texts:
-        diff_additions, diff_deletions = _parse_gitlab_diff(text[:50])
-        additions += diff_additions
-        deletions += diff_deletions
-    return additions, deletions, len(texts)
+    counter = DiffStatsCounter()
+    counter.add_file_diffs(texts)
+    return counter.stats.additions, counter.stats.deletions, counter.stats.changed_files
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from os import getenv
+from threading import Lock
+from time import time
+from typing import Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from mhq.utils.lock import get_redis_lock_service
+from mhq.utils.log import LOG
+
+EXAPI_RESPONSE_CACHE = getenv("EXAPI_RESPONSE_CACHE", "")
+EXAPI_RESPONSE_CACHE_DIR = getenv("EXAPI_RESPONSE_CACHE_DIR", "/tmp/mhq-exapi-cache")
+EXAPI_RESPONSE_CACHE_TTL_SECONDS = (
+    int(getenv("EXAPI_RESPONSE_CACHE_TTL_SECONDS"))
+    if getenv("EXAPI_RESPONSE_CACHE_TTL_SECONDS")
+    else 7 * 24 * 60 * 60
+)
+DISK_RESPONSE_CACHE_SWEEP_INTERVAL_SECONDS = 60 * 60
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link")
+
+
+@dataclass
+class CachedResponse:
+    body: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_response(cls, response: requests.Response) -> "CachedResponse":
+        return cls(
+            body=response.text,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            headers={
+                key: response.headers[key]
+                for key in CACHED_HEADERS
+                if key in response.headers
+            },
+        )
+
+    @property
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_response(
+        self, not_modified_response: requests.Response
+    ) -> requests.Response:
+        """
+        Rebuilds a 200 response from the cached body for a 304 `not_modified_response`.
+        """
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.body.encode("utf-8")
+        response.encoding = "utf-8"
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.url = not_modified_response.url
+        response.request = not_modified_response.request
+        response.reason = "OK"
+        return response
+
+
+class ResponseCacheStore(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl_seconds: int):
+        pass
+
+
+class RedisResponseCacheStore(ResponseCacheStore):
+    def __init__(self, redis):
+        self._redis = redis
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._redis.get(f"exapi_response_cache:{key}")
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str, ttl_seconds: int):
+        self._redis.set(f"exapi_response_cache:{key}", value, ex=ttl_seconds)
+
+
+class DiskResponseCacheStore(ResponseCacheStore):
+    """
+    Stores every response in its own file, with the file's mtime set to when it expires.
+    Expired files are removed when read, and swept from the directory at most every
+    `sweep_interval_seconds` on writes, so entries that are never read again do not pile up.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sweep_interval_seconds: int = DISK_RESPONSE_CACHE_SWEEP_INTERVAL_SECONDS,
+    ):
+        self.directory = directory
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._swept_at = time()
+        self._sweep_lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        if os.path.getmtime(path) < time():
+            os.remove(path)
+            return None
+        with open(path, "r") as f:
+            return f.read()
+
+    def set(self, key: str, value: str, ttl_seconds: int):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(value)
+        expires_at = time() + ttl_seconds
+        os.utime(tmp_path, (expires_at, expires_at))
+        os.replace(tmp_path, path)
+        self._sweep_if_due()
+
+    def _sweep_if_due(self):
+        now = time()
+        with self._sweep_lock:
+            if now - self._swept_at < self.sweep_interval_seconds:
+                return
+            self._swept_at = now
+        self.sweep(now)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Removes expired entries, and temp files left behind by interrupted writes.
+        :returns: The number of files removed
+        """
+        now = now or time()
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                    expires_at = stat.st_mtime
+                    if entry.name.endswith(".tmp"):
+                        # Give writes in flight the sweep interval to finish
+                        expires_at = stat.st_ctime + self.sweep_interval_seconds
+                    if expires_at < now:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+
+class ResponseCache:
+    """
+    Conditional request cache for GET responses of provider APIs.
+    Responses with an ETag or Last-Modified header are stored, later requests send them back
+    as If-None-Match / If-Modified-Since and a 304 is answered from the stored body.
+    Failures of the store are logged and treated as misses, so the cache never fails a sync.
+    """
+
+    def __init__(
+        self,
+        store: ResponseCacheStore,
+        ttl_seconds: int = EXAPI_RESPONSE_CACHE_TTL_SECONDS,
+    ):
+        self._store = store
+        self.ttl_seconds = ttl_seconds
+        self._stats_lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(scope: str, url: str, params: Optional[Dict] = None) -> str:
+        prepared_url = requests.Request("GET", url, params=params).prepare().url
+        return hashlib.sha256(f"{scope}:{prepared_url}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        try:
+            value = self._store.get(key)
+        except Exception as e:
+            LOG.error(f"[Response Cache] Error reading cached response: {str(e)}")
+            return None
+        return CachedResponse(**json.loads(value)) if value else None
+
+    def set(self, key: str, cached_response: CachedResponse):
+        try:
+            self._store.set(key, json.dumps(asdict(cached_response)), self.ttl_seconds)
+        except Exception as e:
+            LOG.error(f"[Response Cache] Error storing response: {str(e)}")
+
+    def record_hit(self):
+        with self._stats_lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._stats_lock:
+            self.misses += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+
+
+response_cache: Optional[ResponseCache] = None
+_response_cache_lock = Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Returns the process wide response cache configured by EXAPI_RESPONSE_CACHE,
+    `redis` or `disk`, or None when caching is disabled.
+    """
+    global response_cache
+    if response_cache or not EXAPI_RESPONSE_CACHE:
+        return response_cache
+
+    with _response_cache_lock:
+        if response_cache:
+            return response_cache
+        if EXAPI_RESPONSE_CACHE == "redis":
+            store = RedisResponseCacheStore(get_redis_lock_service().redis)
+        elif EXAPI_RESPONSE_CACHE == "disk":
+            store = DiskResponseCacheStore(EXAPI_RESPONSE_CACHE_DIR)
+        else:
+            LOG.error(f"[Response Cache] Unknown cache backend {EXAPI_RESPONSE_CACHE}")
+            return None
+        response_cache = ResponseCache(store)
+    return response_cache
@@ -0,0 +1,363 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from os import getenv
+from threading import Lock
+from typing import Any, Dict, Optional, Union
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import aiohttp
+import requests
+from multidict import CIMultiDict, CIMultiDictProxy
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from yarl import URL
+
+from mhq.utils.log import LOG
+
+EXAPI_REPLAY_MODE = getenv("EXAPI_REPLAY_MODE", "")
+EXAPI_REPLAY_DIR = getenv("EXAPI_REPLAY_DIR", "/tmp/mhq-exapi-recordings")
+EXAPI_REPLAY_LATENCY_MS = getenv("EXAPI_REPLAY_LATENCY_MS", "0")
+CONDITIONAL_REQUEST_HEADERS = ("If-None-Match", "If-Modified-Since")
+UNRECORDED_RESPONSE_HEADERS = (
+    "Connection",
+    "Content-Encoding",
+    "Content-Length",
+    "Set-Cookie",
+    "Transfer-Encoding",
+)
+UNREPLAYED_RESPONSE_HEADERS = (
+    "Retry-After",
+    "X-RateLimit-Limit",
+    "X-RateLimit-Remaining",
+    "X-RateLimit-Reset",
+    "X-RateLimit-Used",
+)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Query params holding a point in time, e.g. a sync bookmark, which moves with the clock
+TIME_VALUED_PARAMS = (
+    "created",
+    "created_after",
+    "created_before",
+    "since",
+    "until",
+    "updated_after",
+    "updated_before",
+)
+
+
+class ExapiReplayMode(Enum):
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+class MissingRecordingError(Exception):
+    pass
+
+
+def _filter_headers(headers, left_out_headers) -> Dict[str, str]:
+    left_out_headers = {header.lower() for header in left_out_headers}
+    return {
+        key: value
+        for key, value in headers.items()
+        if key.lower() not in left_out_headers
+    }
+
+
+@dataclass
+class RecordedResponse:
+    method: str
+    url: str
+    status: int
+    body: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    duration_seconds: float = 0
+
+    def get_replayed_headers(self) -> CaseInsensitiveDict:
+        return CaseInsensitiveDict(
+            _filter_headers(self.headers, UNREPLAYED_RESPONSE_HEADERS)
+        )
+
+    def to_response(self, request: requests.PreparedRequest) -> requests.Response:
+        response = requests.Response()
+        response.status_code = self.status
+        response._content = self.body.encode("utf-8")
+        response.encoding = "utf-8"
+        response.headers = self.get_replayed_headers()
+        response.url = request.url
+        response.request = request
+        response.reason = "Replayed"
+        return response
+
+
+class ExapiRecordings:
+    """
+    Responses of provider APIs kept as one JSON file per request in `directory`, so a sync
+    recorded once against GitHub or GitLab can be replayed with no network, e.g. to compare
+    sync throughput across code changes. Requests are matched on method, url with sorted
+    query params and body, whichever client made them. Time valued query params are left
+    out of the match, as bookmarks derived from the current time differ on every run.
+
+    Replayed responses wait `latency_seconds`, or the time the recorded request took when
+    it is None, so benchmarks can model a slow provider. Rate limit headers are not
+    replayed, so the rate limiter never makes a replay wait.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        mode: ExapiReplayMode,
+        latency_seconds: Optional[float] = 0,
+    ):
+        self.directory = directory
+        self.mode = mode
+        self.latency_seconds = latency_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def get_url(url: str, params: Optional[Dict] = None) -> str:
+        """
+        The url with `params` encoded into it, its query params sorted and the default port
+        of its scheme left out.
+        """
+        prepared_url = requests.Request("GET", url, params=params).prepare().url
+        parsed_url = urlparse(prepared_url)
+        netloc = parsed_url.netloc
+        if parsed_url.port and parsed_url.port == DEFAULT_PORTS.get(parsed_url.scheme):
+            netloc = parsed_url.hostname
+        query = urlencode(sorted(parse_qsl(parsed_url.query, keep_blank_values=True)))
+        return urlunparse(parsed_url._replace(netloc=netloc, query=query))
+
+    @classmethod
+    def get_key(
+        cls,
+        method: str,
+        url: str,
+        params: Optional[Dict] = None,
+        body: Optional[Union[str, bytes]] = None,
+    ) -> str:
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        parsed_url = urlparse(cls.get_url(url, params))
+        query = urlencode(
+            [
+                (key, value)
+                for key, value in parse_qsl(parsed_url.query, keep_blank_values=True)
+                if key not in TIME_VALUED_PARAMS
+            ]
+        )
+        key_url = urlunparse(parsed_url._replace(query=query))
+        request = f"{method.upper()} {key_url}".encode("utf-8")
+        return hashlib.sha256(request + b"\n" + (body or b"")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict] = None,
+        body: Optional[Union[str, bytes]] = None,
+    ) -> RecordedResponse:
+        path = self._path(self.get_key(method, url, params, body))
+        if not os.path.exists(path):
+            raise MissingRecordingError(
+                f"No recorded response for {method.upper()} {self.get_url(url, params)}"
+            )
+        with open(path, "r") as f:
+            return RecordedResponse(**json.load(f))
+
+    def save(
+        self,
+        recorded_response: RecordedResponse,
+        params: Optional[Dict] = None,
+        body: Optional[Union[str, bytes]] = None,
+    ):
+        recorded_response.url = self.get_url(recorded_response.url, params)
+        path = self._path(
+            self.get_key(recorded_response.method, recorded_response.url, body=body)
+        )
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(recorded_response), f)
+        os.replace(tmp_path, path)
+
+    def get_latency(self, recorded_response: RecordedResponse) -> float:
+        if self.latency_seconds is None:
+            return recorded_response.duration_seconds
+        return self.latency_seconds
+
+
+class RecordingHTTPAdapter(HTTPAdapter):
+    """
+    Transport adapter that records every response it receives, or replays recorded
+    responses without sending anything, depending on the mode of the recordings.
+    Conditional request headers are dropped while recording, so that every recording
+    holds a full response rather than a 304.
+    """
+
+    def __init__(self, recordings: ExapiRecordings, **kwargs):
+        super().__init__(**kwargs)
+        self.recordings = recordings
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if self.recordings.mode == ExapiReplayMode.REPLAY:
+            recorded_response = self.recordings.get(
+                request.method, request.url, body=request.body
+            )
+            time.sleep(self.recordings.get_latency(recorded_response))
+            return recorded_response.to_response(request)
+
+        for header in CONDITIONAL_REQUEST_HEADERS:
+            request.headers.pop(header, None)
+        started_at = time.perf_counter()
+        response = super().send(request, **kwargs)
+        self.recordings.save(
+            RecordedResponse(
+                method=request.method,
+                url=request.url,
+                status=response.status_code,
+                body=response.text,
+                headers=_filter_headers(response.headers, UNRECORDED_RESPONSE_HEADERS),
+                duration_seconds=time.perf_counter() - started_at,
+            ),
+            body=request.body,
+        )
+        return response
+
+
+class ReplayedClientResponse:
+    """
+    The parts of `aiohttp.ClientResponse` the exapi services read, served from a recording.
+    """
+
+    def __init__(self, recorded_response: RecordedResponse):
+        self._recorded_response = recorded_response
+        self.method = recorded_response.method
+        self.url = URL(recorded_response.url)
+        self.status = recorded_response.status
+        self.headers = CIMultiDictProxy(
+            CIMultiDict(recorded_response.get_replayed_headers())
+        )
+
+    async def read(self) -> bytes:
+        return self._recorded_response.body.encode("utf-8")
+
+    async def text(self, encoding: Optional[str] = None) -> str:
+        return self._recorded_response.body
+
+    async def json(self, **kwargs) -> Any:
+        return json.loads(self._recorded_response.body)
+
+    def raise_for_status(self):
+        if self.status < 400:
+            return
+        raise aiohttp.ClientResponseError(
+            aiohttp.RequestInfo(
+                self.url, self.method, CIMultiDictProxy(CIMultiDict()), self.url
+            ),
+            (),
+            status=self.status,
+            message="Replayed error response",
+            headers=self.headers,
+        )
+
+
+class RecordingClientSession:
+    """
+    Stand-in for `aiohttp.ClientSession` that records the responses of GET requests made
+    through it, or replays them without sending anything, like `RecordingHTTPAdapter`.
+    """
+
+    def __init__(self, recordings: ExapiRecordings, headers: Optional[Dict] = None):
+        self.recordings = recordings
+        self._session: Optional[aiohttp.ClientSession] = (
+            aiohttp.ClientSession(headers=headers)
+            if recordings.mode == ExapiReplayMode.RECORD
+            else None
+        )
+
+    async def __aenter__(self) -> "RecordingClientSession":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+
+    @contextlib.asynccontextmanager
+    async def get(
+        self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None
+    ):
+        if self.recordings.mode == ExapiReplayMode.REPLAY:
+            recorded_response = self.recordings.get("GET", url, params)
+            await asyncio.sleep(self.recordings.get_latency(recorded_response))
+            yield ReplayedClientResponse(recorded_response)
+            return
+
+        headers = {
+            key: value
+            for key, value in (headers or {}).items()
+            if key not in CONDITIONAL_REQUEST_HEADERS
+        }
+        started_at = time.perf_counter()
+        async with self._session.get(url, params=params, headers=headers) as response:
+            body = await response.text()
+            self.recordings.save(
+                RecordedResponse(
+                    method="GET",
+                    url=url,
+                    status=response.status,
+                    body=body,
+                    headers=_filter_headers(
+                        response.headers, UNRECORDED_RESPONSE_HEADERS
+                    ),
+                    duration_seconds=time.perf_counter() - started_at,
+                ),
+                params=params,
+            )
+            yield response
+
+
+exapi_recordings: Optional[ExapiRecordings] = None
+_exapi_recordings_lock = Lock()
+
+
+def get_exapi_recordings() -> Optional[ExapiRecordings]:
+    """
+    Returns the process wide recordings configured by EXAPI_REPLAY_MODE, `record` or
+    `replay`, or None when provider APIs are called as usual.
+    EXAPI_REPLAY_LATENCY_MS is the latency of every replayed response, or `recorded`
+    to replay the latency of the recorded requests.
+    """
+    global exapi_recordings
+    if exapi_recordings or not EXAPI_REPLAY_MODE:
+        return exapi_recordings
+
+    with _exapi_recordings_lock:
+        if exapi_recordings:
+            return exapi_recordings
+        try:
+            mode = ExapiReplayMode(EXAPI_REPLAY_MODE)
+        except ValueError:
+            LOG.error(f"[Exapi Replay] Unknown replay mode {EXAPI_REPLAY_MODE}")
+            return None
+        latency_seconds = (
+            None
+            if EXAPI_REPLAY_LATENCY_MS == "recorded"
+            else float(EXAPI_REPLAY_LATENCY_MS or 0) / 1000
+        )
+        exapi_recordings = ExapiRecordings(EXAPI_REPLAY_DIR, mode, latency_seconds)
+        LOG.info(
+            f"[Exapi Replay] Provider API calls are in {mode.value} mode, "
+            f"recordings are in {EXAPI_REPLAY_DIR}"
+        )
+    return exapi_recordings
@@ -0,0 +1,342 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from http import HTTPStatus
+from os import getenv
+from threading import Lock, Thread
+from typing import Awaitable, Dict, List, Mapping, Optional, Tuple, TypeVar, Union
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from mhq.utils.http_cache import CachedResponse, ResponseCache, get_response_cache
+from mhq.utils.http_replay import (
+    RecordingClientSession,
+    RecordingHTTPAdapter,
+    get_exapi_recordings,
+)
+from mhq.utils.metrics import record_exapi_request
+from mhq.utils.rate_limit import (
+    RATE_LIMIT_MAX_ATTEMPTS,
+    RATE_LIMIT_STATUS_CODES,
+    RateLimitScheduler,
+    get_rate_limit_scheduler,
+)
+
+EXAPI_HTTP_POOL_SIZE = (
+    int(getenv("EXAPI_HTTP_POOL_SIZE")) if getenv("EXAPI_HTTP_POOL_SIZE") else 10
+)
+EXAPI_HTTP_MAX_RETRIES = (
+    int(getenv("EXAPI_HTTP_MAX_RETRIES")) if getenv("EXAPI_HTTP_MAX_RETRIES") else 3
+)
+EXAPI_HTTP_BACKOFF_FACTOR = (
+    float(getenv("EXAPI_HTTP_BACKOFF_FACTOR"))
+    if getenv("EXAPI_HTTP_BACKOFF_FACTOR")
+    else 0.5
+)
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+T = TypeVar("T")
+
+_sessions: Dict[Tuple[str, str], requests.Session] = {}
+_sessions_lock = Lock()
+
+
+def get_retry_config() -> Retry:
+    """
+    Retries connection errors and transient server errors with exponential backoff.
+    Once retries run out the last response is returned, so callers keep handling status codes.
+    """
+    return Retry(
+        total=EXAPI_HTTP_MAX_RETRIES,
+        backoff_factor=EXAPI_HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        raise_on_status=False,
+    )
+
+
+class ConditionalRequestSession(requests.Session):
+    """
+    Session that revalidates GET responses against the response cache, when one is configured.
+    A 304 from the provider is returned to the caller as the cached 200 response.
+    Requests whose params move every sync, like a bookmark, can never be revalidated and
+    should pass `cache=False` so they don't fill the cache with entries that are never read.
+    """
+
+    def __init__(self, response_cache: Optional[ResponseCache], cache_scope: str):
+        super().__init__()
+        self.response_cache = response_cache
+        self.cache_scope = cache_scope
+        self.rate_limiter: Optional[RateLimitScheduler] = None
+
+    def request(self, method, url, params=None, headers=None, cache=True, **kwargs):
+        if not cache or not self.response_cache or method.upper() != "GET":
+            return self._send_within_rate_limit(
+                method, url, params=params, headers=headers, **kwargs
+            )
+
+        key = self.response_cache.get_key(self.cache_scope, url, params)
+        cached_response: Optional[CachedResponse] = self.response_cache.get(key)
+        if cached_response:
+            headers = {**(headers or {}), **cached_response.conditional_headers}
+
+        response = self._send_within_rate_limit(
+            method, url, params=params, headers=headers, **kwargs
+        )
+
+        if cached_response and response.status_code == HTTPStatus.NOT_MODIFIED:
+            self.response_cache.record_hit()
+            return cached_response.to_response(response)
+
+        self.response_cache.record_miss()
+        if response.status_code == HTTPStatus.OK and (
+            response.headers.get("ETag") or response.headers.get("Last-Modified")
+        ):
+            self.response_cache.set(key, CachedResponse.from_response(response))
+        return response
+
+    def _send_within_rate_limit(self, method, url, **kwargs) -> requests.Response:
+        """
+        Waits for the rate limiter before every attempt and retries requests that were
+        rate limited, once the limiter allows requests again.
+        """
+        attempt = 1
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            response = self._send(method, url, **kwargs)
+            if not self.rate_limiter or attempt >= RATE_LIMIT_MAX_ATTEMPTS:
+                return response
+
+            body = (
+                response.text if response.status_code in RATE_LIMIT_STATUS_CODES else ""
+            )
+            if not self.rate_limiter.update(
+                response.status_code, response.headers, body
+            ):
+                return response
+            attempt += 1
+
+    def _send(self, method, url, **kwargs) -> requests.Response:
+        started_at = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except Exception:
+            record_exapi_request(method, url, None, time.perf_counter() - started_at)
+            raise
+        record_exapi_request(
+            method, url, response.status_code, time.perf_counter() - started_at
+        )
+        return response
+
+
+def get_cache_scope(access_token: str) -> str:
+    """
+    Cached responses are scoped to the token they were fetched with, as visibility and
+    ETags differ between tokens.
+    """
+    return hashlib.sha256((access_token or "").encode("utf-8")).hexdigest()
+
+
+def get_http_adapter(pool_size: int = EXAPI_HTTP_POOL_SIZE) -> HTTPAdapter:
+    """
+    Adapter with the retry config, recording or replaying responses when
+    EXAPI_REPLAY_MODE is set.
+    """
+    adapter_kwargs = dict(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=get_retry_config(),
+    )
+    recordings = get_exapi_recordings()
+    if recordings:
+        return RecordingHTTPAdapter(recordings, **adapter_kwargs)
+    return HTTPAdapter(**adapter_kwargs)
+
+
+def _create_session(access_token: str) -> requests.Session:
+    session = ConditionalRequestSession(
+        get_response_cache(), get_cache_scope(access_token)
+    )
+    adapter = get_http_adapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_http_session(base_url: str, access_token: str) -> requests.Session:
+    """
+    Returns the keep-alive session for a provider domain and token, creating it on first use.
+    The same session is shared by every API service built for that domain and token in the
+    process, so connections are reused across handlers and repos for the whole sync.
+    """
+    key = (base_url, access_token or "")
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if not session:
+            session = _create_session(access_token)
+            _sessions[key] = session
+        return session
+
+
+def close_http_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        async_sessions = list(_async_sessions.values())
+        _async_sessions.clear()
+
+    if async_sessions:
+        run_async_http_requests(_close_async_http_sessions(async_sessions))
+
+
+def create_async_http_session(
+    headers: Optional[Dict] = None,
+) -> Union[aiohttp.ClientSession, RecordingClientSession]:
+    """
+    Session for concurrent provider API requests, recording or replaying them when
+    EXAPI_REPLAY_MODE is set.
+    """
+    recordings = get_exapi_recordings()
+    if recordings:
+        return RecordingClientSession(recordings, headers)
+    return aiohttp.ClientSession(headers=headers)
+
+
+def get_retry_backoff_seconds(retries: int) -> float:
+    """
+    Seconds to wait before the given retry, backing off exponentially like `get_retry_config`.
+    """
+    if retries <= 1:
+        return 0
+    return EXAPI_HTTP_BACKOFF_FACTOR * (2 ** (retries - 1))
+
+
+@dataclass
+class AsyncResponse:
+    status: int
+    headers: Mapping
+    body: str
+
+
+class AsyncHTTPSession:
+    """
+    Async counterpart of the keep-alive session of a provider domain and token. Requests
+    are handled like the sync session handles them: connection errors and transient server
+    errors are retried with exponential backoff, every attempt waits for the rate limiter
+    and rate limited requests are retried once the limiter allows requests again.
+    """
+
+    def __init__(
+        self,
+        session: Union[aiohttp.ClientSession, RecordingClientSession],
+        rate_limiter: Optional[RateLimitScheduler] = None,
+    ):
+        self._session = session
+        self.rate_limiter = rate_limiter
+
+    async def get(
+        self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None
+    ) -> AsyncResponse:
+        attempt = 1
+        while True:
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async()
+            response = await self._send_with_retries(url, params, headers)
+            if not self.rate_limiter or attempt >= RATE_LIMIT_MAX_ATTEMPTS:
+                return response
+
+            body = response.body if response.status in RATE_LIMIT_STATUS_CODES else ""
+            if not self.rate_limiter.update(response.status, response.headers, body):
+                return response
+            attempt += 1
+
+    async def _send_with_retries(
+        self, url: str, params: Optional[Dict], headers: Optional[Dict]
+    ) -> AsyncResponse:
+        retries = 0
+        while True:
+            try:
+                response = await self._send(url, params, headers)
+                if (
+                    response.status not in RETRY_STATUS_CODES
+                    or retries >= EXAPI_HTTP_MAX_RETRIES
+                ):
+                    return response
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if retries >= EXAPI_HTTP_MAX_RETRIES:
+                    raise
+            retries += 1
+            await asyncio.sleep(get_retry_backoff_seconds(retries))
+
+    async def _send(
+        self, url: str, params: Optional[Dict], headers: Optional[Dict]
+    ) -> AsyncResponse:
+        started_at = time.perf_counter()
+        status = None
+        try:
+            async with self._session.get(
+                url, params=params, headers=headers
+            ) as response:
+                status = response.status
+                return AsyncResponse(
+                    status=response.status,
+                    headers=response.headers,
+                    body=await response.text(),
+                )
+        finally:
+            record_exapi_request("GET", url, status, time.perf_counter() - started_at)
+
+    async def close(self):
+        await self._session.close()
+
+
+async def _close_async_http_sessions(sessions: List[AsyncHTTPSession]):
+    await asyncio.gather(*[session.close() for session in sessions])
+
+
+_async_sessions: Dict[Tuple[str, str], AsyncHTTPSession] = {}
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_async_loop() -> asyncio.AbstractEventLoop:
+    global _async_loop
+    with _sessions_lock:
+        if not _async_loop:
+            _async_loop = asyncio.new_event_loop()
+            Thread(
+                target=_async_loop.run_forever, name="exapi-async-http", daemon=True
+            ).start()
+        return _async_loop
+
+
+def run_async_http_requests(coroutine: Awaitable[T]) -> T:
+    """
+    Runs a coroutine making async provider API requests and waits for its result.
+    aiohttp sessions are bound to the event loop they were created on, so every coroutine
+    runs on one long lived event loop thread, where the async sessions stay open across
+    calls and threads instead of being set up again for every call.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_async_loop()).result()
+
+
+def get_async_http_session(base_url: str, access_token: str) -> AsyncHTTPSession:
+    """
+    Returns the async keep-alive session for a provider domain and token, creating it on
+    first use. It shares the rate limiter of the token with the sync session.
+    Must be called from a coroutine run with `run_async_http_requests`.
+    """
+    key = (base_url, access_token or "")
+    with _sessions_lock:
+        session = _async_sessions.get(key)
+        if not session:
+            session = AsyncHTTPSession(
+                create_async_http_session(),
+                get_rate_limit_scheduler(base_url, access_token),
+            )
+            _async_sessions[key] = session
+        return session
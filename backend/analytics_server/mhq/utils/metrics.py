@@ -0,0 +1,132 @@
+import re
+from os import getenv
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+PROMETHEUS_MULTIPROC_DIR = getenv("PROMETHEUS_MULTIPROC_DIR", "")
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+SYNC_DURATION_BUCKETS = (0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+_ID_SEGMENT_REGEX = re.compile(r"^(\d+|[0-9a-fA-F]{7,40})$")
+_NAMED_SEGMENTS = {
+    "repos": ["{owner}", "{repo}"],
+    "orgs": ["{org}"],
+    "users": ["{user}"],
+    "projects": ["{project}"],
+    "groups": ["{group}"],
+}
+
+EXAPI_REQUESTS_TOTAL = Counter(
+    "mhq_exapi_requests_total",
+    "Requests made to provider APIs, by endpoint and response status",
+    ["host", "method", "endpoint", "status"],
+)
+EXAPI_REQUEST_DURATION_SECONDS = Histogram(
+    "mhq_exapi_request_duration_seconds",
+    "Latency of requests made to provider APIs, by endpoint",
+    ["host", "method", "endpoint"],
+)
+DB_ROWS_WRITTEN_TOTAL = Counter(
+    "mhq_db_rows_written_total",
+    "Rows written by bulk upserts and updates, by table",
+    ["table", "operation"],
+)
+SYNC_STAGE_DURATION_SECONDS = Histogram(
+    "mhq_sync_stage_duration_seconds",
+    "Wall clock time of a stage of an org sync, from its first task to its last",
+    ["stage"],
+    buckets=SYNC_DURATION_BUCKETS,
+)
+SYNC_TASK_DURATION_SECONDS = Histogram(
+    "mhq_sync_task_duration_seconds",
+    "Time taken by a single sync task, e.g. the PRs of one repo, by stage",
+    ["stage"],
+    buckets=SYNC_DURATION_BUCKETS,
+)
+SYNC_TASKS_TOTAL = Counter(
+    "mhq_sync_tasks_total",
+    "Sync tasks run, by stage and status",
+    ["stage", "status"],
+)
+SYNC_ITEMS_TOTAL = Counter(
+    "mhq_sync_items_total",
+    "Items synced, e.g. PRs or workflow runs, by stage",
+    ["stage"],
+)
+SYNC_BOOKMARK_LAG_SECONDS = Gauge(
+    "mhq_sync_bookmark_lag_seconds",
+    "Time between the last update of a sync bookmark and the time it points to",
+    ["bookmark_type", "entity_id"],
+    multiprocess_mode="mostrecent",
+)
+HTTP_REQUEST_DURATION_SECONDS = Histogram(
+    "mhq_http_request_duration_seconds",
+    "Latency of requests served by the API, by route",
+    ["blueprint", "method", "route", "status"],
+)
+
+
+def render_metrics() -> bytes:
+    """
+    Metrics in the Prometheus text format. With PROMETHEUS_MULTIPROC_DIR set, as it is for
+    the gunicorn workers and the sync worker, the values of all those processes are summed.
+    """
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def get_exapi_endpoint(url: str) -> Tuple[str, str]:
+    """
+    Host and path template of a provider API url, e.g. `/repos/{owner}/{repo}/pulls/{id}`,
+    so metrics are kept per endpoint rather than per repo or PR.
+    """
+    parsed_url = urlparse(url)
+    segments = [segment for segment in parsed_url.path.split("/") if segment]
+    endpoint: List[str] = []
+    index = 0
+    while index < len(segments):
+        segment = segments[index]
+        endpoint.append(
+            "{id}" if _ID_SEGMENT_REGEX.match(segment) and endpoint else segment
+        )
+        index += 1
+        for placeholder in _NAMED_SEGMENTS.get(segment, []):
+            if index >= len(segments):
+                break
+            endpoint.append(placeholder)
+            index += 1
+    return parsed_url.netloc, "/" + "/".join(endpoint)
+
+
+def record_exapi_request(
+    method: str, url: str, status: Optional[int], duration_seconds: float
+):
+    """
+    Records a request to a provider API. A request that failed without a response is
+    recorded with the status `error`.
+    """
+    host, endpoint = get_exapi_endpoint(url)
+    EXAPI_REQUESTS_TOTAL.labels(
+        host=host,
+        method=method.upper(),
+        endpoint=endpoint,
+        status=status if status is not None else "error",
+    ).inc()
+    EXAPI_REQUEST_DURATION_SECONDS.labels(
+        host=host, method=method.upper(), endpoint=endpoint
+    ).observe(duration_seconds)
@@ -0,0 +1,225 @@
+import asyncio
+import math
+import time
+from http import HTTPStatus
+from os import getenv
+from threading import Lock
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+from requests.structures import CaseInsensitiveDict
+
+from mhq.utils.log import LOG
+
+RATE_LIMIT_MAX_WAIT_SECONDS = (
+    int(getenv("RATE_LIMIT_MAX_WAIT_SECONDS"))
+    if getenv("RATE_LIMIT_MAX_WAIT_SECONDS")
+    else 60 * 60
+)
+RATE_LIMIT_PACING_THRESHOLD = (
+    float(getenv("RATE_LIMIT_PACING_THRESHOLD"))
+    if getenv("RATE_LIMIT_PACING_THRESHOLD")
+    else 0.2
+)
+RATE_LIMIT_RESERVE = 5
+RATE_LIMIT_MAX_ATTEMPTS = 5
+RATE_LIMIT_STATUS_CODES = (HTTPStatus.FORBIDDEN, HTTPStatus.TOO_MANY_REQUESTS)
+SECONDARY_RATE_LIMIT_WAIT_SECONDS = 60
+
+
+class RateLimitScheduler:
+    """
+    Token bucket scheduler shared by every request made with one token.
+
+    The bucket is refilled from the `X-RateLimit-*` headers of GitHub responses, or the
+    `RateLimit-*` headers of GitLab responses. While more than `pacing_threshold` of the
+    quota is left requests go out immediately. Below that, the
+    remaining quota is spread evenly over the time left until reset. Every request reserves
+    the next free slot, so the repos syncing in parallel take turns instead of one repo
+    draining the quota. When the quota runs out, or GitHub asks to back off with
+    `Retry-After` or a secondary rate limit, requests wait until they may resume instead
+    of failing, as long as the wait is below `max_wait_seconds`.
+    """
+
+    def __init__(
+        self,
+        max_wait_seconds: int = RATE_LIMIT_MAX_WAIT_SECONDS,
+        pacing_threshold: float = RATE_LIMIT_PACING_THRESHOLD,
+        reserve: int = RATE_LIMIT_RESERVE,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_wait_seconds = max_wait_seconds
+        self.pacing_threshold = pacing_threshold
+        self.reserve = reserve
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = Lock()
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.paused_until: Optional[float] = None
+        self._next_slot_at: float = 0
+        self.waited_seconds: float = 0
+
+    def _reserve_slot(self) -> float:
+        """
+        Reserves the next request slot and returns the seconds to wait for it.
+        """
+        with self._lock:
+            now = self._clock()
+            if self.reset_at is not None and self.reset_at <= now:
+                self.remaining = self.limit
+                self.reset_at = None
+
+            if self.paused_until is not None and self.paused_until > now:
+                slot_at = max(self.paused_until, self._next_slot_at)
+            elif (
+                self.remaining is not None
+                and self.reset_at is not None
+                and self.remaining <= self.reserve
+            ):
+                slot_at = max(self.reset_at + 1, self._next_slot_at)
+            else:
+                slot_at = max(now, self._next_slot_at)
+
+            self._next_slot_at = slot_at + self._get_interval(slot_at)
+            if self.remaining is not None:
+                self.remaining = max(0, self.remaining - 1)
+
+            wait_seconds = max(0.0, slot_at - now)
+            self.waited_seconds += wait_seconds
+            return wait_seconds
+
+    def _get_interval(self, slot_at: float) -> float:
+        if (
+            self.limit is None
+            or self.remaining is None
+            or self.reset_at is None
+            or self.reset_at <= slot_at
+            or self.remaining > self.limit * self.pacing_threshold
+        ):
+            return 0
+        return (self.reset_at - slot_at) / max(1, self.remaining - self.reserve)
+
+    def acquire(self):
+        wait_seconds = self._reserve_slot()
+        if wait_seconds:
+            self._sleep(wait_seconds)
+
+    async def acquire_async(self):
+        wait_seconds = self._reserve_slot()
+        if wait_seconds:
+            await asyncio.sleep(wait_seconds)
+
+    def get_concurrency(self, max_concurrency: int) -> int:
+        """
+        Scales the number of concurrent requests down in proportion to the quota left.
+        """
+        with self._lock:
+            if not self.limit or self.remaining is None:
+                return max_concurrency
+            return max(
+                1,
+                min(
+                    max_concurrency,
+                    math.ceil(max_concurrency * self.remaining / self.limit),
+                ),
+            )
+
+    def update(self, status: int, headers: Optional[Mapping], body: str = "") -> bool:
+        """
+        Records the quota reported by a response.
+        :returns: True if the request was rate limited and should be retried after `acquire`
+        """
+        headers = CaseInsensitiveDict(headers or {})
+        remaining, limit, reset_at = self._parse_rate_limit_headers(headers)
+
+        with self._lock:
+            now = self._clock()
+            if remaining is not None:
+                self.remaining = remaining
+            if limit is not None:
+                self.limit = limit
+            if reset_at is not None:
+                self.reset_at = reset_at
+
+            paused_until = self._get_paused_until(status, headers, body, now)
+            if paused_until is None:
+                return False
+
+            if paused_until - now > self.max_wait_seconds:
+                LOG.error(
+                    f"[Rate Limit] Rate limited for {int(paused_until - now)}s, "
+                    f"more than the {self.max_wait_seconds}s allowed to wait"
+                )
+                return False
+
+            self.paused_until = max(self.paused_until or 0, paused_until)
+            LOG.info(
+                f"[Rate Limit] Rate limited, pausing for {int(paused_until - now)}s"
+            )
+            return True
+
+    @classmethod
+    def is_rate_limited(
+        cls, status: int, headers: Optional[Mapping], body: str = ""
+    ) -> bool:
+        """
+        Tells rate limited responses apart from other 403 and 429 responses, e.g. for a
+        missing permission or SSO authorization, the way `update` does.
+        """
+        return (
+            cls._get_paused_until(status, CaseInsensitiveDict(headers or {}), body, 0)
+            is not None
+        )
+
+    @classmethod
+    def _get_paused_until(
+        cls, status: int, headers: Mapping, body: str, now: float
+    ) -> Optional[float]:
+        """
+        :returns: The time requests may resume at, None if the response is not rate limited
+        """
+        if status not in RATE_LIMIT_STATUS_CODES:
+            return None
+
+        remaining, _, reset_at = cls._parse_rate_limit_headers(headers)
+        retry_after = headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return now + int(retry_after)
+        if remaining == 0 and reset_at is not None:
+            return reset_at + 1
+        if "rate limit" in (body or "").lower():
+            return now + SECONDARY_RATE_LIMIT_WAIT_SECONDS
+        return None
+
+    @staticmethod
+    def _parse_rate_limit_headers(
+        headers: Mapping,
+    ) -> Tuple[Optional[int], Optional[int], Optional[float]]:
+        def _get_int(key: str) -> Optional[int]:
+            value = headers.get(f"X-{key}", headers.get(key))
+            return int(value) if value is not None and str(value).isdigit() else None
+
+        reset_at = _get_int("RateLimit-Reset")
+        return (
+            _get_int("RateLimit-Remaining"),
+            _get_int("RateLimit-Limit"),
+            float(reset_at) if reset_at is not None else None,
+        )
+
+
+_schedulers: Dict[Tuple[str, str], RateLimitScheduler] = {}
+_schedulers_lock = Lock()
+
+
+def get_rate_limit_scheduler(base_url: str, access_token: str) -> RateLimitScheduler:
+    """
+    Returns the scheduler for a provider domain and token. Quota is tracked per token,
+    so all services and threads using the same token share one scheduler.
+    """
+    key = (base_url, access_token or "")
+    with _schedulers_lock:
+        if key not in _schedulers:
+            _schedulers[key] = RateLimitScheduler()
+        return _schedulers[key]
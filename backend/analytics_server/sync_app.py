@@ -9,6 +9,8 @@ load_app_env()
 from mhq.store import configure_db_with_app
 from mhq.api.hello import app as core_api
 from mhq.api.sync import app as sync_api
+from mhq.api.webhooks import app as webhooks_api
+from mhq.api.metrics import app as metrics_api
 
 SYNC_SERVER_PORT = getenv("SYNC_SERVER_PORT")
 
@@ -16,6 +18,8 @@ app = Flask(__name__)
 
 app.register_blueprint(core_api)
 app.register_blueprint(sync_api)
+app.register_blueprint(webhooks_api)
+app.register_blueprint(metrics_api)
 
 configure_db_with_app(app)
 
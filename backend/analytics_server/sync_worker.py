@@ -0,0 +1,31 @@
+import time
+from os import getenv
+
+from flask import Flask
+
+from env import load_app_env
+
+load_app_env()
+
+from mhq.store import configure_db_with_app  # noqa: E402
+from mhq.service.sync_jobs import process_sync_tasks  # noqa: E402
+from mhq.utils.log import LOG  # noqa: E402
+
+SYNC_WORKER_POLL_SECONDS = (
+    int(getenv("SYNC_WORKER_POLL_SECONDS")) if getenv("SYNC_WORKER_POLL_SECONDS") else 5
+)
+
+app = Flask(__name__)
+
+configure_db_with_app(app)
+
+if __name__ == "__main__":
+    LOG.info("[Sync Jobs] Starting sync worker")
+    while True:
+        try:
+            # Every task runs in its own app context, pushed from this one
+            with app.app_context():
+                process_sync_tasks(wait_seconds=SYNC_WORKER_POLL_SECONDS)
+        except Exception as e:
+            LOG.error(f"[Sync Jobs] Error processing sync tasks: {str(e)}")
+            time.sleep(SYNC_WORKER_POLL_SECONDS)
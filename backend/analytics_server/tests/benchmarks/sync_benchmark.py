@@ -0,0 +1,361 @@
+"""
+Full sync benchmark against the synthetic GitHub and GitLab stand-in.
+
+Seeds an org whose integration points at a `SyntheticProviderServer`, runs a full data
+sync for it and reports PRs synced per second, provider API calls per PR, DB writes per PR
+and the peak RSS of the sync process. Needs the Postgres and Redis configured for the
+analytics server, and seeds a new org on every run, so run it against a disposable
+database:
+
+    python -m tests.benchmarks.sync_benchmark --provider github --repos 5 --prs-per-repo 500
+"""
+
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from flask import Flask
+from sqlalchemy import event
+
+from env import load_app_env
+
+load_app_env()
+
+from mhq.service.sync_data import trigger_data_sync  # noqa: E402
+from mhq.store import configure_db_with_app, db  # noqa: E402
+from mhq.store.models.code import (  # noqa: E402
+    OrgRepo,
+    PullRequest,
+    RepoWorkflow,
+    RepoWorkflowProviders,
+    RepoWorkflowType,
+)
+from mhq.store.models.core import Organization  # noqa: E402
+from mhq.store.models.integrations import (  # noqa: E402
+    Integration,
+    UserIdentityProvider,
+)  # noqa: E402
+from mhq.utils.cryptography import get_crypto_service  # noqa: E402
+from mhq.utils.time import time_now  # noqa: E402
+from tests.factories.provider_server import (  # noqa: E402
+    STATS_PATH,
+    SyntheticProviderData,
+    SyntheticProviderServer,
+    SyntheticRateLimit,
+    SyntheticVolumes,
+)
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+TOKEN_CHUNK_SIZE = 127
+BENCHMARK_TOKEN = "synthetic-token"
+
+
+@dataclass
+class SyncBenchmarkReport:
+    provider: str
+    repos: int
+    prs: int
+    duration_seconds: float
+    api_calls: int
+    db_write_statements: int
+    db_rows_written: int
+    peak_rss_mb: float
+    api_calls_by_endpoint: Dict[str, int] = field(default_factory=dict)
+    stages: List[Dict] = field(default_factory=list)
+
+    @property
+    def prs_per_second(self) -> float:
+        return self.prs / self.duration_seconds if self.duration_seconds else 0
+
+    @property
+    def api_calls_per_pr(self) -> float:
+        return self.api_calls / self.prs if self.prs else 0
+
+    @property
+    def db_writes_per_pr(self) -> float:
+        return self.db_write_statements / self.prs if self.prs else 0
+
+    @property
+    def db_rows_written_per_pr(self) -> float:
+        return self.db_rows_written / self.prs if self.prs else 0
+
+    def to_dict(self) -> Dict:
+        return {
+            **asdict(self),
+            "prs_per_second": self.prs_per_second,
+            "api_calls_per_pr": self.api_calls_per_pr,
+            "db_writes_per_pr": self.db_writes_per_pr,
+            "db_rows_written_per_pr": self.db_rows_written_per_pr,
+        }
+
+    def format(self) -> str:
+        lines = [
+            f"Full {self.provider} sync of {self.prs} PRs in {self.repos} repos "
+            f"took {self.duration_seconds:.2f}s",
+            f"  PRs/sec:            {self.prs_per_second:.2f}",
+            f"  API calls per PR:   {self.api_calls_per_pr:.2f} ({self.api_calls} calls)",
+            f"  DB writes per PR:   {self.db_writes_per_pr:.2f} "
+            f"({self.db_write_statements} statements, {self.db_rows_written} rows)",
+            f"  Peak RSS:           {self.peak_rss_mb:.1f} MB",
+            "  API calls by endpoint:",
+        ]
+        lines += [
+            f"    {count:>7}  {endpoint}"
+            for endpoint, count in sorted(
+                self.api_calls_by_endpoint.items(), key=lambda item: -item[1]
+            )
+        ]
+        lines.append("  Stages:")
+        lines += [
+            f"    {stage['stage']:<16} {stage['tasks']:>4} tasks, "
+            f"{stage['failed']} failed, {stage['items']} items, "
+            f"{stage['wall_clock_seconds']:.2f}s wall clock"
+            for stage in self.stages
+        ]
+        return "\n".join(lines)
+
+
+class DBWriteCounter:
+    """
+    Counts the INSERT, UPDATE and DELETE statements sent over an engine, and the rows they
+    carry, an `executemany` counting one row per parameter set.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        if not statement.lstrip().upper().startswith(WRITE_STATEMENTS):
+            return
+        with self._lock:
+            self.statements += 1
+            self.rows += len(parameters) if executemany and parameters else 1
+
+    def __enter__(self) -> "DBWriteCounter":
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+
+def get_peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+
+def _serve_provider(
+    volumes: SyntheticVolumes,
+    rate_limit: Optional[SyntheticRateLimit],
+    url_queue: multiprocessing.Queue,
+):
+    SyntheticProviderServer(volumes, rate_limit).serve_forever(url_queue.put)
+
+
+def start_provider_server_process(
+    volumes: SyntheticVolumes, rate_limit: Optional[SyntheticRateLimit] = None
+) -> Tuple[str, multiprocessing.Process]:
+    """
+    Runs the stand-in in a process of its own, so serving it neither competes with the
+    sync for the GIL nor adds to its RSS.
+    """
+    url_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_serve_provider, args=(volumes, rate_limit, url_queue), daemon=True
+    )
+    process.start()
+    return url_queue.get(timeout=30), process
+
+
+def get_provider_stats(server_url: str) -> Dict:
+    response = requests.get(f"{server_url}{STATS_PATH}")
+    response.raise_for_status()
+    return response.json()
+
+
+def seed_benchmark_org(
+    provider: str, volumes: SyntheticVolumes, server_url: str
+) -> Tuple[str, List[str]]:
+    """
+    Creates an org with a code integration pointing at the stand-in, one active repo per
+    synthetic repo and, for GitHub, a deployment workflow per repo.
+    :returns: Id of the org and ids of its repos
+    """
+    org_id = uuid.uuid4()
+    db.session.add(
+        Organization(
+            id=org_id,
+            name=f"Sync benchmark {org_id}",
+            created_at=time_now(),
+            domain="example.com",
+        )
+    )
+    db.session.add(
+        Integration(
+            org_id=org_id,
+            name=provider,
+            access_token_enc_chunks=get_crypto_service().encrypt(
+                BENCHMARK_TOKEN, TOKEN_CHUNK_SIZE
+            ),
+            provider_meta={"custom_domain": server_url},
+        )
+    )
+
+    repo_ids: List[str] = []
+    for repo in SyntheticProviderData(volumes).repos:
+        org_repo = OrgRepo(
+            id=uuid.uuid4(),
+            org_id=org_id,
+            name=repo.name,
+            provider=provider,
+            org_name=repo.org_name,
+            idempotency_key=str(
+                repo.github_id
+                if provider == UserIdentityProvider.GITHUB.value
+                else repo.gitlab_id
+            ),
+            slug=repo.name,
+            is_active=True,
+        )
+        db.session.add(org_repo)
+        repo_ids.append(str(org_repo.id))
+        if provider != UserIdentityProvider.GITHUB.value:
+            continue
+        db.session.add(
+            RepoWorkflow(
+                id=uuid.uuid4(),
+                org_repo_id=org_repo.id,
+                type=RepoWorkflowType.DEPLOYMENT,
+                provider=RepoWorkflowProviders.GITHUB_ACTIONS,
+                provider_workflow_id=str(repo.github_workflow_id),
+                name="deploy",
+                meta={},
+                is_active=True,
+            )
+        )
+
+    db.session.commit()
+    return str(org_id), repo_ids
+
+
+def count_synced_prs(repo_ids: List[str]) -> int:
+    return (
+        db.session.query(PullRequest).filter(PullRequest.repo_id.in_(repo_ids)).count()
+    )
+
+
+def run_sync_benchmark(
+    provider: str, volumes: SyntheticVolumes, server_url: str
+) -> SyncBenchmarkReport:
+    """
+    Runs a full data sync of a freshly seeded org against the stand-in at `server_url`.
+    Must run within an app context with the DB configured.
+    """
+    org_id, repo_ids = seed_benchmark_org(provider, volumes, server_url)
+    provider_stats_before = get_provider_stats(server_url)
+
+    with DBWriteCounter(db.engine) as db_writes:
+        started_at = time.perf_counter()
+        stage_reports = trigger_data_sync(org_id)
+        duration_seconds = time.perf_counter() - started_at
+
+    provider_stats = get_provider_stats(server_url)
+    api_calls_by_endpoint = {
+        endpoint: count - provider_stats_before["requests_by_endpoint"].get(endpoint, 0)
+        for endpoint, count in provider_stats["requests_by_endpoint"].items()
+    }
+    return SyncBenchmarkReport(
+        provider=provider,
+        repos=len(repo_ids),
+        prs=count_synced_prs(repo_ids),
+        duration_seconds=duration_seconds,
+        api_calls=sum(api_calls_by_endpoint.values()),
+        db_write_statements=db_writes.statements,
+        db_rows_written=db_writes.rows,
+        peak_rss_mb=get_peak_rss_mb(),
+        api_calls_by_endpoint={
+            endpoint: count
+            for endpoint, count in api_calls_by_endpoint.items()
+            if count
+        },
+        stages=[
+            {**asdict(report), "stage": report.stage.value} for report in stage_reports
+        ],
+    )
+
+
+def _parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
+    defaults = SyntheticVolumes()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--provider",
+        choices=[provider.value for provider in UserIdentityProvider],
+        default=UserIdentityProvider.GITHUB.value,
+    )
+    parser.add_argument("--repos", type=int, default=defaults.repos)
+    parser.add_argument("--prs-per-repo", type=int, default=defaults.prs_per_repo)
+    parser.add_argument("--reviews-per-pr", type=int, default=defaults.reviews_per_pr)
+    parser.add_argument("--comments-per-pr", type=int, default=defaults.comments_per_pr)
+    parser.add_argument("--commits-per-pr", type=int, default=defaults.commits_per_pr)
+    parser.add_argument("--files-per-pr", type=int, default=defaults.files_per_pr)
+    parser.add_argument(
+        "--workflow-runs-per-repo", type=int, default=defaults.workflow_runs_per_repo
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        default=None,
+        help="Requests allowed per rate limit window, unlimited by default",
+    )
+    parser.add_argument("--rate-limit-window-seconds", type=int, default=3600)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(args)
+
+
+def main(args: Optional[List[str]] = None):
+    args = _parse_args(args)
+    volumes = SyntheticVolumes(
+        repos=args.repos,
+        prs_per_repo=args.prs_per_repo,
+        reviews_per_pr=args.reviews_per_pr,
+        comments_per_pr=args.comments_per_pr,
+        commits_per_pr=args.commits_per_pr,
+        files_per_pr=args.files_per_pr,
+        workflow_runs_per_repo=args.workflow_runs_per_repo,
+    )
+    rate_limit = (
+        SyntheticRateLimit(args.rate_limit, args.rate_limit_window_seconds)
+        if args.rate_limit
+        else None
+    )
+
+    # The stand-in is forked before the app opens any DB connection
+    server_url, server_process = start_provider_server_process(volumes, rate_limit)
+    try:
+        app = Flask(__name__)
+        configure_db_with_app(app)
+        with app.app_context():
+            report = run_sync_benchmark(args.provider, volumes, server_url)
+    finally:
+        server_process.terminate()
+        server_process.join()
+
+    print(json.dumps(report.to_dict(), indent=2) if args.json else report.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+from sqlalchemy import create_engine, text
+
+from tests.benchmarks.sync_benchmark import DBWriteCounter, SyncBenchmarkReport
+
+
+def test_sync_benchmark_report_rates():
+    report = SyncBenchmarkReport(
+        provider="github",
+        repos=2,
+        prs=100,
+        duration_seconds=4,
+        api_calls=350,
+        db_write_statements=40,
+        db_rows_written=900,
+        peak_rss_mb=150,
+    )
+
+    assert report.prs_per_second == 25
+    assert report.api_calls_per_pr == 3.5
+    assert report.db_writes_per_pr == 0.4
+    assert report.db_rows_written_per_pr == 9
+    assert report.to_dict()["api_calls_per_pr"] == 3.5
+
+
+def test_sync_benchmark_report_without_prs():
+    report = SyncBenchmarkReport(
+        provider="gitlab",
+        repos=1,
+        prs=0,
+        duration_seconds=0,
+        api_calls=3,
+        db_write_statements=1,
+        db_rows_written=1,
+        peak_rss_mb=100,
+    )
+
+    assert report.prs_per_second == 0
+    assert report.api_calls_per_pr == 0
+    assert report.db_writes_per_pr == 0
+
+
+def test_db_write_counter_counts_write_statements_and_rows():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE pr (id INTEGER, title TEXT)"))
+
+    with DBWriteCounter(engine) as db_writes:
+        with engine.begin() as connection:
+            connection.execute(
+                text("INSERT INTO pr (id, title) VALUES (:id, :title)"),
+                [{"id": i, "title": "change"} for i in range(3)],
+            )
+            connection.execute(text("UPDATE pr SET title = 'fix' WHERE id = 1"))
+            connection.execute(text("SELECT * FROM pr")).fetchall()
+
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM pr"))
+
+    assert db_writes.statements == 2
+    assert db_writes.rows == 4
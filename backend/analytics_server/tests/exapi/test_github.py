@@ -2,13 +2,24 @@ import unittest
 from unittest.mock import patch
 
 from mhq.exapi.github import GithubApiService, PAGE_SIZE
+from mhq.utils.http_session import EXAPI_HTTP_POOL_SIZE
+from mhq.utils.rate_limit import RateLimitScheduler
+
+
+class DummyRequester:
+    def __init__(self):
+        self.rate_limiting = (-1, -1)
+        self.rate_limiting_resettime = 0
 
 
 class DummyGithub:
-    def __init__(self, token, base_url=None, per_page=None):
+    def __init__(self, token, base_url=None, per_page=None, retry=None, pool_size=None):
         self.token = token
         self.base_url = base_url
         self.per_page = per_page
+        self.retry = retry
+        self.pool_size = pool_size
+        self._Github__requester = DummyRequester()
 
 
 class TestGithubApiService(unittest.TestCase):
@@ -22,6 +33,8 @@ class TestGithubApiService(unittest.TestCase):
         self.assertEqual(service._g.token, token)
         self.assertEqual(service._g.base_url, "https://api.github.com")
         self.assertEqual(service._g.per_page, PAGE_SIZE)
+        self.assertEqual(service._g.pool_size, EXAPI_HTTP_POOL_SIZE)
+        self.assertIsNotNone(service._g.retry)
 
     @patch("mhq.exapi.github.Github", new=DummyGithub)
     def test_empty_string_domain_uses_default_url(self):
@@ -38,3 +51,28 @@ class TestGithubApiService(unittest.TestCase):
         expected = f"{custom_domain}/api/v3"
         self.assertEqual(service.base_url, expected)
         self.assertEqual(service._g.base_url, expected)
+
+    @patch("mhq.exapi.github.Github", new=DummyGithub)
+    def test_successful_calls_feed_quota_to_rate_limiter(self):
+        service = GithubApiService(access_token="deadpool", domain=None)
+        service._rate_limiter = RateLimitScheduler()
+
+        def _get_page():
+            service._g._Github__requester.rate_limiting = (4200, 5000)
+            service._g._Github__requester.rate_limiting_resettime = 1_700_000_000
+            return ["pr"]
+
+        self.assertEqual(service._call_within_rate_limit(_get_page, "/pulls"), ["pr"])
+        self.assertEqual(service._rate_limiter.remaining, 4200)
+        self.assertEqual(service._rate_limiter.limit, 5000)
+        self.assertEqual(service._rate_limiter.reset_at, 1_700_000_000)
+
+    @patch("mhq.exapi.github.Github", new=DummyGithub)
+    def test_calls_without_quota_headers_leave_rate_limiter_as_is(self):
+        service = GithubApiService(access_token="deadpool", domain=None)
+        service._rate_limiter = RateLimitScheduler()
+
+        service._call_within_rate_limit(lambda: [], "/pulls")
+
+        self.assertIsNone(service._rate_limiter.remaining)
+        self.assertIsNone(service._rate_limiter.limit)
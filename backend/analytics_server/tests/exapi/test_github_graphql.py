@@ -0,0 +1,313 @@
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import pytz
+from github.GithubException import GithubException
+
+from mhq.exapi.github import GithubApiService, GithubRateLimitExceeded
+from mhq.exapi.github_graphql import GithubGraphQLApiService
+from mhq.service.code.sync.etl_code_analytics import CodeETLAnalyticsService
+from mhq.service.code.sync.etl_github_handler import GithubETLHandler
+from mhq.store.models.code import OrgRepo, PullRequestState
+from mhq.store.models.code.enums import PullRequestEventType
+from mhq.utils.string import uuid4_str
+
+
+def _get_pr_node(number: int, updated_at: str, commits=None, reviews=None):
+    commits = commits if commits is not None else []
+    reviews = reviews if reviews is not None else []
+    return {
+        "id": f"PR_{number}",
+        "databaseId": 1000 + number,
+        "number": number,
+        "title": f"PR {number}",
+        "url": f"https://github.com/org/repo/pull/{number}",
+        "state": "MERGED",
+        "createdAt": "2024-01-01T10:00:00Z",
+        "updatedAt": updated_at,
+        "closedAt": "2024-01-03T10:00:00Z",
+        "mergedAt": "2024-01-03T10:00:00Z",
+        "additions": 10,
+        "deletions": 5,
+        "changedFiles": 2,
+        "baseRefName": "main",
+        "headRefName": f"feature-{number}",
+        "headRefOid": f"head{number}",
+        "comments": {"totalCount": 1},
+        "baseRepository": {"nameWithOwner": "org/repo"},
+        "author": {"__typename": "User", "login": "author"},
+        "mergeCommit": {"oid": f"merge{number}"},
+        "reviewRequests": {
+            "nodes": [{"requestedReviewer": {"__typename": "User", "login": "rev"}}]
+        },
+        "commits": {
+            "totalCount": len(commits),
+            "pageInfo": {"hasNextPage": False, "endCursor": None},
+            "nodes": commits,
+        },
+        "reviews": {
+            "pageInfo": {"hasNextPage": False, "endCursor": None},
+            "nodes": reviews,
+        },
+        "timelineItems": {
+            "pageInfo": {"hasNextPage": False, "endCursor": None},
+            "nodes": [
+                {
+                    "id": f"RFRE_{number}",
+                    "createdAt": "2024-01-01T11:00:00Z",
+                    "actor": {"__typename": "User", "login": "author"},
+                }
+            ],
+        },
+    }
+
+
+def _get_commit_node(sha: str, date: str = "2024-01-01T09:00:00+05:30"):
+    return {
+        "commit": {
+            "oid": sha,
+            "url": f"https://github.com/org/repo/commit/{sha}",
+            "message": f"commit {sha}",
+            "author": {
+                "name": "author",
+                "email": "author@mhq.dev",
+                "date": date,
+                "user": {"login": "author"},
+            },
+            "committer": {
+                "name": "author",
+                "email": "author@mhq.dev",
+                "date": date,
+                "user": None,
+            },
+        }
+    }
+
+
+def _get_review_node(database_id: int, state: str, submitted_at: str, author=None):
+    return {
+        "id": f"PRR_{database_id}",
+        "databaseId": database_id,
+        "state": state,
+        "body": "",
+        "url": "https://github.com/org/repo/pull/1#review",
+        "submittedAt": submitted_at,
+        "authorAssociation": "MEMBER",
+        "commit": {"oid": "abc"},
+        "comments": {"totalCount": 2},
+        "author": author or {"__typename": "User", "login": "reviewer"},
+    }
+
+
+class GithubGraphQLStandIn:
+    """
+    Local stand-in for the GitHub GraphQL endpoint serving canned pages.
+    """
+
+    def __init__(self, pr_pages, nested_pages=None, status=200, errors=None):
+        self.pr_pages = pr_pages
+        self.nested_pages = nested_pages or {}
+        self.status = status
+        self.errors = errors
+        self.queries = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stand_in.queries.append(body)
+                response = stand_in.respond(body)
+                self.send_response(stand_in.status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps(response).encode())
+
+            def log_message(self, *args):
+                return
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.domain = f"http://127.0.0.1:{self.server.server_port}"
+
+    def respond(self, body):
+        if self.errors:
+            return {"errors": self.errors}
+
+        variables = body["variables"]
+        if "node(id:" in body["query"]:
+            return {"data": {"node": self.nested_pages[variables["nestedCursor"]]}}
+
+        page = int(variables["cursor"] or 0)
+        has_next_page = page + 1 < len(self.pr_pages)
+        return {
+            "data": {
+                "repository": {
+                    "pullRequests": {
+                        "pageInfo": {
+                            "hasNextPage": has_next_page,
+                            "endCursor": str(page + 1) if has_next_page else None,
+                        },
+                        "nodes": self.pr_pages[page],
+                    }
+                }
+            }
+        }
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+BOOKMARK = datetime(2024, 1, 5, tzinfo=pytz.UTC)
+
+
+def test_get_pull_requests_updated_after_pages_until_bookmark():
+    pr_pages = [
+        [
+            _get_pr_node(3, "2024-01-09T00:00:00Z"),
+            _get_pr_node(2, "2024-01-08T00:00:00Z"),
+        ],
+        [
+            _get_pr_node(1, "2024-01-07T00:00:00Z"),
+            _get_pr_node(0, "2024-01-04T00:00:00Z"),
+        ],
+        [_get_pr_node(-1, "2024-01-03T00:00:00Z")],
+    ]
+    with GithubGraphQLStandIn(pr_pages) as stand_in:
+        service = GithubGraphQLApiService("token", stand_in.domain, pr_page_size=2)
+        prs_bulk_data = service.get_pull_requests_updated_after("org", "repo", BOOKMARK)
+
+    assert [d.pr["number"] for d in prs_bulk_data] == [3, 2, 1]
+    assert len(stand_in.queries) == 2
+    assert stand_in.queries[0]["variables"]["owner"] == "org"
+    assert stand_in.queries[1]["variables"]["cursor"] == "1"
+
+
+def test_get_pull_requests_updated_after_adapts_to_rest_shape():
+    reviews = [
+        _get_review_node(11, "CHANGES_REQUESTED", "2024-01-02T10:00:00Z"),
+        _get_review_node(
+            12,
+            "APPROVED",
+            "2024-01-02T12:00:00Z",
+            author={"__typename": "Bot", "login": "dependabot"},
+        ),
+        _get_review_node(13, "PENDING", None),
+    ]
+    pr_node = _get_pr_node(1, "2024-01-07T00:00:00Z", [_get_commit_node("c1")], reviews)
+    pr_node["author"] = None
+    with GithubGraphQLStandIn([[pr_node]]) as stand_in:
+        service = GithubGraphQLApiService("token", stand_in.domain)
+        [pr_bulk_data] = service.get_pull_requests_updated_after(
+            "org", "repo", BOOKMARK
+        )
+
+    assert pr_bulk_data.pr["user"] == {"login": "ghost", "type": "User"}
+    assert pr_bulk_data.pr["state"] == "closed"
+    assert pr_bulk_data.pr["requested_reviewers"] == [{"login": "rev", "type": "User"}]
+    assert pr_bulk_data.pr["base"]["repo"]["full_name"] == "org/repo"
+    assert pr_bulk_data.pr["head"]["sha"] == "head1"
+    assert pr_bulk_data.pr["comments"] == 1
+    assert pr_bulk_data.pr["review_comments"] == 6
+
+    events = pr_bulk_data.timeline_events
+    assert [e.type for e in events] == [
+        PullRequestEventType.REVIEW,
+        PullRequestEventType.REVIEW,
+        PullRequestEventType.READY_FOR_REVIEW,
+    ]
+    assert [e.id for e in events] == ["11", "12", "RFRE_1"]
+    assert events[0].raw_data["state"] == "changes_requested"
+    assert events[1].user == "dependabot[bot]"
+    assert events[1].raw_data["user"]["type"] == "Bot"
+
+    [commit] = pr_bulk_data.commits
+    assert commit["sha"] == "c1"
+    assert commit["author"] == {"login": "author"}
+    assert commit["commit"]["committer"]["date"] == "2024-01-01T03:30:00Z"
+
+
+def test_get_pull_requests_updated_after_fetches_remaining_nested_pages():
+    pr_node = _get_pr_node(1, "2024-01-07T00:00:00Z", [_get_commit_node("c1")])
+    pr_node["commits"]["totalCount"] = 2
+    pr_node["commits"]["pageInfo"] = {"hasNextPage": True, "endCursor": "c-1"}
+    nested_pages = {
+        "c-1": {
+            "commits": {
+                "totalCount": 2,
+                "pageInfo": {"hasNextPage": False, "endCursor": None},
+                "nodes": [_get_commit_node("c2")],
+            }
+        }
+    }
+    with GithubGraphQLStandIn([[pr_node]], nested_pages) as stand_in:
+        service = GithubGraphQLApiService("token", stand_in.domain)
+        [pr_bulk_data] = service.get_pull_requests_updated_after(
+            "org", "repo", BOOKMARK
+        )
+
+    assert [c["sha"] for c in pr_bulk_data.commits] == ["c1", "c2"]
+    assert stand_in.queries[1]["variables"]["id"] == "PR_1"
+
+
+def test_get_pull_requests_updated_after_raises_on_rate_limit():
+    with GithubGraphQLStandIn([[]], errors=[{"type": "RATE_LIMITED"}]) as stand_in:
+        service = GithubGraphQLApiService("token", stand_in.domain)
+        with pytest.raises(GithubRateLimitExceeded):
+            service.get_pull_requests_updated_after("org", "repo", BOOKMARK)
+
+
+def test_get_pull_requests_updated_after_raises_forbidden_apart_from_rate_limit():
+    errors = [{"message": "Resource protected by organization SAML enforcement"}]
+    with GithubGraphQLStandIn([[]], status=403, errors=errors) as stand_in:
+        service = GithubGraphQLApiService("token", stand_in.domain)
+        with pytest.raises(GithubException) as e:
+            service.get_pull_requests_updated_after("org", "repo", BOOKMARK)
+
+    assert e.value.status == 403
+
+
+def test_github_etl_handler_with_graphql_engine_builds_pr_models():
+    class CodeRepoService:
+        def get_repo_prs_by_numbers(self, *args):
+            return []
+
+    reviews = [
+        _get_review_node(11, "CHANGES_REQUESTED", "2024-01-02T10:00:00Z"),
+        _get_review_node(12, "APPROVED", "2024-01-02T12:00:00Z"),
+    ]
+    pr_pages = [
+        [_get_pr_node(1, "2024-01-07T00:00:00Z", [_get_commit_node("c1")], reviews)]
+    ]
+    pr_pages[0][0]["closedAt"] = pr_pages[0][0]["mergedAt"] = "2024-01-06T10:00:00Z"
+    org_repo = OrgRepo(id=uuid4_str(), org_name="org", name="repo")
+    with GithubGraphQLStandIn(pr_pages) as stand_in:
+        handler = GithubETLHandler(
+            uuid4_str(),
+            GithubApiService("token", stand_in.domain),
+            CodeRepoService(),
+            CodeETLAnalyticsService(),
+            None,
+            GithubGraphQLApiService("token", stand_in.domain),
+        )
+        prs, commits, events = handler.get_repo_pull_requests_data(org_repo, BOOKMARK)
+
+    [pr] = prs
+    assert pr.number == "1"
+    assert pr.state == PullRequestState.MERGED
+    assert pr.merge_commit_sha == "merge1"
+    assert pr.requested_reviews == ["rev"]
+    assert pr.meta["code_stats"]["comments"] == 2
+    assert pr.first_response_time == 23 * 60 * 60
+    assert pr.rework_time == 2 * 60 * 60
+    assert [c.hash for c in commits] == ["c1"]
+    assert len(events) == 3
+    assert pr.sync_fingerprint == GithubETLHandler._get_pr_sync_fingerprint(
+        handler._api.get_pull_request_from_raw_data(pr.data)
+    )
@@ -0,0 +1,285 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from github.GithubException import GithubException
+
+from mhq.exapi.github import PAGE_SIZE, GithubApiService, GithubRateLimitExceeded
+from mhq.utils.http_cache import DiskResponseCacheStore, ResponseCache
+from mhq.utils.http_session import ConditionalRequestSession
+
+
+def _get_commented_event(pr_number: int, index: int):
+    return {
+        "event": "commented",
+        "id": pr_number * 1000 + index,
+        "user": {"login": "reviewer", "type": "User"},
+        "created_at": "2024-01-02T10:00:00Z",
+    }
+
+
+class GithubTimelineStandIn:
+    """
+    Local stand-in for the GitHub issue timeline endpoint.
+    Serves `pr_events_count[pr_number]` events per PR in pages of PAGE_SIZE and records
+    the peak number of requests in flight.
+    """
+
+    def __init__(
+        self,
+        pr_events_count,
+        link_headers=True,
+        status=200,
+        latency_seconds=0.02,
+        etags=False,
+        rate_limited_requests=0,
+        server_errors=0,
+        error_headers=None,
+    ):
+        self.pr_events_count = pr_events_count
+        self.link_headers = link_headers
+        self.etags = etags
+        self.rate_limited_requests = rate_limited_requests
+        self.server_errors = server_errors
+        self.error_headers = error_headers or {}
+        self.not_modified_responses = 0
+        self.status = status
+        self.latency_seconds = latency_seconds
+        self.requests = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stand_in._lock:
+                    stand_in.in_flight += 1
+                    stand_in.peak_in_flight = max(
+                        stand_in.peak_in_flight, stand_in.in_flight
+                    )
+                time.sleep(stand_in.latency_seconds)
+                status, headers, body = stand_in.respond(self.path, self.headers)
+                with stand_in._lock:
+                    stand_in.in_flight -= 1
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if status != 304:
+                    self.wfile.write(json.dumps(body).encode())
+
+            def log_message(self, *args):
+                return
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.domain = f"http://127.0.0.1:{self.server.server_port}"
+
+    def respond(self, path, request_headers):
+        url = urlparse(path)
+        pr_number = int(url.path.split("/")[-2])
+        page = int(parse_qs(url.query)["page"][0])
+        with self._lock:
+            self.requests.append((pr_number, page))
+
+        if self.status != 200:
+            return self.status, self.error_headers, {"message": "error"}
+
+        with self._lock:
+            if self.server_errors:
+                self.server_errors -= 1
+                return 502, {}, {"message": "Server Error"}
+            if self.rate_limited_requests:
+                self.rate_limited_requests -= 1
+                return 403, {"Retry-After": "0"}, {"message": "secondary rate limit"}
+
+        events_count = self.pr_events_count[pr_number]
+        events = [
+            _get_commented_event(pr_number, index)
+            for index in range(
+                (page - 1) * PAGE_SIZE, min(page * PAGE_SIZE, events_count)
+            )
+        ]
+        last_page = max(1, -(-events_count // PAGE_SIZE))
+        headers = {}
+        if self.link_headers and last_page > 1:
+            base_url = f"{self.domain}{url.path}?per_page={PAGE_SIZE}"
+            headers["Link"] = (
+                f'<{base_url}&page={min(page + 1, last_page)}>; rel="next", '
+                f'<{base_url}&page={last_page}>; rel="last"'
+            )
+        if self.etags:
+            headers["ETag"] = f'"{pr_number}-{page}-{events_count}"'
+            if request_headers.get("If-None-Match") == headers["ETag"]:
+                with self._lock:
+                    self.not_modified_responses += 1
+                return 304, headers, None
+        return 200, headers, events
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_get_prs_timeline_events_fetches_all_pages_in_input_order():
+    pr_events_count = {1: 250, 2: 3, 3: 0, 4: PAGE_SIZE}
+    with GithubTimelineStandIn(pr_events_count) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        prs_timeline_events = service.get_prs_timeline_events(
+            [("org/repo", number) for number in pr_events_count]
+        )
+
+    assert [len(events) for events in prs_timeline_events] == [250, 3, 0, PAGE_SIZE]
+    assert [event.id for event in prs_timeline_events[0]] == [
+        str(1000 + index) for index in range(250)
+    ]
+    # A full single page has no `Link` header, so like the serial fetch it checks one more page
+    assert sorted(stand_in.requests) == [
+        (1, 1),
+        (1, 2),
+        (1, 3),
+        (2, 1),
+        (3, 1),
+        (4, 1),
+        (4, 2),
+    ]
+
+
+def test_get_prs_timeline_events_pages_sequentially_without_link_headers():
+    with GithubTimelineStandIn({1: 2 * PAGE_SIZE}, link_headers=False) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        [timeline_events] = service.get_prs_timeline_events([("org/repo", 1)])
+
+    assert len(timeline_events) == 2 * PAGE_SIZE
+    assert stand_in.requests == [(1, 1), (1, 2), (1, 3)]
+
+
+def test_get_prs_timeline_events_respects_max_concurrency():
+    pr_events_count = {number: 3 * PAGE_SIZE for number in range(1, 7)}
+    with GithubTimelineStandIn(pr_events_count) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        prs_timeline_events = service.get_prs_timeline_events(
+            [("org/repo", number) for number in pr_events_count], max_concurrency=4
+        )
+
+    assert all(len(events) == 3 * PAGE_SIZE for events in prs_timeline_events)
+    assert 1 < stand_in.peak_in_flight <= 4
+
+
+def test_get_prs_timeline_events_matches_serial_fetch():
+    with GithubTimelineStandIn({1: 150}) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        [timeline_events] = service.get_prs_timeline_events([("org/repo", 1)])
+        serial_timeline_events = service.get_pr_timeline_events("org/repo", 1)
+
+    assert [(e.id, e.type, e.user, e.timestamp) for e in timeline_events] == [
+        (e.id, e.type, e.user, e.timestamp) for e in serial_timeline_events
+    ]
+
+
+def test_get_prs_timeline_events_raises_on_rate_limit():
+    # The quota resets in more than the rate limiter is allowed to wait
+    error_headers = {
+        "X-RateLimit-Remaining": "0",
+        "X-RateLimit-Reset": str(int(time.time()) + 2 * 60 * 60),
+    }
+    with GithubTimelineStandIn(
+        {1: 1}, status=403, error_headers=error_headers
+    ) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        with pytest.raises(GithubRateLimitExceeded):
+            service.get_prs_timeline_events([("org/repo", 1)])
+
+
+def test_get_prs_timeline_events_raises_forbidden_apart_from_rate_limit():
+    with GithubTimelineStandIn({1: 1}, status=403) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        with pytest.raises(GithubException) as e:
+            service.get_prs_timeline_events([("org/repo", 1)])
+        with pytest.raises(GithubException):
+            service.get_pr_timeline_events("org/repo", 1)
+
+    assert e.value.status == 403
+
+
+def test_get_prs_timeline_events_raises_on_missing_pr():
+    with GithubTimelineStandIn({1: 1}, status=404) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        with pytest.raises(GithubException):
+            service.get_prs_timeline_events([("org/repo", 1)])
+
+
+def test_get_prs_timeline_events_revalidates_cached_pages(tmp_path):
+    response_cache = ResponseCache(DiskResponseCacheStore(str(tmp_path)))
+    with GithubTimelineStandIn({1: 150, 2: 3}, etags=True) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        service._session = ConditionalRequestSession(response_cache, "scope")
+        first_timeline_events = service.get_prs_timeline_events(
+            [("org/repo", 1), ("org/repo", 2)]
+        )
+        stand_in.pr_events_count[2] = 4
+        second_timeline_events = service.get_prs_timeline_events(
+            [("org/repo", 1), ("org/repo", 2)]
+        )
+        serial_timeline_events = service.get_pr_timeline_events("org/repo", 1)
+
+    assert [len(events) for events in first_timeline_events] == [150, 3]
+    assert [len(events) for events in second_timeline_events] == [150, 4]
+    assert [e.id for e in second_timeline_events[0]] == [
+        e.id for e in first_timeline_events[0]
+    ]
+    assert len(serial_timeline_events) == 150
+    assert stand_in.not_modified_responses == 4
+    assert response_cache.get_stats() == {"hits": 4, "misses": 4}
+
+
+def test_get_prs_timeline_events_retries_rate_limited_pages():
+    with GithubTimelineStandIn({1: 250, 2: 3}, rate_limited_requests=2) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        prs_timeline_events = service.get_prs_timeline_events(
+            [("org/repo", 1), ("org/repo", 2)]
+        )
+
+    assert [len(events) for events in prs_timeline_events] == [250, 3]
+    assert len(stand_in.requests) == 4 + 2
+
+
+def test_get_prs_timeline_events_retries_server_errors():
+    with GithubTimelineStandIn({1: 3, 2: 3}, server_errors=2) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        prs_timeline_events = service.get_prs_timeline_events(
+            [("org/repo", 1), ("org/repo", 2)]
+        )
+
+    assert [len(events) for events in prs_timeline_events] == [3, 3]
+    assert len(stand_in.requests) == 2 + 2
+
+
+def test_get_prs_timeline_events_reads_and_writes_cache_off_the_event_loop(tmp_path):
+    cache_threads = []
+
+    class RecordingStore(DiskResponseCacheStore):
+        def get(self, key):
+            cache_threads.append(threading.current_thread().name)
+            return super().get(key)
+
+        def set(self, key, value, ttl_seconds):
+            cache_threads.append(threading.current_thread().name)
+            super().set(key, value, ttl_seconds)
+
+    response_cache = ResponseCache(RecordingStore(str(tmp_path)))
+    with GithubTimelineStandIn({1: 3, 2: 3}, etags=True) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        service._session = ConditionalRequestSession(response_cache, "scope")
+        service.get_prs_timeline_events([("org/repo", 1), ("org/repo", 2)])
+
+    assert len(cache_threads) == 4
+    assert "exapi-async-http" not in cache_threads
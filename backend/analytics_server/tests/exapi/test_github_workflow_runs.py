@@ -0,0 +1,111 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytz
+
+from mhq.exapi.github import PAGE_SIZE, GithubApiService
+from mhq.utils.time import ISO_8601_DATE_FORMAT
+
+NEWEST_RUN_AT = datetime(2024, 6, 1, tzinfo=pytz.UTC)
+
+
+class GithubWorkflowRunsStandIn:
+    """
+    Local stand-in for the GitHub workflow runs endpoints. Serves `runs_count` runs, one
+    an hour, newest first. Applies the `created` filter unless `filter_created` is False.
+    """
+
+    def __init__(self, runs_count, filter_created=True):
+        self.runs = [
+            {
+                "id": run_id,
+                "status": "completed",
+                "created_at": (NEWEST_RUN_AT - timedelta(hours=run_id)).strftime(
+                    ISO_8601_DATE_FORMAT
+                ),
+            }
+            for run_id in range(runs_count)
+        ]
+        self.filter_created = filter_created
+        self.requests = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body = stand_in.respond(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps(body).encode())
+
+            def log_message(self, *args):
+                return
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.domain = f"http://127.0.0.1:{self.server.server_port}"
+
+    def respond(self, path):
+        url = urlparse(path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.requests.append((url.path, query))
+
+        if "/actions/runs/" in url.path:
+            run_id = int(url.path.rsplit("/", 1)[-1])
+            if run_id >= len(self.runs):
+                return 404, {"message": "Not Found"}
+            return 200, self.runs[run_id]
+
+        runs = self.runs
+        if self.filter_created:
+            created_after = datetime.fromisoformat(query["created"].removeprefix(">="))
+            runs = [
+                run
+                for run in runs
+                if datetime.strptime(run["created_at"], ISO_8601_DATE_FORMAT).replace(
+                    tzinfo=pytz.UTC
+                )
+                >= created_after
+            ]
+        page, per_page = int(query["page"]), int(query["per_page"])
+        start = (page - 1) * per_page
+        return 200, {"total_count": len(runs), "workflow_runs": runs[start:][:per_page]}
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_get_workflow_runs_filters_by_created_date_on_the_server():
+    bookmark = NEWEST_RUN_AT - timedelta(hours=PAGE_SIZE + 49)
+    with GithubWorkflowRunsStandIn(runs_count=1000) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        workflow_runs = service.get_workflow_runs("org", "repo", "1", bookmark)
+
+    assert len(workflow_runs) == PAGE_SIZE + 50
+    assert [query["page"] for _, query in stand_in.requests] == ["1", "2"]
+    assert stand_in.requests[0][1]["created"] == f">={bookmark.isoformat()}"
+
+
+def test_get_workflow_runs_stops_paging_at_the_bookmark():
+    bookmark = NEWEST_RUN_AT - timedelta(hours=PAGE_SIZE + 49)
+    with GithubWorkflowRunsStandIn(runs_count=1000, filter_created=False) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+        workflow_runs = service.get_workflow_runs("org", "repo", "1", bookmark)
+
+    assert [run["id"] for run in workflow_runs] == list(range(PAGE_SIZE + 50))
+    assert len(stand_in.requests) == 2
+
+
+def test_get_workflow_run_returns_none_for_missing_run():
+    with GithubWorkflowRunsStandIn(runs_count=3) as stand_in:
+        service = GithubApiService("token", stand_in.domain)
+
+        assert service.get_workflow_run("org", "repo", "2")["id"] == 2
+        assert service.get_workflow_run("org", "repo", "5") is None
@@ -0,0 +1,203 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from requests.exceptions import HTTPError
+
+from mhq.exapi.gitlab import GitlabApiService
+from mhq.utils.diffparser import DiffStats
+
+PROJECT_ID = "42"
+
+
+class GitlabMergeRequestStandIn:
+    """
+    Local stand-in for the GitLab merge request notes, commits and diffs endpoints.
+    Diffs are served one file per page over `diff_pages` pages.
+    Records every request and the peak number of requests in flight.
+    """
+
+    def __init__(
+        self, status=200, latency_seconds=0.02, diff_pages=1, rate_limited_requests=0
+    ):
+        self.status = status
+        self.rate_limited_requests = rate_limited_requests
+        self.latency_seconds = latency_seconds
+        self.diff_pages = diff_pages
+        self.requests = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stand_in._lock:
+                    stand_in.in_flight += 1
+                    stand_in.peak_in_flight = max(
+                        stand_in.peak_in_flight, stand_in.in_flight
+                    )
+                time.sleep(stand_in.latency_seconds)
+                status, body, headers = stand_in.respond(self.path)
+                with stand_in._lock:
+                    stand_in.in_flight -= 1
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(json.dumps(body).encode())
+
+            def log_message(self, *args):
+                return
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.domain = f"http://127.0.0.1:{self.server.server_port}"
+
+    def respond(self, path):
+        parsed_url = urlparse(path)
+        *_, iid, endpoint = parsed_url.path.split("/")
+        page = int(parse_qs(parsed_url.query).get("page", ["1"])[0])
+        with self._lock:
+            self.requests.append((int(iid), endpoint))
+
+        if self.status != 200:
+            return self.status, {"message": "404 Not found"}, {}
+        with self._lock:
+            if self.rate_limited_requests:
+                self.rate_limited_requests -= 1
+                return (
+                    429,
+                    {"message": "Retry later"},
+                    {"Retry-After": "0", "RateLimit-Remaining": "0"},
+                )
+        if endpoint == "notes":
+            return (
+                200,
+                [
+                    {
+                        "id": int(iid) * 10,
+                        "body": "looks good",
+                        "system": False,
+                        "author": {"username": "reviewer"},
+                        "created_at": "2024-01-02T10:00:00Z",
+                    }
+                ],
+                {},
+            )
+        if endpoint == "commits":
+            return (
+                200,
+                [
+                    {
+                        "id": f"sha-{iid}",
+                        "message": "fix",
+                        "created_at": "2024-01-01T10:00:00Z",
+                    }
+                ],
+                {},
+            )
+        next_page = str(page + 1) if page < self.diff_pages else ""
+        return (
+            200,
+            [{"diff": "@@ -1,2 +1,3 @@\n-a\n+b\n+c\n", "new_path": f"file{page}.py"}],
+            {"X-Next-Page": next_page},
+        )
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_get_merge_requests_details_returns_details_in_input_order():
+    with GitlabMergeRequestStandIn() as stand_in:
+        api = GitlabApiService("token", stand_in.domain)
+        details = api.get_merge_requests_details(
+            PROJECT_ID, [("3", True), ("1", False), ("2", True)]
+        )
+
+    assert [d.notes[0].idempotency_key for d in details] == ["30", "10", "20"]
+    assert [[c.hash for c in d.commits] for d in details] == [
+        ["sha-3"],
+        [],
+        ["sha-2"],
+    ]
+    assert [d.diff_stats for d in details] == [
+        DiffStats(additions=2, deletions=1, changed_files=1),
+        None,
+        DiffStats(additions=2, deletions=1, changed_files=1),
+    ]
+
+
+def test_get_merge_requests_details_fetches_changes_only_when_asked():
+    with GitlabMergeRequestStandIn() as stand_in:
+        api = GitlabApiService("token", stand_in.domain)
+        api.get_merge_requests_details(PROJECT_ID, [("1", False), ("2", True)])
+
+    assert sorted(stand_in.requests) == [
+        (1, "notes"),
+        (2, "commits"),
+        (2, "diffs"),
+        (2, "notes"),
+    ]
+
+
+def test_get_merge_requests_details_bounds_requests_in_flight():
+    merge_requests = [(str(iid), True) for iid in range(1, 11)]
+    with GitlabMergeRequestStandIn(latency_seconds=0.05) as stand_in:
+        api = GitlabApiService("token", stand_in.domain)
+        api.get_merge_requests_details(PROJECT_ID, merge_requests, max_concurrency=4)
+
+    assert len(stand_in.requests) == 30
+    assert 1 < stand_in.peak_in_flight <= 4
+
+
+def test_get_merge_requests_details_raises_on_error_response():
+    with GitlabMergeRequestStandIn(status=404) as stand_in:
+        api = GitlabApiService("token", stand_in.domain)
+        with pytest.raises(HTTPError, match="404"):
+            api.get_merge_requests_details(PROJECT_ID, [("1", True)])
+
+
+def test_get_merge_requests_details_retries_rate_limited_requests():
+    with GitlabMergeRequestStandIn(rate_limited_requests=2) as stand_in:
+        api = GitlabApiService("token", stand_in.domain)
+        details = api.get_merge_requests_details(PROJECT_ID, [("1", True)])
+
+    assert len(details[0].notes) == 1
+    assert len(details[0].commits) == 1
+    assert len(stand_in.requests) == 3 + 2
+
+
+def test_get_merge_requests_details_of_no_merge_requests_makes_no_requests():
+    assert (
+        GitlabApiService("token", "http://127.0.0.1:1").get_merge_requests_details(
+            PROJECT_ID, []
+        )
+        == []
+    )
+
+
+def test_get_merge_requests_details_counts_diff_stats_over_all_pages():
+    with GitlabMergeRequestStandIn(diff_pages=3) as stand_in:
+        api = GitlabApiService("token", stand_in.domain)
+        details = api.get_merge_requests_details(PROJECT_ID, [("1", True)])
+
+    assert details[0].diff_stats == DiffStats(additions=6, deletions=3, changed_files=3)
+    assert stand_in.requests.count((1, "diffs")) == 3
+
+
+def test_get_merge_request_diff_stats_counts_over_all_pages():
+    with GitlabMergeRequestStandIn(diff_pages=2) as stand_in:
+        api = GitlabApiService("token", stand_in.domain)
+        diff_stats = api.get_merge_request_diff_stats(PROJECT_ID, "1")
+
+    assert diff_stats == DiffStats(additions=4, deletions=2, changed_files=2)
+    assert stand_in.requests == [(1, "diffs"), (1, "diffs")]
@@ -0,0 +1,132 @@
+from datetime import timedelta
+
+import requests
+
+from mhq.exapi.github import GithubApiService
+from mhq.exapi.gitlab import GitlabApiService
+from mhq.exapi.models.gitlab import GitlabNoteType
+from mhq.store.models.code.enums import PullRequestEventType
+from mhq.utils.diffparser import DiffStats
+from mhq.utils.time import time_now
+from tests.factories.provider_server import (
+    STATS_PATH,
+    SyntheticProviderServer,
+    SyntheticRateLimit,
+    SyntheticVolumes,
+)
+
+
+def test_github_api_service_reads_synthetic_volumes():
+    volumes = SyntheticVolumes(
+        repos=1,
+        prs_per_repo=120,
+        reviews_per_pr=2,
+        comments_per_pr=1,
+        commits_per_pr=3,
+        workflow_runs_per_repo=10,
+    )
+    with SyntheticProviderServer(volumes) as server:
+        api = GithubApiService("token", server.url)
+        github_repo = api.get_repo("mhq-bench", "repo-0")
+        github_pull_requests = api.get_pull_requests(github_repo)
+
+        assert api.check_pat()
+        assert github_repo.id == 1000
+        assert github_pull_requests.totalCount == 120
+
+        prs = api.get_pull_requests_page(github_pull_requests, 0)
+        assert [pr.number for pr in prs] == list(range(120, 20, -1))
+        assert prs[0].updated_at > prs[1].updated_at
+
+        merged_pr = next(pr for pr in prs if pr.merged_at)
+        assert merged_pr.additions == 8
+        assert len(api.get_pr_commits(merged_pr)) == 3
+
+        [timeline_events] = api.get_prs_timeline_events(
+            [(merged_pr.base.repo.full_name, merged_pr.number)], 1
+        )
+        assert [event.type for event in timeline_events] == [
+            PullRequestEventType.COMMENTED,
+            PullRequestEventType.REVIEW,
+            PullRequestEventType.REVIEW,
+            PullRequestEventType.MERGED,
+        ]
+        assert timeline_events[2].data["state"] == "approved"
+
+        assert len(api.get_contributors("mhq-bench", "repo-0")) == 5
+        assert (
+            len(
+                api.get_workflow_runs(
+                    "mhq-bench", "repo-0", "3000", time_now() - timedelta(days=3)
+                )
+            )
+            == 4
+        )
+
+        stats = server.get_stats()
+        assert stats["requests_by_endpoint"]["/api/v3/repos/{owner}/{repo}/pulls"] == 2
+        assert (
+            stats["requests_by_endpoint"]["/api/v3/repos/{owner}/{repo}/pulls/{id}"]
+            == 1
+        )
+
+
+def test_gitlab_api_service_reads_synthetic_volumes():
+    volumes = SyntheticVolumes(
+        repos=1, prs_per_repo=45, reviews_per_pr=2, comments_per_pr=1, files_per_pr=30
+    )
+    with SyntheticProviderServer(volumes) as server:
+        api = GitlabApiService("token", server.url)
+        project = api.get_project(2000)
+        merge_requests = api.get_project_merge_requests(
+            project.idempotency_key, time_now() - timedelta(days=30)
+        )
+        [details] = api.get_merge_requests_details(2000, [("3", True)])
+
+        assert project.org_name == "mhq-bench"
+        assert len(merge_requests) == 45
+        assert [note.state for note in details.notes] == [
+            GitlabNoteType.COMMENTED,
+            GitlabNoteType.CHANGES_REQUESTED,
+            GitlabNoteType.APPROVED,
+        ]
+        assert len(details.commits) == 3
+        assert details.diff_stats == DiffStats(
+            additions=60, deletions=30, changed_files=30
+        )
+        assert (
+            server.get_stats()["requests_by_endpoint"][
+                "/api/v4/projects/{project}/merge_requests/{id}/diffs"
+            ]
+            == 2
+        )
+
+
+def test_rate_limit_headers_and_exhausted_quota():
+    with SyntheticProviderServer(
+        SyntheticVolumes(repos=1, prs_per_repo=1), SyntheticRateLimit(limit=2)
+    ) as server:
+        user_url = f"{server.url}/api/v3/user"
+        first_response = requests.get(user_url)
+        conditional_response = requests.get(
+            user_url, headers={"If-None-Match": first_response.headers["ETag"]}
+        )
+        second_response = requests.get(user_url)
+        github_rate_limited_response = requests.get(user_url)
+        gitlab_rate_limited_response = requests.get(f"{server.url}/api/v4/user")
+
+        assert first_response.headers["X-RateLimit-Limit"] == "2"
+        assert first_response.headers["X-RateLimit-Remaining"] == "1"
+        assert conditional_response.status_code == 304
+        assert conditional_response.headers["X-RateLimit-Remaining"] == "1"
+        assert second_response.headers["X-RateLimit-Remaining"] == "0"
+        assert github_rate_limited_response.status_code == 403
+        assert "rate limit" in github_rate_limited_response.json()["message"]
+        assert int(github_rate_limited_response.headers["X-RateLimit-Reset"]) > 0
+        assert gitlab_rate_limited_response.status_code == 429
+        assert gitlab_rate_limited_response.headers["RateLimit-Remaining"] == "0"
+        assert int(gitlab_rate_limited_response.headers["Retry-After"]) > 0
+
+        stats = requests.get(f"{server.url}{STATS_PATH}").json()
+        assert stats["requests"] == 5
+        assert stats["requests_by_status"] == {"200": 2, "304": 1, "403": 1, "429": 1}
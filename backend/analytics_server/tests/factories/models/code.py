@@ -46,8 +46,12 @@ def get_pull_request(
     merge_to_deploy=None,
     url=None,
     merge_commit_sha=None,
+    rework_cycles=None,
+    sync_fingerprint=None,
+    reverted_pr_number=None,
+    reverted_merge_commit_sha=None,
 ):
-    return PullRequest(
+    pull_request = PullRequest(
         id=id or uuid4(),
         repo_id=repo_id or uuid4(),
         number=number or randint(10, 100),
@@ -74,7 +78,14 @@ def get_pull_request(
         meta=meta or {},
         url=url,
         merge_commit_sha=merge_commit_sha,
+        reverted_pr_number=reverted_pr_number,
+        reverted_merge_commit_sha=reverted_merge_commit_sha,
     )
+    if rework_cycles is not None:
+        pull_request.rework_cycles = rework_cycles
+    if sync_fingerprint is not None:
+        pull_request.sync_fingerprint = sync_fingerprint
+    return pull_request
 
 
 def get_pull_request_event(
@@ -56,7 +56,8 @@ def get_github_pull_request_review(
     return GithubPullRequestReview(review_id, submitted_at, user_login)
 
 
-Branch = namedtuple("Branch", ["ref"])
+Branch = namedtuple("Branch", ["ref", "sha", "repo"], defaults=[None, None])
+Repo = namedtuple("Repo", ["full_name"])
 User = namedtuple("User", ["login"])
 
 
@@ -77,6 +78,9 @@ class GithubPullRequest:
     deletions: int
     changed_files: int
     merge_commit_sha: str
+    state: str = "open"
+    comments: int = 0
+    review_comments: int = 0
 
     @property
     def raw_data(self):
@@ -109,6 +113,7 @@ def get_github_pull_request(
     created_at: datetime = time_now(),
     updated_at: datetime = time_now(),
     base_ref: str = "main",
+    base_repo_full_name: str = "org/repo",
     head_ref: str = "feature",
     user_login: str = "abc",
     commits: int = 1,
@@ -116,6 +121,10 @@ def get_github_pull_request(
     deletions: int = 1,
     changed_files: int = 1,
     merge_commit_sha: str = "123456",
+    head_sha: str = "abcdef",
+    state: str = None,
+    comments: int = 0,
+    review_comments: int = 0,
 ) -> GithubPullRequest:
     return GithubPullRequest(
         number,
@@ -125,14 +134,17 @@ def get_github_pull_request(
         html_url,
         created_at,
         updated_at,
-        Branch(base_ref),
-        Branch(head_ref),
+        Branch(base_ref, repo=Repo(base_repo_full_name)),
+        Branch(head_ref, head_sha),
         User(user_login),
         commits,
         additions,
         deletions,
         changed_files,
         merge_commit_sha,
+        state or ("closed" if merged_at or closed_at else "open"),
+        comments,
+        review_comments,
     )
 
 
@@ -0,0 +1,1051 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from mhq.utils.metrics import get_exapi_endpoint
+from mhq.utils.time import dt_from_iso_time_string, time_now
+
+GITHUB_API_PREFIX = "/api/v3"
+GITLAB_API_PREFIX = "/api/v4"
+STATS_PATH = "/_synthetic/stats"
+ORG_NAME = "mhq-bench"
+DEFAULT_BRANCH = "main"
+GITHUB_REPO_ID_OFFSET = 1000
+GITLAB_PROJECT_ID_OFFSET = 2000
+GITHUB_WORKFLOW_ID_OFFSET = 3000
+GITHUB_DEFAULT_PER_PAGE = 30
+GITLAB_DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+Response = Tuple[int, object, Dict[str, str]]
+
+
+@dataclass
+class SyntheticVolumes:
+    """
+    Size of the data the synthetic provider serves. Every repo has the same shape, so the
+    totals are the per repo volumes times `repos`.
+    """
+
+    repos: int = 2
+    prs_per_repo: int = 50
+    reviews_per_pr: int = 2
+    comments_per_pr: int = 1
+    commits_per_pr: int = 3
+    files_per_pr: int = 4
+    workflow_runs_per_repo: int = 20
+    contributors_per_repo: int = 5
+    days: int = 7
+
+    @property
+    def prs(self) -> int:
+        return self.repos * self.prs_per_repo
+
+
+@dataclass
+class SyntheticRateLimit:
+    """
+    Quota shared by every request to the server, refilled every `window_seconds`.
+    Responses served from an ETag match do not count against it, as on GitHub.
+    """
+
+    limit: int
+    window_seconds: int = 3600
+
+
+@dataclass
+class SyntheticRepo:
+    index: int
+    org_name: str
+    name: str
+    github_id: int
+    gitlab_id: int
+    github_workflow_id: int
+
+
+def _sha(*parts) -> str:
+    return hashlib.sha1(":".join(map(str, parts)).encode("utf-8")).hexdigest()
+
+
+def _user_id(login: str) -> int:
+    return int(_sha(login)[:8], 16)
+
+
+def _github_time(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _gitlab_time(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class SyntheticProviderData:
+    """
+    Deterministic GitHub and GitLab data for the configured volumes, built on request so
+    that large volumes cost no memory up front.
+
+    PR `k` of a repo is created `k` time slots into the last `days` days, and PRs are updated
+    in the order they were created. Every tenth PR is open, every tenth, offset by five, is
+    closed without merging and the rest are merged, the last review approving them.
+    """
+
+    def __init__(self, volumes: SyntheticVolumes, now: Optional[datetime] = None):
+        self.volumes = volumes
+        self.now = (now or time_now()).replace(microsecond=0)
+        self.start = self.now - timedelta(days=volumes.days)
+        self.pr_slot = timedelta(days=volumes.days) / (volumes.prs_per_repo + 1)
+        self.run_slot = timedelta(days=volumes.days) / (
+            volumes.workflow_runs_per_repo + 1
+        )
+        self.repos: List[SyntheticRepo] = [
+            SyntheticRepo(
+                index=index,
+                org_name=ORG_NAME,
+                name=f"repo-{index}",
+                github_id=GITHUB_REPO_ID_OFFSET + index,
+                gitlab_id=GITLAB_PROJECT_ID_OFFSET + index,
+                github_workflow_id=GITHUB_WORKFLOW_ID_OFFSET + index,
+            )
+            for index in range(volumes.repos)
+        ]
+
+    def get_repo(
+        self,
+        name: Optional[str] = None,
+        gitlab_id: Optional[int] = None,
+    ) -> Optional[SyntheticRepo]:
+        for repo in self.repos:
+            if repo.name == name or repo.gitlab_id == gitlab_id:
+                return repo
+        return None
+
+    def has_pr(self, number: int) -> bool:
+        return 1 <= number <= self.volumes.prs_per_repo
+
+    def get_user(self, repo: SyntheticRepo, offset: int) -> str:
+        return (
+            f"dev-{(repo.index + offset) % max(1, self.volumes.contributors_per_repo)}"
+        )
+
+    def get_pr_state(self, number: int) -> str:
+        if number % 10 == 0:
+            return "open"
+        if number % 10 == 5:
+            return "closed"
+        return "merged"
+
+    def get_pr_times(self, number: int) -> Dict[str, Optional[datetime]]:
+        created_at = self.start + self.pr_slot * number
+        state = self.get_pr_state(number)
+        closed_at = created_at + self.pr_slot * 0.45 if state != "open" else None
+        return {
+            "created_at": created_at,
+            "updated_at": created_at + self.pr_slot * 0.5,
+            "closed_at": closed_at,
+            "merged_at": closed_at if state == "merged" else None,
+        }
+
+    def get_review_time(self, number: int, review: int) -> datetime:
+        created_at = self.get_pr_times(number)["created_at"]
+        return created_at + self.pr_slot * (
+            0.1 + 0.3 * review / max(1, self.volumes.reviews_per_pr)
+        )
+
+    def get_comment_time(self, number: int, comment: int) -> datetime:
+        created_at = self.get_pr_times(number)["created_at"]
+        return created_at + self.pr_slot * (
+            0.05 + 0.3 * comment / max(1, self.volumes.comments_per_pr)
+        )
+
+    def get_commit_time(self, number: int, commit: int) -> datetime:
+        created_at = self.get_pr_times(number)["created_at"]
+        return created_at - timedelta(minutes=self.volumes.commits_per_pr - commit)
+
+    def get_review_state(self, number: int, review: int) -> str:
+        if review == self.volumes.reviews_per_pr - 1 and self.get_pr_state(number) in (
+            "merged",
+            "open",
+        ):
+            return "approved"
+        return "changes_requested" if review % 2 == 0 else "commented"
+
+    def get_event_id(self, repo: SyntheticRepo, number: int, offset: int) -> int:
+        return (repo.index + 1) * 10**9 + number * 10**4 + offset
+
+    def get_run_times(self, run: int) -> Dict[str, datetime]:
+        created_at = self.start + self.run_slot * run
+        return {
+            "created_at": created_at,
+            "run_started_at": created_at + timedelta(seconds=5),
+            "updated_at": created_at + timedelta(minutes=10),
+        }
+
+
+def _paginate(items: List, page: int, per_page: int) -> Tuple[List, int]:
+    last_page = max(1, (len(items) + per_page - 1) // per_page)
+    page_start = (page - 1) * per_page
+    page_end = page * per_page
+    return items[page_start:page_end], last_page
+
+
+class SyntheticGithubApi:
+    """
+    The GitHub REST endpoints the GitHub sync calls. Like GitHub, PR lists leave out the
+    code stats that only the single PR endpoint returns, so reading them costs a request
+    per PR.
+    """
+
+    def __init__(self, data: SyntheticProviderData, base_url: str):
+        self.data = data
+        self.base_url = base_url
+        self.routes: List[Tuple[re.Pattern, Callable[..., Response]]] = [
+            (re.compile(r"^/user$"), self.get_user),
+            (re.compile(r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)$"), self.get_repo),
+            (
+                re.compile(r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/contributors$"),
+                self.get_contributors,
+            ),
+            (
+                re.compile(r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls$"),
+                self.get_pulls,
+            ),
+            (
+                re.compile(
+                    r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls/(?P<number>\d+)$"
+                ),
+                self.get_pull,
+            ),
+            (
+                re.compile(
+                    r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/pulls/(?P<number>\d+)/commits$"
+                ),
+                self.get_pull_commits,
+            ),
+            (
+                re.compile(
+                    r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/issues/(?P<number>\d+)/timeline$"
+                ),
+                self.get_timeline,
+            ),
+            (
+                re.compile(
+                    r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/actions/workflows/(?P<workflow_id>\d+)/runs$"
+                ),
+                self.get_workflow_runs,
+            ),
+            (
+                re.compile(
+                    r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/actions/runs/(?P<run_id>\d+)$"
+                ),
+                self.get_workflow_run,
+            ),
+        ]
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}{GITHUB_API_PREFIX}{path}"
+
+    def _page(self, path: str, params: Dict[str, str], items: List) -> Response:
+        per_page = min(
+            int(params.get("per_page") or GITHUB_DEFAULT_PER_PAGE), MAX_PER_PAGE
+        )
+        page = max(1, int(params.get("page") or 1))
+        page_items, last_page = _paginate(items, page, per_page)
+
+        def _link(rel: str, link_page: int) -> str:
+            query = urlencode({**params, "page": link_page})
+            return f'<{self._url(path)}?{query}>; rel="{rel}"'
+
+        links = []
+        if page < last_page:
+            links += [_link("next", page + 1), _link("last", last_page)]
+        if page > 1:
+            links += [_link("first", 1), _link("prev", page - 1)]
+        return HTTPStatus.OK, page_items, {"Link": ", ".join(links)} if links else {}
+
+    def _not_found(self) -> Response:
+        return (
+            HTTPStatus.NOT_FOUND,
+            {
+                "message": "Not Found",
+                "documentation_url": "https://docs.github.com/rest",
+            },
+            {},
+        )
+
+    def _user(self, login: str) -> Dict:
+        return {"login": login, "id": _user_id(login), "type": "User"}
+
+    def get_user(self, params, **_) -> Response:
+        return HTTPStatus.OK, self._user(ORG_NAME), {}
+
+    def _repo(self, repo: SyntheticRepo) -> Dict:
+        full_name = f"{repo.org_name}/{repo.name}"
+        return {
+            "id": repo.github_id,
+            "name": repo.name,
+            "full_name": full_name,
+            "owner": self._user(repo.org_name),
+            "url": self._url(f"/repos/{full_name}"),
+            "html_url": f"https://github.com/{full_name}",
+            "default_branch": DEFAULT_BRANCH,
+            "language": "Python",
+            "pushed_at": _github_time(self.data.now),
+        }
+
+    def get_repo(self, params, repo: SyntheticRepo, **_) -> Response:
+        return HTTPStatus.OK, self._repo(repo), {}
+
+    def get_contributors(self, params, repo: SyntheticRepo, **_) -> Response:
+        contributors = []
+        for index in range(self.data.volumes.contributors_per_repo):
+            login = f"dev-{index}"
+            url = self._url(f"/users/{login}")
+            contributors.append(
+                {
+                    **self._user(login),
+                    "node_id": f"node-{login}",
+                    "avatar_url": "",
+                    "gravatar_id": "",
+                    "url": url,
+                    "html_url": f"https://github.com/{login}",
+                    "followers_url": f"{url}/followers",
+                    "following_url": f"{url}/following",
+                    "gists_url": f"{url}/gists",
+                    "starred_url": f"{url}/starred",
+                    "subscriptions_url": f"{url}/subscriptions",
+                    "organizations_url": f"{url}/orgs",
+                    "repos_url": f"{url}/repos",
+                    "events_url": f"{url}/events",
+                    "received_events_url": f"{url}/received_events",
+                    "site_admin": False,
+                    "contributions": 10 * (index + 1),
+                }
+            )
+        return self._page(
+            f"/repos/{repo.org_name}/{repo.name}/contributors", params, contributors
+        )
+
+    def _pull(self, repo: SyntheticRepo, number: int, with_stats: bool) -> Dict:
+        data = self.data
+        full_name = f"{repo.org_name}/{repo.name}"
+        times = data.get_pr_times(number)
+        state = data.get_pr_state(number)
+        repo_data = self._repo(repo)
+        pull = {
+            "id": data.get_event_id(repo, number, 0),
+            "number": number,
+            "url": self._url(f"/repos/{full_name}/pulls/{number}"),
+            "html_url": f"https://github.com/{full_name}/pull/{number}",
+            "title": f"Synthetic change {number}",
+            "user": self._user(data.get_user(repo, number)),
+            "state": "open" if state == "open" else "closed",
+            "created_at": _github_time(times["created_at"]),
+            "updated_at": _github_time(times["updated_at"]),
+            "closed_at": (
+                _github_time(times["closed_at"]) if times["closed_at"] else None
+            ),
+            "merged_at": (
+                _github_time(times["merged_at"]) if times["merged_at"] else None
+            ),
+            "merge_commit_sha": _sha(repo.index, number, "merge"),
+            "requested_reviewers": (
+                [self._user(data.get_user(repo, number + 1))] if state == "open" else []
+            ),
+            "head": {
+                "ref": f"feature/change-{number}",
+                "sha": _sha(repo.index, number, data.volumes.commits_per_pr - 1),
+                "repo": repo_data,
+            },
+            "base": {
+                "ref": DEFAULT_BRANCH,
+                "sha": _sha(repo.index, "base"),
+                "repo": repo_data,
+            },
+        }
+        if with_stats:
+            pull.update(
+                {
+                    "merged": state == "merged",
+                    "commits": data.volumes.commits_per_pr,
+                    "additions": 2 * data.volumes.files_per_pr,
+                    "deletions": data.volumes.files_per_pr,
+                    "changed_files": data.volumes.files_per_pr,
+                    "comments": data.volumes.comments_per_pr,
+                    "review_comments": 0,
+                }
+            )
+        return pull
+
+    def get_pulls(self, params, repo: SyntheticRepo, **_) -> Response:
+        numbers = range(1, self.data.volumes.prs_per_repo + 1)
+        if params.get("direction", "desc") == "desc":
+            numbers = reversed(numbers)
+        pulls = [self._pull(repo, number, with_stats=False) for number in numbers]
+        return self._page(f"/repos/{repo.org_name}/{repo.name}/pulls", params, pulls)
+
+    def get_pull(self, params, repo: SyntheticRepo, number: str, **_) -> Response:
+        if not self.data.has_pr(int(number)):
+            return self._not_found()
+        return HTTPStatus.OK, self._pull(repo, int(number), with_stats=True), {}
+
+    def _commit(self, repo: SyntheticRepo, number: int, commit: int) -> Dict:
+        sha = _sha(repo.index, number, commit)
+        author = self.data.get_user(repo, number)
+        committed_at = _github_time(self.data.get_commit_time(number, commit))
+        git_author = {
+            "name": author,
+            "email": f"{author}@example.com",
+            "date": committed_at,
+        }
+        return {
+            "sha": sha,
+            "html_url": f"https://github.com/{repo.org_name}/{repo.name}/commit/{sha}",
+            "commit": {
+                "message": f"Synthetic commit {commit} of change {number}",
+                "author": git_author,
+                "committer": git_author,
+            },
+            "author": self._user(author),
+        }
+
+    def get_pull_commits(
+        self, params, repo: SyntheticRepo, number: str, **_
+    ) -> Response:
+        if not self.data.has_pr(int(number)):
+            return self._not_found()
+        commits = [
+            self._commit(repo, int(number), commit)
+            for commit in range(self.data.volumes.commits_per_pr)
+        ]
+        return self._page(
+            f"/repos/{repo.org_name}/{repo.name}/pulls/{number}/commits",
+            params,
+            commits,
+        )
+
+    def get_timeline(self, params, repo: SyntheticRepo, number: str, **_) -> Response:
+        number = int(number)
+        if not self.data.has_pr(number):
+            return self._not_found()
+
+        data = self.data
+        events: List[Tuple[datetime, Dict]] = []
+        for commit in range(data.volumes.commits_per_pr):
+            commit_data = self._commit(repo, number, commit)
+            events.append(
+                (
+                    data.get_commit_time(number, commit),
+                    {
+                        "event": "committed",
+                        "sha": commit_data["sha"],
+                        "author": commit_data["commit"]["author"],
+                        "message": commit_data["commit"]["message"],
+                    },
+                )
+            )
+        for comment in range(data.volumes.comments_per_pr):
+            created_at = data.get_comment_time(number, comment)
+            events.append(
+                (
+                    created_at,
+                    {
+                        "event": "commented",
+                        "id": data.get_event_id(repo, number, 5000 + comment),
+                        "user": self._user(data.get_user(repo, number + 1 + comment)),
+                        "created_at": _github_time(created_at),
+                        "body": "Looks good overall",
+                    },
+                )
+            )
+        for review in range(data.volumes.reviews_per_pr):
+            submitted_at = data.get_review_time(number, review)
+            events.append(
+                (
+                    submitted_at,
+                    {
+                        "event": "reviewed",
+                        "id": data.get_event_id(repo, number, 1 + review),
+                        "user": self._user(data.get_user(repo, number + 1 + review)),
+                        "submitted_at": _github_time(submitted_at),
+                        "state": data.get_review_state(number, review),
+                    },
+                )
+            )
+
+        times = data.get_pr_times(number)
+        if times["closed_at"]:
+            event = "merged" if times["merged_at"] else "closed"
+            events.append(
+                (
+                    times["closed_at"],
+                    {
+                        "event": event,
+                        "id": data.get_event_id(repo, number, 9000),
+                        "actor": self._user(data.get_user(repo, number)),
+                        "created_at": _github_time(times["closed_at"]),
+                    },
+                )
+            )
+
+        return self._page(
+            f"/repos/{repo.org_name}/{repo.name}/issues/{number}/timeline",
+            params,
+            [event for _, event in sorted(events, key=lambda item: item[0])],
+        )
+
+    def _run(self, repo: SyntheticRepo, run: int) -> Dict:
+        run_id = repo.github_workflow_id * 10**6 + run
+        times = self.data.get_run_times(run)
+        return {
+            "id": run_id,
+            "actor": self._user(self.data.get_user(repo, run)),
+            "head_branch": DEFAULT_BRANCH,
+            "head_sha": _sha(repo.index, "run", run),
+            "status": "completed",
+            "conclusion": "failure" if run % 7 == 0 else "success",
+            "run_started_at": _github_time(times["run_started_at"]),
+            "created_at": _github_time(times["created_at"]),
+            "updated_at": _github_time(times["updated_at"]),
+            "html_url": f"https://github.com/{repo.org_name}/{repo.name}/actions/runs/{run_id}",
+        }
+
+    def get_workflow_runs(
+        self, params, repo: SyntheticRepo, workflow_id: str, **_
+    ) -> Response:
+        if int(workflow_id) != repo.github_workflow_id:
+            return self._not_found()
+
+        created_after: Optional[datetime] = None
+        if params.get("created", "").startswith(">="):
+            created_after = dt_from_iso_time_string(params["created"][2:])
+
+        runs = [
+            self._run(repo, run)
+            for run in reversed(range(1, self.data.volumes.workflow_runs_per_repo + 1))
+            if not created_after
+            or self.data.get_run_times(run)["created_at"] >= created_after
+        ]
+        status, page_runs, headers = self._page(
+            f"/repos/{repo.org_name}/{repo.name}/actions/workflows/{workflow_id}/runs",
+            params,
+            runs,
+        )
+        return status, {"total_count": len(runs), "workflow_runs": page_runs}, headers
+
+    def get_workflow_run(self, params, repo: SyntheticRepo, run_id: str, **_):
+        workflow_id, run = divmod(int(run_id), 10**6)
+        if (
+            workflow_id != repo.github_workflow_id
+            or not 1 <= run <= self.data.volumes.workflow_runs_per_repo
+        ):
+            return self._not_found()
+        return HTTPStatus.OK, self._run(repo, run), {}
+
+    def handle(self, path: str, params: Dict[str, str]) -> Response:
+        for pattern, handler in self.routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            kwargs = match.groupdict()
+            if "repo" in kwargs:
+                repo = self.data.get_repo(name=kwargs.pop("repo"))
+                if not repo or kwargs.pop("owner") != repo.org_name:
+                    return self._not_found()
+                kwargs["repo"] = repo
+            return handler(params, **kwargs)
+        return self._not_found()
+
+
+class SyntheticGitlabApi:
+    """
+    The GitLab v4 endpoints the GitLab sync calls. Lists are paginated with the `X-Page`
+    family of headers and default to 20 items per page, as on GitLab.
+    """
+
+    def __init__(self, data: SyntheticProviderData, base_url: str):
+        self.data = data
+        self.base_url = base_url
+        self.routes: List[Tuple[re.Pattern, Callable[..., Response]]] = [
+            (re.compile(r"^/user$"), self.get_user),
+            (re.compile(r"^/projects/(?P<project_id>\d+)$"), self.get_project),
+            (
+                re.compile(r"^/projects/(?P<project_id>\d+)/repository/contributors$"),
+                self.get_contributors,
+            ),
+            (
+                re.compile(r"^/projects/(?P<project_id>\d+)/merge_requests$"),
+                self.get_merge_requests,
+            ),
+            (
+                re.compile(
+                    r"^/projects/(?P<project_id>\d+)/merge_requests/(?P<iid>\d+)$"
+                ),
+                self.get_merge_request,
+            ),
+            (
+                re.compile(
+                    r"^/projects/(?P<project_id>\d+)/merge_requests/(?P<iid>\d+)/notes$"
+                ),
+                self.get_notes,
+            ),
+            (
+                re.compile(
+                    r"^/projects/(?P<project_id>\d+)/merge_requests/(?P<iid>\d+)/commits$"
+                ),
+                self.get_commits,
+            ),
+            (
+                re.compile(
+                    r"^/projects/(?P<project_id>\d+)/merge_requests/(?P<iid>\d+)/diffs$"
+                ),
+                self.get_diffs,
+            ),
+        ]
+
+    def _page(self, params: Dict[str, str], items: List) -> Response:
+        per_page = min(
+            int(params.get("per_page") or GITLAB_DEFAULT_PER_PAGE), MAX_PER_PAGE
+        )
+        page = max(1, int(params.get("page") or 1))
+        page_items, last_page = _paginate(items, page, per_page)
+        return (
+            HTTPStatus.OK,
+            page_items,
+            {
+                "X-Page": str(page),
+                "X-Per-Page": str(per_page),
+                "X-Next-Page": str(page + 1) if page < last_page else "",
+                "X-Prev-Page": str(page - 1) if page > 1 else "",
+                "X-Total": str(len(items)),
+                "X-Total-Pages": str(last_page),
+            },
+        )
+
+    def _not_found(self) -> Response:
+        return HTTPStatus.NOT_FOUND, {"message": "404 Not found"}, {}
+
+    def _user(self, username: str) -> Dict:
+        return {
+            "id": _user_id(username),
+            "username": username,
+            "name": username,
+            "avatar_url": "",
+        }
+
+    def get_user(self, params, **_) -> Response:
+        return HTTPStatus.OK, self._user(ORG_NAME), {}
+
+    def get_project(self, params, repo: SyntheticRepo, **_) -> Response:
+        return (
+            HTTPStatus.OK,
+            {
+                "id": repo.gitlab_id,
+                "name": repo.name,
+                "path": repo.name,
+                "namespace": {"full_path": repo.org_name},
+                "default_branch": DEFAULT_BRANCH,
+                "description": "Synthetic project",
+                "web_url": f"https://gitlab.com/{repo.org_name}/{repo.name}",
+                "last_activity_at": _gitlab_time(self.data.now),
+            },
+            {},
+        )
+
+    def get_contributors(self, params, repo: SyntheticRepo, **_) -> Response:
+        contributors = [
+            {
+                "name": f"dev-{index}",
+                "email": f"dev-{index}@example.com",
+                "commits": 10 * (index + 1),
+                "additions": 0,
+                "deletions": 0,
+            }
+            for index in range(self.data.volumes.contributors_per_repo)
+        ]
+        return self._page(params, contributors)
+
+    def _merge_request(
+        self, repo: SyntheticRepo, iid: int, with_changes: bool = False
+    ) -> Dict:
+        data = self.data
+        times = data.get_pr_times(iid)
+        state = data.get_pr_state(iid)
+        merge_request = {
+            "id": data.get_event_id(repo, iid, 0),
+            "iid": iid,
+            "project_id": repo.gitlab_id,
+            "title": f"Synthetic change {iid}",
+            "web_url": f"https://gitlab.com/{repo.org_name}/{repo.name}/-/merge_requests/{iid}",
+            "author": self._user(data.get_user(repo, iid)),
+            "state": "opened" if state == "open" else state,
+            "source_branch": f"feature/change-{iid}",
+            "target_branch": DEFAULT_BRANCH,
+            "created_at": _gitlab_time(times["created_at"]),
+            "updated_at": _gitlab_time(times["updated_at"]),
+            "closed_at": (
+                _gitlab_time(times["closed_at"])
+                if state == "closed" and times["closed_at"]
+                else None
+            ),
+            "merged_at": (
+                _gitlab_time(times["merged_at"]) if times["merged_at"] else None
+            ),
+            "merge_commit_sha": (
+                _sha(repo.index, iid, "merge") if state == "merged" else None
+            ),
+            "reviewers": [
+                self._user(data.get_user(repo, iid + 1 + review))
+                for review in range(data.volumes.reviews_per_pr)
+            ],
+            "merged_by": (
+                self._user(data.get_user(repo, iid + 1)) if state == "merged" else None
+            ),
+        }
+        if with_changes:
+            merge_request["changes_count"] = str(data.volumes.files_per_pr)
+        return merge_request
+
+    def get_merge_requests(self, params, repo: SyntheticRepo, **_) -> Response:
+        updated_after = dt_from_iso_time_string(params.get("updated_after"))
+        merge_requests = [
+            self._merge_request(repo, iid)
+            for iid in reversed(range(1, self.data.volumes.prs_per_repo + 1))
+            if not updated_after
+            or self.data.get_pr_times(iid)["updated_at"] > updated_after
+        ]
+        return self._page(params, merge_requests)
+
+    def get_merge_request(self, params, repo: SyntheticRepo, iid: str, **_):
+        if not self.data.has_pr(int(iid)):
+            return self._not_found()
+        return HTTPStatus.OK, self._merge_request(repo, int(iid), True), {}
+
+    def get_notes(self, params, repo: SyntheticRepo, iid: str, **_) -> Response:
+        iid = int(iid)
+        if not self.data.has_pr(iid):
+            return self._not_found()
+
+        data = self.data
+        notes: List[Tuple[datetime, Dict]] = []
+        for comment in range(data.volumes.comments_per_pr):
+            created_at = data.get_comment_time(iid, comment)
+            notes.append(
+                (
+                    created_at,
+                    {
+                        "id": data.get_event_id(repo, iid, 5000 + comment),
+                        "body": "Looks good overall",
+                        "author": self._user(data.get_user(repo, iid + 1 + comment)),
+                        "created_at": _gitlab_time(created_at),
+                        "system": False,
+                        "type": None,
+                    },
+                )
+            )
+        for review in range(data.volumes.reviews_per_pr):
+            created_at = data.get_review_time(iid, review)
+            state = data.get_review_state(iid, review)
+            notes.append(
+                (
+                    created_at,
+                    {
+                        "id": data.get_event_id(repo, iid, 1 + review),
+                        "body": (
+                            "approved this merge request"
+                            if state == "approved"
+                            else "Please rename this"
+                        ),
+                        "author": self._user(data.get_user(repo, iid + 1 + review)),
+                        "created_at": _gitlab_time(created_at),
+                        "system": state == "approved",
+                        "type": "DiffNote" if state == "changes_requested" else None,
+                    },
+                )
+            )
+        return self._page(
+            params, [note for _, note in sorted(notes, key=lambda item: item[0])]
+        )
+
+    def get_commits(self, params, repo: SyntheticRepo, iid: str, **_) -> Response:
+        iid = int(iid)
+        if not self.data.has_pr(iid):
+            return self._not_found()
+
+        author = self.data.get_user(repo, iid)
+        commits = []
+        for commit in range(self.data.volumes.commits_per_pr):
+            sha = _sha(repo.index, iid, commit)
+            commits.append(
+                {
+                    "id": sha,
+                    "short_id": sha[:8],
+                    "title": f"Synthetic commit {commit} of change {iid}",
+                    "message": f"Synthetic commit {commit} of change {iid}",
+                    "author_name": author,
+                    "author_email": f"{author}@example.com",
+                    "created_at": _gitlab_time(self.data.get_commit_time(iid, commit)),
+                    "web_url": f"https://gitlab.com/{repo.org_name}/{repo.name}/-/commit/{sha}",
+                }
+            )
+        return self._page(params, commits)
+
+    def get_diffs(self, params, repo: SyntheticRepo, iid: str, **_) -> Response:
+        if not self.data.has_pr(int(iid)):
+            return self._not_found()
+        diffs = [
+            {
+                "old_path": f"src/module_{index}.py",
+                "new_path": f"src/module_{index}.py",
+                "diff": f"@@ -1,1 +1,2 @@\n-old line {index}\n+new line {index}\n+added line {index}\n",
+                "new_file": False,
+                "renamed_file": False,
+                "deleted_file": False,
+            }
+            for index in range(self.data.volumes.files_per_pr)
+        ]
+        return self._page(params, diffs)
+
+    def handle(self, path: str, params: Dict[str, str]) -> Response:
+        for pattern, handler in self.routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            kwargs = match.groupdict()
+            if "project_id" in kwargs:
+                repo = self.data.get_repo(gitlab_id=int(kwargs.pop("project_id")))
+                if not repo:
+                    return self._not_found()
+                kwargs["repo"] = repo
+            return handler(params, **kwargs)
+        return self._not_found()
+
+
+class SyntheticProviderServer:
+    """
+    Local HTTP stand-in for GitHub and GitLab, serving synthetic repos, PRs, reviews and
+    workflow runs in the volumes asked for. Point a GitHub or GitLab integration at `url` as
+    its custom domain to sync from it.
+
+    The server counts the requests it serves per endpoint, to measure API calls per PR of a
+    sync. The counts are also served at `/_synthetic/stats`, for servers run in another
+    process. With a `rate_limit` it sends rate limit headers and rejects requests once the
+    quota is used up, with 403 on the GitHub API and 429 on the GitLab API.
+    """
+
+    def __init__(
+        self,
+        volumes: Optional[SyntheticVolumes] = None,
+        rate_limit: Optional[SyntheticRateLimit] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        now: Optional[datetime] = None,
+    ):
+        self.volumes = volumes or SyntheticVolumes()
+        self.rate_limit = rate_limit
+        self.data = SyntheticProviderData(self.volumes, now)
+        self._address = (host, port)
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._github_api: Optional[SyntheticGithubApi] = None
+        self._gitlab_api: Optional[SyntheticGitlabApi] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._request_counts: Counter = Counter()
+        self._status_counts: Counter = Counter()
+        self._remaining = rate_limit.limit if rate_limit else None
+        self._reset_at: Optional[int] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def repos(self) -> List[SyntheticRepo]:
+        return self.data.repos
+
+    def _bind(self):
+        self._server = ThreadingHTTPServer(self._address, self._get_handler_class())
+        self._server.daemon_threads = True
+        self._github_api = SyntheticGithubApi(self.data, self.url)
+        self._gitlab_api = SyntheticGitlabApi(self.data, self.url)
+
+    def start(self) -> "SyntheticProviderServer":
+        self._bind()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self, on_ready: Optional[Callable[[str], None]] = None):
+        """
+        Serves on the calling thread, e.g. in a process of its own so that serving does not
+        compete for the GIL with the code being measured. `on_ready` gets the url once the
+        server listens.
+        """
+        self._bind()
+        if on_ready:
+            on_ready(self.url)
+        self._server.serve_forever()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._thread:
+            self._thread.join()
+        self._server, self._thread = None, None
+
+    def __enter__(self) -> "SyntheticProviderServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": sum(self._request_counts.values()),
+                "requests_by_endpoint": dict(self._request_counts),
+                "requests_by_status": {
+                    str(status): count for status, count in self._status_counts.items()
+                },
+                "rate_limit_remaining": self._remaining,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._request_counts.clear()
+            self._status_counts.clear()
+
+    def _use_rate_limit(self, is_conditional_hit: bool) -> Dict[str, int]:
+        """
+        Takes a request off the quota, unless it is answered from an ETag match.
+        :returns: The quota left after the request and when it resets, empty without a
+        rate limit
+        """
+        if not self.rate_limit:
+            return {}
+
+        with self._lock:
+            now = int(time.time())
+            if self._reset_at is None or self._reset_at <= now:
+                self._reset_at = now + self.rate_limit.window_seconds
+                self._remaining = self.rate_limit.limit
+            exceeded = self._remaining <= 0
+            if not exceeded and not is_conditional_hit:
+                self._remaining -= 1
+            return {
+                "limit": self.rate_limit.limit,
+                "remaining": self._remaining,
+                "reset": self._reset_at,
+                "exceeded": exceeded,
+            }
+
+    def handle(
+        self, path: str, query: str, if_none_match: Optional[str]
+    ) -> Tuple[int, bytes, Dict[str, str]]:
+        if path == STATS_PATH:
+            return HTTPStatus.OK, json.dumps(self.get_stats()).encode("utf-8"), {}
+
+        params = dict(parse_qsl(query, keep_blank_values=True))
+        is_github = path.startswith(GITHUB_API_PREFIX)
+        if is_github:
+            status, body, headers = self._github_api.handle(
+                path.removeprefix(GITHUB_API_PREFIX), params
+            )
+        elif path.startswith(GITLAB_API_PREFIX):
+            status, body, headers = self._gitlab_api.handle(
+                path.removeprefix(GITLAB_API_PREFIX), params
+            )
+        else:
+            status, body, headers = HTTPStatus.NOT_FOUND, {"message": "Not Found"}, {}
+
+        content = json.dumps(body).encode("utf-8")
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        is_conditional_hit = status == HTTPStatus.OK and if_none_match == etag
+        quota = self._use_rate_limit(is_conditional_hit)
+        if quota and quota["exceeded"]:
+            status, content, headers = self._get_rate_limited_response(is_github, quota)
+        elif is_conditional_hit:
+            status, content = HTTPStatus.NOT_MODIFIED, b""
+        if status in (HTTPStatus.OK, HTTPStatus.NOT_MODIFIED):
+            headers["ETag"] = etag
+        headers.update(self._get_rate_limit_headers(is_github, quota))
+
+        with self._lock:
+            self._request_counts[get_exapi_endpoint(path)[1]] += 1
+            self._status_counts[int(status)] += 1
+        return status, content, headers
+
+    @staticmethod
+    def _get_rate_limited_response(
+        is_github: bool, quota: Dict[str, int]
+    ) -> Tuple[int, bytes, Dict[str, str]]:
+        if is_github:
+            body = {
+                "message": "API rate limit exceeded for user ID 1.",
+                "documentation_url": "https://docs.github.com/rest/overview/resources-in-the-rest-api#rate-limiting",
+            }
+            return HTTPStatus.FORBIDDEN, json.dumps(body).encode("utf-8"), {}
+        retry_after = max(1, quota["reset"] - int(time.time()))
+        return (
+            HTTPStatus.TOO_MANY_REQUESTS,
+            b"Retry later",
+            {"Retry-After": str(retry_after)},
+        )
+
+    @staticmethod
+    def _get_rate_limit_headers(
+        is_github: bool, quota: Dict[str, int]
+    ) -> Dict[str, str]:
+        if not quota:
+            return {}
+        if is_github:
+            return {
+                "X-RateLimit-Limit": str(quota["limit"]),
+                "X-RateLimit-Remaining": str(quota["remaining"]),
+                "X-RateLimit-Reset": str(quota["reset"]),
+                "X-RateLimit-Used": str(quota["limit"] - quota["remaining"]),
+            }
+        return {
+            "RateLimit-Limit": str(quota["limit"]),
+            "RateLimit-Remaining": str(quota["remaining"]),
+            "RateLimit-Reset": str(quota["reset"]),
+            "RateLimit-Observed": str(quota["limit"] - quota["remaining"]),
+        }
+
+    def _get_handler_class(self):
+        provider_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parsed_url = urlparse(self.path)
+                status, content, headers = provider_server.handle(
+                    parsed_url.path,
+                    parsed_url.query,
+                    self.headers.get("If-None-Match"),
+                )
+                self.send_response(status)
+                if content:
+                    self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(content)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if content:
+                    self.wfile.write(content)
+
+            def log_message(self, *args):
+                return
+
+        return Handler
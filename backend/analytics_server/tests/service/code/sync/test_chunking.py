@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+from mhq.service.code.sync.chunking import (
+    collect_pull_requests_data_chunks,
+    get_prs_chunks_by_updated_at,
+)
+
+START = datetime(2024, 1, 1)
+
+
+def _get_chunks(updated_at_offsets, chunk_size):
+    prs = [
+        (number, START + timedelta(hours=offset))
+        for number, offset in enumerate(updated_at_offsets)
+    ]
+    return [
+        [number for number, _ in chunk]
+        for chunk in get_prs_chunks_by_updated_at(prs, lambda pr: pr[1], chunk_size)
+    ]
+
+
+def test_get_prs_chunks_returns_oldest_updated_first_in_chunks():
+    assert _get_chunks([5, 4, 3, 2, 1], 2) == [[4, 3], [2, 1], [0]]
+
+
+def test_get_prs_chunks_keeps_prs_updated_together_in_one_chunk():
+    assert _get_chunks([1, 2, 2, 2, 3], 2) == [[0, 1, 2, 3], [4]]
+
+
+def test_get_prs_chunks_of_no_prs_is_empty():
+    assert _get_chunks([], 2) == []
+
+
+def test_collect_pull_requests_data_chunks_concatenates_chunks():
+    chunks = [(["pr1"], ["c1"], ["e1", "e2"]), (["pr2"], [], ["e3"])]
+
+    assert collect_pull_requests_data_chunks(chunks) == (
+        ["pr1", "pr2"],
+        ["c1"],
+        ["e1", "e2", "e3"],
+    )
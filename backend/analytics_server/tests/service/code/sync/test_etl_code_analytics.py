@@ -1,3 +1,4 @@
+import random
 from datetime import timedelta
 
 from mhq.service.code.sync.etl_code_analytics import CodeETLAnalyticsService
@@ -744,3 +745,133 @@ def test_cycle_time_ready_for_review_with_draft_pr_workflow():
 
     assert performance.cycle_time == 86400
     assert performance.first_review_time == 14400
+
+
+def _create_pr_metrics_per_pr(pr, pr_events, pr_commits):
+    pr_service = CodeETLAnalyticsService()
+    if pr.state == PullRequestState.OPEN:
+        return pr
+
+    non_bot_pr_events = pr_service.filter_non_bot_events(pr_events)
+    performance = pr_service.get_pr_performance(pr, non_bot_pr_events)
+    pr.first_response_time = (
+        performance.first_review_time if performance.first_review_time != -1 else None
+    )
+    pr.rework_time = performance.rework_time if performance.rework_time != -1 else None
+    pr.merge_time = performance.merge_time if performance.merge_time != -1 else None
+    pr.cycle_time = performance.cycle_time if performance.cycle_time != -1 else None
+    pr.reviewers = list(
+        {e.actor_username for e in non_bot_pr_events if e.actor_username != pr.author}
+    )
+    if pr_commits:
+        pr.rework_cycles = pr_service.get_rework_cycles(
+            pr, non_bot_pr_events, pr_commits
+        )
+        pr_commits.sort(key=lambda x: x.created_at)
+        pr.first_commit_to_open = (
+            pr.created_at - pr_commits[0].created_at
+        ).total_seconds()
+    return pr
+
+
+def _get_random_prs_data(seed, count):
+    """
+    PRs with events and commits on a coarse time grid, so that many of them share a time
+    """
+    rng = random.Random(seed)
+    t0 = time_now()
+    actors = ["author", "reviewer_1", "reviewer_2", "reviewer_3", "ci_bot"]
+    review_states = [
+        PullRequestEventState.APPROVED.value,
+        PullRequestEventState.CHANGES_REQUESTED.value,
+        PullRequestEventState.COMMENTED.value,
+    ]
+    event_types = [
+        PullRequestEventType.REVIEW.value,
+        PullRequestEventType.REVIEW.value,
+        PullRequestEventType.READY_FOR_REVIEW.value,
+        PullRequestEventType.COMMENTED.value,
+    ]
+
+    prs_data = []
+    for _ in range(count):
+        created_at = t0 + timedelta(minutes=rng.randint(0, 10))
+        pr = get_pull_request(
+            author="author",
+            state=rng.choice(list(PullRequestState)),
+            created_at=created_at,
+            state_changed_at=created_at + timedelta(minutes=rng.randint(0, 40)),
+        )
+        events = [
+            get_pull_request_event(
+                pull_request_id=pr.id,
+                type=rng.choice(event_types),
+                reviewer=rng.choice(actors),
+                state=rng.choice(review_states),
+                created_at=t0 + timedelta(minutes=rng.randint(0, 40)),
+            )
+            for _ in range(rng.randint(0, 8))
+        ]
+        commits = [
+            get_pull_request_commit(
+                pr_id=pr.id, created_at=t0 + timedelta(minutes=rng.randint(0, 40))
+            )
+            for _ in range(rng.randint(0, 6))
+        ]
+        prs_data.append((pr, events, commits))
+    return prs_data
+
+
+def test_create_prs_metrics_matches_per_pr_metrics():
+    metric_fields = [
+        "first_response_time",
+        "rework_time",
+        "merge_time",
+        "cycle_time",
+        "rework_cycles",
+        "first_commit_to_open",
+        "reviewers",
+    ]
+
+    batch_prs = CodeETLAnalyticsService().create_prs_metrics(
+        _get_random_prs_data(seed=7, count=2000)
+    )
+    per_pr_prs = [
+        _create_pr_metrics_per_pr(pr, events, commits)
+        for pr, events, commits in _get_random_prs_data(seed=7, count=2000)
+    ]
+
+    assert any(pr.rework_cycles for pr in per_pr_prs)
+    for batch_pr, per_pr_pr in zip(batch_prs, per_pr_prs):
+        for field in metric_fields:
+            batch_value = getattr(batch_pr, field)
+            per_pr_value = getattr(per_pr_pr, field)
+            if field == "reviewers" and batch_value is not None:
+                batch_value, per_pr_value = sorted(batch_value), sorted(per_pr_value)
+            assert batch_value == per_pr_value, field
+
+
+def test_create_prs_metrics_keeps_order_and_skips_open_prs():
+    t1 = time_now()
+    t2 = t1 + timedelta(hours=1)
+    open_pr = get_pull_request(state=PullRequestState.OPEN, created_at=t1)
+    merged_pr = get_pull_request(
+        state=PullRequestState.MERGED, created_at=t1, state_changed_at=t2
+    )
+    open_pr_event = get_pull_request_event(pull_request_id=open_pr.id, created_at=t2)
+    merged_pr_event = get_pull_request_event(
+        pull_request_id=merged_pr.id, reviewer="reviewer", created_at=t2
+    )
+
+    prs = CodeETLAnalyticsService().create_prs_metrics(
+        [(open_pr, [open_pr_event], []), (merged_pr, [merged_pr_event], [])]
+    )
+
+    assert prs == [open_pr, merged_pr]
+    assert open_pr.first_response_time is None
+    assert open_pr.reviewers == ["randomuser1", "randomuser2"]
+    assert merged_pr.first_response_time == 3600
+    assert merged_pr.rework_time == 0
+    assert merged_pr.merge_time == 0
+    assert merged_pr.cycle_time == 3600
+    assert merged_pr.reviewers == ["reviewer"]
@@ -2,8 +2,10 @@ from datetime import datetime
 
 import pytz
 
+from mhq.service.code.sync.etl_code_analytics import CodeETLAnalyticsService
 from mhq.service.code.sync.etl_github_handler import GithubETLHandler
-from mhq.store.models.code import PullRequestState
+from mhq.service.code.sync.prefetch import ExistingPRsData
+from mhq.store.models.code import PullRequestEventType, PullRequestState
 from mhq.utils.string import uuid4_str
 from tests.factories.models import (
     get_pull_request,
@@ -281,6 +283,58 @@ def test__to_pr_events_given_a_list_of_new_events_and_old_events_returns_a_list_
         assert compare_objects_as_dicts(event, expected_event, ["id"]) is True
 
 
+def test__to_pr_events_matches_ready_for_review_events_synced_by_the_other_engine():
+    pr_model = get_pull_request()
+    ready_at = datetime(2022, 6, 29, 10, 53, 15, tzinfo=pytz.UTC)
+    rest_event = get_github_pr_timeline_event(
+        event_type="ready_for_review",
+        raw_data={
+            "event": "ready_for_review",
+            "id": 9876543210,
+            "node_id": "RFRE_kwDOA",
+            "actor": {"login": "dev", "type": "User"},
+            "created_at": "2022-06-29T10:53:15Z",
+        },
+    )
+    graphql_event = get_github_pr_timeline_event(
+        event_type="ready_for_review",
+        raw_data={
+            "event": "ready_for_review",
+            "id": "RFRE_kwDOA",
+            "node_id": "RFRE_kwDOA",
+            "actor": {"login": "dev", "type": "User"},
+            "created_at": "2022-06-29T10:53:15Z",
+        },
+    )
+
+    [rest_pr_event] = GithubETLHandler._to_pr_events([rest_event], pr_model, [])
+    rest_pr_event.type = PullRequestEventType.READY_FOR_REVIEW
+    [graphql_pr_event] = GithubETLHandler._to_pr_events(
+        [graphql_event], pr_model, [rest_pr_event]
+    )
+    [resynced_rest_pr_event] = GithubETLHandler._to_pr_events(
+        [rest_event], pr_model, [graphql_pr_event]
+    )
+    [other_pr_event] = GithubETLHandler._to_pr_events(
+        [
+            get_github_pr_timeline_event(
+                event_type="ready_for_review",
+                raw_data={**graphql_event.raw_data, "actor": {"login": "other"}},
+            )
+        ],
+        pr_model,
+        [rest_pr_event],
+    )
+
+    assert rest_pr_event.created_at == ready_at
+    assert rest_pr_event.idempotency_key == "9876543210"
+    assert graphql_pr_event.id == rest_pr_event.id
+    assert graphql_pr_event.idempotency_key == "9876543210"
+    assert resynced_rest_pr_event.id == rest_pr_event.id
+    assert other_pr_event.id != rest_pr_event.id
+    assert other_pr_event.idempotency_key == "RFRE_kwDOA"
+
+
 def test__to_pr_commits_given_an_empty_list_of_commits_returns_an_empty_list():
     pr_model = get_pull_request()
     github_etl_handler = GithubETLHandler(ORG_ID, None, None, None, None)
@@ -396,3 +450,142 @@ def test__github_bot_filter_given_mixed_events_returns_non_bot_events():
     result = github_etl_handler._github_bot_filter([bot_event, human_event])
     assert len(result) == 1
     assert result[0] == human_event
+
+
+def test__is_pr_unchanged_given_merged_pr_with_same_fingerprint_returns_true():
+    merged_at = datetime(2022, 6, 29, 10, 53, 15, tzinfo=pytz.UTC)
+    github_pull_request = get_github_pull_request(merged_at=merged_at, comments=2)
+    pr_model = get_pull_request(
+        state=PullRequestState.MERGED,
+        sync_fingerprint=GithubETLHandler._get_pr_sync_fingerprint(github_pull_request),
+    )
+
+    github_etl_handler = GithubETLHandler(ORG_ID, None, None, None, None)
+
+    assert github_etl_handler._is_pr_unchanged(github_pull_request, pr_model)
+
+
+def test__is_pr_unchanged_given_new_comments_or_commits_returns_false():
+    merged_at = datetime(2022, 6, 29, 10, 53, 15, tzinfo=pytz.UTC)
+    github_pull_request = get_github_pull_request(merged_at=merged_at, comments=2)
+    pr_model = get_pull_request(
+        state=PullRequestState.MERGED,
+        sync_fingerprint=GithubETLHandler._get_pr_sync_fingerprint(github_pull_request),
+    )
+    github_etl_handler = GithubETLHandler(ORG_ID, None, None, None, None)
+
+    assert not github_etl_handler._is_pr_unchanged(
+        get_github_pull_request(merged_at=merged_at, comments=3), pr_model
+    )
+    assert not github_etl_handler._is_pr_unchanged(
+        get_github_pull_request(merged_at=merged_at, comments=2, head_sha="fedcba"),
+        pr_model,
+    )
+
+
+def test__is_pr_unchanged_given_open_or_new_pr_returns_false():
+    github_pull_request = get_github_pull_request()
+    pr_model = get_pull_request(
+        state=PullRequestState.OPEN,
+        sync_fingerprint=GithubETLHandler._get_pr_sync_fingerprint(github_pull_request),
+    )
+    github_etl_handler = GithubETLHandler(ORG_ID, None, None, None, None)
+
+    assert not github_etl_handler._is_pr_unchanged(github_pull_request, pr_model)
+    assert not github_etl_handler._is_pr_unchanged(github_pull_request, None)
+
+
+def test__process_unchanged_pr_refreshes_pr_and_keeps_metrics():
+    repo_id = uuid4_str()
+    merged_at = datetime(2022, 6, 29, 10, 53, 15, tzinfo=pytz.UTC)
+    github_pull_request = get_github_pull_request(
+        merged_at=merged_at, title="new_title"
+    )
+    pr_model = get_pull_request(
+        repo_id=repo_id,
+        state=PullRequestState.MERGED,
+        title="old_title",
+        first_response_time=100,
+        rework_time=200,
+        merge_time=300,
+        cycle_time=600,
+        reviewers=["def"],
+        rework_cycles=1,
+        first_commit_to_open=50,
+        meta={"code_stats": {"comments": 4}},
+        sync_fingerprint="fingerprint",
+    )
+
+    github_etl_handler = GithubETLHandler(ORG_ID, None, None, None, None)
+    updated_pr_model, events, commits = github_etl_handler._process_unchanged_pr(
+        repo_id, github_pull_request, pr_model
+    )
+
+    assert (events, commits) == ([], [])
+    assert updated_pr_model.id == pr_model.id
+    assert updated_pr_model.title == "new_title"
+    assert updated_pr_model.meta["code_stats"]["comments"] == 4
+    assert updated_pr_model.first_response_time == 100
+    assert updated_pr_model.rework_time == 200
+    assert updated_pr_model.merge_time == 300
+    assert updated_pr_model.cycle_time == 600
+    assert updated_pr_model.reviewers == ["def"]
+    assert updated_pr_model.rework_cycles == 1
+    assert updated_pr_model.first_commit_to_open == 50
+    assert updated_pr_model.sync_fingerprint == "fingerprint"
+
+
+class BatchRecordingCodeETLAnalyticsService(CodeETLAnalyticsService):
+    def __init__(self):
+        self.batches = []
+
+    def create_prs_metrics(self, prs_data):
+        self.batches.append(prs_data)
+        return super().create_prs_metrics(prs_data)
+
+
+def test__process_prs_creates_metrics_of_a_chunk_at_once_except_unchanged_prs():
+    merged_at = datetime(2022, 6, 29, 10, 53, 15, tzinfo=pytz.UTC)
+    github_prs = [
+        get_github_pull_request(number=number, merged_at=merged_at)
+        for number in (1, 2, 3)
+    ]
+    pr_models = {
+        number: get_pull_request(
+            state=PullRequestState.MERGED,
+            created_at=datetime(2022, 6, 29, 9, 0, 0, tzinfo=pytz.UTC),
+            state_changed_at=merged_at,
+            first_response_time=100,
+        )
+        for number in (1, 2, 3)
+    }
+    bot_event = get_pull_request_event(
+        created_at=datetime(2022, 6, 29, 9, 10, 0, tzinfo=pytz.UTC)
+    )
+    bot_event.data = {"user": {"type": "Bot", "login": "dependabot"}}
+    human_event = get_pull_request_event(
+        reviewer="john_doe", created_at=datetime(2022, 6, 29, 9, 30, 0, tzinfo=pytz.UTC)
+    )
+
+    def _process_pr(github_pr, existing_prs_data):
+        if github_pr.number == 2:
+            return pr_models[2], [], []
+        return pr_models[github_pr.number], [bot_event, human_event], []
+
+    code_etl_analytics_service = BatchRecordingCodeETLAnalyticsService()
+    github_etl_handler = GithubETLHandler(
+        ORG_ID, None, None, code_etl_analytics_service, None
+    )
+    pull_requests, _, _ = github_etl_handler._process_prs(
+        None, github_prs, _process_pr, ExistingPRsData(), {2}
+    )
+
+    assert pull_requests == [pr_models[1], pr_models[2], pr_models[3]]
+    [batch] = code_etl_analytics_service.batches
+    assert [(pr, events) for pr, events, _ in batch] == [
+        (pr_models[1], [human_event]),
+        (pr_models[3], [human_event]),
+    ]
+    assert pr_models[1].first_response_time == 30 * 60
+    assert pr_models[2].first_response_time == 100
+    assert pr_models[3].first_response_time == 30 * 60
@@ -12,6 +12,7 @@ from tests.factories.models.code import (
 from tests.factories.models.exapi.gitlab import get_gitlab_pull_request
 from tests.utilities import compare_objects_as_dicts
 from mhq.service.code.sync.etl_gitlab_handler import GitlabETLHandler
+from mhq.utils.diffparser import DiffStats
 from mhq.utils.string import uuid4_str
 from mhq.store.models.code import PullRequestState
 
@@ -296,3 +297,49 @@ def test__to_pr_commits_given_a_list_of_commits_returns_a_list_of_pr_commits():
 
     for commit, expected_commit in zip(pr_commits, expected_pr_commits):
         assert compare_objects_as_dicts(commit, expected_commit, ["created_at"]) is True
+
+
+class FakeGitlabDiffStatsApi:
+    def __init__(self, diff_stats):
+        self.diff_stats = diff_stats
+        self.calls = []
+
+    def get_merge_request_diff_stats(self, project_id, merge_request_internal_id):
+        self.calls.append((project_id, merge_request_internal_id))
+        return self.diff_stats
+
+
+def test_process_pr_code_stats_uses_prefetched_diff_stats():
+    api = FakeGitlabDiffStatsApi(DiffStats(additions=1, deletions=1, changed_files=1))
+    gitlab_etl_handler = GitlabETLHandler("org_id", api, None, None, None)
+
+    code_stats = gitlab_etl_handler.process_pr_code_stats(
+        "42", get_pull_request(), DiffStats(additions=7, deletions=3, changed_files=2)
+    )
+
+    assert code_stats == (7, 3, 2)
+    assert api.calls == []
+
+
+def test_process_pr_code_stats_fetches_diff_stats_and_prefers_changes_count():
+    api = FakeGitlabDiffStatsApi(DiffStats(additions=5, deletions=2, changed_files=3))
+    gitlab_etl_handler = GitlabETLHandler("org_id", api, None, None, None)
+
+    code_stats = gitlab_etl_handler.process_pr_code_stats(
+        "42", get_pull_request(number="7"), changes_count=4
+    )
+
+    assert code_stats == (5, 2, 4)
+    assert api.calls == [("42", "7")]
+
+
+def test_process_pr_code_stats_skips_diffs_without_changes():
+    api = FakeGitlabDiffStatsApi(DiffStats(additions=5, deletions=2, changed_files=3))
+    gitlab_etl_handler = GitlabETLHandler("org_id", api, None, None, None)
+
+    code_stats = gitlab_etl_handler.process_pr_code_stats(
+        "42", get_pull_request(), changes_count=0
+    )
+
+    assert code_stats == (0, 0, 0)
+    assert api.calls == []
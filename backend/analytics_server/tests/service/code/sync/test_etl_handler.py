@@ -0,0 +1,407 @@
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from mhq.service.code.sync import etl_github_handler
+from mhq.service.code.sync.etl_code_analytics import CodeETLAnalyticsService
+from mhq.service.code.sync.etl_github_handler import GithubETLHandler
+from mhq.service.code.sync.etl_handler import CodeETLHandler
+from mhq.service.settings.models import DefaultSyncDaysSetting
+from mhq.store.models.code import CodeProvider, OrgRepo, PullRequest
+from mhq.utils.string import uuid4_str
+from tests.factories.models.exapi.github import get_github_pull_request
+
+ORG_ID = uuid4_str()
+
+
+class FakeETLService:
+    def check_pat_validity(self):
+        return True
+
+    def get_org_repos(self, org_repos):
+        return org_repos
+
+
+class FakeCodeRepoService:
+    def __init__(self, org_repos):
+        self.org_repos = {str(org_repo.id): org_repo for org_repo in org_repos}
+
+    def get_active_org_repos_for_provider(self, *args):
+        return list(self.org_repos.values())
+
+    def update_org_repos(self, *args):
+        return
+
+    def get_repo_by_id(self, repo_id):
+        return self.org_repos.get(repo_id)
+
+    def save_pull_requests_data(self, pull_requests, *args):
+        self.saved_prs = getattr(self, "saved_prs", []) + pull_requests
+
+    def save_revert_pr_mappings(self, *args):
+        return
+
+
+class FakeBookmarkService:
+    def __init__(self, bookmark: datetime):
+        self.bookmark = bookmark
+        self.updates = []
+
+    def get_bookmark(self, *args):
+        return self.bookmark
+
+    def update_bookmark(self, repo_id, bookmark_type, provider, bookmark):
+        self.bookmark = bookmark
+        self.updates.append(bookmark)
+
+
+class FakeSettingsService:
+    def get_or_set_default_settings(self, **kwargs):
+        return type("Setting", (), {"specific_settings": DefaultSyncDaysSetting(31)})()
+
+
+class FakeRedisLockService:
+    def __init__(self):
+        self.acquired_keys = []
+
+    def acquire_lock(self, key: str):
+        self.acquired_keys.append(key)
+        return nullcontext()
+
+
+class FakeMTDBroker:
+    def pushback_merge_to_deploy_bookmark(self, *args):
+        return
+
+
+def _get_org_repo(name: str) -> OrgRepo:
+    return OrgRepo(id=uuid4_str(), org_id=ORG_ID, name=name, provider="github")
+
+
+def test_sync_org_repos_with_workers_syncs_every_repo_with_fresh_handlers():
+    org_repos = [_get_org_repo(f"repo-{i}") for i in range(5)]
+    code_repo_service = FakeCodeRepoService(org_repos)
+    synced_repos = []
+    worker_handlers = []
+
+    class WorkerHandler(CodeETLHandler):
+        def _sync_repo_pull_requests_data(self, org_repo: OrgRepo):
+            synced_repos.append(org_repo.name)
+
+    def _worker_handler_factory():
+        handler = WorkerHandler(code_repo_service, None, None, None, None, None)
+        worker_handlers.append(handler)
+        return handler
+
+    handler = CodeETLHandler(
+        code_repo_service,
+        FakeETLService(),
+        None,
+        None,
+        None,
+        None,
+        max_workers=3,
+        worker_handler_factory=_worker_handler_factory,
+    )
+    handler.sync_org_repos(ORG_ID, CodeProvider.GITHUB)
+
+    assert sorted(synced_repos) == sorted(org_repo.name for org_repo in org_repos)
+    assert len(worker_handlers) == len(org_repos)
+
+
+def test_sync_org_repos_with_workers_isolates_failing_repo():
+    org_repos = [_get_org_repo(f"repo-{i}") for i in range(4)]
+    code_repo_service = FakeCodeRepoService(org_repos)
+    synced_repos = []
+
+    class WorkerHandler(CodeETLHandler):
+        def _sync_repo_pull_requests_data(self, org_repo: OrgRepo):
+            if org_repo.name == "repo-1":
+                raise Exception("API error")
+            synced_repos.append(org_repo.name)
+
+    handler = CodeETLHandler(
+        code_repo_service,
+        FakeETLService(),
+        None,
+        None,
+        None,
+        None,
+        max_workers=2,
+        worker_handler_factory=lambda: WorkerHandler(
+            code_repo_service, None, None, None, None, None
+        ),
+    )
+    handler.sync_org_repos(ORG_ID, CodeProvider.GITHUB)
+
+    assert sorted(synced_repos) == ["repo-0", "repo-2", "repo-3"]
+
+
+BOOKMARK = datetime(2024, 1, 1, tzinfo=pytz.UTC)
+
+
+def _get_pr(hours: int) -> PullRequest:
+    return PullRequest(
+        id=uuid4_str(), number=str(hours), updated_at=BOOKMARK + timedelta(hours=hours)
+    )
+
+
+class ChunkedETLService(FakeETLService):
+    def __init__(self, chunks, fail_after: int = None):
+        self.chunks = chunks
+        self.fail_after = fail_after
+
+    def get_repo_pull_requests_data_chunks(self, org_repo, bookmark):
+        for i, chunk in enumerate(self.chunks):
+            if i == self.fail_after:
+                raise Exception("API error")
+            yield chunk, [], []
+
+    def get_revert_prs_mapping(self, prs):
+        return []
+
+
+def _get_chunked_sync_handler(etl_service, bookmark_service, code_repo_service):
+    return CodeETLHandler(
+        code_repo_service,
+        etl_service,
+        FakeMTDBroker(),
+        bookmark_service,
+        FakeSettingsService(),
+        FakeRedisLockService(),
+    )
+
+
+def test_sync_repo_pull_requests_data_checkpoints_bookmark_after_every_chunk():
+    org_repo = _get_org_repo("repo")
+    code_repo_service = FakeCodeRepoService([org_repo])
+    bookmark_service = FakeBookmarkService(BOOKMARK)
+    chunks = [[_get_pr(1), _get_pr(2)], [_get_pr(3)]]
+
+    _get_chunked_sync_handler(
+        ChunkedETLService(chunks), bookmark_service, code_repo_service
+    )._sync_repo_pull_requests_data(org_repo)
+
+    assert bookmark_service.updates == [
+        BOOKMARK + timedelta(hours=2),
+        BOOKMARK + timedelta(hours=3),
+    ]
+    assert len(code_repo_service.saved_prs) == 3
+
+
+def test_sync_repo_pull_requests_data_holds_the_repo_pull_requests_lock():
+    org_repo = _get_org_repo("repo")
+    handler = _get_chunked_sync_handler(
+        ChunkedETLService([[_get_pr(1)]]),
+        FakeBookmarkService(BOOKMARK),
+        FakeCodeRepoService([org_repo]),
+    )
+
+    handler.sync_repo_pull_requests(str(org_repo.id))
+
+    assert handler.redis_lock_service.acquired_keys == [
+        "{org_repo}:" + f"{org_repo.id}:pull_requests"
+    ]
+
+
+def test_sync_repo_pull_request_holds_the_repo_pull_requests_lock():
+    org_repo = _get_org_repo("repo")
+    pr = _get_pr(1)
+    code_repo_service = FakeCodeRepoService([org_repo])
+
+    class SinglePRETLService(ChunkedETLService):
+        def get_pull_request_data(self, org_repo, pr_number):
+            return pr, [], []
+
+    handler = _get_chunked_sync_handler(
+        SinglePRETLService([]), FakeBookmarkService(BOOKMARK), code_repo_service
+    )
+    handler.sync_repo_pull_request(org_repo, 1)
+
+    assert code_repo_service.saved_prs == [pr]
+    assert handler.redis_lock_service.acquired_keys == [
+        "{org_repo}:" + f"{org_repo.id}:pull_requests"
+    ]
+
+
+def test_sync_repo_pull_requests_data_keeps_last_checkpoint_on_failure():
+    org_repo = _get_org_repo("repo")
+    code_repo_service = FakeCodeRepoService([org_repo])
+    bookmark_service = FakeBookmarkService(BOOKMARK)
+    chunks = [[_get_pr(1), _get_pr(2)], [_get_pr(3)]]
+
+    with pytest.raises(Exception):
+        _get_chunked_sync_handler(
+            ChunkedETLService(chunks, fail_after=1), bookmark_service, code_repo_service
+        )._sync_repo_pull_requests_data(org_repo)
+
+    assert bookmark_service.bookmark == BOOKMARK + timedelta(hours=2)
+    assert len(code_repo_service.saved_prs) == 2
+
+
+def test_sync_repo_pull_requests_data_without_prs_keeps_bookmark():
+    org_repo = _get_org_repo("repo")
+    bookmark_service = FakeBookmarkService(BOOKMARK)
+
+    _get_chunked_sync_handler(
+        ChunkedETLService([]), bookmark_service, FakeCodeRepoService([org_repo])
+    )._sync_repo_pull_requests_data(org_repo)
+
+    assert bookmark_service.updates == [BOOKMARK]
+
+
+class FakeGithubApiService:
+    def __init__(self, github_prs):
+        self.github_prs = github_prs
+        self.timeline_fetches = []
+        self.commit_fetches = []
+
+    def get_repo(self, org_name, repo_name):
+        return None
+
+    def get_pull_requests(self, github_repo):
+        return type("PaginatedList", (), {"totalCount": len(self.github_prs)})()
+
+    def get_pull_requests_page(self, github_pull_requests, page):
+        if page:
+            return []
+        return sorted(self.github_prs, key=lambda pr: pr.updated_at, reverse=True)
+
+    def get_prs_timeline_events(self, prs, concurrency):
+        self.timeline_fetches += [number for _, number in prs]
+        return [[] for _ in prs]
+
+    def get_pr_commits(self, github_pr):
+        self.commit_fetches.append(github_pr.number)
+        return []
+
+
+class PersistingCodeRepoService:
+    def __init__(self, fail_on_save: int = None):
+        self.prs = {}
+        self.events = defaultdict(list)
+        self.fail_on_save = fail_on_save
+        self.saves = 0
+
+    def get_repo_prs_by_numbers(self, repo_id, numbers):
+        return [self.prs[number] for number in numbers if number in self.prs]
+
+    def get_prs_events_by_pr_ids(self, pr_ids):
+        return [event for pr_id in pr_ids for event in self.events[pr_id]]
+
+    def save_pull_requests_data(self, pull_requests, pull_request_commits, events):
+        self.saves += 1
+        if self.saves == self.fail_on_save:
+            raise Exception("DB error")
+        for pr in pull_requests:
+            self.prs[pr.number] = pr
+        for event in events:
+            self.events[event.pull_request_id].append(event)
+
+    def save_revert_pr_mappings(self, *args):
+        return
+
+
+def _get_github_sync_handler(api, code_repo_service, bookmark_service):
+    github_etl_handler = GithubETLHandler(
+        ORG_ID,
+        api,
+        code_repo_service,
+        CodeETLAnalyticsService(),
+        lambda prs: [],
+    )
+    return CodeETLHandler(
+        code_repo_service,
+        github_etl_handler,
+        FakeMTDBroker(),
+        bookmark_service,
+        FakeSettingsService(),
+        FakeRedisLockService(),
+    )
+
+
+def test_sync_repo_pull_requests_data_resumes_prs_merged_before_the_checkpoint(
+    monkeypatch,
+):
+    monkeypatch.setattr(etl_github_handler, "PR_PROCESSING_CHUNK_SIZE", 1)
+    org_repo = _get_org_repo("repo")
+    open_pr = get_github_pull_request(
+        number=1,
+        created_at=BOOKMARK - timedelta(days=1),
+        updated_at=BOOKMARK + timedelta(hours=1),
+    )
+    commented_after_merge_pr = get_github_pull_request(
+        number=2,
+        created_at=BOOKMARK - timedelta(days=1),
+        merged_at=BOOKMARK + timedelta(minutes=30),
+        updated_at=BOOKMARK + timedelta(hours=3),
+    )
+    api = FakeGithubApiService([open_pr, commented_after_merge_pr])
+    bookmark_service = FakeBookmarkService(BOOKMARK)
+
+    with pytest.raises(Exception):
+        _get_github_sync_handler(
+            api, PersistingCodeRepoService(fail_on_save=2), bookmark_service
+        )._sync_repo_pull_requests_data(org_repo)
+    assert bookmark_service.bookmark == BOOKMARK + timedelta(hours=1)
+
+    code_repo_service = PersistingCodeRepoService()
+    _get_github_sync_handler(
+        api, code_repo_service, bookmark_service
+    )._sync_repo_pull_requests_data(org_repo)
+
+    assert list(code_repo_service.prs.keys()) == ["2"]
+    assert bookmark_service.bookmark == BOOKMARK + timedelta(hours=3)
+
+
+def test_sync_repo_pull_requests_data_skips_fetches_of_unchanged_prs_on_resync():
+    org_repo = _get_org_repo("repo")
+    merged_pr = get_github_pull_request(
+        number=1,
+        created_at=BOOKMARK - timedelta(days=1),
+        merged_at=BOOKMARK + timedelta(minutes=30),
+        updated_at=BOOKMARK + timedelta(hours=1),
+        comments=1,
+    )
+    commented_pr = get_github_pull_request(
+        number=2,
+        created_at=BOOKMARK - timedelta(days=1),
+        merged_at=BOOKMARK + timedelta(minutes=30),
+        updated_at=BOOKMARK + timedelta(hours=1),
+        comments=1,
+    )
+    api = FakeGithubApiService([merged_pr, commented_pr])
+    code_repo_service = PersistingCodeRepoService()
+    bookmark_service = FakeBookmarkService(BOOKMARK)
+    handler = _get_github_sync_handler(api, code_repo_service, bookmark_service)
+    handler._sync_repo_pull_requests_data(org_repo)
+
+    assert sorted(api.timeline_fetches) == [1, 2]
+    assert sorted(api.commit_fetches) == [1, 2]
+
+    api.github_prs = [
+        get_github_pull_request(
+            number=1,
+            title="head branch deleted",
+            created_at=BOOKMARK - timedelta(days=1),
+            merged_at=BOOKMARK + timedelta(minutes=30),
+            updated_at=BOOKMARK + timedelta(hours=2),
+            comments=1,
+        ),
+        get_github_pull_request(
+            number=2,
+            created_at=BOOKMARK - timedelta(days=1),
+            merged_at=BOOKMARK + timedelta(minutes=30),
+            updated_at=BOOKMARK + timedelta(hours=2),
+            comments=2,
+        ),
+    ]
+    handler._sync_repo_pull_requests_data(org_repo)
+
+    assert sorted(api.timeline_fetches) == [1, 2, 2]
+    assert sorted(api.commit_fetches) == [1, 2, 2]
+    assert code_repo_service.prs["1"].title == "head branch deleted"
+    assert bookmark_service.bookmark == BOOKMARK + timedelta(hours=2)
@@ -0,0 +1,55 @@
+from mhq.service.code.sync.prefetch import prefetch_existing_prs_data
+from mhq.utils.string import uuid4_str
+from tests.factories.models import get_pull_request, get_pull_request_event
+
+
+class FakeCodeRepoService:
+    def __init__(self, prs, pr_events):
+        self.prs = prs
+        self.pr_events = pr_events
+        self.calls = []
+
+    def get_repo_prs_by_numbers(self, repo_id, pr_numbers):
+        self.calls.append(("prs", repo_id, pr_numbers))
+        return [
+            pr
+            for pr in self.prs
+            if str(pr.repo_id) == repo_id and pr.number in pr_numbers
+        ]
+
+    def get_prs_events_by_pr_ids(self, pr_ids):
+        self.calls.append(("events", pr_ids))
+        return [e for e in self.pr_events if str(e.pull_request_id) in pr_ids]
+
+
+def test_prefetch_existing_prs_data_given_no_existing_prs_skips_event_lookup():
+    repo_id = uuid4_str()
+    code_repo_service = FakeCodeRepoService([], [])
+
+    existing_prs_data = prefetch_existing_prs_data(
+        code_repo_service, repo_id, ["1", "2"]
+    )
+
+    assert existing_prs_data.get_pr("1") is None
+    assert existing_prs_data.get_pr_events(None) == []
+    assert code_repo_service.calls == [("prs", repo_id, ["1", "2"])]
+
+
+def test_prefetch_existing_prs_data_maps_prs_and_events_with_two_queries():
+    repo_id = uuid4_str()
+    pr_1 = get_pull_request(repo_id=repo_id, number="1")
+    pr_2 = get_pull_request(repo_id=repo_id, number="2")
+    pr_1_event_1 = get_pull_request_event(pull_request_id=str(pr_1.id))
+    pr_1_event_2 = get_pull_request_event(pull_request_id=str(pr_1.id))
+    code_repo_service = FakeCodeRepoService([pr_1, pr_2], [pr_1_event_1, pr_1_event_2])
+
+    existing_prs_data = prefetch_existing_prs_data(
+        code_repo_service, repo_id, [1, 2, 3]
+    )
+
+    assert existing_prs_data.get_pr(1) == pr_1
+    assert existing_prs_data.get_pr("2") == pr_2
+    assert existing_prs_data.get_pr("3") is None
+    assert existing_prs_data.get_pr_events(pr_1) == [pr_1_event_1, pr_1_event_2]
+    assert existing_prs_data.get_pr_events(pr_2) == []
+    assert len(code_repo_service.calls) == 2
@@ -0,0 +1,222 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytz
+
+from mhq.exapi.models.gitlab import GitlabRepo
+from mhq.service.code.sync.etl_github_handler import GithubETLHandler
+from mhq.service.code.sync.etl_gitlab_handler import GitlabETLHandler
+from mhq.service.code.sync.repo_metadata import should_refresh_contributors
+from mhq.store.models.code import OrgRepo
+from mhq.utils.string import uuid4_str
+from mhq.utils.time import time_now
+
+PUSHED_AT = datetime(2024, 1, 1, tzinfo=pytz.UTC)
+
+
+def _get_org_repo(
+    idempotency_key="1",
+    name="repo",
+    contributors=None,
+    pushed_at=None,
+    contributors_refreshed_at=None,
+):
+    return OrgRepo(
+        id=uuid4_str(),
+        org_id=uuid4_str(),
+        name=name,
+        org_name="org",
+        idempotency_key=idempotency_key,
+        contributors=contributors,
+        pushed_at=pushed_at,
+        contributors_refreshed_at=contributors_refreshed_at,
+    )
+
+
+def test_should_refresh_contributors_when_never_fetched():
+    org_repo = _get_org_repo(pushed_at=PUSHED_AT)
+
+    assert should_refresh_contributors(org_repo, PUSHED_AT, time_now())
+
+
+def test_should_not_refresh_contributors_within_ttl_without_push():
+    now = time_now()
+    org_repo = _get_org_repo(
+        contributors=[["author", 1]],
+        pushed_at=PUSHED_AT,
+        contributors_refreshed_at=now - timedelta(hours=1),
+    )
+
+    assert not should_refresh_contributors(
+        org_repo, PUSHED_AT, now, ttl=timedelta(hours=24)
+    )
+
+
+def test_should_refresh_contributors_after_push():
+    now = time_now()
+    org_repo = _get_org_repo(
+        contributors=[["author", 1]],
+        pushed_at=PUSHED_AT,
+        contributors_refreshed_at=now - timedelta(hours=1),
+    )
+
+    assert should_refresh_contributors(
+        org_repo, PUSHED_AT + timedelta(minutes=5), now, ttl=timedelta(hours=24)
+    )
+    assert should_refresh_contributors(org_repo, None, now, ttl=timedelta(hours=24))
+
+
+def test_should_refresh_contributors_after_ttl():
+    now = time_now()
+    org_repo = _get_org_repo(
+        contributors=[],
+        pushed_at=PUSHED_AT,
+        contributors_refreshed_at=now - timedelta(hours=25),
+    )
+
+    assert should_refresh_contributors(
+        org_repo, PUSHED_AT, now, ttl=timedelta(hours=24)
+    )
+
+
+class FakeGithubApi:
+    def __init__(self, repo_ids, pushed_at=PUSHED_AT, latency_seconds=0.02):
+        self.repo_ids = repo_ids
+        self.pushed_at = pushed_at
+        self.latency_seconds = latency_seconds
+        self.contributor_calls = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_repo(self, org_login, repo_name):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        time.sleep(self.latency_seconds)
+        with self._lock:
+            self.in_flight -= 1
+        if repo_name not in self.repo_ids:
+            raise Exception(f"{repo_name} not found")
+        return SimpleNamespace(
+            id=self.repo_ids[repo_name],
+            name=repo_name,
+            default_branch="main",
+            language="Python",
+            pushed_at=self.pushed_at.replace(tzinfo=None),
+        )
+
+    def get_repo_contributors(self, github_repo):
+        with self._lock:
+            self.contributor_calls.append(github_repo.name)
+        return [["author", 3]]
+
+
+def test_github_get_org_repos_refreshes_repos_concurrently():
+    repo_ids = {f"repo-{i}": i for i in range(8)}
+    api = FakeGithubApi(repo_ids)
+    org_repos = [
+        _get_org_repo(idempotency_key=str(repo_id), name=name)
+        for name, repo_id in repo_ids.items()
+    ]
+    handler = GithubETLHandler(
+        "org_id", api, None, None, None, repo_metadata_fetch_concurrency=4
+    )
+
+    refreshed_org_repos = handler.get_org_repos(org_repos)
+
+    assert [org_repo.name for org_repo in refreshed_org_repos] == list(repo_ids)
+    assert 1 < api.peak_in_flight <= 4
+    assert sorted(api.contributor_calls) == sorted(repo_ids)
+    assert all(
+        org_repo.pushed_at == PUSHED_AT and org_repo.contributors == [["author", 3]]
+        for org_repo in refreshed_org_repos
+    )
+
+
+def test_github_get_org_repos_keeps_fresh_contributors_of_unpushed_repos():
+    refreshed_at = time_now() - timedelta(hours=1)
+    api = FakeGithubApi({"pushed": 1, "unpushed": 2})
+    org_repos = [
+        _get_org_repo(
+            idempotency_key="1",
+            name="pushed",
+            contributors=[["old", 1]],
+            pushed_at=PUSHED_AT - timedelta(days=1),
+            contributors_refreshed_at=refreshed_at,
+        ),
+        _get_org_repo(
+            idempotency_key="2",
+            name="unpushed",
+            contributors=[["old", 1]],
+            pushed_at=PUSHED_AT,
+            contributors_refreshed_at=refreshed_at,
+        ),
+    ]
+    handler = GithubETLHandler("org_id", api, None, None, None)
+
+    pushed, unpushed = handler.get_org_repos(org_repos)
+
+    assert api.contributor_calls == ["pushed"]
+    assert pushed.contributors == [["author", 3]]
+    assert pushed.contributors_refreshed_at > refreshed_at
+    assert unpushed.contributors == [["old", 1]]
+    assert unpushed.contributors_refreshed_at == refreshed_at
+
+
+def test_github_get_org_repos_skips_repos_that_were_replaced():
+    api = FakeGithubApi({"repo": 2})
+    handler = GithubETLHandler("org_id", api, None, None, None)
+
+    assert handler.get_org_repos([_get_org_repo(idempotency_key="1")]) == []
+
+
+class FakeGitlabApi:
+    def __init__(self, project_ids):
+        self.project_ids = project_ids
+        self.contributor_calls = []
+
+    def get_project(self, project_id):
+        if project_id not in self.project_ids:
+            raise Exception(f"Project {project_id} not found")
+        return GitlabRepo(
+            {
+                "id": int(project_id),
+                "name": f"project-{project_id}",
+                "namespace": {"full_path": "group"},
+                "last_activity_at": "2024-01-01T00:00:00Z",
+            }
+        )
+
+    def get_project_contributors(self, project_id):
+        self.contributor_calls.append(project_id)
+        return [{"email": "author@example.com", "commits": 2}]
+
+
+def test_gitlab_get_org_repos_skips_failed_projects_and_unchanged_contributors():
+    api = FakeGitlabApi({"1", "2"})
+    org_repos = [
+        _get_org_repo(idempotency_key="1"),
+        _get_org_repo(idempotency_key="404"),
+        _get_org_repo(
+            idempotency_key="2",
+            contributors={"contributions": [["old@example.com", 1]]},
+            pushed_at=PUSHED_AT,
+            contributors_refreshed_at=time_now(),
+        ),
+    ]
+    handler = GitlabETLHandler("org_id", api, None, None, None)
+
+    refreshed_org_repos = handler.get_org_repos(org_repos)
+
+    assert [org_repo.idempotency_key for org_repo in refreshed_org_repos] == ["1", "2"]
+    assert api.contributor_calls == ["1"]
+    assert refreshed_org_repos[0].contributors == {
+        "contributions": [["author@example.com", 2]]
+    }
+    assert refreshed_org_repos[0].pushed_at == PUSHED_AT
+    assert refreshed_org_repos[1].contributors == {
+        "contributions": [["old@example.com", 1]]
+    }
@@ -1,7 +1,10 @@
 from datetime import datetime
 from mhq.store.models.code.enums import PullRequestState
 from mhq.store.models.code.pull_requests import PullRequest, PullRequestRevertPRMapping
-from mhq.service.code.sync.revert_pr_gitlab_sync import RevertPRsGitlabSyncHandler
+from mhq.service.code.sync.revert_pr_gitlab_sync import (
+    RevertPRsGitlabSyncHandler,
+    get_reverted_merge_commit_sha,
+)
 
 
 def test_get_revert_merge_commit_hash():
@@ -32,7 +35,7 @@ def test_process_revert_prs_empty_list():
 
 def test_process_revert_prs_no_revert_prs():
     class FakeCodeRepoService:
-        def get_prs_by_head_branch_match_strings(self, repo_ids, match_strings):
+        def get_revert_prs_by_reverted_merge_commit_shas(self, repo_ids, shas):
             return []
 
         def get_reverted_prs_by_merge_commit_hash(self, repo_ids, merge_commit_hashes):
@@ -73,7 +76,7 @@ def test_process_revert_prs_with_revert_prs():
                 )
             ]
 
-        def get_prs_by_head_branch_match_strings(self, repo_ids, match_strings):
+        def get_revert_prs_by_reverted_merge_commit_shas(self, repo_ids, shas):
             return []
 
     handler = RevertPRsGitlabSyncHandler(FakeCodeRepoService())
@@ -106,12 +109,13 @@ def test_process_revert_prs_with_original_pr():
         def get_reverted_prs_by_merge_commit_hash(self, repo_ids, merge_commit_hashes):
             return []
 
-        def get_prs_by_head_branch_match_strings(self, repo_ids, match_strings):
+        def get_revert_prs_by_reverted_merge_commit_shas(self, repo_ids, shas):
             return [
                 PullRequest(
                     id="1",
                     repo_id="repo1",
                     head_branch="revert-abcdef12",
+                    reverted_merge_commit_sha="abcdef12",
                     state=PullRequestState.MERGED,
                     merge_commit_sha="1234567890abcdef",
                 )
@@ -151,7 +155,7 @@ def test_process_revert_prs_datetime():
                 )
             ]
 
-        def get_prs_by_head_branch_match_strings(self, repo_ids, match_strings):
+        def get_revert_prs_by_reverted_merge_commit_shas(self, repo_ids, shas):
             return []
 
     handler = RevertPRsGitlabSyncHandler(FakeCodeRepoService())
@@ -194,7 +198,7 @@ def test_process_revert_prs_with_no_mappings_found():
         def get_reverted_prs_by_merge_commit_hash(self, repo_ids, merge_commit_hashes):
             return []
 
-        def get_prs_by_head_branch_match_strings(self, repo_ids, match_strings):
+        def get_revert_prs_by_reverted_merge_commit_shas(self, repo_ids, shas):
             return []
 
     handler = RevertPRsGitlabSyncHandler(FakeCodeRepoService())
@@ -232,12 +236,13 @@ def test_process_revert_prs_with_duplicate_mappings():
                 )
             ]
 
-        def get_prs_by_head_branch_match_strings(self, repo_ids, match_strings):
+        def get_revert_prs_by_reverted_merge_commit_shas(self, repo_ids, shas):
             return [
                 PullRequest(
                     id="1",
                     repo_id="repo1",
                     head_branch="revert-abcdef12",
+                    reverted_merge_commit_sha="abcdef12",
                     state=PullRequestState.MERGED,
                     merge_commit_sha="1234567890abcdef",
                 )
@@ -266,3 +271,9 @@ def test_process_revert_prs_with_duplicate_mappings():
     assert isinstance(result[0], PullRequestRevertPRMapping)
     assert result[0].pr_id == "1"
     assert result[0].reverted_pr == "2"
+
+
+def test_get_reverted_merge_commit_sha_is_lowercased():
+    assert get_reverted_merge_commit_sha("revert-ABCDEF12") == "abcdef12"
+    assert get_reverted_merge_commit_sha("revert-abcdef1") is None
+    assert get_reverted_merge_commit_sha(None) is None
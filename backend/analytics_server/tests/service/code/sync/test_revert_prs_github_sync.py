@@ -0,0 +1,67 @@
+from mhq.service.code.sync.revert_prs_github_sync import (
+    RevertPRsGitHubSyncHandler,
+    get_reverted_pr_number,
+)
+from mhq.store.models.code import PullRequestState
+from tests.factories.models.code import get_pull_request
+
+REPO_ID = "repo1"
+
+
+def test_get_reverted_pr_number():
+    assert get_reverted_pr_number("revert-123-feature") == "123"
+    assert get_reverted_pr_number("user/revert-45-fix_login") == "45"
+    assert get_reverted_pr_number("revert-123") is None
+    assert get_reverted_pr_number("feature") is None
+    assert get_reverted_pr_number(None) is None
+
+
+def test_original_prs_are_matched_to_revert_prs_by_reverted_pr_number():
+    original_pr = get_pull_request(
+        repo_id=REPO_ID, number="12", state=PullRequestState.MERGED
+    )
+    revert_pr = get_pull_request(
+        repo_id=REPO_ID,
+        number="20",
+        head_branch="revert-12-feature",
+        reverted_pr_number="12",
+    )
+
+    class FakeCodeRepoService:
+        def __init__(self):
+            self.lookups = []
+
+        def get_revert_prs_by_reverted_pr_numbers(self, repo_ids, numbers):
+            self.lookups.append((repo_ids, numbers))
+            return [revert_pr]
+
+        def get_reverted_prs_by_numbers(self, repo_ids, numbers):
+            return []
+
+    code_repo_service = FakeCodeRepoService()
+    mappings = RevertPRsGitHubSyncHandler(code_repo_service)([original_pr])
+
+    assert code_repo_service.lookups == [([REPO_ID], ["12"])]
+    assert [(m.pr_id, m.reverted_pr) for m in mappings] == [
+        (revert_pr.id, original_pr.id)
+    ]
+
+
+def test_revert_prs_are_matched_to_original_prs_by_number():
+    original_pr = get_pull_request(
+        repo_id=REPO_ID, number="12", state=PullRequestState.MERGED
+    )
+    revert_pr = get_pull_request(
+        repo_id=REPO_ID, number="20", head_branch="revert-12-feature"
+    )
+
+    class FakeCodeRepoService:
+        def get_reverted_prs_by_numbers(self, repo_ids, numbers):
+            assert numbers == ["12"]
+            return [original_pr]
+
+    mappings = RevertPRsGitHubSyncHandler(FakeCodeRepoService())([revert_pr])
+
+    assert [(m.pr_id, m.reverted_pr) for m in mappings] == [
+        (revert_pr.id, original_pr.id)
+    ]
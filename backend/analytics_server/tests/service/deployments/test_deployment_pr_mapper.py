@@ -1,3 +1,4 @@
+import random
 from datetime import timedelta
 
 from mhq.service.deployments.deployment_pr_mapper import DeploymentPRMapperService
@@ -181,3 +182,90 @@ def test_deployment_pr_mapper_ignores_sub_prs_merged_post_main_pr_merge():
     )
 
     assert sorted(prs) == sorted([first_feature_pr, pr_to_release])
+
+
+def _get_prs_merge_to_deploy_per_deployment(prs, deployments):
+    """
+    Merge to deploy as computed by mapping every deployment on its own, in order, over the
+    PRs not shipped by an earlier deployment.
+    """
+    merge_to_deploy_by_pr_id = {}
+    for deployment in sorted(deployments, key=lambda d: d.conducted_at):
+        pending_prs = [
+            pr
+            for pr in prs
+            if pr.id not in merge_to_deploy_by_pr_id
+            and pr.state_changed_at <= deployment.conducted_at
+        ]
+        for pr in DeploymentPRMapperService().get_all_prs_deployed(
+            pending_prs, deployment
+        ):
+            merge_to_deploy_by_pr_id[pr.id] = int(
+                (deployment.conducted_at - pr.state_changed_at).total_seconds()
+            )
+    return merge_to_deploy_by_pr_id
+
+
+def test_get_prs_merge_to_deploy_assigns_each_pr_to_its_first_deployment():
+    t = time_now()
+    pr_to_main = get_pull_request(
+        state=PullRequestState.MERGED,
+        head_branch="feature",
+        base_branch="main",
+        state_changed_at=t,
+    )
+    pr_to_release = get_pull_request(
+        state=PullRequestState.MERGED,
+        head_branch="main",
+        base_branch="release",
+        state_changed_at=t + timedelta(hours=1),
+    )
+    late_pr_to_main = get_pull_request(
+        state=PullRequestState.MERGED,
+        head_branch="fix",
+        base_branch="main",
+        state_changed_at=t + timedelta(hours=2),
+    )
+    deployments = [
+        get_repo_workflow_run(
+            head_branch="release", conducted_at=t + timedelta(hours=3)
+        ),
+        get_repo_workflow_run(head_branch="main", conducted_at=t + timedelta(hours=5)),
+    ]
+
+    assert DeploymentPRMapperService().get_prs_merge_to_deploy(
+        [pr_to_main, pr_to_release, late_pr_to_main], deployments
+    ) == {
+        pr_to_main.id: 3 * 3600,
+        pr_to_release.id: 2 * 3600,
+        late_pr_to_main.id: 3 * 3600,
+    }
+
+
+def test_get_prs_merge_to_deploy_matches_mapping_each_deployment_on_its_own():
+    rng = random.Random(42)
+    t = time_now()
+    branches = ["main", "release", "develop", "feature-a", "feature-b", "hotfix"]
+    for _ in range(50):
+        prs = []
+        for _ in range(rng.randint(0, 40)):
+            head_branch, base_branch = rng.sample(branches, 2)
+            prs.append(
+                get_pull_request(
+                    state=PullRequestState.MERGED,
+                    head_branch=head_branch,
+                    base_branch=base_branch,
+                    state_changed_at=t + timedelta(minutes=rng.randint(0, 600)),
+                )
+            )
+        deployments = [
+            get_repo_workflow_run(
+                head_branch=rng.choice(branches),
+                conducted_at=t + timedelta(minutes=rng.randint(0, 700)),
+            )
+            for _ in range(rng.randint(0, 15))
+        ]
+
+        assert DeploymentPRMapperService().get_prs_merge_to_deploy(
+            prs, deployments
+        ) == _get_prs_merge_to_deploy_per_deployment(prs, deployments)
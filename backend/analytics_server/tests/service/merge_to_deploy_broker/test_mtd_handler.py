@@ -0,0 +1,251 @@
+from datetime import timedelta
+
+from mhq.service.bookmark import BookmarkType
+from mhq.service.deployments import DeploymentPRMapperService
+from mhq.service.merge_to_deploy_broker.mtd_handler import MergeToDeployCacheHandler
+from mhq.store.models.code import (
+    OrgRepo,
+    PullRequestState,
+    RepoWorkflow,
+    RepoWorkflowRunsStatus,
+)
+from mhq.utils.string import uuid4_str
+from mhq.utils.time import time_now
+from tests.factories.models.code import get_pull_request, get_repo_workflow_run
+
+T = time_now()
+
+
+class FakeCodeRepoService:
+    def __init__(self, org_repo, prs):
+        self.org_repo = org_repo
+        self.prs = prs
+        self.pr_queries = []
+        self.updates = []
+
+    def get_repo_by_id(self, repo_id):
+        return self.org_repo
+
+    def get_prs_in_repo_merged_before_given_date_with_merge_to_deploy_as_null(
+        self, repo_id, to_time
+    ):
+        self.pr_queries.append(to_time)
+        return [pr for pr in self.prs if pr.state_changed_at <= to_time]
+
+    def update_prs_merge_to_deploy(self, merge_to_deploy_by_pr_id):
+        self.updates.append(merge_to_deploy_by_pr_id)
+
+
+class FakeWorkflowRepoService:
+    def __init__(self, repo_workflow_runs):
+        self.repo_workflow_runs = repo_workflow_runs
+
+    def get_repo_workflows_by_repo_id(self, repo_id):
+        return [RepoWorkflow(id=uuid4_str())]
+
+    def get_repo_workflow_runs_conducted_after_time(self, repo_id, from_time, limit):
+        return self.repo_workflow_runs
+
+
+class FakeLock:
+    def __init__(self, lock_service, key):
+        self.lock_service = lock_service
+        self.key = key
+
+    def acquire(self, blocking=True):
+        if self.key in self.lock_service.held_keys and not blocking:
+            return False
+        self.lock_service.held_keys.discard(self.key)
+        self.lock_service.acquired_keys.append((self.key, blocking))
+        return True
+
+    def release(self):
+        return
+
+
+class FakeLockService:
+    def __init__(self, held_keys=None):
+        self.held_keys = set(held_keys or [])
+        self.acquired_keys = []
+
+    def acquire_lock(self, key):
+        return FakeLock(self, key)
+
+
+class FakeOrgCodeRepoService(FakeCodeRepoService):
+    def __init__(self, org_repos, failing_repo_ids=()):
+        super().__init__(None, [])
+        self.org_repos = {str(org_repo.id): org_repo for org_repo in org_repos}
+        self.failing_repo_ids = failing_repo_ids
+
+    def get_active_org_repos(self, org_id):
+        return list(self.org_repos.values())
+
+    def get_repo_by_id(self, repo_id):
+        if repo_id in self.failing_repo_ids:
+            raise Exception("db unavailable")
+        return self.org_repos[repo_id]
+
+
+class FakeBookmarkService:
+    def __init__(self):
+        self.updates = []
+
+    def get_bookmark(self, entity_id, bookmark_type, provider):
+        return None
+
+    def update_bookmark(self, entity_id, bookmark_type, provider, bookmark):
+        self.updates.append((entity_id, bookmark_type, bookmark))
+
+
+def test_merge_to_deploy_is_cached_with_one_pr_load_update_and_bookmark():
+    org_repo = OrgRepo(id=uuid4_str(), provider="github")
+    first_pr = get_pull_request(
+        state=PullRequestState.MERGED,
+        head_branch="feature",
+        base_branch="main",
+        state_changed_at=T,
+    )
+    second_pr = get_pull_request(
+        state=PullRequestState.MERGED,
+        head_branch="fix",
+        base_branch="main",
+        state_changed_at=T + timedelta(hours=2),
+    )
+    repo_workflow_runs = [
+        get_repo_workflow_run(
+            head_branch="main",
+            status=RepoWorkflowRunsStatus.SUCCESS,
+            conducted_at=T + timedelta(hours=1),
+        ),
+        get_repo_workflow_run(
+            head_branch="main",
+            status=RepoWorkflowRunsStatus.FAILURE,
+            conducted_at=T + timedelta(hours=3),
+        ),
+        get_repo_workflow_run(
+            head_branch="main",
+            status=RepoWorkflowRunsStatus.SUCCESS,
+            conducted_at=T + timedelta(hours=4),
+        ),
+    ]
+    code_repo_service = FakeCodeRepoService(org_repo, [first_pr, second_pr])
+    bookmark_service = FakeBookmarkService()
+    handler = MergeToDeployCacheHandler(
+        uuid4_str(),
+        code_repo_service,
+        FakeWorkflowRepoService(repo_workflow_runs),
+        DeploymentPRMapperService(),
+        None,
+        bookmark_service,
+    )
+
+    handler._process_deployments_for_merge_to_deploy_caching(str(org_repo.id))
+
+    assert code_repo_service.pr_queries == [T + timedelta(hours=4)]
+    assert code_repo_service.updates == [{first_pr.id: 3600, second_pr.id: 2 * 3600}]
+    assert bookmark_service.updates == [
+        (
+            str(org_repo.id),
+            BookmarkType.MERGE_TO_DEPLOY_BOOKMARK,
+            T + timedelta(hours=4),
+        )
+    ]
+
+
+def test_bookmark_moves_past_runs_that_ship_no_prs():
+    org_repo = OrgRepo(id=uuid4_str(), provider="github")
+    code_repo_service = FakeCodeRepoService(org_repo, [])
+    bookmark_service = FakeBookmarkService()
+    handler = MergeToDeployCacheHandler(
+        uuid4_str(),
+        code_repo_service,
+        FakeWorkflowRepoService(
+            [get_repo_workflow_run(head_branch="main", conducted_at=T)]
+        ),
+        DeploymentPRMapperService(),
+        None,
+        bookmark_service,
+    )
+
+    handler._process_deployments_for_merge_to_deploy_caching(str(org_repo.id))
+
+    assert code_repo_service.updates == []
+    assert [bookmark for *_, bookmark in bookmark_service.updates] == [T]
+
+
+def _get_lock_key(org_repo):
+    return "{org_repo}:" + f"{str(org_repo.id)}:merge_to_deploy_broker"
+
+
+def _get_org_handler(org_repos, lock_service, max_workers=1, failing_repo_ids=()):
+    def _get_handler():
+        return MergeToDeployCacheHandler(
+            uuid4_str(),
+            FakeOrgCodeRepoService(org_repos, failing_repo_ids),
+            FakeWorkflowRepoService(
+                [get_repo_workflow_run(head_branch="main", conducted_at=T)]
+            ),
+            DeploymentPRMapperService(),
+            lock_service,
+            FakeBookmarkService(),
+            max_workers=max_workers,
+            worker_handler_factory=_get_handler,
+        )
+
+    return _get_handler()
+
+
+def test_process_org_mtd_reports_timings_and_lag_per_repo():
+    org_repos = [OrgRepo(id=uuid4_str(), provider="github") for _ in range(4)]
+    lock_service = FakeLockService()
+    handler = _get_org_handler(org_repos, lock_service, max_workers=3)
+
+    reports = handler.process_org_mtd()
+
+    assert [report.repo_id for report in reports] == [
+        str(org_repo.id) for org_repo in org_repos
+    ]
+    for report in reports:
+        assert not report.skipped and not report.error
+        assert report.deployments_processed == 1
+        assert report.bookmark == T
+        assert report.caught_up
+        assert report.duration_seconds >= 0
+        assert report.lag_seconds >= 0
+    assert sorted(lock_service.acquired_keys) == sorted(
+        (_get_lock_key(org_repo), False) for org_repo in org_repos
+    )
+
+
+def test_repos_locked_by_another_worker_are_skipped_or_waited_for():
+    org_repos = [OrgRepo(id=uuid4_str(), provider="github") for _ in range(2)]
+    locked_key = _get_lock_key(org_repos[1])
+
+    lock_service = FakeLockService(held_keys=[locked_key])
+    reports = _get_org_handler(org_repos, lock_service).process_org_mtd(
+        wait_for_locked_repos=False
+    )
+    assert [report.skipped for report in reports] == [False, True]
+    assert reports[1].deployments_processed == 0
+
+    lock_service = FakeLockService(held_keys=[locked_key])
+    reports = _get_org_handler(org_repos, lock_service).process_org_mtd()
+    assert [report.skipped for report in reports] == [False, False]
+    assert (locked_key, True) in lock_service.acquired_keys
+
+
+def test_failing_repo_does_not_stop_other_repos():
+    org_repos = [OrgRepo(id=uuid4_str(), provider="github") for _ in range(3)]
+    failing_repo_id = str(org_repos[1].id)
+    handler = _get_org_handler(
+        org_repos,
+        FakeLockService(),
+        max_workers=2,
+        failing_repo_ids=(failing_repo_id,),
+    )
+
+    reports = handler.process_org_mtd()
+
+    assert [bool(report.error) for report in reports] == [False, True, False]
+    assert [report.deployments_processed for report in reports] == [1, 0, 1]
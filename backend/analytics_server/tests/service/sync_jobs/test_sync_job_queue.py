@@ -0,0 +1,314 @@
+import time
+from datetime import timedelta
+
+from flask import Flask
+from flask.globals import app_ctx
+
+from mhq.service.sync_jobs import jobs, queue as queue_module, worker
+from mhq.service.sync_jobs.jobs import (
+    SyncJob,
+    SyncJobStatus,
+    SyncTaskResult,
+    get_sync_job_progress,
+)
+from mhq.service.sync_jobs.queue import SyncJobQueue
+from mhq.service.sync_jobs.worker import enqueue_org_sync, process_sync_tasks
+from mhq.utils.time import time_now
+
+ORG_ID = "org_id"
+WORKER_ID = "worker_id"
+GRAPH = {
+    "org_repos:github": [],
+    "pull_requests:1": ["org_repos:github"],
+    "workflows:1": [],
+    "merge_to_deploy:1": ["pull_requests:1", "workflows:1"],
+    "incidents": ["pull_requests:1"],
+}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = str(value).encode()
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def expire(self, key, seconds):
+        return key in self.values
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1).encode()
+        return int(self.values[key])
+
+    def lpush(self, key, value):
+        self.values.setdefault(key, []).insert(0, str(value).encode())
+
+    def rpop(self, key):
+        items = self.values.get(key)
+        return items.pop() if items else None
+
+    def lmove(self, source, destination, src="LEFT", dest="RIGHT"):
+        items = self.values.get(source)
+        if not items:
+            return None
+        value = items.pop() if src == "RIGHT" else items.pop(0)
+        destination_items = self.values.setdefault(destination, [])
+        if dest == "LEFT":
+            destination_items.insert(0, value)
+        else:
+            destination_items.append(value)
+        return value
+
+    def blmove(self, source, destination, timeout, src="LEFT", dest="RIGHT"):
+        return self.lmove(source, destination, src, dest)
+
+    def lrem(self, key, count, value):
+        items = self.values.get(key, [])
+        value = value if isinstance(value, bytes) else str(value).encode()
+        if value in items:
+            items.remove(value)
+            return 1
+        return 0
+
+    def ltrim(self, key, start, end):
+        end = None if end == -1 else end + 1
+        self.values[key] = self.values.get(key, [])[start:end]
+
+    def lrange(self, key, start, end):
+        end = None if end == -1 else end + 1
+        return self.values.get(key, [])[start:end]
+
+    def hset(self, key, mapping):
+        self.values.setdefault(key, {}).update(
+            {k.encode(): str(v).encode() for k, v in mapping.items()}
+        )
+
+    def hsetnx(self, key, field, value):
+        hash_values = self.values.setdefault(key, {})
+        if field.encode() in hash_values:
+            return 0
+        hash_values[field.encode()] = str(value).encode()
+        return 1
+
+    def hincrby(self, key, field, amount):
+        hash_values = self.values.setdefault(key, {})
+        hash_values[field.encode()] = str(
+            int(hash_values.get(field.encode(), 0)) + amount
+        ).encode()
+        return int(hash_values[field.encode()])
+
+    def hgetall(self, key):
+        return dict(self.values.get(key, {}))
+
+    def hdel(self, key, field):
+        return int(self.values.get(key, {}).pop(field.encode(), None) is not None)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+
+def _run_tasks_in_order(monkeypatch, ran):
+    def _get_task_func(org_id, key):
+        def _run():
+            ran.append(key)
+            if key == "workflows:1":
+                raise Exception("workflow sync failed")
+            return 2
+
+        return _run
+
+    monkeypatch.setattr(worker, "get_org_sync_task_func", _get_task_func)
+
+
+def test_tasks_are_queued_once_their_dependencies_finish(monkeypatch):
+    queue = SyncJobQueue(FakeRedis())
+    ran = []
+    _run_tasks_in_order(monkeypatch, ran)
+    monkeypatch.setattr(worker, "get_org_sync_task_graph", lambda org_id: GRAPH)
+
+    job = enqueue_org_sync(ORG_ID, queue)
+    assert enqueue_org_sync(ORG_ID, queue).id == job.id
+    assert queue.get_job_progress(job.id)["status"] == SyncJobStatus.QUEUED.value
+
+    assert process_sync_tasks(queue) == len(GRAPH)
+
+    assert ran.index("merge_to_deploy:1") > max(
+        ran.index("pull_requests:1"), ran.index("workflows:1")
+    )
+    assert ran.index("incidents") > ran.index("pull_requests:1")
+
+    progress = queue.get_job_progress(job.id)
+    assert progress["status"] == SyncJobStatus.COMPLETED.value
+    assert progress["tasks"] == {
+        "total": 5,
+        "completed": 5,
+        "failed": 1,
+        "skipped": 0,
+    }
+    assert progress["eta_seconds"] == 0
+    stages = {stage["stage"]: stage for stage in progress["stages"]}
+    assert stages["pull_requests"]["items"] == 2
+    assert stages["workflows"]["failed"] == 1
+    assert queue.get_recent_job_ids() == [job.id]
+
+    assert queue.get_active_job(ORG_ID) is None
+    assert enqueue_org_sync(ORG_ID, queue).id != job.id
+
+
+def test_pull_requests_are_skipped_when_the_repo_refresh_fails(monkeypatch):
+    queue = SyncJobQueue(FakeRedis())
+    ran = []
+
+    def _get_task_func(org_id, key):
+        def _run():
+            ran.append(key)
+            if key == "org_repos:github":
+                raise Exception("Github Personal Access Token is invalid")
+            return 2
+
+        return _run
+
+    monkeypatch.setattr(worker, "get_org_sync_task_func", _get_task_func)
+    monkeypatch.setattr(worker, "get_org_sync_task_graph", lambda org_id: GRAPH)
+
+    job = enqueue_org_sync(ORG_ID, queue)
+    process_sync_tasks(queue)
+
+    assert "pull_requests:1" not in ran
+    assert "merge_to_deploy:1" in ran
+    assert "incidents" in ran
+    progress = queue.get_job_progress(job.id)
+    assert progress["status"] == SyncJobStatus.COMPLETED.value
+    assert progress["tasks"] == {
+        "total": 5,
+        "completed": 5,
+        "failed": 1,
+        "skipped": 1,
+    }
+    stages = {stage["stage"]: stage for stage in progress["stages"]}
+    assert stages["pull_requests"]["skipped"] == 1
+
+
+def test_task_completed_twice_releases_dependents_once():
+    queue = SyncJobQueue(FakeRedis())
+    job = queue.enqueue_job(
+        ORG_ID, {"workflows:1": [], "merge_to_deploy:1": ["workflows:1"]}
+    )
+    task = queue.pop_task(WORKER_ID)
+    result = SyncTaskResult(started_at=0, finished_at=1, items=1)
+
+    queue.complete_task(task, result, WORKER_ID)
+    queue.complete_task(task, result, WORKER_ID)
+
+    assert queue.pop_task(WORKER_ID).key == "merge_to_deploy:1"
+    assert queue.pop_task(WORKER_ID) is None
+    assert queue.get_job_progress(job.id)["tasks"]["completed"] == 1
+
+
+def test_tasks_of_a_worker_killed_mid_task_are_requeued(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(queue_module, "time", clock)
+    redis = FakeRedis()
+    queue = SyncJobQueue(redis, lease_seconds=60)
+    ran = []
+    _run_tasks_in_order(monkeypatch, ran)
+    job = queue.enqueue_job(ORG_ID, GRAPH)
+
+    # A worker killed mid task never completes it nor releases its lease
+    killed_task = queue.pop_task("killed_worker")
+    assert queue.requeue_expired_tasks() == 0
+    assert process_sync_tasks(queue) == 1
+    assert queue.get_active_job(ORG_ID).id == job.id
+
+    clock.now += 61
+    assert process_sync_tasks(queue) == len(GRAPH) - 1
+
+    assert killed_task.key in ran
+    assert queue.get_job_progress(job.id)["status"] == SyncJobStatus.COMPLETED.value
+    assert queue.get_active_job(ORG_ID) is None
+    assert not redis.get("sync_jobs:processing:killed_worker")
+    assert redis.hgetall("sync_jobs:leases") == {}
+
+
+def test_workers_that_stop_release_their_lease_and_processing_list():
+    redis = FakeRedis()
+    queue = SyncJobQueue(redis)
+    queue.enqueue_job(ORG_ID, {"workflows:1": [], "incidents": []})
+    queue.pop_task(WORKER_ID)
+
+    queue.release_worker(WORKER_ID)
+
+    assert redis.hgetall("sync_jobs:leases") == {}
+    assert not redis.get(f"sync_jobs:processing:{WORKER_ID}")
+    assert sorted(
+        task.key for task in [queue.pop_task("other"), queue.pop_task("other")]
+    ) == [
+        "incidents",
+        "workflows:1",
+    ]
+
+
+def test_empty_job_is_finished_right_away():
+    queue = SyncJobQueue(FakeRedis())
+
+    job = queue.enqueue_job(ORG_ID, {})
+
+    assert queue.get_job_progress(job.id)["status"] == SyncJobStatus.COMPLETED.value
+    assert queue.get_active_job(ORG_ID) is None
+
+
+def test_eta_extrapolates_time_taken_over_tasks_left():
+    now = time_now()
+    job = SyncJob(id="job", org_id=ORG_ID, graph=GRAPH)
+    results = {
+        "org_repos:github": SyncTaskResult(started_at=0, finished_at=10, items=1),
+        "workflows:1": SyncTaskResult(started_at=0, finished_at=30, items=4),
+    }
+
+    progress = get_sync_job_progress(
+        job, results, now - timedelta(seconds=60), None, now
+    )
+
+    assert progress["status"] == jobs.SyncJobStatus.RUNNING.value
+    assert progress["eta_seconds"] == 90
+    assert [stage["completed"] for stage in progress["stages"]] == [1, 0, 1, 0, 0]
+
+
+def test_every_task_runs_in_its_own_app_context(monkeypatch):
+    app = Flask(__name__)
+    app_contexts = []
+    torn_down_contexts = []
+
+    def _get_task_func(org_id, key):
+        def _run():
+            app_contexts.append(app_ctx._get_current_object())
+            return 1
+
+        return _run
+
+    app.teardown_appcontext(lambda exc: torn_down_contexts.append(exc))
+    monkeypatch.setattr(worker, "get_org_sync_task_func", _get_task_func)
+    queue = SyncJobQueue(FakeRedis())
+    queue.enqueue_job(ORG_ID, {"workflows:1": [], "workflows:2": []})
+
+    with app.app_context():
+        outer_app_context = app_ctx._get_current_object()
+        assert process_sync_tasks(queue) == 2
+        assert len(torn_down_contexts) == 2
+
+    assert len({id(context) for context in app_contexts}) == 2
+    assert outer_app_context not in app_contexts
@@ -0,0 +1,238 @@
+from mhq.service import sync_data
+from mhq.service.code.sync.refreshed_repos import RefreshedOrgReposStore
+from mhq.service.merge_to_deploy_broker.mtd_handler import MergeToDeployRepoReport
+from mhq.service.sync_data import SyncStage, get_org_sync_tasks, trigger_data_sync
+from mhq.store.models.code import OrgRepo, RepoWorkflow
+from mhq.utils.string import uuid4_str
+
+ORG_ID = "org_id"
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode()
+
+    def get(self, key):
+        return self.values.get(key)
+
+
+class FakeCodeIntegrationService:
+    def get_org_providers(self, org_id):
+        return ["github"]
+
+
+class FakeCodeRepoService:
+    def __init__(self, org_repos):
+        self.org_repos = org_repos
+
+    def get_active_org_repos(self, org_id):
+        return self.org_repos
+
+    def get_repo_by_id(self, repo_id):
+        return next(
+            (repo for repo in self.org_repos if str(repo.id) == str(repo_id)), None
+        )
+
+
+class FakeCodeETLHandler:
+    def __init__(self, org_repos, synced, refresh_error=None, dropped_repo_ids=()):
+        self.org_repos = org_repos
+        self.synced = synced
+        self.refresh_error = refresh_error
+        self.dropped_repo_ids = dropped_repo_ids
+
+    def refresh_org_repos(self, org_id, provider):
+        self.synced.append(("org_repos", provider.value))
+        if self.refresh_error:
+            raise self.refresh_error
+        return [
+            org_repo
+            for org_repo in self.org_repos
+            if str(org_repo.id) not in self.dropped_repo_ids
+        ]
+
+    def sync_repo_pull_requests(self, repo_id):
+        self.synced.append(("pull_requests", repo_id))
+        return 3
+
+
+class FakeWorkflowETLHandler:
+    def __init__(self, repo_workflows, synced):
+        self.repo_workflows = repo_workflows
+        self.synced = synced
+
+    def get_active_repo_workflows(self, org_id):
+        return [(None, repo_workflow) for repo_workflow in self.repo_workflows]
+
+    def sync_repo_workflow(self, repo_workflow_id):
+        self.synced.append(("workflows", repo_workflow_id))
+        return 2
+
+
+class FakeMergeToDeployCacheHandler:
+    def __init__(self, synced):
+        self.synced = synced
+
+    def process_repo(self, repo_id):
+        self.synced.append(("merge_to_deploy", repo_id))
+        return MergeToDeployRepoReport(repo_id=repo_id, deployments_processed=1)
+
+
+def _patch_sync_services(
+    monkeypatch, org_repos, repo_workflows, synced, code_etl_handler=None
+):
+    monkeypatch.setattr(
+        sync_data, "get_code_integration_service", FakeCodeIntegrationService
+    )
+    refreshed_org_repos_store = RefreshedOrgReposStore(FakeRedis())
+    monkeypatch.setattr(
+        sync_data, "get_refreshed_org_repos_store", lambda: refreshed_org_repos_store
+    )
+    monkeypatch.setattr(
+        sync_data, "CodeRepoService", lambda: FakeCodeRepoService(org_repos)
+    )
+    monkeypatch.setattr(
+        sync_data,
+        "get_code_etl_handler",
+        lambda org_id, provider: code_etl_handler
+        or FakeCodeETLHandler(org_repos, synced),
+    )
+    monkeypatch.setattr(
+        sync_data,
+        "get_workflow_etl_handler",
+        lambda org_id: FakeWorkflowETLHandler(repo_workflows, synced),
+    )
+    monkeypatch.setattr(
+        sync_data,
+        "get_merge_to_deploy_cache_handler",
+        lambda org_id: FakeMergeToDeployCacheHandler(synced),
+    )
+    monkeypatch.setattr(
+        sync_data, "sync_org_incidents", lambda org_id: synced.append(("incidents",))
+    )
+
+
+def _get_org_repos_and_workflows():
+    org_repos = [OrgRepo(id=uuid4_str(), provider="github") for _ in range(2)]
+    repo_workflows = [
+        RepoWorkflow(id=uuid4_str(), org_repo_id=org_repos[0].id),
+        RepoWorkflow(id=uuid4_str(), org_repo_id=org_repos[0].id),
+    ]
+    return org_repos, repo_workflows
+
+
+def test_merge_to_deploy_of_a_repo_depends_only_on_its_own_inputs(monkeypatch):
+    org_repos, repo_workflows = _get_org_repos_and_workflows()
+    _patch_sync_services(monkeypatch, org_repos, repo_workflows, [])
+    first_repo_id, second_repo_id = (str(org_repo.id) for org_repo in org_repos)
+
+    dependencies = {task.key: task.depends_on for task in get_org_sync_tasks(ORG_ID)}
+
+    assert dependencies[f"pull_requests:{first_repo_id}"] == ["org_repos:github"]
+    assert dependencies[f"workflows:{repo_workflows[0].id}"] == []
+    assert sorted(dependencies[f"merge_to_deploy:{first_repo_id}"]) == sorted(
+        [f"pull_requests:{first_repo_id}"]
+        + [f"workflows:{repo_workflow.id}" for repo_workflow in repo_workflows]
+    )
+    assert dependencies[f"merge_to_deploy:{second_repo_id}"] == [
+        f"pull_requests:{second_repo_id}"
+    ]
+    assert sorted(dependencies["incidents"]) == sorted(
+        f"pull_requests:{repo_id}" for repo_id in (first_repo_id, second_repo_id)
+    )
+
+
+def test_trigger_data_sync_reports_time_and_items_per_stage(monkeypatch):
+    org_repos, repo_workflows = _get_org_repos_and_workflows()
+    synced = []
+    _patch_sync_services(monkeypatch, org_repos, repo_workflows, synced)
+    monkeypatch.setattr(sync_data, "DATA_SYNC_MAX_WORKERS", 4)
+
+    reports = trigger_data_sync(ORG_ID)
+
+    assert synced[0] == ("org_repos", "github")
+    assert len(synced) == 1 + 2 + 2 + 2 + 1
+    assert synced.index(("incidents",)) > max(
+        synced.index(("pull_requests", str(org_repo.id))) for org_repo in org_repos
+    )
+
+    reports_by_stage = {report.stage: report for report in reports}
+    assert list(reports_by_stage) == list(SyncStage)
+    assert reports_by_stage[SyncStage.ORG_REPOS].items == 2
+    assert reports_by_stage[SyncStage.PULL_REQUESTS].items == 6
+    assert reports_by_stage[SyncStage.WORKFLOWS].items == 4
+    assert reports_by_stage[SyncStage.MERGE_TO_DEPLOY].items == 2
+    assert reports_by_stage[SyncStage.INCIDENTS].tasks == 1
+    for report in reports:
+        assert report.failed == 0
+        assert 0 <= report.wall_clock_seconds
+        assert 0 <= report.busy_seconds
+
+
+def test_trigger_data_sync_skips_pull_requests_when_the_repo_refresh_fails(
+    monkeypatch,
+):
+    org_repos, repo_workflows = _get_org_repos_and_workflows()
+    synced = []
+    _patch_sync_services(
+        monkeypatch,
+        org_repos,
+        repo_workflows,
+        synced,
+        FakeCodeETLHandler(
+            org_repos,
+            synced,
+            refresh_error=Exception("Github Personal Access Token is invalid"),
+        ),
+    )
+    monkeypatch.setattr(sync_data, "DATA_SYNC_MAX_WORKERS", 4)
+
+    reports = trigger_data_sync(ORG_ID)
+
+    assert not [item for item in synced if item[0] == "pull_requests"]
+    assert ("incidents",) in synced
+    reports_by_stage = {report.stage: report for report in reports}
+    assert reports_by_stage[SyncStage.ORG_REPOS].failed == 1
+    assert reports_by_stage[SyncStage.PULL_REQUESTS].tasks == 2
+    assert reports_by_stage[SyncStage.PULL_REQUESTS].skipped == 2
+    assert reports_by_stage[SyncStage.PULL_REQUESTS].failed == 0
+    assert reports_by_stage[SyncStage.MERGE_TO_DEPLOY].tasks == 2
+
+
+def test_trigger_data_sync_skips_pull_requests_of_repos_dropped_by_the_refresh(
+    monkeypatch,
+):
+    org_repos, repo_workflows = _get_org_repos_and_workflows()
+    dropped_repo_id = str(org_repos[1].id)
+    synced = []
+    _patch_sync_services(
+        monkeypatch,
+        org_repos,
+        repo_workflows,
+        synced,
+        FakeCodeETLHandler(org_repos, synced, dropped_repo_ids=(dropped_repo_id,)),
+    )
+
+    reports = trigger_data_sync(ORG_ID)
+
+    assert [item for item in synced if item[0] == "pull_requests"] == [
+        ("pull_requests", str(org_repos[0].id))
+    ]
+    reports_by_stage = {report.stage: report for report in reports}
+    assert reports_by_stage[SyncStage.PULL_REQUESTS].skipped == 1
+    assert reports_by_stage[SyncStage.PULL_REQUESTS].items == 3
+
+
+def test_repos_are_kept_when_no_refresh_was_recorded():
+    store = RefreshedOrgReposStore(FakeRedis())
+
+    assert store.is_repo_kept(ORG_ID, "github", "1")
+
+    store.save_refreshed_repo_ids(ORG_ID, "github", ["1"])
+
+    assert store.is_repo_kept(ORG_ID, "github", "1")
+    assert not store.is_repo_kept(ORG_ID, "github", "2")
+    assert store.is_repo_kept(ORG_ID, "gitlab", "2")
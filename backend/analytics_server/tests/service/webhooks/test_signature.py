@@ -0,0 +1,33 @@
+import hashlib
+import hmac
+
+from mhq.service.webhooks import verify_github_signature, verify_gitlab_token
+
+SECRET = "webhook-secret"
+BODY = b'{"action": "opened"}'
+
+
+def _sign(secret: str, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def test_verify_github_signature_accepts_valid_signature():
+    assert verify_github_signature(SECRET, BODY, _sign(SECRET, BODY))
+
+
+def test_verify_github_signature_rejects_tampered_body_or_wrong_secret():
+    assert not verify_github_signature(SECRET, BODY + b" ", _sign(SECRET, BODY))
+    assert not verify_github_signature(SECRET, BODY, _sign("other", BODY))
+
+
+def test_verify_github_signature_rejects_missing_signature_or_secret():
+    assert not verify_github_signature(SECRET, BODY, None)
+    assert not verify_github_signature(SECRET, BODY, "sha1=abc")
+    assert not verify_github_signature(None, BODY, _sign(SECRET, BODY))
+
+
+def test_verify_gitlab_token():
+    assert verify_gitlab_token(SECRET, SECRET)
+    assert not verify_gitlab_token(SECRET, "other")
+    assert not verify_gitlab_token(SECRET, None)
+    assert not verify_gitlab_token(None, SECRET)
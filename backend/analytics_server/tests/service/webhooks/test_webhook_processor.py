@@ -0,0 +1,185 @@
+from mhq.service.webhooks import WebhookEvent
+from mhq.service.webhooks.events import PullRequestUpdate
+from mhq.service.webhooks import processor as processor_module
+from mhq.service.webhooks.processor import (
+    WebhookEventProcessor,
+    process_webhook_events,
+)
+from mhq.store.models.code import OrgRepo, RepoWorkflowProviders
+from mhq.utils.string import uuid4_str
+
+ORG_ID = uuid4_str()
+
+
+def _github_pr_event(repo_id: int, number: int, event="pull_request"):
+    return WebhookEvent(
+        "github",
+        event,
+        {
+            "action": "opened",
+            "repository": {"id": repo_id},
+            "pull_request": {"number": number},
+        },
+    )
+
+
+def _github_workflow_run_event(repo_id: int, run_id: int, status: str, updated_at: str):
+    return WebhookEvent(
+        "github",
+        "workflow_run",
+        {
+            "repository": {"id": repo_id},
+            "workflow_run": {"id": run_id, "status": status, "updated_at": updated_at},
+        },
+    )
+
+
+class FakeCodeRepoService:
+    def __init__(self, org_repos):
+        self.org_repos = org_repos
+
+    def get_repos_by_idempotency_keys(self, idempotency_keys):
+        return [r for r in self.org_repos if r.idempotency_key in idempotency_keys]
+
+
+def _get_org_repo(
+    idempotency_key: str, provider="github", org_id=ORG_ID, is_active=True
+):
+    return OrgRepo(
+        id=uuid4_str(),
+        org_id=org_id,
+        name=f"repo-{idempotency_key}",
+        provider=provider,
+        idempotency_key=idempotency_key,
+        is_active=is_active,
+    )
+
+
+def test_get_updates_coalesces_events_per_pr():
+    events = [
+        _github_pr_event(1, 10),
+        _github_pr_event(1, 10, event="pull_request_review"),
+        _github_pr_event(1, 11),
+        WebhookEvent(
+            "gitlab",
+            "Merge Request Hook",
+            {"project": {"id": 7}, "object_attributes": {"iid": 3}},
+        ),
+        WebhookEvent(
+            "gitlab",
+            "Note Hook",
+            {
+                "project": {"id": 7},
+                "object_attributes": {"noteable_type": "MergeRequest"},
+                "merge_request": {"iid": 3},
+            },
+        ),
+    ]
+
+    pull_request_updates, workflow_run_updates = WebhookEventProcessor.get_updates(
+        events
+    )
+
+    assert pull_request_updates == [
+        PullRequestUpdate("github", "1", 10),
+        PullRequestUpdate("github", "1", 11),
+        PullRequestUpdate("gitlab", "7", 3),
+    ]
+    assert workflow_run_updates == []
+
+
+def test_get_updates_keeps_latest_state_of_workflow_run():
+    events = [
+        _github_workflow_run_event(1, 100, "in_progress", "2024-01-01T10:00:00Z"),
+        _github_workflow_run_event(1, 100, "completed", "2024-01-01T10:05:00Z"),
+        _github_workflow_run_event(1, 100, "in_progress", "2024-01-01T10:01:00Z"),
+    ]
+
+    _, workflow_run_updates = WebhookEventProcessor.get_updates(events)
+
+    assert [update.workflow_run["status"] for update in workflow_run_updates] == [
+        "completed"
+    ]
+
+
+def test_get_updates_ignores_malformed_and_unknown_events():
+    events = [
+        WebhookEvent("github", "pull_request", {"repository": {"id": 1}}),
+        WebhookEvent("github", "issues", {"repository": {"id": 1}}),
+        WebhookEvent(
+            "gitlab",
+            "Note Hook",
+            {"project": {"id": 7}, "object_attributes": {"noteable_type": "Issue"}},
+        ),
+    ]
+
+    assert WebhookEventProcessor.get_updates(events) == ([], [])
+
+
+def test_process_syncs_only_tracked_repos_of_org():
+    tracked_repo = _get_org_repo("1")
+    org_repos = [
+        tracked_repo,
+        _get_org_repo("2", is_active=False),
+        _get_org_repo("3", org_id=uuid4_str()),
+    ]
+    synced_prs = []
+    synced_runs = []
+
+    processor = WebhookEventProcessor(
+        ORG_ID,
+        FakeCodeRepoService(org_repos),
+        lambda org_id, org_repo, number: synced_prs.append((org_repo.name, number)),
+        lambda org_id, org_repo, provider, run: synced_runs.append(
+            (org_repo.name, provider, run["id"])
+        ),
+    )
+    result = processor.process(
+        [
+            _github_pr_event(1, 10),
+            _github_pr_event(2, 20),
+            _github_pr_event(3, 30),
+            _github_pr_event(4, 40),
+            _github_workflow_run_event(1, 100, "completed", "2024-01-01T10:05:00Z"),
+        ]
+    )
+
+    assert synced_prs == [("repo-1", 10)]
+    assert synced_runs == [("repo-1", RepoWorkflowProviders.GITHUB_ACTIONS, 100)]
+    assert result == {"events": 5, "pull_requests": 1, "workflow_runs": 1}
+
+
+def test_process_continues_after_failed_update():
+    org_repo = _get_org_repo("1")
+    synced_prs = []
+
+    def _sync_pull_request(org_id, org_repo, number):
+        if number == 10:
+            raise Exception("API error")
+        synced_prs.append(number)
+
+    processor = WebhookEventProcessor(
+        ORG_ID, FakeCodeRepoService([org_repo]), _sync_pull_request, None
+    )
+    result = processor.process([_github_pr_event(1, 10), _github_pr_event(1, 11)])
+
+    assert synced_prs == [11]
+    assert result["pull_requests"] == 1
+
+
+def test_process_webhook_events_without_org_processes_nothing(monkeypatch):
+    class FakeQueryValidator:
+        def get_default_org(self):
+            return None
+
+    class FailingQueue:
+        def pop_batch(self, batch_size):
+            raise AssertionError("Queue read without an org")
+
+    monkeypatch.setattr(processor_module, "get_query_validator", FakeQueryValidator)
+
+    assert process_webhook_events(FailingQueue()) == {
+        "events": 0,
+        "pull_requests": 0,
+        "workflow_runs": 0,
+    }
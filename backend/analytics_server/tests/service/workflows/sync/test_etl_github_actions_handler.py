@@ -1,8 +1,11 @@
+from datetime import timedelta
+
 from mhq.service.workflows.sync.etl_github_actions_handler import (
     GithubActionsETLHandler,
 )
-from mhq.store.models.code import RepoWorkflowRunsStatus
+from mhq.store.models.code import OrgRepo, RepoWorkflow, RepoWorkflowRunsStatus
 from mhq.utils.string import uuid4_str
+from mhq.utils.time import time_now
 from tests.factories.models import get_repo_workflow_run
 from tests.factories.models.exapi.github import get_github_workflow_run_dict
 from tests.utilities import compare_objects_as_dicts
@@ -108,3 +111,142 @@ def test__get_repo_workflow_run_duration_given_workflow_run_without_timings_retu
         repo_workflow_run
     )
     assert actual_duration is None
+
+
+def test_get_workflow_runs_looks_up_existing_runs_once_per_page():
+    github_workflow_runs = [
+        get_github_workflow_run_dict(run_id=str(run_id)) for run_id in range(150)
+    ]
+    repo_workflow = RepoWorkflow(id=uuid4_str(), provider_workflow_id="123")
+    existing_run = get_repo_workflow_run(
+        repo_workflow_id=str(repo_workflow.id), provider_workflow_run_id="120"
+    )
+
+    class GithubApiService:
+        def get_workflow_runs(self, *args):
+            return github_workflow_runs
+
+    class WorkflowRepoService:
+        def __init__(self):
+            self.lookups = []
+
+        def get_repo_workflow_runs_by_provider_workflow_run_ids(
+            self, repo_workflow_id, provider_workflow_run_ids
+        ):
+            self.lookups.append(provider_workflow_run_ids)
+            return [
+                run
+                for run in [existing_run]
+                if run.provider_workflow_run_id in provider_workflow_run_ids
+            ]
+
+        def get_repo_workflow_run_by_provider_workflow_run_id(self, *args):
+            raise AssertionError("Runs should be looked up in bulk")
+
+        def get_pending_repo_workflow_runs(self, *args):
+            return []
+
+    workflow_repo_service = WorkflowRepoService()
+    gh_actions_etl_handler = GithubActionsETLHandler(
+        uuid4_str(), GithubApiService(), workflow_repo_service
+    )
+
+    repo_workflow_runs, _ = gh_actions_etl_handler.get_workflow_runs(
+        OrgRepo(org_name="org", name="repo"), repo_workflow, time_now()
+    )
+
+    assert [len(lookup) for lookup in workflow_repo_service.lookups] == [100, 50]
+    assert [run.provider_workflow_run_id for run in repo_workflow_runs] == [
+        str(run_id) for run_id in range(150)
+    ]
+    assert repo_workflow_runs[120].id == existing_run.id
+    assert len({run.id for run in repo_workflow_runs}) == 150
+
+
+def test_get_workflow_runs_refetches_runs_pending_at_last_sync():
+    repo_workflow = RepoWorkflow(id=uuid4_str(), provider_workflow_id="123")
+    pending_runs = [
+        get_repo_workflow_run(
+            repo_workflow_id=str(repo_workflow.id),
+            provider_workflow_run_id=run_id,
+            status=RepoWorkflowRunsStatus.PENDING,
+        )
+        for run_id in ["1", "2", "3"]
+    ]
+
+    class GithubApiService:
+        def __init__(self):
+            self.fetched_run_ids = []
+
+        def get_workflow_runs(self, *args):
+            return [get_github_workflow_run_dict(run_id="3", status="in_progress")]
+
+        def get_workflow_run(self, org_login, repo_name, run_id):
+            self.fetched_run_ids.append(run_id)
+            if run_id == "2":
+                return None
+            return get_github_workflow_run_dict(run_id=run_id)
+
+    class WorkflowRepoService:
+        def get_repo_workflow_runs_by_provider_workflow_run_ids(self, *args):
+            return pending_runs
+
+        def get_pending_repo_workflow_runs(self, repo_workflow_id, conducted_after):
+            return pending_runs
+
+    api = GithubApiService()
+    gh_actions_etl_handler = GithubActionsETLHandler(
+        uuid4_str(), api, WorkflowRepoService()
+    )
+    sync_started_at = time_now()
+
+    repo_workflow_runs, bookmark = gh_actions_etl_handler.get_workflow_runs(
+        OrgRepo(org_name="org", name="repo"),
+        repo_workflow,
+        sync_started_at - timedelta(days=1),
+    )
+
+    assert api.fetched_run_ids == ["1", "2"]
+    assert [
+        (run.provider_workflow_run_id, run.status) for run in repo_workflow_runs
+    ] == [
+        ("3", RepoWorkflowRunsStatus.PENDING),
+        ("1", RepoWorkflowRunsStatus.SUCCESS),
+        ("2", RepoWorkflowRunsStatus.CANCELLED),
+    ]
+    assert repo_workflow_runs[1].id == pending_runs[0].id
+    assert repo_workflow_runs[2] is pending_runs[1]
+    assert bookmark >= sync_started_at
+
+
+def test_get_workflow_runs_cancels_pending_runs_github_no_longer_has():
+    repo_workflow = RepoWorkflow(id=uuid4_str(), provider_workflow_id="123")
+    pending_run = get_repo_workflow_run(
+        repo_workflow_id=str(repo_workflow.id),
+        provider_workflow_run_id="1",
+        status=RepoWorkflowRunsStatus.PENDING,
+    )
+
+    class GithubApiService:
+        def get_workflow_runs(self, *args):
+            return []
+
+        def get_workflow_run(self, org_login, repo_name, run_id):
+            return None
+
+    class WorkflowRepoService:
+        def get_pending_repo_workflow_runs(self, repo_workflow_id, conducted_after):
+            return [pending_run]
+
+    gh_actions_etl_handler = GithubActionsETLHandler(
+        uuid4_str(), GithubApiService(), WorkflowRepoService()
+    )
+    bookmark = time_now() - timedelta(days=1)
+
+    repo_workflow_runs, new_bookmark = gh_actions_etl_handler.get_workflow_runs(
+        OrgRepo(org_name="org", name="repo"), repo_workflow, bookmark
+    )
+
+    assert repo_workflow_runs == [pending_run]
+    assert pending_run.status == RepoWorkflowRunsStatus.CANCELLED
+    assert new_bookmark == bookmark
@@ -0,0 +1,159 @@
+import threading
+import time
+
+from mhq.service.workflows.sync.etl_handler import WorkflowETLHandler
+from mhq.store.models.code import OrgRepo, RepoWorkflow, RepoWorkflowProviders
+from mhq.utils.string import uuid4_str
+
+
+class FakeWorkflowRepoService:
+    def __init__(self, repo_workflows):
+        self.repo_workflows = repo_workflows
+        self.saved_runs = []
+
+    def get_active_repo_workflows_by_repo_ids_and_providers(self, repo_ids, providers):
+        return [
+            repo_workflow
+            for repo_workflow in self.repo_workflows
+            if str(repo_workflow.org_repo_id) in repo_ids
+            and repo_workflow.provider in providers
+        ]
+
+    def save_repo_workflow_runs(self, repo_workflow_runs):
+        self.saved_runs += repo_workflow_runs
+
+
+class FakeWorkflowETLService:
+    def get_workflow_run_from_payload(self, repo_workflow, provider_workflow_run):
+        return (str(repo_workflow.id), provider_workflow_run["id"])
+
+
+def _get_repo_workflow(org_repo: OrgRepo, provider_workflow_id: str) -> RepoWorkflow:
+    return RepoWorkflow(
+        id=uuid4_str(),
+        org_repo_id=org_repo.id,
+        provider=RepoWorkflowProviders.GITHUB_ACTIONS,
+        provider_workflow_id=provider_workflow_id,
+    )
+
+
+def _get_handler(workflow_repo_service) -> WorkflowETLHandler:
+    return WorkflowETLHandler(
+        None,
+        workflow_repo_service,
+        lambda provider: FakeWorkflowETLService(),
+        None,
+        None,
+    )
+
+
+def test_sync_repo_workflow_run_matches_workflow_by_id_or_file_name():
+    org_repo = OrgRepo(id=uuid4_str())
+    by_id = _get_repo_workflow(org_repo, "123")
+    by_file_name = _get_repo_workflow(org_repo, "deploy.yml")
+    workflow_repo_service = FakeWorkflowRepoService([by_id, by_file_name])
+    handler = _get_handler(workflow_repo_service)
+
+    handler.sync_repo_workflow_run(
+        org_repo,
+        RepoWorkflowProviders.GITHUB_ACTIONS,
+        {"id": 1, "workflow_id": 123, "path": ".github/workflows/build.yml"},
+    )
+    handler.sync_repo_workflow_run(
+        org_repo,
+        RepoWorkflowProviders.GITHUB_ACTIONS,
+        {"id": 2, "workflow_id": 456, "path": ".github/workflows/deploy.yml"},
+    )
+
+    assert workflow_repo_service.saved_runs == [
+        (str(by_id.id), 1),
+        (str(by_file_name.id), 2),
+    ]
+
+
+def test_sync_repo_workflow_run_skips_runs_of_untracked_workflows():
+    org_repo = OrgRepo(id=uuid4_str())
+    workflow_repo_service = FakeWorkflowRepoService(
+        [_get_repo_workflow(org_repo, "123")]
+    )
+
+    saved_run = _get_handler(workflow_repo_service).sync_repo_workflow_run(
+        org_repo,
+        RepoWorkflowProviders.GITHUB_ACTIONS,
+        {"id": 1, "workflow_id": 789, "path": ".github/workflows/lint.yml"},
+    )
+
+    assert saved_run is None
+    assert workflow_repo_service.saved_runs == []
+
+
+class FakeCodeRepoService:
+    def __init__(self, org_repos):
+        self.org_repos = {str(org_repo.id): org_repo for org_repo in org_repos}
+
+    def get_repo_by_id(self, repo_id):
+        return self.org_repos.get(repo_id)
+
+
+class FakeWorkerWorkflowRepoService:
+    def __init__(self, repo_workflows):
+        self.repo_workflows = {
+            str(repo_workflow.id): repo_workflow for repo_workflow in repo_workflows
+        }
+
+    def get_repo_workflow_by_id(self, repo_workflow_id):
+        return self.repo_workflows.get(repo_workflow_id)
+
+
+class RecordingWorkflowETLHandler(WorkflowETLHandler):
+    def __init__(self, synced, fail_repo_workflow_id=None, **kwargs):
+        super().__init__(None, None, None, None, None, **kwargs)
+        self.synced = synced
+        self.fail_repo_workflow_id = fail_repo_workflow_id
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _sync_repo_workflow(self, org_repo, repo_workflow):
+        if str(repo_workflow.id) == self.fail_repo_workflow_id:
+            raise Exception("sync failed")
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+            self.synced.append((str(org_repo.id), str(repo_workflow.id)))
+
+
+def test_sync_org_workflows_syncs_workflows_concurrently_with_worker_handlers():
+    org_repos = [OrgRepo(id=uuid4_str()) for _ in range(3)]
+    repo_workflows = [
+        _get_repo_workflow(org_repo, str(i)) for org_repo in org_repos for i in range(2)
+    ]
+    failing_repo_workflow = repo_workflows[0]
+    synced = []
+    handler = RecordingWorkflowETLHandler(
+        synced, fail_repo_workflow_id=str(failing_repo_workflow.id), max_workers=4
+    )
+
+    def _get_worker_handler():
+        worker_handler = handler
+        worker_handler.code_repo_service = FakeCodeRepoService(org_repos)
+        worker_handler.workflow_repo_service = FakeWorkerWorkflowRepoService(
+            repo_workflows
+        )
+        return worker_handler
+
+    handler.worker_handler_factory = _get_worker_handler
+    handler.get_active_repo_workflows = lambda org_id: [
+        (next(r for r in org_repos if r.id == w.org_repo_id), w) for w in repo_workflows
+    ]
+
+    handler.sync_org_workflows("org_id")
+
+    assert sorted(synced) == sorted(
+        (str(repo_workflow.org_repo_id), str(repo_workflow.id))
+        for repo_workflow in repo_workflows[1:]
+    )
+    assert 1 < handler.peak_in_flight <= 4
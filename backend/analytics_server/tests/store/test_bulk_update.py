@@ -0,0 +1,38 @@
+from uuid import uuid4
+
+from sqlalchemy.dialects import postgresql
+
+from mhq.store.bulk import get_bulk_update_statements
+from mhq.store.models.code import PullRequest
+
+
+def _compile(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_bulk_update_sets_column_from_values_list():
+    values_by_pk = {uuid4(): 60, uuid4(): 120}
+
+    statements = get_bulk_update_statements(
+        PullRequest, "merge_to_deploy", values_by_pk
+    )
+
+    assert len(statements) == 1
+    sql = _compile(statements[0])
+    assert sql.startswith('UPDATE "PullRequest" SET merge_to_deploy=new_values.value')
+    assert "updated_in_db_at=now()" in sql
+    assert "FROM (VALUES" in sql
+    assert '"PullRequest".id = new_values.pk' in sql
+    params = set(statements[0].compile().params.values())
+    assert set(values_by_pk) <= params
+    assert {60, 120} <= params
+
+
+def test_bulk_update_is_batched():
+    values_by_pk = {uuid4(): index for index in range(5)}
+
+    statements = get_bulk_update_statements(
+        PullRequest, "merge_to_deploy", values_by_pk, batch_size=2
+    )
+
+    assert len(statements) == 3
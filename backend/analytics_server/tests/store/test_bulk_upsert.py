@@ -0,0 +1,76 @@
+from uuid import uuid4
+
+from sqlalchemy.dialects import postgresql
+
+from mhq.store.bulk import get_bulk_upsert_statements
+from mhq.store.models.code import PullRequest, PullRequestCommit
+
+
+def _compile(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_upsert_conflicts_on_primary_key_and_updates_set_columns():
+    pr = PullRequest(id=uuid4(), number="1", title="Add feature", state="OPEN")
+
+    statements = get_bulk_upsert_statements(PullRequest, [pr])
+
+    assert len(statements) == 1
+    sql = _compile(statements[0])
+    assert "ON CONFLICT (id) DO UPDATE SET" in sql
+    assert "title = excluded.title" in sql
+    assert "state = excluded.state" in sql
+    assert "updated_in_db_at = now()" in sql
+
+
+def test_upsert_leaves_unset_columns_untouched():
+    pr = PullRequest(id=uuid4(), number="1", title="Add feature")
+
+    sql = _compile(get_bulk_upsert_statements(PullRequest, [pr])[0])
+
+    assert "merge_to_deploy" not in sql
+    assert "id = excluded.id" not in sql
+
+
+def test_upsert_keeps_last_object_per_primary_key():
+    pr_id = uuid4()
+    prs = [
+        PullRequest(id=pr_id, number="1", title="first"),
+        PullRequest(id=pr_id, number="1", title="second"),
+    ]
+
+    statements = get_bulk_upsert_statements(PullRequest, prs)
+
+    params = statements[0].compile(dialect=postgresql.dialect()).params
+    assert list(v for k, v in params.items() if k.startswith("title")) == ["second"]
+
+
+def test_upsert_is_batched():
+    commits = [PullRequestCommit(hash=str(i), message="fix") for i in range(5)]
+
+    statements = get_bulk_upsert_statements(PullRequestCommit, commits, batch_size=2)
+
+    assert len(statements) == 3
+
+
+def test_upsert_groups_objects_by_set_columns():
+    prs = [
+        PullRequest(id=uuid4(), number="1", title="Add feature"),
+        PullRequest(id=uuid4(), number="2", title="Fix bug", merge_to_deploy=10),
+        PullRequest(id=uuid4(), number="3", title="Docs"),
+    ]
+
+    statements = get_bulk_upsert_statements(PullRequest, prs)
+
+    assert len(statements) == 2
+    assert "merge_to_deploy" not in _compile(statements[0])
+    assert "merge_to_deploy = excluded.merge_to_deploy" in _compile(statements[1])
+
+
+def test_upsert_with_only_primary_key_still_refreshes_updated_at():
+    commit = PullRequestCommit(hash="abc")
+
+    statements = get_bulk_upsert_statements(PullRequestCommit, [commit])
+
+    sql = _compile(statements[0])
+    assert "ON CONFLICT (hash) DO UPDATE SET updated_in_db_at = now()" in sql
@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+
+from mhq.utils.concurrency import DAGTask, DAGTaskSkipped, run_dag_in_app_context_pool
+
+
+def test_empty_tasks_returns_empty_list():
+    assert run_dag_in_app_context_pool([], 4) == []
+
+
+def test_tasks_run_after_their_dependencies():
+    order = []
+    tasks = [
+        DAGTask("mtd", lambda: order.append("mtd"), depends_on=["prs", "workflows"]),
+        DAGTask("prs", lambda: order.append("prs")),
+        DAGTask("workflows", lambda: order.append("workflows"), depends_on=["prs"]),
+    ]
+
+    results = run_dag_in_app_context_pool(tasks, 1)
+
+    assert order == ["prs", "workflows", "mtd"]
+    assert [result.key for result in results] == ["mtd", "prs", "workflows"]
+
+
+def test_independent_tasks_overlap_while_dependents_wait():
+    other_repo_started = threading.Event()
+    order = []
+
+    def _sync_first_repo():
+        assert other_repo_started.wait(timeout=5)
+        order.append("first")
+        return 10
+
+    def _sync_second_repo():
+        other_repo_started.set()
+        order.append("second")
+        return 5
+
+    tasks = [
+        DAGTask("prs:1", _sync_first_repo),
+        DAGTask("workflows:2", _sync_second_repo),
+        DAGTask("mtd:1", lambda: order.append("mtd"), depends_on=["prs:1"]),
+    ]
+
+    results = run_dag_in_app_context_pool(tasks, 2)
+
+    assert order == ["second", "first", "mtd"]
+    assert [result.result for result in results[:2]] == [10, 5]
+    assert results[2].started_at >= results[0].finished_at
+    assert all(result.duration_seconds >= 0 for result in results)
+
+
+def test_failed_dependency_does_not_stop_dependents():
+    def _fail():
+        raise ValueError("boom")
+
+    tasks = [
+        DAGTask("prs", _fail),
+        DAGTask("mtd", lambda: "done", depends_on=["prs"]),
+    ]
+
+    results = run_dag_in_app_context_pool(tasks, 2)
+
+    assert [result.failed for result in results] == [True, False]
+    assert str(results[0].error) == "boom"
+    assert results[1].result == "done"
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_failed_dependency_skips_dependents_marked_to_skip(max_workers):
+    ran = []
+
+    def _fail():
+        raise ValueError("invalid PAT")
+
+    tasks = [
+        DAGTask("repos", _fail),
+        DAGTask(
+            "prs", lambda: ran.append("prs"), ["repos"], skip_on_failed_dependency=True
+        ),
+        DAGTask(
+            "reverts",
+            lambda: ran.append("reverts"),
+            ["prs"],
+            skip_on_failed_dependency=True,
+        ),
+        DAGTask("mtd", lambda: ran.append("mtd"), depends_on=["prs"]),
+    ]
+
+    results = run_dag_in_app_context_pool(tasks, max_workers)
+
+    assert ran == ["mtd"]
+    assert [result.skipped for result in results] == [False, True, True, False]
+    assert [result.failed for result in results] == [True, False, False, False]
+
+
+def test_task_raising_skipped_is_reported_as_skipped():
+    def _skip():
+        raise DAGTaskSkipped("nothing to sync")
+
+    results = run_dag_in_app_context_pool(
+        [
+            DAGTask("prs", _skip),
+            DAGTask("mtd", lambda: "done", ["prs"], skip_on_failed_dependency=True),
+        ],
+        2,
+    )
+
+    assert [result.skipped for result in results] == [True, True]
+    assert not any(result.failed for result in results)
+
+
+def test_invalid_dependencies_raise():
+    with pytest.raises(ValueError):
+        run_dag_in_app_context_pool([DAGTask("a", lambda: 1, depends_on=["b"])], 2)
+
+    with pytest.raises(ValueError):
+        run_dag_in_app_context_pool(
+            [
+                DAGTask("a", lambda: 1, depends_on=["b"]),
+                DAGTask("b", lambda: 1, depends_on=["a"]),
+            ],
+            2,
+        )
@@ -0,0 +1,52 @@
+import threading
+
+from flask import Flask, current_app
+
+from mhq.utils.concurrency import run_in_app_context_pool
+
+
+def test_empty_items_returns_empty_list():
+    assert run_in_app_context_pool(lambda x: x, [], 4) == []
+
+
+def test_results_are_returned_in_order_of_items():
+    results = run_in_app_context_pool(lambda x: x * 2, [1, 2, 3, 4, 5], 3)
+
+    assert [r.item for r in results] == [1, 2, 3, 4, 5]
+    assert [r.result for r in results] == [2, 4, 6, 8, 10]
+    assert not any(r.failed for r in results)
+
+
+def test_failure_of_one_item_is_isolated():
+    def _func(x):
+        if x == 2:
+            raise ValueError("boom")
+        return x
+
+    results = run_in_app_context_pool(_func, [1, 2, 3], 2)
+
+    assert [r.result for r in results] == [1, None, 3]
+    assert [r.failed for r in results] == [False, True, False]
+    assert str(results[1].error) == "boom"
+
+
+def test_single_worker_runs_serially_on_calling_thread():
+    calling_thread = threading.get_ident()
+
+    results = run_in_app_context_pool(lambda _: threading.get_ident(), [1, 2], 1)
+
+    assert {r.result for r in results} == {calling_thread}
+
+
+def test_workers_run_inside_their_own_app_context():
+    app = Flask(__name__)
+    parent_contexts = []
+
+    def _func(_):
+        return current_app.name, id(current_app._get_current_object())
+
+    with app.app_context():
+        parent_contexts.append(id(current_app._get_current_object()))
+        results = run_in_app_context_pool(_func, [1, 2, 3], 3)
+
+    assert {r.result for r in results} == {(app.name, parent_contexts[0])}
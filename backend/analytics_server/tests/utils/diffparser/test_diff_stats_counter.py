@@ -0,0 +1,42 @@
+from mhq.utils.diffparser import DiffStats, DiffStatsCounter, parse_gitlab_diffs
+
+
+def test_counts_lines_across_all_hunks():
+    diff = (
+        "@@ -1,3 +1,3 @@\n"
+        " context\n"
+        "-old\n"
+        "+new\n"
+        " context\n"
+        "@@ -20,2 +20,4 @@ def function():\n"
+        " context\n"
+        "+first\n"
+        "+second\n"
+        " context\n"
+    )
+
+    assert parse_gitlab_diffs([diff]) == (3, 1, 1)
+
+
+def test_removed_and_added_lines_that_look_like_file_headers_are_counted():
+    diff = "@@ -1,2 +1,2 @@\n--- removed\n-x\n+++ added\n+y\n"
+
+    assert parse_gitlab_diffs([diff]) == (2, 2, 1)
+
+
+def test_hunk_headers_without_line_counts_and_no_newline_markers():
+    diff = "@@ -1 +1 @@\n-a\n\\ No newline at end of file\n+b\n"
+
+    assert parse_gitlab_diffs([diff]) == (1, 1, 1)
+
+
+def test_empty_and_missing_diffs_still_count_as_changed_files():
+    assert parse_gitlab_diffs(["", None, "@@ -0,0 +1 @@\n+a"]) == (1, 0, 3)
+
+
+def test_counter_accumulates_over_many_calls():
+    counter = DiffStatsCounter()
+    counter.add_file_diffs(["@@ -1 +1,2 @@\n a\n+b\n"])
+    counter.add_file_diff("@@ -1,2 +1 @@\n a\n-b\n")
+
+    assert counter.stats == DiffStats(additions=1, deletions=1, changed_files=2)
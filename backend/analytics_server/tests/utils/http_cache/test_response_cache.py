@@ -0,0 +1,174 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mhq.utils.http_cache import (
+    DiskResponseCacheStore,
+    ResponseCache,
+    ResponseCacheStore,
+)
+from mhq.utils.http_session import ConditionalRequestSession
+
+
+class ETagServer:
+    def __init__(self, etag='"v1"'):
+        self.etag = etag
+        self.request_headers = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.request_headers.append(dict(self.headers))
+                if server.etag and self.headers.get("If-None-Match") == server.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = b'[{"login": "author"}]'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if server.etag:
+                    self.send_header("ETag", server.etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                return
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/repos/org/repo"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FailingStore(ResponseCacheStore):
+    def get(self, key):
+        raise ConnectionError("cache down")
+
+    def set(self, key, value, ttl_seconds):
+        raise ConnectionError("cache down")
+
+
+def test_session_answers_not_modified_from_cache(tmp_path):
+    response_cache = ResponseCache(DiskResponseCacheStore(str(tmp_path)))
+    session = ConditionalRequestSession(response_cache, "scope")
+
+    with ETagServer() as server:
+        first_response = session.get(server.url, params={"page": 1})
+        second_response = session.get(server.url, params={"page": 1})
+
+    assert first_response.status_code == second_response.status_code == 200
+    assert second_response.json() == first_response.json() == [{"login": "author"}]
+    assert second_response.headers["ETag"] == '"v1"'
+    assert "If-None-Match" not in server.request_headers[0]
+    assert server.request_headers[1]["If-None-Match"] == '"v1"'
+    assert response_cache.get_stats() == {"hits": 1, "misses": 1}
+
+
+def test_session_refetches_when_resource_changed(tmp_path):
+    response_cache = ResponseCache(DiskResponseCacheStore(str(tmp_path)))
+    session = ConditionalRequestSession(response_cache, "scope")
+
+    with ETagServer() as server:
+        session.get(server.url)
+        server.etag = '"v2"'
+        session.get(server.url)
+        session.get(server.url)
+
+    assert [h.get("If-None-Match") for h in server.request_headers] == [
+        None,
+        '"v1"',
+        '"v2"',
+    ]
+    assert response_cache.get_stats() == {"hits": 1, "misses": 2}
+
+
+def test_session_does_not_cache_responses_without_validators(tmp_path):
+    response_cache = ResponseCache(DiskResponseCacheStore(str(tmp_path)))
+    session = ConditionalRequestSession(response_cache, "scope")
+
+    with ETagServer(etag=None) as server:
+        session.get(server.url)
+        session.get(server.url)
+
+    assert os.listdir(tmp_path) == []
+    assert response_cache.get_stats() == {"hits": 0, "misses": 2}
+
+
+def test_cache_keys_are_scoped_per_token_and_params():
+    url = "https://api.github.com/repos/org/repo/contributors"
+
+    assert ResponseCache.get_key("a", url, {"page": 1}) != ResponseCache.get_key(
+        "b", url, {"page": 1}
+    )
+    assert ResponseCache.get_key("a", url, {"page": 1}) != ResponseCache.get_key(
+        "a", url, {"page": 2}
+    )
+    assert ResponseCache.get_key("a", url, {"page": 1}) == ResponseCache.get_key(
+        "a", f"{url}?page=1"
+    )
+
+
+def test_session_falls_back_to_network_when_store_fails():
+    response_cache = ResponseCache(FailingStore())
+    session = ConditionalRequestSession(response_cache, "scope")
+
+    with ETagServer() as server:
+        response = session.get(server.url)
+
+    assert response.json() == [{"login": "author"}]
+    assert response_cache.get_stats() == {"hits": 0, "misses": 1}
+
+
+def test_disk_store_expires_entries(tmp_path):
+    store = DiskResponseCacheStore(str(tmp_path))
+    store.set("key", "value", ttl_seconds=60)
+    assert store.get("key") == "value"
+
+    path = os.path.join(str(tmp_path), "key.json")
+    os.utime(path, (0, 0))
+
+    assert store.get("key") is None
+    assert not os.path.exists(path)
+
+
+def test_session_skips_cache_when_asked(tmp_path):
+    response_cache = ResponseCache(DiskResponseCacheStore(str(tmp_path)))
+    session = ConditionalRequestSession(response_cache, "scope")
+
+    with ETagServer() as server:
+        session.get(server.url, cache=False)
+        session.get(server.url, cache=False)
+
+    assert os.listdir(tmp_path) == []
+    assert "If-None-Match" not in server.request_headers[1]
+    assert response_cache.get_stats() == {"hits": 0, "misses": 0}
+
+
+def test_disk_store_sweeps_expired_entries_on_set(tmp_path):
+    store = DiskResponseCacheStore(str(tmp_path), sweep_interval_seconds=60)
+    store.set("expired", "value", ttl_seconds=60)
+    store.set("fresh", "value", ttl_seconds=60)
+    os.utime(os.path.join(str(tmp_path), "expired.json"), (0, 0))
+    store._swept_at = 0
+
+    store.set("new", "value", ttl_seconds=60)
+
+    assert sorted(os.listdir(tmp_path)) == ["fresh.json", "new.json"]
+
+
+def test_disk_store_sweeps_at_most_once_per_interval(tmp_path):
+    store = DiskResponseCacheStore(str(tmp_path), sweep_interval_seconds=60)
+    store.set("expired", "value", ttl_seconds=60)
+    os.utime(os.path.join(str(tmp_path), "expired.json"), (0, 0))
+
+    store.set("new", "value", ttl_seconds=60)
+
+    assert sorted(os.listdir(tmp_path)) == ["expired.json", "new.json"]
+    assert store.sweep() == 1
@@ -0,0 +1,277 @@
+import json
+import threading
+from datetime import timedelta
+from uuid import uuid4
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from github.Requester import Requester
+
+from mhq.exapi.github import GithubApiService
+from mhq.exapi.gitlab import GitlabApiService
+from mhq.utils import http_replay
+from mhq.utils.http_replay import (
+    ExapiRecordings,
+    ExapiReplayMode,
+    MissingRecordingError,
+    RecordedResponse,
+)
+from mhq.service.workflows.sync.etl_github_actions_handler import (
+    GithubActionsETLHandler,
+)
+from mhq.store.models.code import OrgRepo, RepoWorkflow
+from mhq.utils.http_session import close_http_sessions
+from mhq.utils.time import time_now
+from tests.factories.provider_server import SyntheticProviderServer, SyntheticVolumes
+
+NOTE = {
+    "id": 1,
+    "body": "approved this merge request",
+    "created_at": "2024-01-01T00:00:00Z",
+    "author": {"username": "dev"},
+}
+COMMIT = {"id": "abc123", "message": "fix", "created_at": "2024-01-01T00:00:00Z"}
+DIFF = "@@ -1 +1,2 @@\n-a\n+b\n+c"
+GITLAB_RESPONSES = {
+    "/api/v4/projects/1/merge_requests/2": ({"iid": 2, "title": "MR"}, {}),
+    "/api/v4/projects/1/merge_requests/2/notes": ([NOTE], {}),
+    "/api/v4/projects/1/merge_requests/2/commits": ([COMMIT], {}),
+    "/api/v4/projects/1/merge_requests/2/diffs?page=1&per_page=20": (
+        [{"diff": DIFF}],
+        {"X-Next-Page": "2"},
+    ),
+    "/api/v4/projects/1/merge_requests/2/diffs?page=2&per_page=20": (
+        [{"diff": DIFF}],
+        {"X-Next-Page": "", "X-RateLimit-Remaining": "0"},
+    ),
+}
+
+
+def _start_gitlab_server(requested_paths):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            requested_paths.append(self.path)
+            body, headers = GITLAB_RESPONSES[self.path]
+            content = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _sync_merge_request(gitlab_api_service: GitlabApiService):
+    details = gitlab_api_service.get_merge_requests_details(1, [("2", True)])[0]
+    return (
+        gitlab_api_service.get_merge_request(1, 2),
+        gitlab_api_service.get_merge_request_diff_stats(1, 2),
+        [note.idempotency_key for note in details.notes],
+        [commit.hash for commit in details.commits],
+        details.diff_stats,
+    )
+
+
+def test_recorded_gitlab_calls_are_replayed_without_network(tmp_path, monkeypatch):
+    requested_paths = []
+    server = _start_gitlab_server(requested_paths)
+    domain = f"http://127.0.0.1:{server.server_port}"
+    try:
+        close_http_sessions()
+        monkeypatch.setattr(
+            http_replay,
+            "exapi_recordings",
+            ExapiRecordings(str(tmp_path), ExapiReplayMode.RECORD),
+        )
+        recorded = _sync_merge_request(GitlabApiService("token", domain))
+    finally:
+        close_http_sessions()
+        server.shutdown()
+        server.server_close()
+
+    monkeypatch.setattr(
+        http_replay,
+        "exapi_recordings",
+        ExapiRecordings(str(tmp_path), ExapiReplayMode.REPLAY),
+    )
+    replayed = _sync_merge_request(GitlabApiService("token", domain))
+    close_http_sessions()
+
+    assert replayed == recorded
+    assert recorded[1].additions == 4 and recorded[1].deletions == 2
+    assert len(requested_paths) == 7
+
+
+def test_rate_limit_headers_are_recorded_but_not_replayed(tmp_path):
+    recordings = ExapiRecordings(str(tmp_path), ExapiReplayMode.REPLAY)
+    recordings.save(
+        RecordedResponse(
+            method="GET",
+            url="https://api.github.com/user",
+            status=200,
+            body="{}",
+            headers={"x-ratelimit-remaining": "0", "ETag": "etag"},
+        )
+    )
+
+    recorded_response = recordings.get("GET", "https://api.github.com/user")
+
+    assert recorded_response.headers["x-ratelimit-remaining"] == "0"
+    assert dict(recorded_response.get_replayed_headers()) == {"ETag": "etag"}
+
+
+def test_pygithub_calls_are_replayed(tmp_path, monkeypatch):
+    recordings = ExapiRecordings(str(tmp_path), ExapiReplayMode.REPLAY)
+    recordings.save(
+        RecordedResponse(
+            method="GET",
+            url="https://ghe.mhq.dev/api/v3/user/orgs",
+            status=200,
+            body=json.dumps([{"login": "middlewarehq", "id": 1}]),
+            headers={"Content-Type": "application/json"},
+        ),
+        params={"per_page": 100},
+    )
+    monkeypatch.setattr(http_replay, "exapi_recordings", recordings)
+
+    try:
+        orgs = GithubApiService("token", "https://ghe.mhq.dev").get_org_list()
+    finally:
+        Requester.resetConnectionClasses()
+        close_http_sessions()
+
+    assert [org.login for org in orgs] == ["middlewarehq"]
+
+
+def test_replay_fails_for_requests_that_were_not_recorded(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        http_replay,
+        "exapi_recordings",
+        ExapiRecordings(str(tmp_path), ExapiReplayMode.REPLAY),
+    )
+
+    with pytest.raises(MissingRecordingError):
+        GitlabApiService("token", "https://gitlab.mhq.dev").get_merge_request(1, 2)
+    close_http_sessions()
+
+
+def test_replayed_responses_wait_for_the_configured_latency(tmp_path):
+    recordings = ExapiRecordings(str(tmp_path), ExapiReplayMode.REPLAY, None)
+    recorded_response = RecordedResponse(
+        method="GET",
+        url="https://api.github.com/user",
+        status=200,
+        body="{}",
+        duration_seconds=0.25,
+    )
+
+    assert recordings.get_latency(recorded_response) == 0.25
+    recordings.latency_seconds = 0.05
+    assert recordings.get_latency(recorded_response) == 0.05
+
+
+def test_recordings_match_requests_regardless_of_param_order_and_default_port():
+    assert ExapiRecordings.get_key(
+        "GET", "https://api.github.com:443/repos/a/b/pulls?state=all&page=2"
+    ) == ExapiRecordings.get_key(
+        "get", "https://api.github.com/repos/a/b/pulls", {"page": 2, "state": "all"}
+    )
+    assert ExapiRecordings.get_key(
+        "POST", "https://api.github.com/graphql", body='{"query": "a"}'
+    ) != ExapiRecordings.get_key(
+        "POST", "https://api.github.com/graphql", body='{"query": "b"}'
+    )
+
+
+class EmptyWorkflowRepoService:
+    def get_pending_repo_workflow_runs(self, repo_workflow_id, created_after):
+        return []
+
+    def get_repo_workflow_runs_by_provider_workflow_run_ids(
+        self, repo_workflow_id, provider_workflow_run_ids
+    ):
+        return []
+
+
+def _sync_workflow_and_merge_requests(server_url: str, bookmark):
+    org_repo = OrgRepo(id=uuid4(), org_name="mhq-bench", name="repo-0")
+    repo_workflow = RepoWorkflow(id=uuid4(), provider_workflow_id="3000")
+    github_actions_etl_handler = GithubActionsETLHandler(
+        "org_id", GithubApiService("token", server_url), EmptyWorkflowRepoService()
+    )
+    workflow_runs, _ = github_actions_etl_handler.get_workflow_runs(
+        org_repo, repo_workflow, bookmark
+    )
+    merge_requests = GitlabApiService("token", server_url).get_project_merge_requests(
+        2000, bookmark
+    )
+    return (
+        [workflow_run.provider_workflow_run_id for workflow_run in workflow_runs],
+        [merge_request["iid"] for merge_request in merge_requests],
+    )
+
+
+def test_syncs_with_bookmarks_taken_later_are_replayed(tmp_path, monkeypatch):
+    volumes = SyntheticVolumes(repos=1, prs_per_repo=5, workflow_runs_per_repo=10)
+    with SyntheticProviderServer(volumes) as server:
+        server_url = server.url
+        close_http_sessions()
+        monkeypatch.setattr(
+            http_replay,
+            "exapi_recordings",
+            ExapiRecordings(str(tmp_path), ExapiReplayMode.RECORD),
+        )
+        try:
+            recorded = _sync_workflow_and_merge_requests(
+                server_url, time_now() - timedelta(days=3)
+            )
+        finally:
+            Requester.resetConnectionClasses()
+            close_http_sessions()
+
+    monkeypatch.setattr(
+        http_replay,
+        "exapi_recordings",
+        ExapiRecordings(str(tmp_path), ExapiReplayMode.REPLAY),
+    )
+    try:
+        replayed = _sync_workflow_and_merge_requests(
+            server_url, time_now() - timedelta(days=3, seconds=-30)
+        )
+    finally:
+        Requester.resetConnectionClasses()
+        close_http_sessions()
+
+    assert len(recorded[0]) == 4 and len(recorded[1]) == 3
+    assert replayed == recorded
+
+
+def test_recordings_match_requests_regardless_of_time_valued_params():
+    assert ExapiRecordings.get_key(
+        "GET",
+        "https://api.github.com/repos/a/b/actions/workflows/1/runs",
+        {"created": ">=2024-01-01T00:00:00+00:00", "page": 1},
+    ) == ExapiRecordings.get_key(
+        "GET",
+        "https://api.github.com/repos/a/b/actions/workflows/1/runs",
+        {"created": ">=2024-01-02T00:00:00+00:00", "page": 1},
+    )
+    assert ExapiRecordings.get_key(
+        "GET",
+        "https://api.github.com/repos/a/b/actions/workflows/1/runs",
+        {"created": ">=2024-01-01T00:00:00+00:00", "page": 1},
+    ) != ExapiRecordings.get_key(
+        "GET",
+        "https://api.github.com/repos/a/b/actions/workflows/1/runs",
+        {"created": ">=2024-01-01T00:00:00+00:00", "page": 2},
+    )
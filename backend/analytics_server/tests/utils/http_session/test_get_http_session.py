@@ -0,0 +1,147 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mhq.exapi.github import GithubApiService
+from mhq.exapi.gitlab import GitlabApiService
+from mhq.utils.http_session import (
+    EXAPI_HTTP_MAX_RETRIES,
+    EXAPI_HTTP_POOL_SIZE,
+    close_http_sessions,
+    get_async_http_session,
+    get_http_session,
+    run_async_http_requests,
+)
+
+
+def test_get_http_session_reuses_session_per_domain_and_token():
+    close_http_sessions()
+
+    session = get_http_session("https://api.github.com", "token")
+
+    assert get_http_session("https://api.github.com", "token") is session
+    assert get_http_session("https://api.github.com", "other_token") is not session
+    assert get_http_session("https://ghe.mhq.dev/api/v3", "token") is not session
+    close_http_sessions()
+
+
+def test_get_http_session_mounts_pooled_retrying_adapter():
+    close_http_sessions()
+
+    adapter = get_http_session("https://api.github.com", "token").get_adapter(
+        "https://api.github.com/user"
+    )
+
+    assert adapter._pool_maxsize == EXAPI_HTTP_POOL_SIZE
+    assert adapter.max_retries.total == EXAPI_HTTP_MAX_RETRIES
+    assert 503 in adapter.max_retries.status_forcelist
+    assert 403 not in adapter.max_retries.status_forcelist
+    close_http_sessions()
+
+
+def test_api_services_for_same_token_share_session():
+    close_http_sessions()
+
+    assert GithubApiService("token", None)._session is (
+        GithubApiService("token", None)._session
+    )
+    assert GitlabApiService("token")._session is GitlabApiService("token")._session
+    assert GitlabApiService("token")._session is not (
+        GithubApiService("token", None)._session
+    )
+    close_http_sessions()
+
+
+def test_get_http_session_retries_server_errors_over_kept_alive_connection():
+    close_http_sessions()
+    statuses = [503, 200, 200]
+    client_ports = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            client_ports.append(self.client_address[1])
+            self.send_response(statuses.pop(0))
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        session = get_http_session(base_url, "token")
+        first_response = session.get(f"{base_url}/user")
+        second_response = session.get(f"{base_url}/user")
+    finally:
+        close_http_sessions()
+        server.shutdown()
+        server.server_close()
+
+    assert first_response.status_code == 200
+    assert second_response.status_code == 200
+    assert len(client_ports) == 3
+    assert len(set(client_ports)) == 1
+
+
+def test_get_async_http_session_reuses_session_per_domain_and_token():
+    close_http_sessions()
+
+    async def _get_sessions():
+        return [
+            get_async_http_session("https://api.github.com", "token"),
+            get_async_http_session("https://api.github.com", "token"),
+            get_async_http_session("https://api.github.com", "other_token"),
+        ]
+
+    first_session, same_session, other_session = run_async_http_requests(
+        _get_sessions()
+    )
+    [next_call_session, _, _] = run_async_http_requests(_get_sessions())
+
+    assert same_session is first_session
+    assert next_call_session is first_session
+    assert other_session is not first_session
+    close_http_sessions()
+
+
+def test_get_async_http_session_retries_server_errors_over_kept_alive_connection():
+    close_http_sessions()
+    statuses = [503, 200, 200]
+    client_ports = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            client_ports.append(self.client_address[1])
+            self.send_response(statuses.pop(0))
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    async def _get_user():
+        return await get_async_http_session(base_url, "token").get(f"{base_url}/user")
+
+    try:
+        first_response = run_async_http_requests(_get_user())
+        second_response = run_async_http_requests(_get_user())
+    finally:
+        close_http_sessions()
+        server.shutdown()
+        server.server_close()
+
+    assert first_response.status == 200
+    assert second_response.status == 200
+    assert len(client_ports) == 3
+    assert len(set(client_ports)) == 1
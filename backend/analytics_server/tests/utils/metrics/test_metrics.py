@@ -0,0 +1,111 @@
+import os
+import subprocess
+import sys
+
+from flask import Blueprint, Flask
+from prometheus_client import REGISTRY
+
+from mhq.api import metrics as metrics_api
+from mhq.utils.metrics import get_exapi_endpoint, record_exapi_request
+
+ANALYTICS_SERVER_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+
+def test_exapi_endpoints_do_not_carry_repo_or_pr_ids():
+    assert get_exapi_endpoint(
+        "https://api.github.com/repos/middlewarehq/middleware/pulls/12/reviews?page=2"
+    ) == ("api.github.com", "/repos/{owner}/{repo}/pulls/{id}/reviews")
+    assert get_exapi_endpoint(
+        "https://gitlab.com/api/v4/projects/middlewarehq%2Fmiddleware/merge_requests/3"
+    ) == ("gitlab.com", "/api/v4/projects/{project}/merge_requests/{id}")
+    assert get_exapi_endpoint(
+        "https://github.example.com/api/v3/repos/org/repo/commits/4f9b1c2d"
+    ) == ("github.example.com", "/api/v3/repos/{owner}/{repo}/commits/{id}")
+    assert get_exapi_endpoint("https://api.github.com/orgs/middlewarehq/repos") == (
+        "api.github.com",
+        "/orgs/{org}/repos",
+    )
+
+
+def test_exapi_requests_are_recorded_per_endpoint():
+    labels = {
+        "host": "metrics.test",
+        "method": "GET",
+        "endpoint": "/repos/{owner}/{repo}/pulls",
+    }
+
+    record_exapi_request("get", "https://metrics.test/repos/org/a/pulls", 200, 0.2)
+    record_exapi_request("get", "https://metrics.test/repos/org/b/pulls", None, 0.1)
+
+    assert (
+        REGISTRY.get_sample_value(
+            "mhq_exapi_requests_total", {**labels, "status": "200"}
+        )
+        == 1
+    )
+    assert (
+        REGISTRY.get_sample_value(
+            "mhq_exapi_requests_total", {**labels, "status": "error"}
+        )
+        == 1
+    )
+    assert (
+        REGISTRY.get_sample_value("mhq_exapi_request_duration_seconds_count", labels)
+        == 2
+    )
+
+
+def test_metrics_of_all_processes_are_summed(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    record = (
+        "from mhq.utils.metrics import record_exapi_request;"
+        "record_exapi_request('GET', 'https://metrics.test/orgs/org/repos', 200, 0.1)"
+    )
+    for _ in range(2):
+        subprocess.run(
+            [sys.executable, "-c", record],
+            cwd=ANALYTICS_SERVER_DIR,
+            env=env,
+            check=True,
+        )
+
+    rendered = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from mhq.utils.metrics import render_metrics;"
+            "print(render_metrics().decode())",
+        ],
+        cwd=ANALYTICS_SERVER_DIR,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    assert (
+        'mhq_exapi_requests_total{endpoint="/orgs/{org}/repos",host="metrics.test",'
+        'method="GET",status="200"} 2.0'
+    ) in rendered.splitlines()
+
+
+def test_route_latency_is_recorded_per_route():
+    teams_api = Blueprint("metrics_test_teams", __name__)
+    teams_api.add_url_rule("/teams/<team_id>", "get_team", lambda team_id: team_id)
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(teams_api)
+    flask_app.register_blueprint(metrics_api.app)
+    client = flask_app.test_client()
+
+    client.get("/teams/1")
+    client.get("/teams/2")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    assert (
+        'mhq_http_request_duration_seconds_count{blueprint="metrics_test_teams",'
+        'method="GET",route="/teams/<team_id>",status="200"} 2.0'
+    ) in response.get_data(as_text=True)
@@ -0,0 +1,203 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mhq.utils.http_session import ConditionalRequestSession
+from mhq.utils.rate_limit import RateLimitScheduler
+
+NOW = 1_700_000_000.0
+
+
+class FakeClock:
+    def __init__(self, now: float = NOW):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _get_scheduler(clock: FakeClock, **kwargs) -> RateLimitScheduler:
+    return RateLimitScheduler(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def _get_rate_limit_headers(remaining: int, reset_in: int, limit: int = 5000):
+    return {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(int(NOW) + reset_in),
+    }
+
+
+def test_acquire_without_known_quota_does_not_wait():
+    clock = FakeClock()
+    scheduler = _get_scheduler(clock)
+
+    for _ in range(10):
+        scheduler.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_exhausted_quota_pauses_until_reset_and_retries():
+    clock = FakeClock()
+    scheduler = _get_scheduler(clock)
+
+    should_retry = scheduler.update(403, _get_rate_limit_headers(0, 100))
+    scheduler.acquire()
+
+    assert should_retry
+    assert clock.sleeps == [101]
+
+    scheduler.acquire()
+    assert clock.sleeps == [101]
+    assert scheduler.remaining == 4999
+
+
+def test_retry_after_pauses_for_given_seconds():
+    clock = FakeClock()
+    scheduler = _get_scheduler(clock)
+
+    assert scheduler.update(429, {"Retry-After": "30"})
+    scheduler.acquire()
+
+    assert clock.sleeps == [30]
+
+
+def test_secondary_rate_limit_without_headers_pauses_for_a_minute():
+    clock = FakeClock()
+    scheduler = _get_scheduler(clock)
+
+    assert scheduler.update(
+        403, {}, '{"message": "You have exceeded a secondary rate limit"}'
+    )
+    scheduler.acquire()
+
+    assert clock.sleeps == [60]
+
+
+def test_forbidden_without_rate_limit_is_not_retried():
+    clock = FakeClock()
+    scheduler = _get_scheduler(clock)
+
+    assert not scheduler.update(403, _get_rate_limit_headers(4000, 100), "Forbidden")
+    scheduler.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_rate_limit_longer_than_max_wait_is_not_retried():
+    clock = FakeClock()
+    scheduler = _get_scheduler(clock, max_wait_seconds=60)
+
+    assert not scheduler.update(403, _get_rate_limit_headers(0, 3600))
+
+
+def test_low_quota_is_spread_until_reset():
+    clock = FakeClock()
+    scheduler = _get_scheduler(clock, pacing_threshold=0.2, reserve=5)
+    scheduler.update(200, _get_rate_limit_headers(15, 100, limit=100))
+
+    for _ in range(3):
+        scheduler.acquire()
+
+    # 10 requests above the reserve over 100s, one every 10s
+    assert clock.sleeps == [10, 10]
+    assert scheduler.remaining == 12
+
+
+def test_high_quota_is_not_paced():
+    clock = FakeClock()
+    scheduler = _get_scheduler(clock)
+    scheduler.update(200, _get_rate_limit_headers(4000, 100))
+
+    for _ in range(100):
+        scheduler.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_get_concurrency_scales_with_remaining_quota():
+    clock = FakeClock()
+    scheduler = _get_scheduler(clock)
+    assert scheduler.get_concurrency(10) == 10
+
+    scheduler.update(200, _get_rate_limit_headers(2500, 100))
+    assert scheduler.get_concurrency(10) == 5
+
+    scheduler.update(200, _get_rate_limit_headers(1, 100))
+    assert scheduler.get_concurrency(10) == 1
+
+
+def test_gitlab_rate_limit_headers_are_read():
+    clock = FakeClock()
+    scheduler = _get_scheduler(clock)
+
+    should_retry = scheduler.update(
+        429,
+        {
+            "RateLimit-Limit": "2000",
+            "RateLimit-Remaining": "0",
+            "RateLimit-Reset": str(int(NOW) + 30),
+        },
+    )
+    scheduler.acquire()
+
+    assert should_retry
+    assert scheduler.limit == 2000
+    assert clock.sleeps == [31]
+
+
+def test_is_rate_limited_tells_rate_limits_apart_from_other_forbidden_responses():
+    assert RateLimitScheduler.is_rate_limited(403, _get_rate_limit_headers(0, 100))
+    assert RateLimitScheduler.is_rate_limited(429, {"Retry-After": "30"})
+    assert RateLimitScheduler.is_rate_limited(
+        403, {}, '{"message": "You have exceeded a secondary rate limit"}'
+    )
+    assert not RateLimitScheduler.is_rate_limited(
+        403, _get_rate_limit_headers(4000, 100), '{"message": "Must have admin rights"}'
+    )
+    assert not RateLimitScheduler.is_rate_limited(200, _get_rate_limit_headers(0, 100))
+
+
+def test_session_waits_and_retries_rate_limited_request():
+    responses = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            responses.append(self.path)
+            if len(responses) == 1:
+                self.send_response(403)
+                self.send_header("X-RateLimit-Limit", "5000")
+                self.send_header("X-RateLimit-Remaining", "0")
+                self.send_header("X-RateLimit-Reset", str(int(time.time()) + 5))
+            else:
+                self.send_response(200)
+                self.send_header("X-RateLimit-Limit", "5000")
+                self.send_header("X-RateLimit-Remaining", "4999")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            return
+
+    sleeps = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        session = ConditionalRequestSession(None, "scope")
+        session.rate_limiter = RateLimitScheduler(sleep=sleeps.append)
+        response = session.get(f"http://127.0.0.1:{server.server_port}/user")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.status_code == 200
+    assert len(responses) == 2
+    assert len(sleeps) == 1 and 4 <= sleeps[0] <= 7
+    assert session.rate_limiter.remaining == 4999
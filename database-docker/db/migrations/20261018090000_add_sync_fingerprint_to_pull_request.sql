@@ -0,0 +1,9 @@
+-- migrate:up
+
+ALTER TABLE public."PullRequest"
+ADD COLUMN "sync_fingerprint" character varying;
+
+-- migrate:down
+
+ALTER TABLE public."PullRequest"
+DROP COLUMN "sync_fingerprint";
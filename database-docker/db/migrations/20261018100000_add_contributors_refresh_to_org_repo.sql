@@ -0,0 +1,11 @@
+-- migrate:up
+
+ALTER TABLE public."OrgRepo"
+ADD COLUMN "pushed_at" timestamp with time zone,
+ADD COLUMN "contributors_refreshed_at" timestamp with time zone;
+
+-- migrate:down
+
+ALTER TABLE public."OrgRepo"
+DROP COLUMN "pushed_at",
+DROP COLUMN "contributors_refreshed_at";
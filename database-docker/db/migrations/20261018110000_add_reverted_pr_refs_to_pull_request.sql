@@ -0,0 +1,19 @@
+-- migrate:up
+
+ALTER TABLE public."PullRequest"
+ADD COLUMN "reverted_pr_number" character varying,
+ADD COLUMN "reverted_merge_commit_sha" character varying;
+
+UPDATE public."PullRequest"
+SET "reverted_pr_number" = substring(head_branch from 'revert-(\d+)-\w+')
+WHERE provider = 'github' AND head_branch ~ 'revert-\d+-\w+';
+
+UPDATE public."PullRequest"
+SET "reverted_merge_commit_sha" = lower(substring(head_branch from '^revert-([a-fA-F0-9]{8})$'))
+WHERE provider = 'gitlab' AND head_branch ~ '^revert-[a-fA-F0-9]{8}$';
+
+-- migrate:down
+
+ALTER TABLE public."PullRequest"
+DROP COLUMN "reverted_pr_number",
+DROP COLUMN "reverted_merge_commit_sha";
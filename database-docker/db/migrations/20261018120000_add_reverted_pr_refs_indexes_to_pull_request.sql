@@ -0,0 +1,11 @@
+-- migrate:up transaction:false
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS pull_request_repo_id_reverted_pr_number_index ON public."PullRequest" USING btree (repo_id, reverted_pr_number) WHERE reverted_pr_number IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS pull_request_repo_id_reverted_merge_commit_sha_index ON public."PullRequest" USING btree (repo_id, reverted_merge_commit_sha) WHERE reverted_merge_commit_sha IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS pull_request_repo_id_short_merge_commit_sha_index ON public."PullRequest" USING btree (repo_id, lower("left"((merge_commit_sha)::text, 8)));
+
+-- migrate:down transaction:false
+
+DROP INDEX CONCURRENTLY IF EXISTS pull_request_repo_id_short_merge_commit_sha_index;
+DROP INDEX CONCURRENTLY IF EXISTS pull_request_repo_id_reverted_merge_commit_sha_index;
+DROP INDEX CONCURRENTLY IF EXISTS pull_request_repo_id_reverted_pr_number_index;
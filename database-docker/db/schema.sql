@@ -178,7 +178,9 @@ CREATE TABLE public."OrgRepo" (
     language character varying,
     contributors jsonb,
     idempotency_key character varying,
-    slug character varying
+    slug character varying,
+    pushed_at timestamp with time zone,
+    contributors_refreshed_at timestamp with time zone
 );
 
 
@@ -226,7 +228,10 @@ CREATE TABLE public."PullRequest" (
     merge_to_deploy bigint,
     merge_commit_sha character varying,
     created_in_db_at timestamp with time zone DEFAULT now() NOT NULL,
-    updated_in_db_at timestamp with time zone DEFAULT now() NOT NULL
+    updated_in_db_at timestamp with time zone DEFAULT now() NOT NULL,
+    sync_fingerprint character varying,
+    reverted_pr_number character varying,
+    reverted_merge_commit_sha character varying
 );
 
 
@@ -909,6 +914,27 @@ CREATE INDEX pull_request_for_metrics_by_repos_by_created ON public."PullRequest
 CREATE UNIQUE INDEX pull_request_repo_id_number_unique_index ON public."PullRequest" USING btree (repo_id, number);
 
 
+--
+-- Name: pull_request_repo_id_reverted_merge_commit_sha_index; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX pull_request_repo_id_reverted_merge_commit_sha_index ON public."PullRequest" USING btree (repo_id, reverted_merge_commit_sha) WHERE (reverted_merge_commit_sha IS NOT NULL);
+
+
+--
+-- Name: pull_request_repo_id_reverted_pr_number_index; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX pull_request_repo_id_reverted_pr_number_index ON public."PullRequest" USING btree (repo_id, reverted_pr_number) WHERE (reverted_pr_number IS NOT NULL);
+
+
+--
+-- Name: pull_request_repo_id_short_merge_commit_sha_index; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX pull_request_repo_id_short_merge_commit_sha_index ON public."PullRequest" USING btree (repo_id, lower("left"((merge_commit_sha)::text, 8)));
+
+
 --
 -- Name: pull_request_repo_interval_index; Type: INDEX; Schema: public; Owner: -
 --
@@ -1360,4 +1386,8 @@ INSERT INTO public.schema_migrations (version) VALUES
     ('20240404142732'),
     ('20240430142502'),
     ('20240503060203'),
-    ('20240503073715');
+    ('20240503073715'),
+    ('20261018090000'),
+    ('20261018100000'),
+    ('20261018110000'),
+    ('20261018120000');
@@ -34,4 +34,10 @@ fi
 
 source ~/.bashrc
 
+if [ -n "${PROMETHEUS_MULTIPROC_DIR:-}" ]; then
+    echo 'MHQ_CLEARING PROMETHEUS METRICS'
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 /usr/bin/supervisord -c "/etc/supervisord.conf"